@@ -1,24 +1,26 @@
 # app/api/deps.py
 from __future__ import annotations
 
-from typing import Optional, Tuple, Generator, Dict, Any, Set
+from typing import Optional, Tuple, Generator, Dict, Any, Set, NamedTuple
 import re
 from urllib.parse import quote_plus
-from datetime import datetime
-from fastapi import Depends, Header, HTTPException, Request
+from fastapi import Depends, Header, HTTPException, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from jose import jwt, JWTError
 
 
 from sqlalchemy.orm import Session, joinedload, sessionmaker
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, and_
+from sqlalchemy.engine import Engine, make_url
 
 from app.core.config import settings
 from app.db.session import MasterSessionLocal, create_tenant_session
+from app.core.tenant_cache import tenant_cache
+from app.core.principal import Principal, PrincipalKey, principal_cache
 from app.models.tenant import Tenant
 from app.models.user import User, UserSession
 from app.models.role import Role
-from app.core.rbac import has_perm as rbac_has_perm
+from app.core.rbac import has_perm as rbac_has_perm, compiled_perms
 
 
 
@@ -69,6 +71,10 @@ def _load_tenant_from_claims(payload: dict, master_db: Session) -> Tenant:
     if not tid and not tcode:
         raise HTTPException(status_code=401, detail="Missing tenant in token")
 
+    cached = tenant_cache.get(tid, tcode)
+    if cached is not None:
+        return cached
+
     q = master_db.query(Tenant)
     if tid:
         q = q.filter(Tenant.id == tid)
@@ -80,30 +86,11 @@ def _load_tenant_from_claims(payload: dict, master_db: Session) -> Tenant:
         raise HTTPException(status_code=403, detail="Tenant not found")
     if not tenant.is_active:
         raise HTTPException(status_code=403, detail="Tenant inactive")
-    return tenant
-
-def _validate_session_and_version(tenant_db: Session, user: User, payload: dict) -> None:
-    tv = payload.get("tv")
-    if tv is None or int(tv) != int(user.token_version):
-        raise HTTPException(status_code=401, detail="Session expired. Please login again.")
 
-    sid = payload.get("sid")
-    if not sid:
-        raise HTTPException(status_code=401, detail="Missing session")
-
-    # enforce session active
-    now = datetime.utcnow()
-    sess = (
-        tenant_db.query(UserSession)
-        .filter(
-            UserSession.session_id == str(sid),
-            UserSession.user_id == user.id,
-            UserSession.revoked_at.is_(None),
-        )
-        .first()
-    )
-    if not sess:
-        raise HTTPException(status_code=401, detail="Session revoked. Please login again.")
+    # detach (all columns already loaded) so the row can outlive master_db
+    master_db.expunge(tenant)
+    tenant_cache.put(tid, tcode, tenant)
+    return tenant
 
 # =========================================================
 # DB URL BUILDERS (PROD SAFE)
@@ -153,21 +140,148 @@ def _resolve_tenant_db_uri(tenant: Tenant) -> str:
     return _tenant_db_url_from_db_name(db_name)
 
 
+# =========================================================
+# PRINCIPAL (user + session state, cached briefly)
+# =========================================================
+def _uid_from_claims(payload: dict) -> int:
+    uid = payload.get("uid")
+    if uid is None:
+        # backward fallback: sub might be user_id
+        sub = payload.get("sub")
+        if not sub:
+            raise HTTPException(status_code=401, detail="Invalid token payload")
+        uid = sub
+    try:
+        return int(uid)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+
+
+def _principal_key(payload: dict, tenant: Tenant, uid: int) -> PrincipalKey:
+    tv = payload.get("tv")
+    sid = payload.get("sid")
+    try:
+        tv_i = int(tv) if tv is not None else -1
+    except (TypeError, ValueError):
+        tv_i = -1
+    return (int(tenant.id), int(uid), str(sid or ""), tv_i)
+
+
+def _build_principal(tenant: Tenant, user: User, key: PrincipalKey, session_active: bool) -> Principal:
+    codes = set()
+    for r in (user.roles or []):
+        for p in (r.permissions or []):
+            c = (getattr(p, "code", None) or "").strip()
+            if c:
+                codes.add(c)
+    return Principal(
+        tenant_id=key[0],
+        tenant_code=str(tenant.code or ""),
+        user_id=int(user.id),
+        session_id=key[2],
+        token_version=int(user.token_version or 0),
+        is_active=bool(user.is_active),
+        is_admin=bool(user.is_admin),
+        session_active=bool(session_active),
+        perm_codes=frozenset(codes),
+    )
+
+
+def _check_principal(p: Principal, payload: dict) -> None:
+    # same order / messages as the original user + session checks
+    if not p.is_active:
+        raise HTTPException(status_code=403, detail="User inactive")
+    tv = payload.get("tv")
+    if tv is None or p.key[3] != int(p.token_version):
+        raise HTTPException(status_code=401, detail="Session expired. Please login again.")
+    if not payload.get("sid"):
+        raise HTTPException(status_code=401, detail="Missing session")
+    if not p.session_active:
+        raise HTTPException(status_code=401, detail="Session revoked. Please login again.")
+
+
+def _load_user_and_principal(
+    tenant_db: Session,
+    tenant: Tenant,
+    payload: dict,
+    *,
+    eager_roles: bool = False,
+) -> Tuple[User, Principal]:
+    """
+    Resolve the token's user against the tenant DB.
+
+    Cache hit  -> principal from memory, User by primary key (roles lazy unless eager_roles).
+    Cache miss -> ONE query: user + roles + permissions + live-session probe.
+    """
+    uid = _uid_from_claims(payload)
+    key = _principal_key(payload, tenant, uid)
+
+    principal = principal_cache.get(key)
+    if principal is not None:
+        if eager_roles:
+            user = (
+                tenant_db.query(User)
+                .options(joinedload(User.roles).joinedload(Role.permissions))
+                .filter(User.id == uid)
+                .first()
+            )
+        else:
+            user = tenant_db.get(User, uid)
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+    else:
+        row = (
+            tenant_db.query(User, UserSession.id)
+            .outerjoin(
+                UserSession,
+                and_(
+                    UserSession.user_id == User.id,
+                    UserSession.session_id == key[2],
+                    UserSession.revoked_at.is_(None),
+                ),
+            )
+            .options(joinedload(User.roles).joinedload(Role.permissions))
+            .filter(User.id == uid)
+            .first()
+        )
+        if not row:
+            raise HTTPException(status_code=401, detail="User not found")
+        user, live_session_id = row
+        principal = _build_principal(tenant, user, key, session_active=live_session_id is not None)
+        principal_cache.put(principal)
+
+    _check_principal(principal, payload)
+    user._principal = principal
+    return user, principal
+
+
 # =========================================================
 # TENANT DB (per request)
 # =========================================================
-def get_db(
+class TokenContext(NamedTuple):
+    payload: dict
+    tenant: Tenant
+
+
+def get_token_context(
     authorization: Optional[str] = Header(None),
     master_db: Session = Depends(get_master_db),
-) -> Generator[Session, None, None]:
+) -> TokenContext:
+    """
+    Decoded bearer claims + resolved tenant. FastAPI caches this per request,
+    so get_db / current_user / current_principal share one decode.
+    """
     raw = _extract_bearer(authorization)
     if not raw:
         raise HTTPException(status_code=401, detail="Missing token")
 
     payload = _decode_token(raw)
     tenant = _load_tenant_from_claims(payload, master_db)
+    return TokenContext(payload=payload, tenant=tenant)
 
-    db_uri = _resolve_tenant_db_uri(tenant)
+
+def get_db(ctx: TokenContext = Depends(get_token_context)) -> Generator[Session, None, None]:
+    db_uri = _resolve_tenant_db_uri(ctx.tenant)
 
     db = create_tenant_session(db_uri)
     try:
@@ -183,45 +297,59 @@ def get_current_user_and_tenant_from_token(raw_token: str, master_db: Session) -
     payload = _decode_token(raw_token)
     tenant = _load_tenant_from_claims(payload, master_db)
 
-    uid = payload.get("uid")
-    if uid is None:
-        # backward fallback: sub might be user_id
-        sub = payload.get("sub")
-        if not sub:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-        try:
-            uid = int(sub)
-        except ValueError:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-
     tenant_db = create_tenant_session(tenant.db_uri)
     try:
-        user: Optional[User] = (
-            tenant_db.query(User)
-            .options(joinedload(User.roles).joinedload(Role.permissions))
-            .filter(User.id == int(uid))
-            .first()
-        )
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        if not user.is_active:
-            raise HTTPException(status_code=403, detail="User inactive")
-
-        _validate_session_and_version(tenant_db, user, payload)
+        # session is closed before return -> roles must be loaded now
+        user, _principal = _load_user_and_principal(tenant_db, tenant, payload, eager_roles=True)
         return user, tenant
     finally:
         tenant_db.close()
 
 
 def current_user(
-    authorization: Optional[str] = Header(None),
-    master_db: Session = Depends(get_master_db),
+    ctx: TokenContext = Depends(get_token_context),
+    db: Session = Depends(get_db),
 ) -> User:
-    raw = _extract_bearer(authorization)
-    user, _tenant = get_current_user_and_tenant_from_token(raw, master_db)
+    """
+    Authenticated user, loaded through the same tenant session as get_db
+    (one connection per request). The cached Principal is attached as user._principal.
+    """
+    user, _principal = _load_user_and_principal(db, ctx.tenant, ctx.payload)
     return user
 
 
+def current_principal(
+    ctx: TokenContext = Depends(get_token_context),
+    db: Session = Depends(get_db),
+) -> Principal:
+    """
+    Lightweight auth dependency for routes that only need ids + permission codes.
+    """
+    _user, principal = _load_user_and_principal(db, ctx.tenant, ctx.payload)
+    return principal
+
+
+def _socket_tenant_key(raw_token: str) -> str:
+    with MasterSessionLocal() as master_db:
+        _user, tenant = get_current_user_and_tenant_from_token(raw_token, master_db)
+    return str(make_url(_resolve_tenant_db_uri(tenant)).database or "default")
+
+
+async def websocket_tenant(websocket: WebSocket) -> Optional[str]:
+    """
+    Tenant key (tenant DB name, as event_bus.tenant_of) of an authenticated
+    WebSocket, or None. Browsers cannot set headers on a WebSocket, so the
+    access token may also come as ?token=...
+    """
+    raw = _extract_bearer(websocket.headers.get("authorization")) or websocket.query_params.get("token")
+    if not raw:
+        return None
+    try:
+        return await run_in_threadpool(_socket_tenant_key, raw)
+    except HTTPException:
+        return None
+
+
 # =========================================================
 # CONNECTOR TENANT DB (Analyzer Connector only)
 # =========================================================
@@ -283,23 +411,7 @@ def get_connector_tenant_db(request: Request) -> Generator[Session, None, None]:
 # MASTER / PROVIDER CONSOLE HELPERS
 # =========================================================
 def user_perm_codes(u: Any) -> Set[str]:
-    codes: Set[str] = set()
-
-    direct = getattr(u, "permissions", None) or []
-    for p in direct:
-        code = p if isinstance(p, str) else getattr(p, "code", None)
-        if code:
-            codes.add(code)
-
-    roles = getattr(u, "roles", None) or []
-    for r in roles:
-        perms = getattr(r, "permissions", None) or []
-        for p in perms:
-            code = p if isinstance(p, str) else getattr(p, "code", None)
-            if code:
-                codes.add(code)
-
-    return codes
+    return set(compiled_perms(u).codes)
 
 
 def require_perm(u: Any, perm: str) -> None:
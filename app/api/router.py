@@ -65,6 +65,7 @@ from app.api import (
     # routes_billing_wallet,
     routes_pdf_templates,
     routes_ipd_pdfs,
+    routes_pdf_jobs,
     routes_ipd_drug_chart_form_pdf,
     routes_ipd_newborn,
     routes_ipd_admissions,
@@ -73,6 +74,7 @@ from app.api import (
     # routes_settings_branding
     routes_opd_reports,
     routes_billing_revenue,
+    routes_billing_ar,
     routes_billing_payments,
     routes_emr_template_library,
     routes_emr_all,
@@ -138,6 +140,7 @@ api_router.include_router(routes_ipd_nursing.router)
 api_router.include_router(routes_ipd_transfers.router)
 api_router.include_router(routes_ipd_referrals.router)
 api_router.include_router(routes_ipd_pdfs.router)
+api_router.include_router(routes_pdf_jobs.router)
 api_router.include_router(routes_pdf_templates.router)
 api_router.include_router(routes_ipd_drug_chart_form_pdf.router)
 api_router.include_router(routes_ipd_newborn.router)
@@ -169,6 +172,7 @@ api_router.include_router(charge_item_master.router)
 api_router.include_router(routes_billing_edits .router)
 api_router.include_router(routes_billing_print.router)
 api_router.include_router(routes_billing_revenue.router)
+api_router.include_router(routes_billing_ar.router)
 api_router.include_router(routes_billing_payments.router)
 # api_router.include_router(routes_billing_advances.router)
 # api_router.include_router(routes_billing_wallet.router )
@@ -14,6 +14,8 @@ from app.api.deps import get_master_db, get_current_user_and_tenant_from_token
 from app.core.config import settings
 from app.core.security import verify_password
 from app.db.session import create_tenant_session
+from app.core.tenant_cache import invalidate_tenant
+from app.core.principal import invalidate_principals
 from app.models.tenant import Tenant
 from app.models.user import User, UserSession
 from app.models.permission import Permission
@@ -196,6 +198,7 @@ def _cleanup_expired_sessions(db: Session, user_id: int) -> None:
             changed = True
     if changed:
         db.commit()
+        invalidate_principals(user_id=int(user_id))
 
 
 def _active_sessions(db: Session, user_id: int):
@@ -248,6 +251,7 @@ def _revoke_same_device_sessions(db: Session, user_id: int, request: Request, re
             changed = True
     if changed:
         db.commit()
+        invalidate_principals(user_id=int(user_id))
 
 
 def _revoke_session_by_sid(db: Session, user_id: int, sid: str, reason: str) -> None:
@@ -261,6 +265,7 @@ def _revoke_session_by_sid(db: Session, user_id: int, sid: str, reason: str) ->
         sess.revoked_at = now
         sess.revoke_reason = str(reason)
         db.commit()
+        invalidate_principals(user_id=int(user_id), session_id=str(sid))
 
 
 def _create_session(db: Session, user: User, request: Request) -> str:
@@ -389,6 +394,7 @@ def register_admin(
 
         master_db.commit()
         master_db.refresh(tenant)
+        invalidate_tenant(tenant_id=tenant.id, code=tenant.code)
 
     except ValueError as e:
         master_db.rollback()
@@ -644,6 +650,7 @@ def refresh_token(request: Request, response: Response, master_db: Session = Dep
             sess.revoked_at = _utcnow().isoformat()
             sess.revoke_reason = "expired"
             tenant_db.commit()
+            invalidate_principals(tenant_id=tenant.id, user_id=int(uid), session_id=str(sid))
             raise HTTPException(status_code=401, detail="Session expired. Please login again.")
 
         sess.last_seen_at = _utcnow().isoformat()
@@ -697,6 +704,7 @@ def logout(
         _revoke_session_by_sid(tenant_db, user_id=int(uid), sid=str(sid), reason="logout")
     finally:
         tenant_db.close()
+    invalidate_principals(tenant_id=tenant.id, user_id=int(uid), session_id=str(sid))
 
     return {"ok": True}
 
@@ -87,9 +87,10 @@ from app.services.billing_claims_service import (
 # import service functions you will add below
 from app.services.billing_finance import (
     apply_advances_to_selected_invoices,
+    case_ledger,
     list_case_invoice_outstanding,
 )
-from app.services.billing_service import update_invoice_line, delete_invoice_line
+from app.services.billing_service import update_invoice_line, delete_invoice_line, reconcile_invoice_totals
 
 try:
     from app.services.billing_finance import apply_advances_to_case, case_financials as case_financials_v2
@@ -2174,17 +2175,17 @@ def case_dashboard(
         c = _get_case_or_404(db, user, case_id)
         p = db.query(Patient).filter(Patient.id == int(c.patient_id)).first()
 
-        inv_rows = (db.query(BillingInvoice).filter(
-            BillingInvoice.billing_case_id == int(c.id)).order_by(
-                desc(BillingInvoice.created_at)).all())
+        led = case_ledger(db, case_id=int(c.id))
+        inv_rows = sorted((x.invoice for x in led.invoices),
+                          key=lambda inv: inv.created_at,
+                          reverse=True)
 
         # totals by module (ignore VOID)
-        mod_rows = (db.query(
-            BillingInvoice.module,
-            func.coalesce(func.sum(BillingInvoice.grand_total), 0),
-        ).filter(BillingInvoice.billing_case_id == int(c.id)).filter(
-            BillingInvoice.status != DocStatus.VOID).group_by(
-                BillingInvoice.module).all())
+        mod_rows: Dict[Optional[str], Decimal] = {}
+        for x in led.live:
+            mod_rows[x.invoice.module] = mod_rows.get(
+                x.invoice.module, Decimal("0")) + Decimal(
+                    str(x.invoice.grand_total or 0))
 
         # ✅ show ALL modules always + amount order wise
         mod_amount: Dict[str, Decimal] = {
@@ -2193,7 +2194,7 @@ def case_dashboard(
         }
         extra_amount: Dict[str, Decimal] = {}
 
-        for mod, amt in mod_rows:
+        for mod, amt in mod_rows.items():
             m = (mod or "MISC").strip().upper() or "MISC"
             a = Decimal(str(amt or 0))
             if m in mod_amount:
@@ -2222,22 +2223,9 @@ def case_dashboard(
 
         particulars.sort(key=lambda x: x["amount"], reverse=True)
 
-        paid = (db.query(func.coalesce(
-            func.sum(BillingPayment.amount),
-            0)).filter(BillingPayment.billing_case_id == int(c.id)).scalar())
-        paid = Decimal(str(paid or 0))
-
-        adv = (db.query(func.coalesce(
-            func.sum(BillingAdvance.amount),
-            0)).filter(BillingAdvance.billing_case_id == int(c.id)).filter(
-                BillingAdvance.entry_type == AdvanceType.ADVANCE).scalar())
-        adv = Decimal(str(adv or 0))
-
-        refunds = (db.query(func.coalesce(
-            func.sum(BillingAdvance.amount),
-            0)).filter(BillingAdvance.billing_case_id == int(c.id)).filter(
-                BillingAdvance.entry_type == AdvanceType.REFUND).scalar())
-        refunds = Decimal(str(refunds or 0))
+        paid = led.payments_total
+        adv = led.advance_in
+        refunds = led.advance_refund
 
         net_deposit = adv - refunds
         balance = total_bill - paid
@@ -4645,10 +4633,11 @@ def recalc_invoice(
 
         _require_perm_code(user, "billing.invoice.recalculate")
 
-        inv = _recalc_invoice_totals(db, inv)
+        # full re-aggregation; "drift" = stored (incrementally maintained) - computed
+        rec = reconcile_invoice_totals(db, int(inv.id), fix=True)
         db.commit()
         db.refresh(inv)
-        return {"invoice": _invoice_to_dict(inv)}
+        return {"invoice": _invoice_to_dict(inv), "drift": rec["drift"]}
     except Exception as e:
         db.rollback()
         _err(e)
@@ -0,0 +1,60 @@
+# FILE: app/api/routes_billing_ar.py
+from __future__ import annotations
+
+from datetime import date
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db, current_user
+from app.models.user import User
+from app.models.billing import PayerType
+from app.services import billing_ar
+
+router = APIRouter(prefix="/billing/ar", tags=["Billing AR"])
+
+
+@router.get("/receivables")
+def receivables(
+        db: Session = Depends(get_db),
+        _user: User = Depends(current_user),
+        payer: str = Query("all", description="all | patient | payer (insurer / TPA / corporate)"),
+        sort: str = Query("outstanding", description="outstanding (largest first) | oldest (oldest open invoice first)"),
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+) -> Dict[str, Any]:
+    """
+    Billing cases with an outstanding balance, from billing_case_balances.
+    Keyset paginated: pass next_cursor back until it is null.
+    """
+    return billing_ar.receivables(db, payer=payer, sort=sort, limit=limit, cursor=cursor)
+
+
+@router.get("/aging")
+def aging(
+        db: Session = Depends(get_db),
+        _user: User = Depends(current_user),
+        as_of: Optional[date] = Query(None, description="YYYY-MM-DD (default today)"),
+        payer_type: Optional[PayerType] = Query(None),
+) -> Dict[str, Any]:
+    """
+    Open invoice outstanding per payer type in 0-30 / 31-60 / 61-90 / 90+
+    day buckets. Age = as_of - DATE(COALESCE(posted_at, approved_at, created_at)).
+    """
+    return billing_ar.aging_summary(db, as_of=as_of or date.today(), payer_type=payer_type)
+
+
+@router.get("/aging/invoices")
+def aging_invoices(
+        db: Session = Depends(get_db),
+        _user: User = Depends(current_user),
+        as_of: Optional[date] = Query(None, description="YYYY-MM-DD (default today)"),
+        bucket: Optional[str] = Query(None, description="0_30 | 31_60 | 61_90 | 90_plus"),
+        payer_type: Optional[PayerType] = Query(None),
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+) -> Dict[str, Any]:
+    """Open invoices oldest first (drill-down of /aging), keyset paginated."""
+    return billing_ar.aging_invoices(db, as_of=as_of or date.today(), bucket=bucket,
+                                     payer_type=payer_type, limit=limit, cursor=cursor)
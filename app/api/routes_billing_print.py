@@ -10,7 +10,7 @@ from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 import json
 import logging
 import re
-from fastapi import APIRouter, Depends, HTTPException, Query, Path as FPath
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Path as FPath
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, selectinload, joinedload
 from sqlalchemy.inspection import inspect as sa_inspect
@@ -41,6 +41,7 @@ from app.models.billing import (
     AdvanceType,
 )
 from app.models.ui_branding import UiBranding
+from app.services import pdf_assets, pdf_cache
 
 # ✅ payer masters
 from app.models.payer import Payer, Tpa, CreditPlan  # type: ignore
@@ -543,7 +544,7 @@ def _amount_in_words_inr(amount: Any) -> str:
 # Loaders
 # =========================================================
 def _load_branding(db: Session) -> Optional[UiBranding]:
-    return db.query(UiBranding).order_by(UiBranding.id.desc()).first()
+    return pdf_assets.branding(db)
 
 
 def _load_case(db: Session, case_id: int) -> BillingCase:
@@ -1947,7 +1948,7 @@ def _read_logo_reader(branding: Any) -> Optional[ImageReader]:
     if not abs_path.exists() or not abs_path.is_file():
         return None
     try:
-        return ImageReader(str(abs_path))
+        return pdf_assets.image_reader(abs_path)
     except Exception:
         return None
 
@@ -2037,7 +2038,7 @@ def _read_pdf_header_reader(branding: Any) -> Optional[ImageReader]:
             p = base.joinpath(rel)
         if not p.exists() or not p.is_file():
             return None
-        return ImageReader(str(p))
+        return pdf_assets.image_reader(p)
     except Exception:
         return None
 
@@ -4929,9 +4930,34 @@ def billing_overview_pdf(
                              headers=headers)
 
 
+def _posted_invoices_version(db: Session, case: BillingCase,
+                             invoices: List[BillingInvoice]) -> Optional[List[Any]]:
+    """
+    pdf_cache content version for invoice prints: only when every invoice
+    is POSTED (lines frozen; corrections go through notes). None = render live.
+    """
+    if not invoices or any(inv.status != DocStatus.POSTED for inv in invoices):
+        return None
+    ids = [int(inv.id) for inv in invoices]
+    lines = {
+        int(iid): [int(cnt or 0), str(total or 0)]
+        for iid, cnt, total in db.query(
+            BillingInvoiceLine.invoice_id,
+            func.count(BillingInvoiceLine.id),
+            func.sum(BillingInvoiceLine.net_amount),
+        ).filter(BillingInvoiceLine.invoice_id.in_(ids)).group_by(BillingInvoiceLine.invoice_id)
+    }
+    header = _build_header_payload(db, case, doc_no=None, doc_date=None)
+    return [
+        pdf_cache.digest(header),
+        [[int(inv.id), inv.updated_at, str(inv.grand_total), lines.get(int(inv.id))] for inv in invoices],
+    ]
+
+
 # ✅ FIX: invoice_id is PATH param + supports A3/A4/A5 + landscape
 @router.get("/invoices/{invoice_id}/pdf")
 def billing_invoice_pdf(
+        request: Request,
         invoice_id: int = FPath(..., gt=0),
         disposition: str = Query("inline", pattern="^(inline|attachment)$"),
         paper: str = Query("A4", pattern="^(A3|A4|A5)$"),
@@ -4943,15 +4969,7 @@ def billing_invoice_pdf(
 
     inv = _load_invoice(db, invoice_id)
 
-    # Branding (tenant safe)
-    branding_q = db.query(UiBranding)
-    tenant_id = getattr(user, "tenant_id", None) or getattr(
-        user, "hospital_id", None)
-    if tenant_id is not None and hasattr(UiBranding, "tenant_id"):
-        branding_q = branding_q.filter(UiBranding.tenant_id == tenant_id)
-    if hasattr(UiBranding, "is_active"):
-        branding_q = branding_q.filter(UiBranding.is_active.is_(True))
-    branding = branding_q.order_by(UiBranding.id.desc()).first()
+    branding = pdf_assets.branding(db)
 
     # Load case + patient for header
     cid = getattr(inv, "billing_case_id", None) or getattr(
@@ -4962,26 +4980,33 @@ def billing_invoice_pdf(
     case = _load_case(db, int(cid))
 
     invoices = [inv]
-    pdf_bytes = _render_invoices_by_case_pdf_reportlab(
-        db=db,
-        case=case,
-        invoices=invoices,
-        branding=branding,
-        paper=paper,
-        orientation=orientation,
-        printed_by=_safe(getattr(user, "name", None)),
+    printed_by = _safe(getattr(user, "name", None))
+    pdf = pdf_cache.get_or_render(
+        db,
+        "billing_invoice",
+        inv.id,
+        _posted_invoices_version(db, case, invoices),
+        lambda: _render_invoices_by_case_pdf_reportlab(
+            db=db,
+            case=case,
+            invoices=invoices,
+            branding=branding,
+            paper=paper,
+            orientation=orientation,
+            printed_by=printed_by,
+        ),
+        # footer carries printed by / printed date
+        options=(pdf_cache.branding_version(branding), paper, orientation, printed_by, date.today()),
     )
 
     filename = f"Invoice_{_invoice_bill_no(inv)}.pdf"
-    headers = {"Content-Disposition": f'{disposition}; filename="{filename}"'}
-    return StreamingResponse(BytesIO(pdf_bytes),
-                             media_type="application/pdf",
-                             headers=headers)
+    return pdf_cache.pdf_response(request, pdf, filename, disposition)
 
 
 # ✅ NEW (IMPORTANT): Invoices by Case (this was missing)
 @router.get("/cases/{case_id}/invoices/pdf")
 def billing_case_invoices_pdf(
+        request: Request,
         case_id: int = FPath(..., gt=0),
         include_draft_invoices: bool = Query(True),
         disposition: str = Query("inline", pattern="^(inline|attachment)$"),
@@ -4994,34 +5019,32 @@ def billing_case_invoices_pdf(
 
     case = _load_case(db, int(case_id))
 
-    # Branding (tenant safe)
-    branding_q = db.query(UiBranding)
-    tenant_id = getattr(user, "tenant_id", None) or getattr(
-        user, "hospital_id", None)
-    if tenant_id is not None and hasattr(UiBranding, "tenant_id"):
-        branding_q = branding_q.filter(UiBranding.tenant_id == tenant_id)
-    if hasattr(UiBranding, "is_active"):
-        branding_q = branding_q.filter(UiBranding.is_active.is_(True))
-    branding = branding_q.order_by(UiBranding.id.desc()).first()
+    branding = pdf_assets.branding(db)
 
     invoices = _list_case_invoices(
         db, case.id, include_draft_invoices=include_draft_invoices)
 
-    pdf_bytes = _render_invoices_by_case_pdf_reportlab(
-        db=db,
-        case=case,
-        invoices=invoices,
-        branding=branding,
-        paper=paper,
-        orientation=orientation,
-        printed_by=_safe(getattr(user, "name", None)),
+    printed_by = _safe(getattr(user, "name", None))
+    pdf = pdf_cache.get_or_render(
+        db,
+        "billing_case_invoices",
+        case.id,
+        _posted_invoices_version(db, case, invoices),
+        lambda: _render_invoices_by_case_pdf_reportlab(
+            db=db,
+            case=case,
+            invoices=invoices,
+            branding=branding,
+            paper=paper,
+            orientation=orientation,
+            printed_by=printed_by,
+        ),
+        options=(pdf_cache.branding_version(branding), paper, orientation, printed_by, date.today(),
+                 include_draft_invoices),
     )
 
     filename = f"Invoices_Case_{_safe(getattr(case, 'case_number', None))}.pdf"
-    headers = {"Content-Disposition": f'{disposition}; filename="{filename}"'}
-    return StreamingResponse(BytesIO(pdf_bytes),
-                             media_type="application/pdf",
-                             headers=headers)
+    return pdf_cache.pdf_response(request, pdf, filename, disposition)
 
 # The above code is defining a route in a Python FastAPI application for generating a PDF document
 # that contains the full history of a billing case. The route is accessed using a GET request to
@@ -5045,14 +5068,7 @@ def billing_case_full_history_pdf(
 
     case = _load_case(db, int(case_id))
 
-    branding_q = db.query(UiBranding)
-    tenant_id = getattr(user, "tenant_id", None) or getattr(
-        user, "hospital_id", None)
-    if tenant_id is not None and hasattr(UiBranding, "tenant_id"):
-        branding_q = branding_q.filter(UiBranding.tenant_id == tenant_id)
-    if hasattr(UiBranding, "is_active"):
-        branding_q = branding_q.filter(UiBranding.is_active.is_(True))
-    branding = branding_q.order_by(UiBranding.id.desc()).first()
+    branding = pdf_assets.branding(db)
 
     invoices = _list_case_invoices(
         db, case.id, include_draft_invoices=include_draft_invoices)
@@ -5426,7 +5442,7 @@ def _is_pharmacy_line(ln, invoice=None) -> bool:
 
 
 def get_branding_for_context(db, context_code: str | None):
-    base = db.query(UiBranding).order_by(UiBranding.id.asc()).first()
+    base = pdf_assets.branding(db)
     ctx = None
     if context_code:
         ctx = db.query(UiBrandingContext).filter(
@@ -5480,7 +5496,7 @@ def _read_asset_reader_by_attr(branding: Any,
     if not abs_path.exists() or not abs_path.is_file():
         return None
     try:
-        return ImageReader(str(abs_path))
+        return pdf_assets.image_reader(abs_path)
     except Exception:
         return None
 
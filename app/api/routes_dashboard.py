@@ -2,7 +2,9 @@
 from __future__ import annotations
 
 from datetime import date
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_db, current_user as auth_current_user
@@ -17,6 +19,10 @@ router = APIRouter()
 def get_dashboard_data(
     date_from: date,
     date_to: date,
+    widgets: Optional[str] = Query(
+        None,
+        description="Comma-separated widget codes to build (default: all permitted)",
+    ),
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_current_user),
 ) -> DashboardDataResponse:
@@ -24,6 +30,8 @@ def get_dashboard_data(
     Professional live dashboard data endpoint.
     - Aware of OPD, IPD, Pharmacy, Lab, Radiology, OT & Billing.
     - Returns metrics, tables and charts based on your DB.
+    - ?widgets=code1,code2 builds only those tiles (progressive loading);
+      filters.available_widgets lists every tile the user may request.
     """
     # Guard: swap if user sends wrong order
     if date_to < date_from:
@@ -34,4 +42,5 @@ def get_dashboard_data(
         user=current_user,
         date_from=date_from,
         date_to=date_to,
+        widgets=widgets.split(",") if widgets is not None else None,
     )
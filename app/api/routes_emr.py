@@ -19,7 +19,7 @@ from app.services.emr_opd_summary import build_emr_opd_visit_summary
 from app.models.lis import LisOrder, LisOrderItem, LisResultLine
 from app.services.emr_lab_report import build_emr_lab_report
 from app.services.pdf_patient_lab_history import build_patient_lab_history_pdf
-from app.services.ui_branding import get_ui_branding
+from app.services import pdf_assets, pdf_render_pool
 from app.services.pdf_lab_report_weasy import build_lab_report_pdf_bytes
 from app.services.emr_lab_report import build_emr_lab_report_object_for_pdf
 
@@ -163,13 +163,24 @@ def emr_patient_opd_visits(
 @router.get("/opd/visits/{visit_id}/summary/pdf")
 def emr_visit_summary_pdf(
         visit_id: int,
+        async_: bool = Query(False, alias="async"),
         db: Session = Depends(get_db),
         user: User = Depends(current_user),
 ):
     _require_emr_view(user)
 
-    buff = build_visit_summary_pdf(db, visit_id)
     filename = f"OPD_Visit_{visit_id}.pdf"
+    if async_ and pdf_render_pool.enabled():
+        job = pdf_render_pool.submit(
+            db,
+            "app.services.pdf_opd_summary:build_visit_summary_pdf",
+            {"visit_id": visit_id},
+            filename=filename,
+            user_id=getattr(user, "id", None),
+        )
+        return pdf_render_pool.accepted(job)
+
+    buff = build_visit_summary_pdf(db, visit_id)
 
     return StreamingResponse(
         buff,
@@ -185,6 +196,7 @@ def emr_patient_opd_history_pdf(
         date_from: Optional[date] = Query(None),
         date_to: Optional[date] = Query(None),
         limit: int = Query(50, ge=1, le=200),
+        async_: bool = Query(False, alias="async"),
         db: Session = Depends(get_db),
         user: User = Depends(current_user),
 ):
@@ -194,6 +206,24 @@ def emr_patient_opd_history_pdf(
     if not p:
         raise HTTPException(status_code=404, detail="Patient not found")
 
+    uhid = getattr(p, "uhid", "") or f"PAT-{patient_id}"
+    filename = f"EMR_OPD_HISTORY_{uhid}.pdf"
+
+    if async_ and pdf_render_pool.enabled():
+        job = pdf_render_pool.submit(
+            db,
+            "app.services.pdf_patient_opd_history:build_patient_opd_history_pdf",
+            {
+                "patient_id": patient_id,
+                "date_from": date_from,
+                "date_to": date_to,
+                "limit": limit,
+            },
+            filename=filename,
+            user_id=getattr(user, "id", None),
+        )
+        return pdf_render_pool.accepted(job)
+
     buff = build_patient_opd_history_pdf(
         db,
         patient_id,
@@ -202,9 +232,6 @@ def emr_patient_opd_history_pdf(
         limit=limit,
     )
 
-    uhid = getattr(p, "uhid", "") or f"PAT-{patient_id}"
-    filename = f"EMR_OPD_HISTORY_{uhid}.pdf"
-
     return StreamingResponse(
         buff,
         media_type="application/pdf",
@@ -301,7 +328,7 @@ def emr_lab_report_pdf(
 ):
     _require_emr_view(user)
 
-    branding = get_ui_branding(db)
+    branding = pdf_assets.branding(db)
     report_obj, patient_obj, lab_no, order_date, collected_by_name = (
         build_emr_lab_report_object_for_pdf(db, order_id))
 
@@ -332,6 +359,7 @@ def emr_patient_lab_history_pdf(
         date_from: Optional[date] = Query(None),
         date_to: Optional[date] = Query(None),
         limit: int = Query(200, ge=1, le=400),
+        async_: bool = Query(False, alias="async"),
         db: Session = Depends(get_db),
         user: User = Depends(current_user),
 ):
@@ -341,6 +369,24 @@ def emr_patient_lab_history_pdf(
     if not p:
         raise HTTPException(status_code=404, detail="Patient not found")
 
+    uhid = getattr(p, "uhid", "") or f"PAT-{patient_id}"
+    filename = f"EMR_LAB_HISTORY_{uhid}.pdf"
+
+    if async_ and pdf_render_pool.enabled():
+        job = pdf_render_pool.submit(
+            db,
+            "app.services.pdf_patient_lab_history:build_patient_lab_history_pdf",
+            {
+                "patient_id": patient_id,
+                "date_from": date_from,
+                "date_to": date_to,
+                "limit": limit,
+            },
+            filename=filename,
+            user_id=getattr(user, "id", None),
+        )
+        return pdf_render_pool.accepted(job)
+
     buff = build_patient_lab_history_pdf(
         db,
         patient_id,
@@ -349,9 +395,6 @@ def emr_patient_lab_history_pdf(
         limit=limit,
     )
 
-    uhid = getattr(p, "uhid", "") or f"PAT-{patient_id}"
-    filename = f"EMR_LAB_HISTORY_{uhid}.pdf"
-
     return StreamingResponse(
         buff,
         media_type="application/pdf",
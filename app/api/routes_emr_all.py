@@ -56,6 +56,7 @@ from app.schemas.emr_all import (
 
 )
 
+from app.services import pdf_render_pool
 from app.services.emr_all_service import (
     meta,
     template_list,
@@ -629,12 +630,31 @@ def api_export_generate(
     request: Request,
     paper: str = Query("A4", pattern="^(A3|A4|A5)$"),
     orientation: str = Query("portrait", pattern="^(portrait|landscape)$"),
+    async_: bool = Query(False, alias="async"),
     db: Session = Depends(get_db),
     user: User = Depends(current_user),
 ):
     _need_any(user, ["emr.export.generate", "emr.manage"])
     uid = int(getattr(user, "id", 0) or 0)
     ip, ua = _client_meta(request)
+    if async_ and pdf_render_pool.enabled():
+        # the export stores its own file; the job result carries pdf_file_key
+        job = pdf_render_pool.submit(
+            db,
+            "app.services.emr_all_service:export_generate_pdf",
+            {
+                "bundle_id": bundle_id,
+                "user_id": uid,
+                "ip": ip,
+                "ua": ua,
+                "paper": paper,
+                "orientation": orientation,
+            },
+            filename=f"EMR_Export_{bundle_id}.pdf",
+            user_id=uid or None,
+        )
+        return pdf_render_pool.accepted(job)
+
     data = export_generate_pdf(
         db,
         bundle_id=bundle_id,
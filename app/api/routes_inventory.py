@@ -44,6 +44,7 @@ from app.models.pharmacy_prescription import (
     PharmacyPrescriptionLine,
 )
 from app.services.drug_schedules import IN_DCA, US_CSA, get_schedule_meta
+from app.services import pdf_assets
 from app.schemas.common import ApiResponse
 from app.schemas.pharmacy_inventory import (
     LocationCreate,
@@ -259,7 +260,7 @@ def _validate_payment_block(
 # Branding
 # ============================================================
 def _branding(db: Session) -> Optional[UiBranding]:
-    return db.query(UiBranding).order_by(UiBranding.id.asc()).first()
+    return pdf_assets.branding(db)
 
 
 # ============================================================
@@ -18,12 +18,21 @@ def get_po_suggestions(
     location_id: int = Query(..., ge=1),
     supplier_id: Optional[int] = Query(None, ge=1),
     limit: int = Query(200, ge=1, le=1000),
+    consumption_days: int = Query(30, ge=1, le=365),
+    lead_time_days: int = Query(7, ge=0, le=180),
     db: Session = Depends(get_db),
     me: User = Depends(auth_current_user),
 ):
     if not has_perm(me, "pharmacy.inventory.po.view"):
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return po_suggestions(db, location_id=location_id, supplier_id=supplier_id, limit=limit)
+    return po_suggestions(
+        db,
+        location_id=location_id,
+        supplier_id=supplier_id,
+        limit=limit,
+        consumption_days=consumption_days,
+        lead_time_days=lead_time_days,
+    )
 
 
 @router.get("/items/{item_id:int}/price-hint")
@@ -1,6 +1,6 @@
 # FILE: app/api/routes_ipd.py
 from __future__ import annotations
-from datetime import datetime, date, timedelta, time, timezone
+from datetime import datetime, date, timedelta, timezone
 from typing import List, Optional
 import logging
 
@@ -25,7 +25,6 @@ from app.models.ipd import (
     IpdOtCase,
     IpdAnaesthesiaRecord,
     IpdRoom,
-    IpdBedRate,
     IpdWard,
     IpdAdmissionFeedback,
     # NEW models
@@ -101,7 +100,7 @@ from app.schemas.ipd import (
 
 # adjust if your model path differs
 # we will create this
-from app.services.ipd_billing import compute_ipd_room_charges_daily
+from app.services.ipd_room_charges import room_days
 from app.models.ipd import IpdBed, IpdBedAssignment, IpdAdmission
 from app.services.id_gen import make_ip_admission_code
 from app.services.billing_ipd_room import sync_ipd_room_charges
@@ -1218,18 +1217,6 @@ def list_anaesthesia_for_case(
 
 
 # ---------------- Bed Charge PREVIEW ----------------
-def _resolve_rate(db: Session, room_type: str,
-                  for_date: date) -> Optional[float]:
-    r = (
-        db.query(IpdBedRate).filter(IpdBedRate.is_active.is_(True)).filter(
-            IpdBedRate.room_type == room_type).filter(
-                IpdBedRate.effective_from <= for_date).filter(
-                    (IpdBedRate.effective_to == None)  # noqa: E711
-                    | (IpdBedRate.effective_to >= for_date)).order_by(
-                        IpdBedRate.effective_from.desc()).first())
-    return float(r.daily_rate) if r else None
-
-
 @router.get(
     "/admissions/{admission_id}/bed-charges/preview",
     response_model=BedChargePreviewOut,
@@ -1265,7 +1252,6 @@ def _preview_bed_charges_core(admission_id: int, from_date: date,
     if not has_perm(user, "ipd.view"):
         raise HTTPException(403, "Not permitted")
 
-    data = compute_ipd_room_charges_daily(db, admission_id, from_date, to_date)
     if to_date < from_date:
         raise HTTPException(400, "to_date must be >= from_date")
 
@@ -1273,46 +1259,24 @@ def _preview_bed_charges_core(admission_id: int, from_date: date,
     if not adm:
         raise HTTPException(404, "Admission not found")
 
-    assigns = (db.query(IpdBedAssignment).filter(
-        IpdBedAssignment.admission_id == admission_id).order_by(
-            IpdBedAssignment.from_ts.asc()).all())
-
     days: List[BedChargeDay] = []
     missing = 0
-    cursor = from_date
-    while cursor <= to_date:
-        eod = datetime.combine(cursor, time.max)
-        active = None
-        for a in assigns:
-            start_ok = a.from_ts <= eod
-            end_ok = (a.to_ts is None) or (a.to_ts >= datetime.combine(
-                cursor, time.min))
-            if start_ok and end_ok:
-                active = a
-        if not active:
-            cursor += timedelta(days=1)
-            continue
-
-        bed = db.query(IpdBed).get(active.bed_id)
-        room = db.query(IpdRoom).get(bed.room_id) if bed else None
-        room_type = room.type if room else "General"
-        rate = _resolve_rate(db, room_type, cursor)
-
-        if rate is None:
+    for rd in room_days(db,
+                        admission_id,
+                        from_date,
+                        to_date,
+                        room_type=lambda room: room.type
+                        if room else "General"):
+        if rd.rate is None:
             missing += 1
-            rate_val = 0.0
-        else:
-            rate_val = float(rate)
-
         days.append(
             BedChargeDay(
-                date=cursor,
-                bed_id=bed.id if bed else None,
-                room_type=room_type,
-                rate=rate_val,
-                assignment_id=active.id,
+                date=rd.day,
+                bed_id=rd.bed.id if rd.bed else None,
+                room_type=rd.room_type,
+                rate=float(rd.rate) if rd.rate is not None else 0.0,
+                assignment_id=rd.assignment.id,
             ))
-        cursor += timedelta(days=1)
 
     total = round(sum(d.rate for d in days), 2)
     return BedChargePreviewOut(
@@ -31,6 +31,7 @@ from app.schemas.ipd import (
     DischargeMedicationOut,
 )
 
+from app.services import pdf_cache
 from app.services.pdf_discharge import generate_discharge_summary_pdf
 from app.services.ipd_billing import (
     ensure_invoice_for_context,
@@ -421,6 +422,8 @@ def save_discharge_summary(
         obj.finalized_at = datetime.utcnow()
 
     db.commit()
+    if getattr(obj, "finalized", False):
+        pdf_cache.invalidate(db, "discharge_summary", admission_id)
     db.refresh(obj)
     return obj
 
@@ -4,13 +4,13 @@ from __future__ import annotations
 from datetime import datetime, date
 from typing import List, Optional, Dict, Any, Set, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from sqlalchemy.exc import IntegrityError
 
-from app.api.deps import get_db, current_user as auth_current_user
+from app.api.deps import get_db, current_user as auth_current_user, websocket_tenant
 from app.models.user import User
 from app.models.ipd import IpdWard, IpdRoom, IpdBed, IpdPackage, IpdBedRate
 from app.schemas.ipd import (
@@ -25,6 +25,8 @@ from app.schemas.ipd import (
     BedRateIn,
     BedRateOut,
 )
+from app.services import event_bus
+from app.services import ipd_bed_feed  # noqa: F401  (registers the bed board push hook)
 
 router = APIRouter()
 
@@ -1197,6 +1199,16 @@ def bedboard_with_rate(
     )
 
 
+@router.websocket("/bedboard/ws")
+async def bedboard_ws(websocket: WebSocket):
+    """Pushes {"type": "ipd.beds.changed", bed_ids}; reload /bedboard."""
+    tenant = await websocket_tenant(websocket)
+    if tenant is None:
+        await websocket.close(code=4401)
+        return
+    await event_bus.serve(websocket, tenant, [event_bus.IPD_BEDS])
+
+
 @router.get("/beds-with-rate")
 def list_beds_with_rate(
         room_id: Optional[int] = None,
@@ -4,12 +4,13 @@ from __future__ import annotations
 from typing import Optional, Any
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
 from app.models.user import User
 from app.api.deps import get_db, current_user
+from app.services import pdf_render_pool
 
 # ✅ keep your import (adjust if your folder is app/services/pdf not pdfs)
 from app.services.pdfs.ipd_case_sheet import build_ipd_case_sheet_pdf
@@ -71,12 +72,28 @@ def get_ipd_case_sheet_pdf(
     template_id: Optional[int] = None,
     period_from: Optional[str] = None,
     period_to: Optional[str] = None,
+    async_: bool = Query(False, alias="async"),
     db: Session = Depends(get_db),
     user: User = Depends(current_user),
 ):
     if not _can_ipd_pdf(user):
         raise HTTPException(403, "Not permitted")
 
+    if async_ and pdf_render_pool.enabled():
+        job = pdf_render_pool.submit(
+            db,
+            "app.services.pdfs.ipd_case_sheet:build_ipd_case_sheet_pdf",
+            {
+                "admission_id": admission_id,
+                "template_id": template_id,
+                "period_from": period_from,
+                "period_to": period_to,
+            },
+            filename=f"IPD_CaseSheet_{admission_id}.pdf",
+            user_id=getattr(user, "id", None),
+        )
+        return pdf_render_pool.accepted(job)
+
     try:
         # ✅ call builder (works whether or not it supports user=)
         try:
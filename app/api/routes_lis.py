@@ -3,14 +3,11 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime
-from io import BytesIO
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
@@ -18,7 +15,7 @@ from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, current_user
+from app.api.deps import get_db, current_user, websocket_tenant
 from app.core.config import settings
 from app.models.ipd import IpdAdmission
 from app.models.lis import LabDepartment, LabService, LisAttachment, LisOrder, LisOrderItem, LisResultLine
@@ -37,7 +34,7 @@ from app.schemas.lis import (
     LisResultLineOut,
 )
 
-from app.services.ui_branding import get_ui_branding
+from app.services import event_bus, pdf_assets, pdf_cache
 # ✅ IMPORTANT: use pdf_lis_report (safe import; weasy is inside try)
 from app.services.pdf_lab_report_weasy import build_lab_report_pdf_bytes, _lab_report_pdf_url
 
@@ -70,43 +67,17 @@ def _infer_context_type(db: Session, context_id: int | None) -> str | None:
 
 
 # ---------------- Real-time (WebSocket) ----------------
-class _WSManager:
-    def __init__(self):
-        self.connections: set[WebSocket] = set()
-
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        self.connections.add(ws)
-
-    def disconnect(self, ws: WebSocket):
-        self.connections.discard(ws)
-
-    async def broadcast(self, payload: Dict[str, Any]):
-        dead = []
-        for ws in list(self.connections):
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(ws)
-
-
-_ws = _WSManager()
-
-
 @router.websocket("/ws")
 async def lab_ws(websocket: WebSocket):
-    await _ws.connect(websocket)
-    try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        _ws.disconnect(websocket)
+    tenant = await websocket_tenant(websocket)
+    if tenant is None:
+        await websocket.close(code=4401)
+        return
+    await event_bus.serve(websocket, tenant, [event_bus.LAB])
 
 
-async def _notify(kind: str, **data):
-    await _ws.broadcast({"type": f"lab.{kind}", **data})
+async def _notify(db: Session, kind: str, **data):
+    event_bus.publish(event_bus.tenant_of(db), event_bus.LAB, {"type": f"lab.{kind}", **data})
 
 
 # ---------------- Reference range formatting (DISPLAY ONLY) ----------------
@@ -233,7 +204,7 @@ def _draw_letterhead_background(c: canvas.Canvas, branding: Any, page_num: int =
         return
 
     try:
-        img = ImageReader(str(full_path))
+        img = pdf_assets.image_reader(full_path)
         w, h = A4
         c.drawImage(img, 0, 0, width=w, height=h, preserveAspectRatio=True, mask="auto")
     except Exception:
@@ -529,7 +500,11 @@ async def save_panel_results(
         db.rollback()
         raise HTTPException(status_code=400, detail="Cannot save results: order not found or data inconsistent.")
 
+    if order.status == "reported":
+        pdf_cache.invalidate(db, "lab_report", order_id)
+
     await _notify(
+        db,
         "panel_results_saved",
         order_id=order_id,
         department_id=payload.department_id,
@@ -661,7 +636,7 @@ def get_lab_report_pdf(
 
     patient: Optional[Patient] = db.query(Patient).get(order.patient_id)
     report = get_lab_report_data(order_id=order_id, db=db, user=user)
-    branding = get_ui_branding(db)
+    branding = pdf_assets.branding(db)
 
     collected_by_name = None
     collected_by_id = getattr(order, "collected_by", None)
@@ -676,25 +651,36 @@ def get_lab_report_pdf(
     # ✅ QR must open direct download
     download_url_for_qr = _lab_report_pdf_url(request, order_id, download=True)
 
-    pdf_bytes = build_lab_report_pdf_bytes(
-        branding=branding,
-        report=report,
-        patient=patient,
-        lab_no=lab_no,
-        order_date=order_date,
-        collected_by_name=collected_by_name,
-        request=request,  # ✅ key
+    # Reported orders are cached; the rendition is keyed by the report payload
+    # itself, so a later amendment simply misses.
+    version = None
+    if order.status == "reported":
+        version = [
+            pdf_cache.digest(report.model_dump(mode="json")),
+            pdf_cache.row_digest(patient),
+            collected_by_name,
+            download_url_for_qr,
+        ]
+
+    pdf = pdf_cache.get_or_render(
+        db,
+        "lab_report",
+        order_id,
+        version,
+        lambda: build_lab_report_pdf_bytes(
+            branding=branding,
+            report=report,
+            patient=patient,
+            lab_no=lab_no,
+            order_date=order_date,
+            collected_by_name=collected_by_name,
+            request=request,  # ✅ key
+        ),
+        options=(pdf_cache.branding_version(branding),),
     )
 
-    buf = BytesIO(pdf_bytes)
-    buf.seek(0)
-
     disp = "attachment" if int(download or 0) == 1 else "inline"
-    return StreamingResponse(
-        buf,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'{disp}; filename="lab-report-{order_id}.pdf"'},
-    )
+    return pdf_cache.pdf_response(request, pdf, f"lab-report-{order_id}.pdf", disp)
 
 
 # ---------------- Finalize ----------------
@@ -725,7 +711,7 @@ async def finalize(order_id: int, db: Session = Depends(get_db), user: User = De
         raise HTTPException(status_code=500, detail=f"Billing failed: {e}")
 
     db.commit()
-    await _notify("finalized", order_id=o.id, billing_invoice_id=o.billing_invoice_id)
+    await _notify(db, "finalized", order_id=o.id, billing_invoice_id=o.billing_invoice_id)
 
     return {"message": "Finalized", "billing_invoice_id": o.billing_invoice_id, "billing_status": o.billing_status}
 
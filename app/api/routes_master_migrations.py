@@ -4,15 +4,15 @@ from typing import Any, Dict, List, Tuple
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from sqlalchemy.engine import Engine
-from sqlalchemy import create_engine
 import json
-from app.core.config import settings
 from app.api.deps import get_master_db, current_provider_user, require_perm
 from app.models.tenant import Tenant
+from app.core.tenant_cache import invalidate_tenant
 
 from app.schemas.master_migrations import PlanRequest, PlanResponse, ApplyResponse, JobDetail
 from app.services.master_ddl import build_sql_for_op, is_destructive, exec_sql
+from app.services import master_migration_runner
+from app.services.master_migration_runner import admin_engine
 from app.services.master_storage import tenant_db_usage_mb, usage_by_volume
 from app.services.master_sql_guard import assert_ident, TYPE_ALLOWLIST
 
@@ -48,45 +48,6 @@ def audit(
     master_db.commit()
 
 
-# --------- Admin DDL Engines (cached) ---------
-_admin_engines: Dict[str, Engine] = {}
-
-def _mysql_admin_base_url() -> str:
-    """
-    Uses MYSQL_ADMIN_* if set; fallback to app MYSQL_*.
-    Matches your session.py pool settings.
-    """
-    from urllib.parse import quote_plus
-
-    driver = getattr(settings, "DB_DRIVER", "pymysql")
-    host = getattr(settings, "MYSQL_HOST", "localhost")
-    port = getattr(settings, "MYSQL_PORT", 3306)
-
-    user = getattr(settings, "MYSQL_ADMIN_USER", None) or getattr(settings, "MYSQL_USER", "root")
-    pw_raw = getattr(settings, "MYSQL_ADMIN_PASSWORD", None)
-    if pw_raw is None:
-        pw_raw = getattr(settings, "MYSQL_PASSWORD", "")
-
-    pw = quote_plus(pw_raw or "")
-    return f"mysql+{driver}://{user}:{pw}@{host}:{port}"
-
-def admin_engine(db: str) -> Engine:
-    """
-    db: 'mysql' for global db ops, or tenant db_name for tenant ops.
-    """
-    eng = _admin_engines.get(db)
-    if eng is None:
-        eng = create_engine(
-            f"{_mysql_admin_base_url()}/{db}",
-            pool_pre_ping=True,
-            pool_recycle=280,
-            pool_size=10,
-            max_overflow=20,
-            future=True,
-        )
-        _admin_engines[db] = eng
-    return eng
-
 # --------- helpers ---------
 def _split_ops(ops: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     global_ops = []
@@ -207,6 +168,7 @@ def set_volume(tenant_id: int, payload: Dict[str, Any], master_db: Session = Dep
     meta["volume_tag"] = vol
     t.meta = meta
     master_db.commit()
+    invalidate_tenant(tenant_id=t.id, code=t.code)
     return {"ok": True, "tenant_id": tenant_id, "volume_tag": vol}
 
 @router.get("/tenants/{tenant_id}/storage")
@@ -337,6 +299,7 @@ def apply(req: Request, payload: PlanRequest, master_db: Session = Depends(get_m
             {"c": payload.client_request_id},
         ).scalar()
         if exists:
+            master_migration_runner.start(int(exists))  # no-op unless it was left unfinished
             return ApplyResponse(job_id=int(exists))
 
     if payload.apply_all:
@@ -402,53 +365,8 @@ def apply(req: Request, payload: PlanRequest, master_db: Session = Depends(get_m
         master_db.commit()
         raise HTTPException(500, f"Global migration failed: {e}")
 
-    # ---- Execute tenant ops per tenant (sequential, safest) ----
-    for t in tenants:
-        cancel = master_db.execute(text("SELECT cancel_requested FROM master_migration_jobs WHERE id=:id"), {"id": job_id}).scalar()
-        if cancel:
-            master_db.execute(text("UPDATE master_migration_jobs SET status='CANCELLED' WHERE id=:id"), {"id": job_id})
-            master_db.execute(text("""
-                UPDATE master_migration_job_targets
-                SET status='SKIPPED', finished_at=NOW(), error='Cancelled'
-                WHERE job_id=:j AND status='PENDING'
-            """), {"j": job_id})
-            master_db.commit()
-            break
-
-        master_db.execute(text("""
-            UPDATE master_migration_job_targets SET status='RUNNING', started_at=NOW()
-            WHERE job_id=:j AND tenant_id=:t
-        """), {"j": job_id, "t": t.id})
-        master_db.commit()
-
-        executed_sql: List[str] = []
-        try:
-            for op in tenant_ops:
-                for sql in build_sql_for_op(op, db_name=t.db_name):
-                    executed_sql.append(sql)
-                    if not payload.dry_run:
-                        exec_sql(admin_engine(t.db_name), sql)
-
-            master_db.execute(text("""
-                UPDATE master_migration_job_targets
-                SET status='DONE', finished_at=NOW(), executed_sql=:sql
-                WHERE job_id=:j AND tenant_id=:t
-            """), {"j": job_id, "t": t.id, "sql": "\n".join(executed_sql)})
-            master_db.commit()
-        except Exception as e:
-            master_db.execute(text("""
-                UPDATE master_migration_job_targets
-                SET status='FAILED', finished_at=NOW(), error=:err, executed_sql=:sql
-                WHERE job_id=:j AND tenant_id=:t
-            """), {"j": job_id, "t": t.id, "err": str(e), "sql": "\n".join(executed_sql)})
-            master_db.execute(text("UPDATE master_migration_jobs SET status='FAILED' WHERE id=:id"), {"id": job_id})
-            master_db.commit()
-            break
-
-    st = master_db.execute(text("SELECT status FROM master_migration_jobs WHERE id=:id"), {"id": job_id}).scalar()
-    if st == "RUNNING":
-        master_db.execute(text("UPDATE master_migration_jobs SET status='DONE' WHERE id=:id"), {"id": job_id})
-        master_db.commit()
+    # ---- Tenant ops: background runner (parallel, per-server throttled, resumable) ----
+    master_migration_runner.start(job_id)
 
     return ApplyResponse(job_id=job_id)
 
@@ -461,7 +379,8 @@ def jobs(master_db: Session = Depends(get_master_db), u: Any = Depends(current_p
         ORDER BY id DESC
         LIMIT 50
     """)).mappings().all()
-    return {"items": list(rows)}
+    prog = master_migration_runner.progress(master_db, [int(r["id"]) for r in rows])
+    return {"items": [{**r, "progress": prog.get(int(r["id"]), {"total": 0})} for r in rows]}
 
 @router.get("/jobs/{job_id}", response_model=JobDetail)
 def job_detail(job_id: int, master_db: Session = Depends(get_master_db), u: Any = Depends(current_provider_user)):
@@ -478,7 +397,8 @@ def job_detail(job_id: int, master_db: Session = Depends(get_master_db), u: Any
         WHERE job_id=:id
         ORDER BY tenant_id
     """), {"id": job_id}).mappings().all()
-    return {"job": job, "targets": list(tg)}
+    prog = master_migration_runner.progress(master_db, [job_id])
+    return {"job": {**job, "progress": prog.get(job_id, {"total": 0})}, "targets": list(tg)}
 
 @router.post("/jobs/{job_id}/cancel")
 def cancel(job_id: int, req: Request, master_db: Session = Depends(get_master_db), u: Any = Depends(current_provider_user)):
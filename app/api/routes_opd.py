@@ -8,14 +8,14 @@ from typing import Optional, List, Set, Dict, Any
 from datetime import date, datetime, time, timedelta
 from zoneinfo import ZoneInfo
 from pydantic import BaseModel
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request, Response, WebSocket
 from fastapi.responses import StreamingResponse
 import secrets
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func, case, and_
 
-from app.api.deps import get_db, current_user
+from app.api.deps import get_db, current_user, websocket_tenant
 from app.models.user import User
 from app.models.patient import Patient
 from app.models.department import Department
@@ -40,6 +40,7 @@ from app.models.opd import (
 )
 
 from app.schemas.opd import (
+    AppointmentChangesOut,
     AppointmentCreate,
     AppointmentRow,
     VisitCreate,
@@ -60,6 +61,7 @@ from app.schemas.opd import (
 )
 from app.schemas.opd import FollowUpListItem
 from app.services.billing_hooks import autobill_opd_consultation
+from app.services import event_bus, opd_queue_feed, opd_slots, pdf_render_pool
 from app.services.pdf_opd_summary import build_visit_summary_pdf
 from app.schemas.opd import VitalsLatestResponse, VitalsOut
 
@@ -260,26 +262,6 @@ def _ensure_no_patient_duplicate(
         )
 
 
-def _ensure_slot_free_for_doctor(
-    db: Session,
-    doctor_user_id: int,
-    d: dt_date,
-    slot_start: dt_time,
-    exclude_appointment_id: Optional[int] = None,
-) -> None:
-    q = db.query(Appointment).filter(
-        Appointment.doctor_user_id == doctor_user_id,
-        Appointment.date == d,
-        Appointment.slot_start == slot_start,
-        Appointment.status.in_(BUSY_STATUS),
-    )
-    if exclude_appointment_id:
-        q = q.filter(Appointment.id != exclude_appointment_id)
-    exists = q.first()
-    if exists:
-        raise HTTPException(status_code=409, detail="Slot already booked")
-
-
 def _next_queue_no(db: Session, doctor_user_id: int, d: dt_date) -> int:
     """
     Atomic token generator per doctor+date using row lock.
@@ -520,55 +502,30 @@ def get_slots(
     else:
         raise HTTPException(status_code=400, detail="date required")
 
-    weekday = d.weekday()
-    schedules = (db.query(OpdSchedule).filter(
-        OpdSchedule.doctor_user_id == doctor_user_id,
-        OpdSchedule.weekday == weekday,
-        OpdSchedule.is_active.is_(True),
-    ).all())
-    if not schedules:
+    # slot rows are kept in opd_slots (app.services.opd_slots); a day
+    # outside the materialized horizon is generated on first use
+    if opd_slots.ensure_day(db, doctor_user_id, d):
+        db.commit()
+    slots = opd_slots.day_slots(db, doctor_user_id, d)
+    if not slots:
         return [] if not detailed else {"slots": []}
 
-    busy = {
-        t[0].strftime("%H:%M")
-        for t in db.query(Appointment.slot_start).filter(
-            Appointment.doctor_user_id == doctor_user_id,
-            Appointment.date == d,
-            Appointment.status.in_(BUSY_STATUS),
-            Appointment.slot_start.isnot(None),
-        ).all()
-    }
-
     now = now_local()
     out: List[Dict[str, Any]] = []
-    for sch in schedules:
-        step = timedelta(
-            minutes=int(getattr(sch, "slot_minutes", None) or slot_minutes))
-        cur = datetime.combine(d, sch.start_time, LOCAL_TZ)
-        end_dt = datetime.combine(d, sch.end_time, LOCAL_TZ)
-
-        while cur + step <= end_dt:
-            hhmm = cur.strftime("%H:%M")
-            if cur < now:
-                status = "past"
-            elif hhmm in busy:
-                status = "booked"
-            else:
-                status = "free"
-
-            if detailed:
-                out.append({
-                    "start": hhmm,
-                    "end": (cur + step).strftime("%H:%M"),
-                    "status": status
-                })
-            else:
-                if status == "free":
-                    out.append({
-                        "start": hhmm,
-                        "end": (cur + step).strftime("%H:%M")
-                    })
-            cur += step
+    for sl in slots:
+        hhmm = sl.slot_start.strftime("%H:%M")
+        end = sl.slot_end.strftime("%H:%M")
+        if datetime.combine(d, sl.slot_start, LOCAL_TZ) < now:
+            status = "past"
+        elif sl.status != opd_slots.FREE:
+            status = "booked"
+        else:
+            status = "free"
+
+        if detailed:
+            out.append({"start": hhmm, "end": end, "status": status})
+        elif status == "free":
+            out.append({"start": hhmm, "end": end})
 
     if detailed:
         return {"slots": out}
@@ -577,6 +534,58 @@ def get_slots(
     return [{"start": a, "end": b} for (a, b) in sorted(uniq)]
 
 
+@router.get("/slots/availability")
+def get_slot_availability(
+        department_id: Optional[int] = Query(None),
+        doctor_user_id: Optional[int] = Query(None),
+        date_from: Optional[date] = Query(None, description="Default: today"),
+        days: int = Query(7, ge=1, le=31),
+        db: Session = Depends(get_db),
+        user: User = Depends(current_user),
+):
+    """
+    Free slots of a department (or one doctor) for `days` days, grouped by
+    doctor and date. Reads the materialized slot inventory only.
+    """
+    if not _has_any_perm(
+            user,
+        {"appointments.view", "appointments.create", "schedules.manage"}):
+        raise HTTPException(status_code=403, detail="Not permitted")
+    if department_id is None and doctor_user_id is None:
+        raise HTTPException(status_code=400,
+                            detail="department_id or doctor_user_id required")
+
+    now = now_local()
+    d_from = date_from or now.date()
+    d_to = d_from + timedelta(days=days - 1)
+    rows = opd_slots.availability(
+        db, d_from, d_to,
+        department_id=department_id,
+        doctor_user_ids=[doctor_user_id] if doctor_user_id else None)
+
+    doctors: Dict[int, Dict[str, Any]] = {}
+    for doc_id, doc_name, d, start, end in rows:
+        if datetime.combine(d, start, LOCAL_TZ) < now:
+            continue
+        doc = doctors.setdefault(doc_id, {
+            "doctor_user_id": doc_id,
+            "doctor_name": doc_name or "",
+            "free_count": 0,
+            "days": {},
+        })
+        doc["days"].setdefault(d.isoformat(), []).append({
+            "start": start.strftime("%H:%M"),
+            "end": end.strftime("%H:%M"),
+        })
+        doc["free_count"] += 1
+
+    return {
+        "date_from": d_from.isoformat(),
+        "date_to": d_to.isoformat(),
+        "doctors": list(doctors.values()),
+    }
+
+
 # ------------------- APPOINTMENTS -------------------
 @router.post("/appointments")
 def create_appointment(
@@ -618,8 +627,8 @@ def create_appointment(
 
         _check_slot_in_schedule(sch, payload.date, slot_start, slot_end)
         _ensure_not_past(payload.date, slot_start)
-        _ensure_slot_free_for_doctor(db, payload.doctor_user_id, payload.date,
-                                     slot_start)
+        opd_slots.reserve(db, payload.doctor_user_id, payload.date,
+                          slot_start)
     else:
         _ensure_not_past_date_only(payload.date)
 
@@ -643,6 +652,10 @@ def create_appointment(
 
     db.add(ap)
     try:
+        db.flush()
+        if appt_type == "slot":
+            opd_slots.attach(db, ap.doctor_user_id, ap.date, ap.slot_start,
+                             ap.id)
         db.commit()
         db.refresh(ap)
     except IntegrityError:
@@ -663,32 +676,19 @@ def create_appointment(
     }
 
 
-@router.get("/appointments", response_model=List[AppointmentRow])
-def list_appointments(
-        date: Optional[dt_date] = Query(None),
-        date_str: Optional[str] = Query(None),
-        doctor_id: Optional[int] = Query(None),
-        db: Session = Depends(get_db),
-        user: User = Depends(current_user),
-):
-    if not has_perm(user, "appointments.view"):
-        raise HTTPException(status_code=403, detail="Not permitted")
-
-    if date is None:
-        if not date_str:
-            raise HTTPException(status_code=400, detail="date is required")
-        try:
-            date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid date")
-
+def _appointment_rows(db: Session,
+                      d: dt_date,
+                      doctor_id: Optional[int] = None,
+                      only_ids: Optional[List[int]] = None) -> List[AppointmentRow]:
     q = (db.query(Appointment).options(
         joinedload(Appointment.patient),
         joinedload(Appointment.doctor),
         joinedload(Appointment.department),
-    ).filter(Appointment.date == date))
+    ).filter(Appointment.date == d))
     if doctor_id:
         q = q.filter(Appointment.doctor_user_id == doctor_id)
+    if only_ids is not None:
+        q = q.filter(Appointment.id.in_(only_ids))
 
     rows: List[Appointment] = q.order_by(Appointment.queue_no.asc(),
                                          Appointment.id.asc()).all()
@@ -713,7 +713,7 @@ def list_appointments(
         if patient_ids:
             vit_pat_rows = (db.query(Vitals.patient_id).filter(
                 Vitals.patient_id.in_(patient_ids),
-                func.date(Vitals.created_at) == date).distinct().all())
+                func.date(Vitals.created_at) == d).distinct().all())
             vitals_by_patient = {
                 pid
                 for (pid, ) in vit_pat_rows if pid is not None
@@ -745,6 +745,91 @@ def list_appointments(
     return out
 
 
+def _parse_list_date(date: Optional[dt_date], date_str: Optional[str]) -> dt_date:
+    if date is not None:
+        return date
+    if not date_str:
+        raise HTTPException(status_code=400, detail="date is required")
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid date")
+
+
+@router.get("/appointments", response_model=List[AppointmentRow])
+def list_appointments(
+        request: Request,
+        response: Response,
+        date: Optional[dt_date] = Query(None),
+        date_str: Optional[str] = Query(None),
+        doctor_id: Optional[int] = Query(None),
+        db: Session = Depends(get_db),
+        user: User = Depends(current_user),
+):
+    """
+    Full day list. Sends a weak ETag (opd_queue_feed.version); a poll with
+    a matching If-None-Match gets 304 without the list being rebuilt.
+    """
+    if not has_perm(user, "appointments.view"):
+        raise HTTPException(status_code=403, detail="Not permitted")
+
+    date = _parse_list_date(date, date_str)
+
+    etag = opd_queue_feed.version(db, date, doctor_id)
+    inm = request.headers.get("if-none-match")
+    if inm and etag in [t.strip() for t in inm.split(",")]:
+        return Response(status_code=304,
+                        headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return _appointment_rows(db, date, doctor_id)
+
+
+@router.get("/appointments/changes", response_model=AppointmentChangesOut)
+def list_appointment_changes(
+        date: Optional[dt_date] = Query(None),
+        date_str: Optional[str] = Query(None),
+        doctor_id: Optional[int] = Query(None),
+        since: int = Query(0, ge=0, description="cursor from the previous call; 0 = full list"),
+        db: Session = Depends(get_db),
+        user: User = Depends(current_user),
+):
+    """
+    Rows changed since `since` for one day (and doctor). Poll with the
+    returned cursor, or call again when /opd/queue/ws pushes a change.
+    """
+    if not has_perm(user, "appointments.view"):
+        raise HTTPException(status_code=403, detail="Not permitted")
+
+    date = _parse_list_date(date, date_str)
+
+    cursor, changed = opd_queue_feed.changed_since(db, date, doctor_id, since)
+    if not since:
+        return AppointmentChangesOut(cursor=cursor, rows=_appointment_rows(db, date, doctor_id))
+    if not changed:
+        return AppointmentChangesOut(cursor=cursor, rows=[])
+    rows = _appointment_rows(db, date, doctor_id, only_ids=changed)
+    present = {r.id for r in rows}
+    return AppointmentChangesOut(cursor=cursor,
+                                 rows=rows,
+                                 removed=[i for i in changed if i not in present])
+
+
+@router.websocket("/queue/ws")
+async def opd_queue_ws(
+        websocket: WebSocket,
+        date: dt_date = Query(...),
+        doctor_id: Optional[int] = Query(None),
+):
+    """Pushes {"type": "opd.queue.changed", date, doctor_id, appointment_ids}."""
+    tenant = await websocket_tenant(websocket)
+    if tenant is None:
+        await websocket.close(code=4401)
+        return
+    await event_bus.serve(websocket, tenant,
+                          [opd_queue_feed.topic(date, doctor_id)])
+
+
 class AppointmentStatusUpdateLocal(BaseModel):
     status: str
 
@@ -802,6 +887,8 @@ def update_appointment_status(
 
     # Apply OPD status change
     ap.status = new_status
+    if new_status in {"cancelled", "no_show"}:
+        opd_slots.release(db, ap.id)
 
     # If completed, ensure visit + visit_at
     if new_status == "completed":
@@ -918,11 +1005,12 @@ def reschedule_appointment(
     if create_new:
         if ap.status in BUSY_STATUS and ap.status != "no_show":
             ap.status = "cancelled"
+        opd_slots.release(db, ap.id)
 
         _ensure_no_patient_duplicate(db, ap.patient_id, new_date)
         if appt_type == "slot":
-            _ensure_slot_free_for_doctor(db, ap.doctor_user_id, new_date,
-                                         new_slot_start)
+            opd_slots.reserve(db, ap.doctor_user_id, new_date,
+                              new_slot_start)
 
         queue_no = _next_queue_no(db, ap.doctor_user_id, new_date)
         new_ap = Appointment(
@@ -941,6 +1029,10 @@ def reschedule_appointment(
             new_ap.booked_by = user.id
 
         db.add(new_ap)
+        db.flush()
+        if appt_type == "slot":
+            opd_slots.attach(db, new_ap.doctor_user_id, new_date,
+                             new_slot_start, new_ap.id)
         db.commit()
         db.refresh(new_ap)
 
@@ -956,12 +1048,11 @@ def reschedule_appointment(
                                  ap.patient_id,
                                  new_date,
                                  exclude_appointment_id=ap.id)
+    opd_slots.release(db, ap.id)
     if appt_type == "slot":
-        _ensure_slot_free_for_doctor(db,
-                                     ap.doctor_user_id,
-                                     new_date,
-                                     new_slot_start,
-                                     exclude_appointment_id=ap.id)
+        opd_slots.reserve(db, ap.doctor_user_id, new_date, new_slot_start)
+        opd_slots.attach(db, ap.doctor_user_id, new_date, new_slot_start,
+                         ap.id)
 
     if new_date != ap.date:
         ap.queue_no = _next_queue_no(db, ap.doctor_user_id, new_date)
@@ -1735,7 +1826,7 @@ def schedule_followup(
 
         _check_slot_in_schedule(sch, d, slot_start, slot_end)
         _ensure_not_past(d, slot_start)
-        _ensure_slot_free_for_doctor(db, fu.doctor_user_id, d, slot_start)
+        opd_slots.reserve(db, fu.doctor_user_id, d, slot_start)
     else:
         _ensure_not_past_date_only(d)
 
@@ -1758,6 +1849,8 @@ def schedule_followup(
 
     db.add(ap)
     db.flush()
+    if appt_type == "slot":
+        opd_slots.attach(db, fu.doctor_user_id, d, slot_start, ap.id)
 
     fu.appointment_id = ap.id
     fu.due_date = d
@@ -2112,6 +2205,7 @@ def list_visit_followups(
     "/visits/{visit_id}/summary.pdf")  # ✅ alias for frontend compatibility
 def get_visit_summary_pdf(
         visit_id: int,
+        async_: bool = Query(False, alias="async"),
         db: Session = Depends(get_db),
         user: User = Depends(current_user),
 ):
@@ -2122,8 +2216,18 @@ def get_visit_summary_pdf(
     if not v:
         raise HTTPException(status_code=404, detail="Visit not found")
 
-    buff = build_visit_summary_pdf(db, visit_id)
     filename = f"opd_visit_{visit_id}_summary.pdf"
+    if async_ and pdf_render_pool.enabled():
+        job = pdf_render_pool.submit(
+            db,
+            "app.services.pdf_opd_summary:build_visit_summary_pdf",
+            {"visit_id": visit_id},
+            filename=filename,
+            user_id=getattr(user, "id", None),
+        )
+        return pdf_render_pool.accepted(job)
+
+    buff = build_visit_summary_pdf(db, visit_id)
 
     return StreamingResponse(
         buff,
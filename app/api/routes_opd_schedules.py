@@ -1,7 +1,7 @@
 # app/api/routes_opd_schedule.py
 from __future__ import annotations
 
-from datetime import date, datetime, timedelta
+from datetime import date
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -9,8 +9,9 @@ from sqlalchemy.orm import Session
 
 from app.api.deps import get_db, current_user
 from app.models.user import User
-from app.models.opd import OpdSchedule, Appointment
+from app.models.opd import OpdSchedule
 from app.schemas.opd import OpdScheduleCreate, OpdScheduleUpdate, OpdScheduleOut
+from app.services import opd_slots
 
 
 router = APIRouter()
@@ -112,6 +113,8 @@ def create_schedule(
         is_active=payload.is_active if payload.is_active is not None else True,
     )
     db.add(sch)
+    db.flush()
+    opd_slots.regenerate_horizon(db, sch.doctor_user_id)
     db.commit()
     db.refresh(sch)
     return sch
@@ -159,6 +162,8 @@ def update_schedule(
     for k, v in data.items():
         setattr(sch, k, v)
 
+    db.flush()
+    opd_slots.regenerate_horizon(db, sch.doctor_user_id)
     db.commit()
     db.refresh(sch)
     return sch
@@ -174,7 +179,10 @@ def delete_schedule(
     if not sch:
         raise HTTPException(status_code=404, detail="Not found")
     ensure_can_mutate_schedule(user, sch)
+    doctor_user_id = sch.doctor_user_id
     db.delete(sch)
+    db.flush()
+    opd_slots.regenerate_horizon(db, doctor_user_id)
     db.commit()
     return {"message": "Deleted"}
 
@@ -190,34 +198,11 @@ def get_free_slots(
     if not (can_manage_all(user) or has_perm(user, "appointments.view")):
         raise HTTPException(status_code=403, detail="Not permitted")
 
-    weekday = date.weekday()
-    schedules = (db.query(OpdSchedule).filter(
-        OpdSchedule.doctor_user_id == doctor_user_id,
-        OpdSchedule.weekday == weekday,
-        OpdSchedule.is_active.is_(True),
-    ).all())
-    if not schedules:
-        return []
-
-    busy = {
-        row[0].strftime("%H:%M")
-        for row in db.query(Appointment.slot_start).filter(
-            Appointment.doctor_user_id == doctor_user_id,
-            Appointment.date == date,
-            Appointment.status.in_(["booked", "checked_in", "in_progress"]),
-            Appointment.slot_start.isnot(None),  # ✅ ignore FREE bookings
-        ).all()
-    }
-
-
-    free: List[str] = []
-    for sch in schedules:
-        step = timedelta(minutes=sch.slot_minutes or 15)
-        cur = datetime.combine(date, sch.start_time)
-        end = datetime.combine(date, sch.end_time)
-        while cur + step <= end:
-            t = cur.strftime("%H:%M")
-            if t not in busy:
-                free.append(t)
-            cur += step
+    if opd_slots.ensure_day(db, doctor_user_id, date):
+        db.commit()
+    free = [
+        sl.slot_start.strftime("%H:%M")
+        for sl in opd_slots.day_slots(db, doctor_user_id, date)
+        if sl.status == opd_slots.FREE
+    ]
     return sorted(set(free))
@@ -38,6 +38,7 @@ from app.models.ot_master import OtDeviceMaster, OtInstrumentMaster
 from app.models.ui_branding import UiBranding
 from app.models.ipd import IpdBed, IpdAdmission, IpdRoom
 from app.services.ui_branding import get_ui_branding
+from app.services import pdf_assets
 # Optional import - keep if you use it elsewhere in this file
 
 
@@ -208,7 +209,7 @@ def _dt_to_time_str(value: Optional[datetime]) -> Optional[str]:
 
 def _get_branding(db: Session) -> UiBranding:
     # ✅ adjust if you have tenant-wise branding
-    branding = db.query(UiBranding).order_by(UiBranding.id.desc()).first()
+    branding = pdf_assets.branding(db)
     if not branding:
         branding = UiBranding(
             org_name="Hospital",
@@ -39,6 +39,7 @@ from app.schemas.ot import (
     OtPreopChecklistOut,
 )
 from app.services.billing_ot import create_ot_invoice_items_for_case
+from app.services import pdf_assets
 from app.services.ot_history_pdf import build_patient_ot_history_pdf
 from app.services.ot_case_pdf import build_ot_case_pdf
 
@@ -1067,7 +1068,7 @@ def update_preop_checklist(
 
 def _get_branding(db: Session) -> UiBranding:
     # ✅ adjust if you have tenant-wise branding
-    branding = db.query(UiBranding).order_by(UiBranding.id.desc()).first()
+    branding = pdf_assets.branding(db)
     if not branding:
         # If your UiBranding has required fields, create a safe fallback object
         branding = UiBranding(
@@ -1166,7 +1167,7 @@ def download_ot_case_pdf(
     dt_part = dt.strftime("%Y%m%d") if dt else "date"
     filename = f"OT_Case_{_safe_filename(str(uhid))}_{dt_part}.pdf"
 
-    branding = db.query(UiBranding).order_by(UiBranding.id.desc()).first()
+    branding = pdf_assets.branding(db)
 
     pdf_bytes = build_ot_case_pdf(
         case=case,
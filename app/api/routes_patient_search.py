@@ -2,24 +2,22 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from app.api.deps import get_db, current_user
 from app.models.patient import Patient
+from app.services.patient_search import search_patients as search_patient_keys
 
 router = APIRouter()
 
 
 @router.get("/patients/search")
 def search_patients(q: str = Query(""),
+                    phonetic: bool = Query(False),
                     db: Session = Depends(get_db),
                     user=Depends(current_user)):
     q = (q or "").strip()
-    query = db.query(Patient)
     if q:
-        like = f"%{q}%"
-        query = query.filter((Patient.uhid.ilike(like))
-                             | (Patient.first_name.ilike(like))
-                             | (Patient.last_name.ilike(like))
-                             | (Patient.phone.ilike(like))
-                             | (Patient.email.ilike(like)))
-    rows = query.order_by(Patient.id.desc()).limit(50).all()
+        # ranked prefix lookup on patient_search_keys (no table scan)
+        rows = search_patient_keys(db, q, limit=50, phonetic=phonetic)
+    else:
+        rows = db.query(Patient).order_by(Patient.id.desc()).limit(50).all()
     return [{
         "id": p.id,
         "uhid": p.uhid,
@@ -51,6 +51,7 @@ from app.schemas.patient import (
     PatientSummaryOut
 )
 from app.services.audit_logger import log_audit  # adjust path if your pkg is `services`
+from app.services.patient_search import refresh_patient_search_keys, search_patients
 import re
 from app.models.ui_branding import UiBranding
 from sqlalchemy import func
@@ -343,7 +344,42 @@ def calc_age(dob: Optional[date]):
     return years, months, days, full_text, short_text
 
 
-def serialize_patient(p: Patient, db: Session) -> PatientOut:
+def _master_names(db: Session, model, ids) -> Dict[int, str]:
+    wanted = {int(i) for i in ids if i}
+    if not wanted:
+        return {}
+    rows = db.query(model.id, model.name).filter(model.id.in_(wanted)).all()
+    return {int(i): n for i, n in rows}
+
+
+def prefetch_patient_masters(patients: List[Patient], db: Session) -> Dict[str, Dict[int, str]]:
+    """
+    Display names of every master referenced by a page of patients
+    (one IN query per master, not one lookup per row).
+    """
+    return {
+        "doctor": _master_names(db, User, (p.ref_doctor_id for p in patients)),
+        "payer": _master_names(db, Payer, (p.credit_payer_id for p in patients)),
+        "tpa": _master_names(db, Tpa, (p.credit_tpa_id for p in patients)),
+        "plan": _master_names(db, CreditPlan, (p.credit_plan_id for p in patients)),
+    }
+
+
+def serialize_patients(patients: List[Patient], db: Session) -> List[PatientOut]:
+    """
+    Batch serializer for list pages: constant query count per page.
+    (addresses are selectin-loaded with the page; masters via prefetch_patient_masters)
+    """
+    masters = prefetch_patient_masters(patients, db)
+    return [serialize_patient(p, db, masters=masters) for p in patients]
+
+
+def serialize_patient(
+    p: Patient,
+    db: Session,
+    *,
+    masters: Optional[Dict[str, Dict[int, str]]] = None,
+) -> PatientOut:
     years, months, days, full_text, short_text = calc_age(p.dob)
     data = PatientOut.model_validate(p, from_attributes=True)
 
@@ -354,6 +390,14 @@ def serialize_patient(p: Patient, db: Session) -> PatientOut:
     data.age_text = full_text
     data.age_short_text = short_text
 
+    if masters is not None:
+        data.ref_doctor_name = masters["doctor"].get(p.ref_doctor_id or 0)
+        data.credit_payer_name = masters["payer"].get(p.credit_payer_id or 0)
+        data.credit_tpa_name = masters["tpa"].get(p.credit_tpa_id or 0)
+        data.credit_plan_name = masters["plan"].get(p.credit_plan_id or 0)
+        # addresses relationship is ordered by id desc already
+        return data
+
     # Resolve doctor & credit master display names
     if p.ref_doctor_id:
         doc = db.query(User).get(p.ref_doctor_id)
@@ -576,6 +620,8 @@ def create_patient(
         )
         db.add(a)
 
+    refresh_patient_search_keys(db, p)
+
     try:
         db.commit()
     except IntegrityError as e:
@@ -614,6 +660,7 @@ def create_patient(
 def list_patients(
         q: Optional[str] = None,
         patient_type: Optional[str] = None,
+        phonetic: bool = Query(False),
         limit: int = Query(500, ge=0, le=500),
         offset: int = Query(0, ge=0),
         db: Session = Depends(get_db),
@@ -622,7 +669,8 @@ def list_patients(
     """
     List patients with search + filter + pagination.
 
-    - q: search by UHID, name, phone, email
+    - q: search by UHID, name, phone, email, RCH id (ranked prefix match)
+    - phonetic: also match spelling variants of names
     - patient_type: filter (value from Patient Type master)
     - limit: page size (10 / 20 / 30 / etc up to 100)
     - offset: for pagination (page * limit)
@@ -630,23 +678,19 @@ def list_patients(
     if not has_perm(user, "patients.view"):
         raise HTTPException(status_code=403, detail="Not permitted")
 
-    qry = db.query(Patient).filter(Patient.is_active.is_(True))
-    if q:
-        ql = f"%{q.lower()}%"
-        qry = qry = qry.filter((Patient.uhid.like(ql))
-                               | (Patient.phone.like(ql))
-                               | (Patient.email.like(ql))
-                               | (Patient.first_name.like(ql))
-                               | (Patient.last_name.like(ql))
-                               | (Patient.rch_id.like(ql))  # ✅ add
-                               )
+    if q and q.strip():
+        filters = [Patient.patient_type == patient_type] if patient_type else []
+        patients = search_patients(db, q, limit=limit, offset=offset,
+                                   phonetic=phonetic, filters=filters)
+        return serialize_patients(patients, db)
 
+    qry = db.query(Patient).filter(Patient.is_active.is_(True))
     if patient_type:
         qry = qry.filter(Patient.patient_type == patient_type)
 
     patients = (qry.order_by(
         Patient.id.desc()).offset(offset).limit(limit).all())
-    return [serialize_patient(p, db) for p in patients]
+    return serialize_patients(patients, db)
 
 
 # -------- Excel export (report) --------
@@ -975,6 +1019,8 @@ def update_patient(
                                            patient_id=patient_id,
                                            addr_in=addr_in)
 
+    refresh_patient_search_keys(db, p)
+
     try:
         db.commit()
     except IntegrityError as e:
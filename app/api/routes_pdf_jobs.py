@@ -0,0 +1,60 @@
+# FILE: app/api/routes_pdf_jobs.py
+"""
+Poll / download for PDF renders queued with `?async=1`
+(see app.services.pdf_render_pool).
+"""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db, current_user
+from app.models.user import User
+from app.services import pdf_render_pool
+
+router = APIRouter(prefix="/pdf/jobs", tags=["PDF jobs"])
+
+
+def _own_job(db: Session, job_id: str, user: User) -> Dict[str, Any]:
+    job = pdf_render_pool.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    owner = job.get("user_id")
+    if owner is not None and owner != getattr(user, "id", None) and not getattr(user, "is_admin", False):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}")
+def pdf_job_status(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user: User = Depends(current_user),
+):
+    return pdf_render_pool.public(_own_job(db, job_id, user))
+
+
+@router.get("/{job_id}/download")
+def pdf_job_download(
+    job_id: str,
+    disposition: str = Query("inline", pattern="^(inline|attachment)$"),
+    db: Session = Depends(get_db),
+    user: User = Depends(current_user),
+):
+    job = _own_job(db, job_id, user)
+    if job.get("status") != pdf_render_pool.DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.get('status')}")
+
+    path = pdf_render_pool.result_path(db, job)
+    if not path:
+        raise HTTPException(status_code=404, detail="Job has no PDF")
+
+    filename = job.get("filename") or f"{job_id}.pdf"
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'{disposition}; filename="{filename}"'},
+    )
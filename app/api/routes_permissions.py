@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, func
 from app.api.deps import get_db, current_user, require_perm
+from app.core.principal import invalidate_actor_tenant_principals
 from app.models.user import User
 from app.models.permission import Permission
 from app.schemas.permission import PermissionCreate, PermissionOut, ModuleCountOut
@@ -118,6 +119,7 @@ def update_permission(
 
     db.commit()
     db.refresh(p)
+    invalidate_actor_tenant_principals(user)
     return p
 
 
@@ -135,4 +137,5 @@ def delete_permission(
 
     db.delete(p)
     db.commit()
+    invalidate_actor_tenant_principals(user)
     return {"message": "Deleted"}
@@ -17,7 +17,6 @@ from app.api.deps import get_db, current_user as auth_current_user
 from app.models.user import User
 from app.models.patient import Patient
 
-from app.models.ui_branding import UiBranding
 from app.models.pharmacy_inventory import ItemBatch
 from app.models.pharmacy_prescription import (  # type: ignore
     PharmacyPrescription,
@@ -44,6 +43,7 @@ from app.schemas.pharmacy_prescription import (
 
 from app.schemas.pharmacy_inventory import PharmacyBatchPickOut
 from app.services import pharmacy as pharmacy_service
+from app.services import pdf_assets
 
 from app.services.pdf_prescription import build_prescription_pdf
 from app.services.id_gen import make_op_episode_id, make_ip_admission_code, make_rx_number
@@ -381,7 +381,7 @@ def prescription_pdf(
             .first()
         )
 
-    b = db.query(UiBranding).order_by(UiBranding.id.desc()).first()
+    b = pdf_assets.branding(db)
     branding_obj = b or SimpleNamespace(
         org_name="NUTRYAH HIMS",
         org_tagline="",
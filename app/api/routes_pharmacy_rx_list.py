@@ -4,17 +4,19 @@ from __future__ import annotations
 from datetime import datetime
 from typing import List, Optional
 from fastapi.responses import StreamingResponse
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 from io import BytesIO
-from app.api.deps import get_db, current_user as auth_current_user
+from app.api.deps import get_db, current_user as auth_current_user, websocket_tenant
 from app.models.user import User
 from app.models.patient import Patient
 from app.models.pharmacy_prescription import PharmacyPrescription
 from app.services.pdf_prescription import build_prescription_pdf
+from app.services import event_bus
+from app.services import pharmacy_rx_feed  # noqa: F401  (registers the Rx queue push hook)
 
 router = APIRouter()
 
@@ -135,6 +137,16 @@ def list_pharmacy_rx(
 
     return out
 
+
+@router.websocket("/rx/ws")
+async def pharmacy_rx_ws(websocket: WebSocket):
+    """Pushes {"type": "pharmacy.rx.changed", rx_ids}; reload /rx."""
+    tenant = await websocket_tenant(websocket)
+    if tenant is None:
+        await websocket.close(code=4401)
+        return
+    await event_bus.serve(websocket, tenant, [event_bus.PHARMACY])
+
 @router.get("/prescriptions/{rx_id}/pdf")
 def download_prescription_pdf(
     rx_id: int,
@@ -1,13 +1,13 @@
 from __future__ import annotations
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List
 # add near imports
 from fastapi import Request
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 
-from app.api.deps import get_db, current_user
+from app.api.deps import get_db, current_user, websocket_tenant
 from app.models.user import User
 from app.models.opd import RadiologyTest  # master table
 from app.models.ris import RisOrder, RisAttachment
@@ -17,6 +17,7 @@ from app.schemas.ris import (RisOrderCreate, RisScheduleIn, RisReportIn,
 from app.models.opd import Visit
 from app.models.ipd import IpdAdmission
 
+from app.services import event_bus
 from app.services.billing_hooks import autobill_ris_order
 from app.services.billing_service import BillingError
 from app.utils.files import save_upload
@@ -56,44 +57,17 @@ def _infer_context_type(db: Session, context_id: int | None) -> str | None:
 
 
 # ---------- realtime (WebSocket) ----------
-class _WSManager:
-
-    def __init__(self):
-        self.connections: set[WebSocket] = set()
-
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        self.connections.add(ws)
-
-    def disconnect(self, ws: WebSocket):
-        self.connections.discard(ws)
-
-    async def broadcast(self, payload: Dict[str, Any]):
-        dead = []
-        for ws in list(self.connections):
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(ws)
-
-
-_ws = _WSManager()
-
-
 @router.websocket("/ws")
 async def ws_endpoint(websocket: WebSocket):
-    await _ws.connect(websocket)
-    try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        _ws.disconnect(websocket)
+    tenant = await websocket_tenant(websocket)
+    if tenant is None:
+        await websocket.close(code=4401)
+        return
+    await event_bus.serve(websocket, tenant, [event_bus.RIS])
 
 
-async def _notify(kind: str, **data):
-    await _ws.broadcast({"type": f"ris.{kind}", **data})
+async def _notify(db: Session, kind: str, **data):
+    event_bus.publish(event_bus.tenant_of(db), event_bus.RIS, {"type": f"ris.{kind}", **data})
 
 
 # =====================================================================
@@ -257,7 +231,7 @@ async def create_order(
 
     db.add(o)
     db.commit()
-    await _notify("ordered", order_id=o.id)
+    await _notify(db, "ordered", order_id=o.id)
     return {"id": o.id, "message": "RIS order created"}
 
 
@@ -371,7 +345,7 @@ async def schedule(
     o.updated_by = user.id
     o.updated_at = datetime.utcnow()
     db.commit()
-    await _notify("scheduled", order_id=o.id, at=o.scheduled_at)
+    await _notify(db, "scheduled", order_id=o.id, at=o.scheduled_at)
     return {"message": "Scheduled", "id": o.id}
 
 
@@ -390,7 +364,7 @@ async def mark_scanned(
     o.updated_by = user.id
     o.updated_at = datetime.utcnow()
     db.commit()
-    await _notify("scanned", order_id=o.id, at=o.scanned_at)
+    await _notify(db, "scanned", order_id=o.id, at=o.scanned_at)
     return {"message": "Scan marked", "id": o.id}
 
 
@@ -427,7 +401,7 @@ async def add_report(
     o.updated_at = datetime.utcnow()
 
     db.commit()
-    await _notify("reported", order_id=o.id)
+    await _notify(db, "reported", order_id=o.id)
     return {"message": "Report saved", "id": o.id}
 
 
@@ -450,7 +424,7 @@ async def update_report(
     o.updated_by = user.id
     o.updated_at = datetime.utcnow()
     db.commit()
-    await _notify("report_updated", order_id=o.id)
+    await _notify(db, "report_updated", order_id=o.id)
     return {"message": "Report updated", "id": o.id}
 
 
@@ -487,7 +461,7 @@ async def approve_report(
     o.updated_at = datetime.utcnow()
 
     db.commit()
-    await _notify("approved", order_id=o.id)
+    await _notify(db, "approved", order_id=o.id)
     return {"message": "Approved", "id": o.id}
 
 
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.api.deps import get_db, current_user, require_perm
+from app.core.principal import invalidate_actor_tenant_principals
 from app.models.role import Role, RolePermission
 from app.models.permission import Permission
 from app.schemas.role import RoleCreate, RoleOut
@@ -31,6 +32,7 @@ def create_role(payload: RoleCreate, db: Session = Depends(get_db), me: User = D
         perms = db.query(Permission).filter(Permission.id.in_(payload.permission_ids)).all()
         r.permissions = perms
         db.commit(); db.refresh(r)
+        invalidate_actor_tenant_principals(me)
     return RoleOut(id=r.id, name=r.name, description=r.description, permission_ids=[p.id for p in r.permissions])
 
 
@@ -42,6 +44,7 @@ def update_role(role_id: int, payload: RoleCreate, db: Session = Depends(get_db)
     r.name = payload.name; r.description = payload.description
     r.permissions = db.query(Permission).filter(Permission.id.in_(payload.permission_ids)).all()
     db.commit(); db.refresh(r)
+    invalidate_actor_tenant_principals(me)
     return RoleOut(id=r.id, name=r.name, description=r.description,
     permission_ids=[p.id for p in r.permissions])
 
@@ -52,4 +55,5 @@ def delete_role(role_id: int, db: Session = Depends(get_db), me: User = Depends(
     r = db.query(Role).get(role_id)
     if not r: raise HTTPException(status_code=404, detail="Not found")
     db.delete(r); db.commit()
+    invalidate_actor_tenant_principals(me)
     return {"message": "Deleted"}
@@ -1,9 +1,14 @@
+from typing import Any
+
 from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_master_db
+from app.api.deps import get_master_db, current_provider_user, require_perm
+from app.core.tenant_cache import tenant_cache
+from app.core.principal import principal_cache
 from app.schemas.system import ClientErrorReportIn
 from app.services.error_logger import log_error
+from app.services.number_allocator import allocator as number_allocator
 
 router = APIRouter()
 
@@ -41,3 +46,16 @@ async def report_client_error(
     )
 
     return {"status": "ok"}
+
+
+@router.get("/system/cache-stats")
+def cache_stats(u: Any = Depends(current_provider_user)):
+    """
+    Hit/miss counters for the in-process request hot-path caches (this worker only).
+    """
+    require_perm(u, "master.tenants.view")
+    return {
+        "tenant": tenant_cache.stats(),
+        "principal": principal_cache.stats(),
+        "number_blocks": number_allocator.stats(),
+    }
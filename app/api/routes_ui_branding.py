@@ -28,6 +28,7 @@ from app.schemas.ui_branding import (
     UiBrandingContextOut,
     UiBrandingContextUpdate,
 )
+from app.services import pdf_assets
 from app.services.ui_branding import (
     get_or_create_default_ui_branding,
     get_branding_context,
@@ -374,6 +375,7 @@ def update_ui_branding(
         db.add(branding)
         db.commit()
         db.refresh(branding)
+        pdf_assets.invalidate(db)
     except Exception:
         db.rollback()
         logger.exception("Failed to update branding")
@@ -456,6 +458,7 @@ def upload_ui_branding_assets(
             db.add(branding)
             db.commit()
             db.refresh(branding)
+            pdf_assets.invalidate(db)
 
     except HTTPException:
         raise
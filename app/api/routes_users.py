@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 from sqlalchemy import or_
 from app.api.deps import get_db, current_user, require_perm
+from app.core.principal import invalidate_actor_tenant_principals
 from app.core.security import hash_password
 from app.models.user import User, UserLoginSeq, UserSession
 from app.models.role import Role
@@ -395,6 +396,7 @@ def update_user(
     except IntegrityError as e:
         db.rollback()
         raise _integrity_to_http(e) from e
+    invalidate_actor_tenant_principals(me, user_id=u.id)
 
     if needs_email_verify and u.email:
         _safe_send_verify_otp(db, u)
@@ -425,6 +427,7 @@ def deactivate_user(user_id: int, db: Session = Depends(get_db), me: User = Depe
     except IntegrityError as e:
         db.rollback()
         raise HTTPException(status_code=400, detail="Failed to deactivate user") from e
+    invalidate_actor_tenant_principals(me, user_id=u.id)
 
     return {"ok": True}
 
@@ -64,6 +64,38 @@ class Settings(BaseModel):
         os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", str(7 * 24 * 60)))
     BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
+    # ---------- Request hot-path caches ----------
+    # Resolved tenant rows (master DB) are reused for this many seconds
+    TENANT_CACHE_TTL_SECONDS: int = int(
+        os.getenv("TENANT_CACHE_TTL_SECONDS", "60"))
+    # Authenticated principal (user + token_version + perms + session state)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = int(
+        os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "5"))
+
+    # ---------- Document numbering ----------
+    # Numbers reserved per worker in one short transaction (hi-lo blocks)
+    NUMBER_SERIES_BLOCK_SIZE: int = int(
+        os.getenv("NUMBER_SERIES_BLOCK_SIZE", "20"))
+    # Comma list of series that must stay gapless and in order (row lock
+    # held in the caller's transaction). Default: the GST documents (tax
+    # invoices, credit / debit notes, receipt vouchers). "*" = all series.
+    NUMBER_SERIES_GAPLESS: str = os.getenv("NUMBER_SERIES_GAPLESS",
+                                           "INVOICE,NOTE,RECEIPT")
+
+    # ---------- Reporting rollups ----------
+    # Closed days re-aggregated by each nightly rollup run (late writes)
+    DAILY_ROLLUP_REFRESH_DAYS: int = int(
+        os.getenv("DAILY_ROLLUP_REFRESH_DAYS", "3"))
+    # Parallel dashboard widget groups per request (1 = serial, request session only).
+    # Each request runs them on its own threads and checks out up to N-1 extra
+    # connections from the tenant pool (pool_size 10 + max_overflow 20), so
+    # concurrent dashboard loads x (N-1) count against that limit.
+    DASHBOARD_WIDGET_WORKERS: int = int(
+        os.getenv("DASHBOARD_WIDGET_WORKERS", "3"))
+    # Pharmacy stock-alert snapshots: reused until the next stock txn or TTL (0 = off)
+    STOCK_ALERTS_CACHE_TTL_SECONDS: int = int(
+        os.getenv("STOCK_ALERTS_CACHE_TTL_SECONDS", "60"))
+
     # ---------- Email (Office 365 defaults) ----------
     SMTP_HOST: str = os.getenv("SMTP_HOST", "smtp.office365.com")
     SMTP_PORT: int = int(os.getenv("SMTP_PORT", "587"))
@@ -78,6 +110,56 @@ class Settings(BaseModel):
     # ---------- File storage ----------
     STORAGE_DIR: str = os.getenv("STORAGE_DIR", "./media")
     MEDIA_URL: str = os.getenv("MEDIA_URL", "/files")
+    # Rendered PDFs of finalized documents under STORAGE_DIR/pdf_cache, LRU-bounded (0 = off)
+    PDF_CACHE_MAX_MB: int = int(os.getenv("PDF_CACHE_MAX_MB", "512"))
+    # Branding row reused by PDF builders for this long (0 = query every render)
+    BRANDING_CACHE_TTL_SECONDS: int = int(
+        os.getenv("BRANDING_CACHE_TTL_SECONDS", "60"))
+    # Decoded logo / letterhead images kept in memory per process
+    PDF_ASSET_CACHE_MB: int = int(os.getenv("PDF_ASSET_CACHE_MB", "64"))
+
+    # ---------- Off-request PDF rendering (?async=1) ----------
+    # Render processes per API worker (0 = ?async=1 renders inline)
+    PDF_RENDER_WORKERS: int = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+    # Jobs one tenant may have rendering at once (the rest wait queued)
+    PDF_RENDER_TENANT_CONCURRENCY: int = int(
+        os.getenv("PDF_RENDER_TENANT_CONCURRENCY", "1"))
+    PDF_RENDER_TIMEOUT_SECONDS: int = int(
+        os.getenv("PDF_RENDER_TIMEOUT_SECONDS", "180"))
+    # A render process is replaced after this many jobs (caps RSS growth)
+    PDF_RENDER_JOBS_PER_WORKER: int = int(
+        os.getenv("PDF_RENDER_JOBS_PER_WORKER", "25"))
+    # Finished job files are kept this long for polling / download
+    PDF_RENDER_JOB_TTL_MINUTES: int = int(
+        os.getenv("PDF_RENDER_JOB_TTL_MINUTES", "60"))
+
+    # ---------- Master tenant migrations (background runner) ----------
+    # Tenant databases one migration job alters at once
+    MIGRATION_WORKERS: int = int(os.getenv("MIGRATION_WORKERS", "8"))
+    # DDL statements running at once against one MySQL server (host:port)
+    MIGRATION_HOST_CONCURRENCY: int = int(
+        os.getenv("MIGRATION_HOST_CONCURRENCY", "2"))
+    # Attempts per tenant on transient errors (lock wait, lost connection)
+    MIGRATION_MAX_ATTEMPTS: int = int(os.getenv("MIGRATION_MAX_ATTEMPTS", "3"))
+
+    # ---------- Realtime event bus (WebSockets) ----------
+    # memory = one API process; unix = fan out to every worker on this host
+    EVENT_BUS_BACKEND: str = os.getenv("EVENT_BUS_BACKEND", "memory")
+    # Datagram sockets of the unix backend (default: <tmp>/hims_event_bus)
+    EVENT_BUS_SOCKET_DIR: str = os.getenv("EVENT_BUS_SOCKET_DIR", "")
+    # Events buffered per socket before it is evicted as a slow consumer
+    EVENT_BUS_CLIENT_QUEUE: int = int(os.getenv("EVENT_BUS_CLIENT_QUEUE", "256"))
+    EVENT_BUS_SEND_TIMEOUT_SECONDS: float = float(
+        os.getenv("EVENT_BUS_SEND_TIMEOUT_SECONDS", "5"))
+
+    # ---------- OPD queue change feed ----------
+    # Changes this recent are re-sent on every poll (ids may commit out of order)
+    OPD_QUEUE_FEED_SETTLE_SECONDS: int = int(
+        os.getenv("OPD_QUEUE_FEED_SETTLE_SECONDS", "10"))
+
+    # ---------- OPD slot inventory ----------
+    # Days ahead kept materialized in opd_slots (schedule edits, nightly job)
+    OPD_SLOT_HORIZON_DAYS: int = int(os.getenv("OPD_SLOT_HORIZON_DAYS", "60"))
 
     # ---------- Billing flags ----------
     BILLING_AUTOCREATE: bool = os.getenv(
@@ -86,6 +168,9 @@ class Settings(BaseModel):
         "BILLING_AUTOFINALIZE_OPD", "false").lower() in {"1", "true", "yes"}
     BILLING_DEFAULT_TAX: float = float(
         os.getenv("BILLING_DEFAULT_TAX", "0") or 0.0)
+    # ChargeItemMaster codes the nightly IPD charge job posts for every
+    # inpatient day (comma list, e.g. "NURS-GEN,NURS-ICU"; empty = none)
+    IPD_DAILY_NURSING_CODES: str = os.getenv("IPD_DAILY_NURSING_CODES", "")
 
 
 settings = Settings()
@@ -0,0 +1,145 @@
+# app/core/principal.py
+"""
+Compact, immutable view of the authenticated user for one request.
+
+`Principal` is what auth needs to accept or reject a token (is the user
+active, does token_version match, is the session still live, which
+permission codes does the user hold). Resolving it costs one query; the
+result is cached per (tenant_id, user_id, session_id, token_version) for
+PRINCIPAL_CACHE_TTL_SECONDS so bursts of requests from the same screen
+skip the user/roles/session lookups entirely.
+
+The cache is per process. Logout, session revocation and role/permission
+edits call `invalidate_principals()`; other workers converge within the TTL.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from app.core.config import settings
+
+PrincipalKey = Tuple[int, int, str, int]
+
+
+@dataclass(frozen=True)
+class Principal:
+    tenant_id: int
+    tenant_code: str
+    user_id: int
+    session_id: str
+    token_version: int
+    is_active: bool
+    is_admin: bool
+    session_active: bool
+    perm_codes: FrozenSet[str]
+
+    @property
+    def key(self) -> PrincipalKey:
+        return (self.tenant_id, self.user_id, self.session_id, self.token_version)
+
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds: int, max_items: int = 50_000):
+        self.ttl_seconds = max(0, int(ttl_seconds))
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._items: Dict[PrincipalKey, Tuple[float, Principal]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: PrincipalKey) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > now:
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                self._items.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, principal: Principal) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._items) >= self.max_items:
+                # drop expired entries first; if still full, start over
+                for k in [k for k, (exp, _) in self._items.items() if exp <= now]:
+                    self._items.pop(k, None)
+                if len(self._items) >= self.max_items:
+                    self._items.clear()
+            self._items[principal.key] = (now + self.ttl_seconds, principal)
+
+    def invalidate(
+        self,
+        *,
+        tenant_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        session_id: Optional[str] = None,
+    ) -> int:
+        removed = 0
+        with self._lock:
+            for k in list(self._items.keys()):
+                if tenant_id is not None and k[0] != int(tenant_id):
+                    continue
+                if user_id is not None and k[1] != int(user_id):
+                    continue
+                if session_id is not None and k[2] != str(session_id):
+                    continue
+                self._items.pop(k, None)
+                removed += 1
+            self.invalidations += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def invalidate_principals(
+    *,
+    tenant_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    session_id: Optional[str] = None,
+) -> None:
+    """
+    Drop cached principals. No arguments = everything.
+    - logout / session revoke -> user_id (+ session_id)
+    - user role/active edits  -> user_id
+    - role/permission edits   -> tenant_id
+    """
+    principal_cache.invalidate(tenant_id=tenant_id, user_id=user_id, session_id=session_id)
+
+
+def principal_of(user: Any) -> Optional[Principal]:
+    """
+    Principal attached to a User by app.api.deps.current_user (None for users loaded elsewhere).
+    """
+    return getattr(user, "_principal", None)
+
+
+def invalidate_actor_tenant_principals(actor: Any, *, user_id: Optional[int] = None) -> None:
+    """
+    Drop cached principals in the acting user's tenant (optionally one user only).
+    Used by admin edits where the tenant id is only known through `actor`.
+    Falls back to a user-wide (all tenants) or full clear when actor carries no principal.
+    """
+    p = principal_of(actor)
+    invalidate_principals(tenant_id=p.tenant_id if p else None, user_id=user_id)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+from bisect import bisect_left
 from enum import Enum
-from typing import Any, Iterable, Optional, Set
+from functools import lru_cache
+from typing import Any, FrozenSet, Iterable, Optional, Set, Tuple
 
 from fastapi import HTTPException, status
 
@@ -95,6 +97,71 @@ def iter_user_perm_codes(user: Any) -> Set[str]:
     return out
 
 
+class CompiledPerms:
+    """
+    Permission codes of one principal, normalized once.
+
+    - `codes`: frozenset for exact checks (O(1))
+    - `sorted_codes`: sorted tuple for prefix checks ("any permission under billing.")
+      -> bisect to the first code >= prefix, then one startswith (O(log n))
+    """
+
+    __slots__ = ("codes", "sorted_codes")
+
+    def __init__(self, codes: FrozenSet[str]):
+        self.codes: FrozenSet[str] = codes
+        self.sorted_codes: Tuple[str, ...] = tuple(sorted(codes))
+
+    def has(self, code: str) -> bool:
+        return code in self.codes
+
+    def has_prefix(self, prefix: str) -> bool:
+        if not prefix:
+            return bool(self.codes)
+        arr = self.sorted_codes
+        i = bisect_left(arr, prefix)
+        return i < len(arr) and arr[i].startswith(prefix)
+
+    def has_any_prefix(self, prefixes: Iterable[str]) -> bool:
+        return any(self.has_prefix(p) for p in prefixes)
+
+
+@lru_cache(maxsize=2048)
+def _compile(codes: FrozenSet[str]) -> CompiledPerms:
+    # users sharing the same role set share one compiled object
+    return CompiledPerms(codes)
+
+
+_COMPILED_ATTR = "_compiled_perms"
+
+
+def compiled_perms(user: Any) -> CompiledPerms:
+    """
+    Compiled permission set for `user`, computed once and reused.
+
+    Order of sources:
+      1) user._principal.perm_codes (set by app.api.deps.current_user, already normalized)
+      2) memoized on the user object (first call walks roles/permissions via iter_user_perm_codes)
+    """
+    if not user:
+        return _compile(frozenset())
+
+    principal = getattr(user, "_principal", None)
+    if principal is not None:
+        return _compile(principal.perm_codes)
+
+    cached = getattr(user, _COMPILED_ATTR, None)
+    if isinstance(cached, CompiledPerms):
+        return cached
+
+    cp = _compile(frozenset(iter_user_perm_codes(user)))
+    try:
+        setattr(user, _COMPILED_ATTR, cp)
+    except Exception:
+        pass  # slotted / frozen objects: just don't memoize
+    return cp
+
+
 def has_perm(user: Any, code: str) -> bool:
     """
     Simple, safe permission check.
@@ -106,7 +173,17 @@ def has_perm(user: Any, code: str) -> bool:
     if not want:
         return False
 
-    return want in iter_user_perm_codes(user)
+    return compiled_perms(user).has(want)
+
+
+def has_perm_prefix(user: Any, *prefixes: str) -> bool:
+    """
+    True if user holds ANY permission starting with one of `prefixes`
+    (e.g. has_perm_prefix(user, "billing.", "invoices.")). Admins always pass.
+    """
+    if is_admin_user(user):
+        return True
+    return compiled_perms(user).has_any_prefix(prefixes)
 
 
 def require_any(user: Any, required: Iterable[Any], *, message: Optional[str] = None) -> None:
@@ -120,7 +197,7 @@ def require_any(user: Any, required: Iterable[Any], *, message: Optional[str] =
     if not required_set:
         return
 
-    user_codes = iter_user_perm_codes(user)
+    user_codes = compiled_perms(user).codes
 
     if user_codes.intersection(required_set):
         return
@@ -0,0 +1,103 @@
+# app/core/tenant_cache.py
+"""
+Process-local cache of resolved tenants (master DB `tenants` rows).
+
+Every authenticated request resolves its tenant from the JWT claims
+(tid / tcode). Without a cache that is one master-DB round trip per
+request; with it the master DB only sees a query once per TTL per tenant.
+
+Cached values are *detached* Tenant instances (all columns loaded), so
+callers can read tenant.id / code / db_uri / meta without a session.
+Mutations of a tenant must call `invalidate_tenant()`.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+_Key = Tuple[str, str]
+
+
+def _key(tid: Any, tcode: Any) -> _Key:
+    return (str(tid or "").strip(), str(tcode or "").strip().upper())
+
+
+class TenantCache:
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = max(0, int(ttl_seconds))
+        self._lock = threading.Lock()
+        self._items: Dict[_Key, Tuple[float, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, tid: Any, tcode: Any) -> Optional[Any]:
+        k = _key(tid, tcode)
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(k)
+            if item is not None and item[0] > now:
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                self._items.pop(k, None)
+            self.misses += 1
+            return None
+
+    def put(self, tid: Any, tcode: Any, tenant: Any) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._items[_key(tid, tcode)] = (time.monotonic() + self.ttl_seconds, tenant)
+
+    def invalidate(self, *, tenant_id: Any = None, code: Any = None) -> int:
+        """
+        Drop every entry matching tenant_id or code (either key part or the cached row).
+        With no arguments, clears the cache.
+        """
+        want_id = str(tenant_id).strip() if tenant_id is not None else None
+        want_code = str(code).strip().upper() if code else None
+        removed = 0
+        with self._lock:
+            for k in list(self._items.keys()):
+                t = self._items[k][1]
+                match = want_id is None and want_code is None
+                if want_id is not None and (k[0] == want_id or str(getattr(t, "id", "")) == want_id):
+                    match = True
+                if want_code and (k[1] == want_code or str(getattr(t, "code", "") or "").upper() == want_code):
+                    match = True
+                if match:
+                    self._items.pop(k, None)
+                    removed += 1
+            self.invalidations += 1
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+tenant_cache = TenantCache(settings.TENANT_CACHE_TTL_SECONDS)
+
+
+def invalidate_tenant(*, tenant_id: Any = None, code: Any = None, db_uri: Optional[str] = None) -> None:
+    """
+    Call after any change to a tenant row (activation, db_uri, license, meta).
+    Passing db_uri also drops the pooled engine/sessionmaker for that URI.
+    """
+    tenant_cache.invalidate(tenant_id=tenant_id, code=code)
+    if db_uri:
+        from app.db.session import dispose_tenant_engine
+
+        dispose_tenant_engine(db_uri)
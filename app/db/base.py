@@ -28,5 +28,6 @@ from app.models import (  # noqa: F401
     pharmacy_inventory,
     pharmacy_prescription,
     audit,
-    pharmacy_inventory_new
+    pharmacy_inventory_new,
+    rollup,
 )
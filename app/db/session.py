@@ -1,4 +1,5 @@
 # app/db/session.py
+import threading
 from typing import Dict
 
 from sqlalchemy import create_engine
@@ -32,32 +33,67 @@ SessionLocal = MasterSessionLocal
 # ---------- TENANT DB ENGINES (one per hospital) ----------
 
 _tenant_engines: Dict[str, Engine] = {}
+_tenant_sessionmakers: Dict[str, sessionmaker] = {}
+_tenant_lock = threading.Lock()
 
 
 def get_or_create_tenant_engine(db_uri: str) -> Engine:
     eng = _tenant_engines.get(db_uri)
     if eng is None:
-        eng = create_engine(
-            db_uri,
-            pool_pre_ping=True,
-            pool_recycle=280,
-            pool_size=10,
-            max_overflow=20,
-            future=True,
-        )
-        _tenant_engines[db_uri] = eng
+        # Session-level hooks every tenant session needs, whatever the entry
+        # point (API, cron scripts, workers). Imported here, not at module
+        # level: the services import the models, which import app.db.
+        import app.services.billing_ar  # noqa: F401  (AR balance maintenance)
+
+        with _tenant_lock:
+            eng = _tenant_engines.get(db_uri)
+            if eng is None:
+                eng = create_engine(
+                    db_uri,
+                    pool_pre_ping=True,
+                    pool_recycle=280,
+                    pool_size=10,
+                    max_overflow=20,
+                    future=True,
+                )
+                _tenant_engines[db_uri] = eng
     return eng
 
 
+def get_tenant_sessionmaker(db_uri: str) -> sessionmaker:
+    """
+    One sessionmaker per tenant DB URI (built once, reused by every request).
+    """
+    factory = _tenant_sessionmakers.get(db_uri)
+    if factory is None:
+        eng = get_or_create_tenant_engine(db_uri)
+        with _tenant_lock:
+            factory = _tenant_sessionmakers.get(db_uri)
+            if factory is None:
+                factory = sessionmaker(
+                    autocommit=False,
+                    autoflush=False,
+                    bind=eng,
+                    future=True,
+                )
+                _tenant_sessionmakers[db_uri] = factory
+    return factory
+
+
 def create_tenant_session(db_uri: str):
     """
     Return a new SQLAlchemy Session bound to the given tenant DB URI.
     """
-    eng = get_or_create_tenant_engine(db_uri)
-    TenantSessionLocal = sessionmaker(
-        autocommit=False,
-        autoflush=False,
-        bind=eng,
-        future=True,
-    )   
-    return TenantSessionLocal()
+    return get_tenant_sessionmaker(db_uri)()
+
+
+def dispose_tenant_engine(db_uri: str) -> None:
+    """
+    Drop the cached engine + sessionmaker for a tenant URI
+    (tenant moved / deactivated / credentials rotated).
+    """
+    with _tenant_lock:
+        _tenant_sessionmakers.pop(db_uri, None)
+        eng = _tenant_engines.pop(db_uri, None)
+    if eng is not None:
+        eng.dispose()
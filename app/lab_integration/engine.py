@@ -6,7 +6,7 @@ from typing import Any, Callable, Dict, Optional, List, Tuple
 
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from sqlalchemy import func, insert
 
 from app.models.lab_integration import (
     IntegrationDevice,
@@ -89,6 +89,42 @@ def extract_hl7_meta(raw: str) -> Tuple[Optional[str], Optional[str], Optional[s
     )
 
 
+# Device heartbeat (last_seen_at) is written at most once per interval per device,
+# inside the staging transaction -> no extra commit per message.
+HEARTBEAT_INTERVAL = timedelta(seconds=30)
+
+
+def _resolve_mappings(
+    db: Session,
+    tenant_code: str,
+    device_id: int,
+    external_codes: List[str],
+) -> Dict[str, int]:
+    """
+    external_code -> internal_test_id for all codes of one message, in ONE query.
+    """
+    codes = sorted({c for c in external_codes if c})
+    if not codes:
+        return {}
+    rows = (
+        db.query(LabCodeMapping.external_code, LabCodeMapping.internal_test_id)
+        .filter(
+            LabCodeMapping.tenant_code == tenant_code,
+            LabCodeMapping.source_device_id == device_id,
+            LabCodeMapping.external_code.in_(codes),
+            LabCodeMapping.active == True,
+        )
+        .all()
+    )
+    return {ext: int(internal) for ext, internal in rows if internal}
+
+
+def _touch_device(device: IntegrationDevice, now: datetime) -> None:
+    last = device.last_seen_at
+    if last is None or (now - last) >= HEARTBEAT_INTERVAL:
+        device.last_seen_at = now
+
+
 def stage_pipeline(
     db: Session,
     device: Optional[IntegrationDevice],
@@ -105,6 +141,10 @@ def stage_pipeline(
     - safe dedupe
     - safe staging
     - unmapped -> ERROR queue
+
+    Everything (message, result header, items, status, heartbeat) is written in a
+    single transaction: message INSERT (dedupe point), one mapping lookup, header
+    INSERT, one executemany for the items, one COMMIT.
     """
 
     msg_type, msg_ctl, hl7_fac = extract_hl7_meta(raw_payload)
@@ -114,12 +154,13 @@ def stage_pipeline(
     if device and device.allowed_remote_ips and remote_ip and remote_ip not in (device.allowed_remote_ips or []):
         raise ValueError("Remote IP not allowed for this device")
 
+    now = datetime.utcnow()
     msg = IntegrationMessage(
         tenant_code=tenant_code,
         device_id=device.id if device else None,
         protocol=protocol,
         direction="IN",
-        received_at=datetime.utcnow(),
+        received_at=now,
         processed_at=None,
         remote_ip=remote_ip,
         message_type=msg_type or (kind if kind != "AUTO" else None),
@@ -133,35 +174,32 @@ def stage_pipeline(
     db.add(msg)
 
     try:
-        db.commit()
+        db.flush()
     except IntegrityError:
         db.rollback()
         # Duplicate only happens when device_id+message_control_id matches
         return {"status": True, "duplicate": True, "final_status": "DUPLICATE", "message_id": None}
 
-    db.refresh(msg)
-
     parser_key = choose_parser(protocol, kind, raw_payload)
     parser = PARSERS.get(parser_key)
     if not parser:
         msg.parse_status = "ERROR"
         msg.error_reason = f"No parser registered: {parser_key}"
-        db.add(msg)
+        out = {"status": False, "message_id": msg.id, "final_status": "ERROR", "error_reason": msg.error_reason}
         db.commit()
-        return {"status": False, "message_id": msg.id, "final_status": "ERROR", "error_reason": msg.error_reason}
+        return out
 
     try:
         normalized = parser(raw_payload)
     except Exception as e:
         msg.parse_status = "ERROR"
         msg.error_reason = f"Parse failed ({parser_key}): {str(e)[:200]}"
-        db.add(msg)
         if device:
-            device.last_error_at = datetime.utcnow()
+            device.last_error_at = now
             device.last_error = msg.error_reason
-            db.add(device)
+        out = {"status": False, "message_id": msg.id, "final_status": "ERROR", "error_reason": msg.error_reason}
         db.commit()
-        return {"status": False, "message_id": msg.id, "final_status": "ERROR", "error_reason": msg.error_reason}
+        return out
 
     items = normalized.get("items") or []
     msg.parsed_json = {
@@ -171,12 +209,8 @@ def stage_pipeline(
         "specimen_barcode": normalized.get("specimen_barcode"),
         "item_count": len(items),
     }
-    msg.parse_status = "PARSED"
-    msg.error_reason = None
-    db.add(msg)
-    db.commit()
 
-    # stage result header
+    # stage result header (flush -> id for the items)
     res = LabInboundResult(
         tenant_code=tenant_code,
         message_id=msg.id,
@@ -185,69 +219,57 @@ def stage_pipeline(
         specimen_barcode=normalized.get("specimen_barcode"),
         report_status="RECEIVED",
         observed_at=normalized.get("observed_at"),
-        created_at=datetime.utcnow(),
+        created_at=now,
     )
     db.add(res)
-    db.commit()
-    db.refresh(res)
+    db.flush()
+
+    # stage items + mapping (one IN lookup, one executemany)
+    ext_codes = [(it.get("external_code") or "").strip() for it in items]
+    mapping = _resolve_mappings(db, tenant_code, device.id, ext_codes) if device else {}
 
-    # stage items + mapping
     unmapped: List[str] = []
-    for it in items:
-        ext_code = (it.get("external_code") or "").strip()
+    rows: List[Dict[str, Any]] = []
+    for it, ext_code in zip(items, ext_codes):
         internal_id = None
-
         if device and ext_code:
-            m = (
-                db.query(LabCodeMapping)
-                .filter(
-                    LabCodeMapping.tenant_code == tenant_code,
-                    LabCodeMapping.source_device_id == device.id,
-                    LabCodeMapping.external_code == ext_code,
-                    LabCodeMapping.active == True,
-                )
-                .first()
-            )
-            internal_id = int(m.internal_test_id) if m else None
+            internal_id = mapping.get(ext_code)
             if not internal_id:
                 unmapped.append(ext_code)
 
-        db.add(
-            LabInboundResultItem(
-                result_id=res.id,
-                external_code=ext_code or None,
-                internal_test_id=internal_id,
-                value_text=it.get("value_text"),
-                units=it.get("units"),
-                ref_range=it.get("ref_range"),
-                abnormal_flag=it.get("abnormal_flag"),
-                status=it.get("status"),
-                observed_at=it.get("observed_at") or normalized.get("observed_at"),
-            )
+        rows.append(
+            {
+                "result_id": res.id,
+                "external_code": ext_code or None,
+                "internal_test_id": internal_id,
+                "value_text": it.get("value_text"),
+                "units": it.get("units"),
+                "ref_range": it.get("ref_range"),
+                "abnormal_flag": it.get("abnormal_flag"),
+                "status": it.get("status"),
+                "observed_at": it.get("observed_at") or normalized.get("observed_at"),
+            }
         )
-
-    db.commit()
+    if rows:
+        db.execute(insert(LabInboundResultItem), rows)
 
     if unmapped:
         msg.parse_status = "ERROR"
         msg.error_reason = "Unmapped test codes: " + ", ".join(sorted(set(unmapped))[:50])
         if device:
-            device.last_error_at = datetime.utcnow()
+            device.last_error_at = now
             device.last_error = msg.error_reason
-            db.add(device)
     else:
         msg.parse_status = "PROCESSED"
-        msg.processed_at = datetime.utcnow()
-
-    db.add(msg)
-    db.commit()
+        msg.processed_at = now
 
     if device:
-        device.last_seen_at = datetime.utcnow()
-        db.add(device)
-        db.commit()
+        _touch_device(device, now)
 
-    return {"status": True, "message_id": msg.id, "final_status": msg.parse_status, "error_reason": msg.error_reason}
+    # build the result before commit (expire_on_commit would reload msg otherwise)
+    out = {"status": True, "message_id": msg.id, "final_status": msg.parse_status, "error_reason": msg.error_reason}
+    db.commit()
+    return out
 
 
 def compute_stats(db: Session, tenant_code: Optional[str] = None) -> Dict[str, int]:
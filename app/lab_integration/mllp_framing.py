@@ -0,0 +1,219 @@
+# app/lab_integration/mllp_framing.py
+from __future__ import annotations
+
+import codecs
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+SB = b"\x0b"        # VT
+EB_CR = b"\x1c\x0d" # FS + CR
+
+DEFAULT_MAX_FRAME_BYTES = 4 * 1024 * 1024
+
+# bytes of an oversize frame kept so the NAK can echo MSH-10
+_HEADER_KEEP = 1024
+
+
+@dataclass
+class FrameEvent:
+    kind: str           # "frame" | "oversize"
+    data: bytes         # frame payload (without SB/EB) | first bytes of the rejected frame
+
+
+class MLLPFramer:
+    """
+    Incremental MLLP frame reassembly for one connection.
+
+    - one growing bytearray; consumed bytes are tracked by offset and only
+      compacted once they dominate the buffer (no re-slicing per frame)
+    - every search resumes where the previous one stopped, so a large frame
+      arriving in many small TCP segments is scanned once (linear, not quadratic)
+    - frames larger than `max_frame_bytes` are never buffered: the framer
+      emits one "oversize" event (caller NAKs) and discards input until the
+      frame's end block
+    - bytes outside SB..EB (line noise / keepalives) are dropped and counted
+    """
+
+    def __init__(self, max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES):
+        self.max_frame_bytes = max(1024, int(max_frame_bytes))
+        self._buf = bytearray()
+        self._head = 0          # start of unconsumed data
+        self._start = -1        # index of SB of the frame being assembled
+        self._scan = 0          # where the next search resumes
+        self._skipping = False  # inside an oversize frame, waiting for EB
+
+        self.frames = 0
+        self.oversize_frames = 0
+        self.discarded_bytes = 0
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buf) - self._head
+
+    def feed(self, chunk: bytes) -> List[FrameEvent]:
+        out: List[FrameEvent] = []
+        if not chunk:
+            return out
+        buf = self._buf
+        buf += chunk
+
+        while True:
+            if self._skipping:
+                end = buf.find(EB_CR, self._scan)
+                if end < 0:
+                    # keep only a trailing FS (EB may be split across segments)
+                    keep = 1 if buf.endswith(EB_CR[:1]) else 0
+                    self.discarded_bytes += len(buf) - self._head - keep
+                    self._reset(keep_tail=keep)
+                    break
+                self.discarded_bytes += end + len(EB_CR) - self._head
+                self._head = end + len(EB_CR)
+                self._scan = self._head
+                self._skipping = False
+                continue
+
+            if self._start < 0:
+                start = buf.find(SB, self._scan)
+                if start < 0:
+                    self.discarded_bytes += len(buf) - self._head
+                    self._reset()
+                    break
+                self.discarded_bytes += start - self._head
+                self._start = start
+                self._head = start
+                self._scan = start + 1
+
+            end = buf.find(EB_CR, self._scan)
+            if end < 0:
+                size = len(buf) - self._start - 1
+                if size > self.max_frame_bytes:
+                    header = bytes(memoryview(buf)[self._start + 1 : self._start + 1 + _HEADER_KEEP])
+                    out.append(FrameEvent("oversize", header))
+                    self.oversize_frames += 1
+                    keep = 1 if buf.endswith(EB_CR[:1]) else 0
+                    self.discarded_bytes += len(buf) - self._head - keep
+                    self._skipping = True
+                    self._reset(keep_tail=keep)
+                else:
+                    # EB is 2 bytes: resume one byte back in case it straddles segments
+                    self._scan = max(self._start + 1, len(buf) - (len(EB_CR) - 1))
+                break
+
+            if end - self._start - 1 > self.max_frame_bytes:
+                header = bytes(memoryview(buf)[self._start + 1 : self._start + 1 + _HEADER_KEEP])
+                out.append(FrameEvent("oversize", header))
+                self.oversize_frames += 1
+                self.discarded_bytes += end + len(EB_CR) - self._head
+            else:
+                out.append(FrameEvent("frame", bytes(memoryview(buf)[self._start + 1 : end])))
+                self.frames += 1
+
+            self._head = end + len(EB_CR)
+            self._scan = self._head
+            self._start = -1
+
+        self._compact()
+        return out
+
+    def _reset(self, keep_tail: int = 0) -> None:
+        if keep_tail:
+            del self._buf[: len(self._buf) - keep_tail]
+        else:
+            self._buf.clear()
+        self._head = 0
+        self._scan = 0
+        self._start = -1
+
+    def _compact(self) -> None:
+        # drop consumed prefix only when it is at least half the buffer (amortized O(1))
+        head = self._head
+        if head and (head >= len(self._buf) // 2 or head >= 65536):
+            del self._buf[:head]
+            self._head = 0
+            self._scan -= head
+            if self._start >= 0:
+                self._start -= head
+
+
+# -----------------------------
+# Encoding detection (once per device)
+# -----------------------------
+_HL7_CHARSETS: Dict[str, str] = {
+    "ASCII": "ascii",
+    "8859/1": "latin-1",
+    "8859/15": "iso8859-15",
+    "UNICODE": "utf-8",
+    "UNICODE UTF-8": "utf-8",
+    "UTF-8": "utf-8",
+    "UNICODE UTF-16": "utf-16",
+}
+
+
+def _facility_and_charset(frame: bytes) -> tuple[str, str]:
+    # MSH is ASCII by definition -> latin-1 decode of the first segment is safe
+    first = frame.split(b"\r", 1)[0][:2048].decode("latin-1")
+    if not first.startswith("MSH") or len(first) < 4:
+        return "", ""
+    parts = first.split(first[3])
+    fac = parts[3].strip().upper() if len(parts) > 3 else ""
+    charset = parts[17].strip().upper() if len(parts) > 17 else ""
+    return fac, charset
+
+
+class EncodingRegistry:
+    """
+    Remembers the text encoding per sending facility (device).
+
+    First frame from a device: BOM -> MSH-18 -> strict UTF-8 -> latin-1.
+    Later frames reuse the decision; a frame that does not decode under the
+    remembered codec is decoded with errors="replace" (never raises).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_device: Dict[str, str] = {}
+
+    def detect(self, frame: bytes, device_key: str = "") -> str:
+        with self._lock:
+            known = self._by_device.get(device_key) if device_key else None
+        if known:
+            return known
+
+        enc = None
+        if frame.startswith(codecs.BOM_UTF8):
+            enc = "utf-8-sig"
+        elif frame.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            enc = "utf-16"
+        else:
+            _fac, charset = _facility_and_charset(frame)
+            enc = _HL7_CHARSETS.get(charset)
+            if enc is None:
+                try:
+                    frame.decode("utf-8")
+                    enc = "utf-8"
+                except UnicodeDecodeError:
+                    enc = "latin-1"
+
+        if device_key:
+            with self._lock:
+                self._by_device.setdefault(device_key, enc)
+        return enc
+
+    def decode(self, frame: bytes) -> str:
+        device_key, _charset = _facility_and_charset(frame)
+        enc = self.detect(frame, device_key)
+        try:
+            return frame.decode(enc)
+        except UnicodeDecodeError:
+            return frame.decode(enc, errors="replace")
+
+    def forget(self, device_key: Optional[str] = None) -> None:
+        with self._lock:
+            if device_key:
+                self._by_device.pop(device_key.strip().upper(), None)
+            else:
+                self._by_device.clear()
+
+
+encodings = EncodingRegistry()
@@ -2,17 +2,28 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
 from datetime import datetime
 
 from app.db.session import SessionLocal
 from app.models.lab_integration import IntegrationDevice
 from app.lab_integration.engine import stage_pipeline
 from app.lab_integration.parsers.hl7_v2 import parse_msh, build_ack
+from app.lab_integration.mllp_framing import (
+    SB,
+    EB_CR,
+    DEFAULT_MAX_FRAME_BYTES,
+    FrameEvent,
+    MLLPFramer,
+    encodings,
+)
 
-SB = b"\x0b"        # VT
-EB_CR = b"\x1c\x0d" # FS + CR
+logger = logging.getLogger(__name__)
+
+_EOF = object()     # per-connection queue sentinel
 
 
 def env_bool(name: str, default: bool = False) -> bool:
@@ -22,13 +33,78 @@ def env_bool(name: str, default: bool = False) -> bool:
     return v.strip().lower() in ("1", "true", "yes", "on")
 
 
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
 class MLLPServer:
-    def __init__(self, host: str, port: int):
+    """
+    HL7 MLLP listener.
+
+    The event loop only does socket I/O + framing. Every frame is handed to a
+    bounded thread pool (DB lookup + stage_pipeline run there), so a slow
+    commit never stalls other analyzers or the API sharing this loop.
+
+    Per connection:
+      reader  -> frames, in arrival order -> bounded queue -> ack loop
+      ack loop processes one frame at a time (ordering preserved) and writes
+      the ACK as soon as that frame is staged, while the reader keeps pulling
+      the next frames off the socket (pipelining).
+
+    Framing (mllp_framing.MLLPFramer) is incremental with a hard frame size
+    cap (LAB_MLLP_MAX_FRAME_BYTES); oversize frames get an AR NAK in order.
+    Text encoding is detected once per device (MSH-4) in the worker thread.
+
+    Backpressure: at most `queue_max` frames are in flight across all
+    connections (and `conn_queue_max` per connection). When full the reader
+    stops reading, so TCP flow control slows the analyzer down instead of
+    buffering unbounded data in memory.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        *,
+        session_factory: Optional[Callable[[], Any]] = None,
+        workers: Optional[int] = None,
+        queue_max: Optional[int] = None,
+        conn_queue_max: Optional[int] = None,
+        max_frame_bytes: Optional[int] = None,
+    ):
         self.host = host
         self.port = port
+        self.session_factory = session_factory or SessionLocal
+        self.workers = workers or env_int("LAB_MLLP_WORKERS", 4)
+        self.queue_max = queue_max or env_int("LAB_MLLP_QUEUE_MAX", 256)
+        self.conn_queue_max = conn_queue_max or env_int("LAB_MLLP_CONN_QUEUE_MAX", 32)
+        self.max_frame_bytes = max_frame_bytes or env_int("LAB_MLLP_MAX_FRAME_BYTES", DEFAULT_MAX_FRAME_BYTES)
+
         self._server: Optional[asyncio.base_events.Server] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.stats: Dict[str, int] = {
+            "connections": 0,
+            "frames_received": 0,
+            "acks_sent": 0,
+            "process_errors": 0,
+            "backpressure_waits": 0,
+            "inflight": 0,
+            "oversize_frames": 0,
+            "discarded_bytes": 0,
+        }
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else []
 
     async def start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mllp")
+        self._slots = asyncio.Semaphore(self.queue_max)
         self._server = await asyncio.start_server(self._handle, self.host, self.port)
         await self._server.start_serving()
 
@@ -37,94 +113,175 @@ class MLLPServer:
             self._server.close()
             await self._server.wait_closed()
             self._server = None
+        if self._pool:
+            # let staged-but-unacked frames finish; never block the loop on it
+            pool, self._pool = self._pool, None
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown, True)
 
+    # -----------------------------
+    # connection handling (event loop)
+    # -----------------------------
     async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         peer = writer.get_extra_info("peername")
         remote_ip = peer[0] if peer else None
-        buf = b""
+        self.stats["connections"] += 1
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.conn_queue_max)
+        ack_task = asyncio.create_task(self._ack_loop(queue, remote_ip, writer))
+        framer = MLLPFramer(self.max_frame_bytes)
 
         try:
             while True:
-                chunk = await reader.read(4096)
+                chunk = await reader.read(65536)
                 if not chunk:
                     break
-                buf += chunk
-
-                while True:
-                    start = buf.find(SB)
-                    if start < 0:
-                        if len(buf) > 8192:
-                            buf = buf[-2048:]
-                        break
-
-                    end = buf.find(EB_CR, start)
-                    if end < 0:
-                        break
 
-                    payload = buf[start + 1 : end]
-                    buf = buf[end + len(EB_CR) :]
-
-                    hl7_text = payload.decode("utf-8", errors="replace")
-                    await self._process_one(hl7_text, remote_ip, writer)
+                for ev in framer.feed(chunk):
+                    if ev.kind == "oversize":
+                        self.stats["oversize_frames"] += 1
+                        logger.warning(
+                            "MLLP frame over %s bytes rejected (peer=%s)", self.max_frame_bytes, remote_ip
+                        )
+                    await self._enqueue(queue, ev)
 
+                if ack_task.done():
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
         finally:
+            if not ack_task.done():
+                await queue.put(_EOF)
+            try:
+                await ack_task
+            except Exception:
+                logger.exception("MLLP ack loop failed (peer=%s)", remote_ip)
+            self.stats["discarded_bytes"] += framer.discarded_bytes
             try:
                 writer.close()
                 await writer.wait_closed()
             except Exception:
                 pass
 
-    async def _process_one(self, hl7_text: str, remote_ip: Optional[str], writer: asyncio.StreamWriter):
-        db = SessionLocal()
+    async def _enqueue(self, queue: asyncio.Queue, ev: FrameEvent) -> None:
+        assert self._slots is not None
+        self.stats["frames_received"] += 1
+        if self._slots.locked() or queue.full():
+            self.stats["backpressure_waits"] += 1
+        await self._slots.acquire()
+        self.stats["inflight"] += 1
+        await queue.put(ev)
+
+    async def _ack_loop(self, queue: asyncio.Queue, remote_ip: Optional[str], writer: asyncio.StreamWriter):
+        assert self._slots is not None
+        loop = asyncio.get_running_loop()
+        writable = True
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is _EOF:
+                    return
+                try:
+                    if item.kind == "oversize":
+                        # explicit reject, queued so it keeps its place in the ACK order
+                        ack = self._reject_oversize(item.data)
+                    else:
+                        ack = await loop.run_in_executor(self._pool, self._process_sync, item.data, remote_ip)
+                finally:
+                    self.stats["inflight"] -= 1
+                    self._slots.release()
+
+                if not ack or not writable:
+                    continue
+                try:
+                    writer.write(SB + ack + EB_CR)
+                    await writer.drain()
+                    self.stats["acks_sent"] += 1
+                except (ConnectionError, RuntimeError):
+                    # peer went away: keep staging what was already received
+                    # (analyzer will resend; duplicates are idempotent) but stop writing
+                    writable = False
+        finally:
+            # abnormal exit: give back the slots of frames we will never process
+            while not queue.empty():
+                if queue.get_nowait() is not _EOF:
+                    self.stats["inflight"] -= 1
+                    self._slots.release()
+
+    # -----------------------------
+    # DB work (worker threads)
+    # -----------------------------
+    @staticmethod
+    def _reject_oversize(header: bytes) -> bytes:
+        try:
+            msh = parse_msh(header.decode("latin-1"))
+        except Exception:
+            msh = {}
+        return build_ack(msh, "AR").encode("utf-8")
+
+    def _process_sync(self, frame: bytes, remote_ip: Optional[str]) -> Optional[bytes]:
+        hl7_text = encodings.decode(frame)
         try:
             msh = parse_msh(hl7_text)
-            sending_facility = (msh.get("sending_facility") or "").strip().upper()
-
-            device = (
-                db.query(IntegrationDevice)
-                .filter(
-                    IntegrationDevice.protocol == "HL7_MLLP",
-                    IntegrationDevice.enabled == True,
-                    IntegrationDevice.sending_facility_code == sending_facility,
-                )
-                .first()
+        except Exception:
+            self.stats["process_errors"] += 1
+            logger.warning("MLLP frame without valid MSH from %s", remote_ip)
+            return build_ack({}, "AE").encode("utf-8")
+
+        db = self.session_factory()
+        try:
+            return self._stage(db, msh, hl7_text, remote_ip).encode("utf-8")
+        except Exception:
+            self.stats["process_errors"] += 1
+            logger.exception("MLLP staging failed (peer=%s ctl=%s)", remote_ip, msh.get("message_control_id"))
+            try:
+                db.rollback()
+            except Exception:
+                pass
+            return build_ack(msh, "AE").encode("utf-8")
+        finally:
+            db.close()
+
+    def _stage(self, db, msh: Dict[str, Any], hl7_text: str, remote_ip: Optional[str]) -> str:
+        sending_facility = (msh.get("sending_facility") or "").strip().upper()
+
+        device = (
+            db.query(IntegrationDevice)
+            .filter(
+                IntegrationDevice.protocol == "HL7_MLLP",
+                IntegrationDevice.enabled == True,
+                IntegrationDevice.sending_facility_code == sending_facility,
             )
+            .first()
+        )
 
-            if not device:
-                # store under UNKNOWN so you can see it in Messages UI
-                stage_pipeline(
-                    db,
-                    device=None,
-                    tenant_code="UNKNOWN",
-                    protocol="HL7_MLLP",
-                    raw_payload=hl7_text,
-                    remote_ip=remote_ip,
-                    kind="HL7",
-                    facility_code_override=sending_facility or "UNKNOWN",
-                )
-                ack = build_ack(msh, "AE")
-                writer.write(SB + ack.encode("utf-8") + EB_CR)
-                await writer.drain()
-                return
-
-            result = stage_pipeline(
+        if not device:
+            # store under UNKNOWN so you can see it in Messages UI
+            stage_pipeline(
                 db,
-                device=device,
-                tenant_code=device.tenant_code,
+                device=None,
+                tenant_code="UNKNOWN",
                 protocol="HL7_MLLP",
                 raw_payload=hl7_text,
                 remote_ip=remote_ip,
                 kind="HL7",
+                facility_code_override=sending_facility or "UNKNOWN",
             )
+            return build_ack(msh, "AE")
 
-            # Always ACK AA for success & duplicates; AE for hard errors
-            ack_code = "AA" if result.get("final_status") in ("PROCESSED", "PARSED", "DUPLICATE") else "AE"
-            ack = build_ack(msh, ack_code)
-            writer.write(SB + ack.encode("utf-8") + EB_CR)
-            await writer.drain()
+        result = stage_pipeline(
+            db,
+            device=device,
+            tenant_code=device.tenant_code,
+            protocol="HL7_MLLP",
+            raw_payload=hl7_text,
+            remote_ip=remote_ip,
+            kind="HL7",
+        )
 
-        finally:
-            db.close()
+        # Always ACK AA for success & duplicates; AE for hard errors
+        ack_code = "AA" if result.get("final_status") in ("PROCESSED", "PARSED", "DUPLICATE") else "AE"
+        return build_ack(msh, ack_code)
 
 
 def should_start_mllp() -> bool:
@@ -17,6 +17,7 @@ from app.db.session import MasterSessionLocal
 from app.services.error_logger import log_error, format_exception
 from app.utils.jwt import extract_tenant_from_request
 from app.lab_integration.mllp_server import MLLPServer, should_start_mllp
+from app.services import event_bus, master_migration_runner, pdf_render_pool
 # from app.api.routes_lis_device import public_router as lis_public_router
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
@@ -42,6 +43,9 @@ app.add_middleware(
     expose_headers=["Content-Disposition"],
 )
 
+_mllp = None
+
+
 @app.on_event("startup")
 async def startup():
     global _mllp
@@ -50,6 +54,9 @@ async def startup():
         port = int(os.getenv("LAB_MLLP_PORT", "2575"))
         _mllp = MLLPServer(host, port)
         await _mllp.start()
+    event_bus.start()
+    # tenant migrations left RUNNING by a previous process
+    master_migration_runner.resume_running()
 
 @app.on_event("shutdown")
 async def shutdown():
@@ -57,6 +64,8 @@ async def shutdown():
     if _mllp:
         await _mllp.stop()
         _mllp = None
+    pdf_render_pool.shutdown()
+    event_bus.stop()
 
 def setup_logging():
     logging.basicConfig(
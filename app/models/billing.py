@@ -11,6 +11,7 @@ from sqlalchemy import (
     BigInteger,
     String,
     Text,
+    Date,
     DateTime,
     Numeric,
     ForeignKey,
@@ -1357,3 +1358,82 @@ class BillingAuditLog(Base):
     created_at = Column(DateTime, nullable=False, server_default=func.now())
 
     user = relationship("User", foreign_keys=[user_id])
+
+
+# ============================================================
+# AR balances (maintained by app.services.billing_ar)
+# ============================================================
+class BillingInvoiceBalance(Base):
+    """
+    Receivable state of one invoice: grand_total, received and outstanding
+    as the case outstanding list computes them. is_open = APPROVED / POSTED
+    with outstanding > 0 (what the receivables and aging screens scan).
+    """
+    __tablename__ = "billing_invoice_balances"
+    __table_args__ = (
+        Index("idx_bib_case", "billing_case_id"),
+        Index("idx_bib_open_date", "is_open", "invoice_date", "invoice_id"),
+        Index("idx_bib_open_payer", "is_open", "payer_type", "invoice_date",
+              "invoice_id"),
+        MYSQL_ARGS,
+    )
+
+    invoice_id = Column(
+        BigInteger,
+        ForeignKey("billing_invoices.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    billing_case_id = Column(
+        BigInteger,
+        ForeignKey("billing_cases.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+
+    payer_type = Column(Enum(PayerType), nullable=False)
+    payer_id = Column(Integer, nullable=True)
+    status = Column(Enum(DocStatus), nullable=False)
+
+    # DATE(COALESCE(posted_at, approved_at, created_at)); aging basis
+    invoice_date = Column(Date, nullable=False)
+
+    grand_total = Column(Money, nullable=False, default=0)
+    paid = Column(Money, nullable=False, default=0)
+    outstanding = Column(Money, nullable=False, default=0)
+    is_open = Column(Boolean, nullable=False, default=False)
+
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class BillingCaseBalance(Base):
+    """Receivable totals of one billing case (sum of its invoice balances + advance wallet)."""
+    __tablename__ = "billing_case_balances"
+    __table_args__ = (
+        Index("idx_bcb_outstanding", "outstanding", "billing_case_id"),
+        Index("idx_bcb_patient_out", "patient_outstanding",
+              "billing_case_id"),
+        Index("idx_bcb_payer_out", "payer_outstanding", "billing_case_id"),
+        Index("idx_bcb_oldest", "oldest_open_date", "billing_case_id"),
+        Index("idx_bcb_patient", "patient_id"),
+        MYSQL_ARGS,
+    )
+
+    billing_case_id = Column(
+        BigInteger,
+        ForeignKey("billing_cases.id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    patient_id = Column(Integer, nullable=False)
+
+    billed_total = Column(Money, nullable=False, default=0)  # APPROVED + POSTED
+    paid_total = Column(Money, nullable=False, default=0)
+    outstanding = Column(Money, nullable=False, default=0)
+    patient_outstanding = Column(Money, nullable=False, default=0)  # PATIENT invoices
+    payer_outstanding = Column(Money, nullable=False, default=0)  # INSURER / TPA / CORPORATE invoices
+    advance_balance = Column(Money, nullable=False, default=0)
+
+    open_invoices = Column(Integer, nullable=False, default=0)
+    oldest_open_date = Column(Date, nullable=True)
+
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -82,6 +82,67 @@ class OpdQueueCounter(Base):
     doctor = relationship("User", foreign_keys=[doctor_user_id])
 
 
+class OpdSlot(Base):
+    """
+    Bookable slot inventory, materialized from OpdSchedule by
+    app.services.opd_slots (one row per doctor / date / slot start).
+    Booking flips status free -> booked with a conditional UPDATE, so two
+    requests can never hold the same slot. department_id is the doctor's
+    department, for department-wide availability.
+    """
+    __tablename__ = "opd_slots"
+    __table_args__ = (
+        UniqueConstraint("doctor_user_id", "date", "slot_start",
+                         name="uq_opd_slot_doctor_date_start"),
+        Index("ix_opd_slot_dept_date", "department_id", "date", "status",
+              "slot_start"),
+        Index("ix_opd_slot_appointment", "appointment_id"),
+        {
+            "mysql_engine": "InnoDB",
+            "mysql_charset": "utf8mb4",
+            "mysql_collate": "utf8mb4_unicode_ci",
+        },
+    )
+
+    id = Column(Integer, primary_key=True)
+    doctor_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    department_id = Column(Integer, nullable=True)
+    date = Column(Date, nullable=False)
+    slot_start = Column(Time, nullable=False)
+    slot_end = Column(Time, nullable=False)
+    # NULL: schedule changed after booking, kept until the appointment lets go
+    schedule_id = Column(Integer, nullable=True)
+    status = Column(String(10), nullable=False, default="free")  # free | booked
+    appointment_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime,
+                        default=datetime.utcnow,
+                        onupdate=datetime.utcnow)
+
+
+class OpdQueueChange(Base):
+    """
+    One row per appointment touched by a flush (status, reschedule, visit,
+    vitals). Written by app.services.opd_queue_feed; the id is the cursor
+    of the OPD queue change feed. A reschedule writes a row for both the
+    old and the new (date, doctor).
+    """
+    __tablename__ = "opd_queue_changes"
+    __table_args__ = (
+        Index("ix_opd_qchg_date_doctor", "date", "doctor_user_id", "id"),
+        {
+            "mysql_engine": "InnoDB",
+            "mysql_charset": "utf8mb4",
+            "mysql_collate": "utf8mb4_unicode_ci",
+        },
+    )
+
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+    doctor_user_id = Column(Integer, nullable=False)
+    appointment_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
 class Appointment(Base):
     __tablename__ = "opd_appointments"
     __table_args__ = (
@@ -8,6 +8,7 @@ from sqlalchemy import (
     DateTime,
     func,
     ForeignKey,
+    Index,
 )
 from sqlalchemy.orm import relationship
 
@@ -113,6 +114,34 @@ class Patient(Base):
     )
 
 
+class PatientSearchKey(Base):
+    """
+    Normalized search terms for a patient (maintained by
+    app.services.patient_search). Lookups are prefix range scans on
+    (kind, term) instead of leading-wildcard LIKE on `patients`.
+
+    kind: NAME / PHON (phonetic name) / PHONE / PHONER (reversed digits)
+          UHID / UHIDR (reversed) / RCH / EMAIL
+    """
+    __tablename__ = "patient_search_keys"
+    __table_args__ = (
+        Index("ix_patient_search_keys_lookup", "kind", "term", "patient_id"),
+        Index("ix_patient_search_keys_patient", "patient_id", "kind", "term"),
+        {
+            "mysql_engine": "InnoDB",
+            "mysql_charset": "utf8mb4",
+            "mysql_collate": "utf8mb4_bin",
+        },
+    )
+
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer,
+                        ForeignKey("patients.id", ondelete="CASCADE"),
+                        nullable=False)
+    kind = Column(String(8), nullable=False)
+    term = Column(String(64), nullable=False)
+
+
 class PatientAddress(Base):
     __tablename__ = "patient_addresses"
     __table_args__ = {
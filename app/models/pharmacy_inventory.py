@@ -622,6 +622,46 @@ class StockTransaction(Base):
     user = relationship("User", backref="inventory_stock_transactions")
 
 
+class StockDailyMovement(Base):
+    """
+    StockTransaction summed per day + location + item + txn_type.
+    Maintained by app.services.stock_movements (same transaction as the
+    ledger insert); read by reorder / PO suggestions, non-moving and spike
+    detection instead of scanning the ledger.
+    """
+    __tablename__ = "inv_stock_daily_movements"
+    __table_args__ = (
+        UniqueConstraint("day", "location_id", "item_id", "txn_type", name="uq_inv_daily_mv_key"),
+        Index("ix_inv_daily_mv_loc_day", "location_id", "day"),
+        Index("ix_inv_daily_mv_loc_item_day", "location_id", "item_id", "day"),
+        MYSQL_ARGS,
+    )
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    location_id = Column(Integer, nullable=False)
+    item_id = Column(Integer, nullable=False)
+    txn_type = Column(String(50), nullable=False)
+
+    qty_in = Column(Qty, nullable=False, default=Decimal("0"))    # sum of +quantity_change
+    qty_out = Column(Qty, nullable=False, default=Decimal("0"))   # sum of -quantity_change (OUT rows)
+    txn_count = Column(Integer, nullable=False, default=0)
+    last_txn_time = Column(DateTime, nullable=True)
+
+
+class StockMovementCoverage(Base):
+    """
+    Single row: days >= covered_from are complete in inv_stock_daily_movements
+    (set by the backfill). Earlier days are read from the ledger.
+    """
+    __tablename__ = "inv_stock_movement_coverage"
+    __table_args__ = (MYSQL_ARGS,)
+
+    id = Column(Integer, primary_key=True)
+    covered_from = Column(Date, nullable=False)
+    refreshed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
 # -------------------------
 # Returns / Wastage / Write-off / Recall
 # -------------------------
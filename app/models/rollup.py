@@ -0,0 +1,60 @@
+# FILE: app/models/rollup.py
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Date,
+    DateTime,
+    Numeric,
+    Index,
+    UniqueConstraint,
+    func,
+)
+
+from app.db.base import Base
+
+
+class DailyRollup(Base):
+    """
+    Pre-aggregated daily figures for dashboard / MIS (one row per
+    day + metric + dimension). Maintained by app.services.daily_rollups;
+    the tenant is the database itself.
+
+    metric examples: billing.billed (dim = encounter type),
+    billing.stream (dim = service group), billing.doctor (dim = doctor id),
+    pharmacy.medicines (dim = item name).
+    """
+    __tablename__ = "daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "metric", "dim", name="uq_daily_rollups_day_metric_dim"),
+        Index("ix_daily_rollups_metric_day", "metric", "day"),
+        {
+            "mysql_engine": "InnoDB",
+            "mysql_charset": "utf8mb4",
+            "mysql_collate": "utf8mb4_unicode_ci",
+        },
+    )
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    metric = Column(String(40), nullable=False)
+    dim = Column(String(191), nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Numeric(16, 2), nullable=False, default=0)
+    qty = Column(Numeric(16, 3), nullable=False, default=0)
+
+
+class DailyRollupDay(Base):
+    """
+    A closed day whose rollups are complete. Days without a row here are
+    aggregated live from the source tables.
+    """
+    __tablename__ = "daily_rollup_days"
+    __table_args__ = {
+        "mysql_engine": "InnoDB",
+        "mysql_charset": "utf8mb4",
+        "mysql_collate": "utf8mb4_unicode_ci",
+    }
+
+    day = Column(Date, primary_key=True)
+    refreshed_at = Column(DateTime, nullable=False, server_default=func.now())
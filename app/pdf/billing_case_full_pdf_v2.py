@@ -13,6 +13,7 @@ from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session, selectinload
 
 from app.models.ui_branding import UiBranding
+from app.services import pdf_assets
 from app.models.billing import (
     BillingCase,
     BillingInvoice,
@@ -708,7 +709,7 @@ def _details_html(case: BillingCase) -> str:
 
 def build_full_case_html(db: Session, case_id: int, doc_no: Optional[str],
                          doc_date: Optional[str]) -> str:
-    branding = db.query(UiBranding).order_by(UiBranding.id.desc()).first()
+    branding = pdf_assets.branding(db)
     if not branding:
         # minimal fallback
         class _B:  # type: ignore
@@ -752,6 +753,7 @@ def render_full_case_pdf_bytes(db: Session,
             "WeasyPrint is not installed. Please install weasyprint to render HTML PDFs."
         )
     html = build_full_case_html(db, case_id, doc_no, doc_date)
-    pdf = HTML(string=html).write_pdf(stylesheets=[CSS(
-        string=_css())] if CSS else None)
+    pdf = HTML(string=html).write_pdf(
+        stylesheets=[pdf_assets.css(_css())] if CSS else None,
+        font_config=pdf_assets.font_config())
     return pdf
@@ -4,12 +4,11 @@ from typing import Dict
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.services.ui_branding import get_ui_branding
+from app.services import pdf_assets
 
 
 def draw_branding_header_footer(c: canvas.Canvas,
@@ -19,7 +18,7 @@ def draw_branding_header_footer(c: canvas.Canvas,
     Returns a dict with top/bottom Y coordinates you should respect
     when writing your own content.
     """
-    branding = get_ui_branding(db)
+    branding = pdf_assets.branding(db)
     width, height = A4
 
     header_h = footer_h = 0
@@ -35,7 +34,7 @@ def draw_branding_header_footer(c: canvas.Canvas,
             header_path = Path(settings.STORAGE_DIR).joinpath(
                 branding.pdf_header_path)
             if header_path.exists():
-                img = ImageReader(str(header_path))
+                img = pdf_assets.image_reader(header_path)
                 c.drawImage(
                     img,
                     x=15 * mm,
@@ -51,7 +50,7 @@ def draw_branding_header_footer(c: canvas.Canvas,
             footer_path = Path(settings.STORAGE_DIR).joinpath(
                 branding.pdf_footer_path)
             if footer_path.exists():
-                img = ImageReader(str(footer_path))
+                img = pdf_assets.image_reader(footer_path)
                 c.drawImage(
                     img,
                     x=15 * mm,
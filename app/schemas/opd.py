@@ -97,6 +97,14 @@ class AppointmentRow(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class AppointmentChangesOut(BaseModel):
+    # pass back as ?since= on the next poll
+    cursor: int
+    rows: List[AppointmentRow]
+    # changed, but no longer on this day / doctor (rescheduled or deleted)
+    removed: List[int] = []
+
+
 class AppointmentRescheduleIn(BaseModel):
     date: date
     # ✅ optional now (free appointments don’t need it)
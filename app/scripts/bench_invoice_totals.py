@@ -0,0 +1,217 @@
+# FILE: app/scripts/bench_invoice_totals.py
+"""
+Benchmark: adding N lines to one invoice (long IPD stay).
+
+  incremental : add_auto_line_idempotent as shipped (per-line delta)
+  full        : same, followed by the previous full re-aggregation
+                (SUM + hydrate every line for the GST split) after each line
+
+Every few hundred lines a random line is edited or deleted so the delta
+path is exercised for update/delete too. Halfway through, a taxed line is
+added the way the charge item route does (its own column recalculation,
+meta.gst untouched) so the delta path has to notice the stale split. At
+the end reconcile_invoice_totals() must report zero drift.
+
+Default DB is a throwaway SQLite file; pass --db-uri for MySQL.
+
+Run:
+    python -m app.scripts.bench_invoice_totals --lines 5000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import BigInteger, create_engine, event, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (register every table for FK resolution)
+from app.db.base import Base
+from app.models.billing import (
+    BillingCase,
+    BillingInvoice,
+    BillingInvoiceLine,
+    DocStatus,
+    EncounterType,
+    ServiceGroup,
+)
+from app.services.billing_charge_item_service import recalc_invoice_totals as charge_item_recalc
+from app.services.billing_service import (
+    _apply_active_line_filter,
+    _d,
+    _dec_s,
+    _merge_meta,
+    add_auto_line_idempotent,
+    delete_invoice_line,
+    reconcile_invoice_totals,
+    update_invoice_line,
+)
+
+TABLES = [
+    BillingCase.__table__,
+    BillingInvoice.__table__,
+    BillingInvoiceLine.__table__,
+    Base.metadata.tables["pharmacy_sales"],                 # selectin on BillingInvoice
+    Base.metadata.tables["billing_payment_allocations"],
+]
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+class _User:
+    id = None
+
+
+def _legacy_recalc(db, invoice_id: int) -> None:
+    """Pre-incremental _recalc_invoice_totals (kept for comparison)."""
+    inv = db.get(BillingInvoice, int(invoice_id))
+    q = (db.query(
+        func.coalesce(func.sum(BillingInvoiceLine.line_total), 0),
+        func.coalesce(func.sum(BillingInvoiceLine.discount_amount), 0),
+        func.coalesce(func.sum(BillingInvoiceLine.tax_amount), 0),
+        func.coalesce(func.sum(BillingInvoiceLine.net_amount), 0),
+    ).filter(BillingInvoiceLine.invoice_id == int(inv.id)))
+    row = _apply_active_line_filter(q).first()
+    inv.sub_total, inv.discount_total, inv.tax_total = _d(row[0]), _d(row[1]), _d(row[2])
+    inv.round_off = Decimal("0")
+    inv.grand_total = _d(row[3])
+
+    ql = _apply_active_line_filter(
+        db.query(BillingInvoiceLine).filter(BillingInvoiceLine.invoice_id == int(inv.id)))
+    cgst = sgst = igst = Decimal("0")
+    for ln in ql.all():
+        tax = _d(ln.tax_amount)
+        if tax <= 0:
+            continue
+        mj = ln.meta_json
+        if isinstance(mj, dict) and isinstance(mj.get("gst"), dict):
+            g = mj["gst"]
+            cgst += _d(g.get("cgst_amount"))
+            sgst += _d(g.get("sgst_amount"))
+            igst += _d(g.get("igst_amount"))
+            continue
+        cgst += tax / Decimal("2")
+        sgst += tax / Decimal("2")
+    _merge_meta(inv, {"gst": {"cgst_total": _dec_s(cgst), "sgst_total": _dec_s(sgst),
+                              "igst_total": _dec_s(igst), "tax_total": _dec_s(_d(inv.tax_total))}})
+    db.flush()
+
+
+def _foreign_line(db, inv: BillingInvoice) -> None:
+    """Taxed IGST line + column-only recalculation (charge item path), meta.gst left as is."""
+    db.add(BillingInvoiceLine(
+        billing_case_id=inv.billing_case_id, invoice_id=inv.id, service_group=ServiceGroup.MISC,
+        description="Charge item", qty=Decimal("1"), unit_price=Decimal("1000.00"),
+        line_total=Decimal("1000.00"), discount_amount=Decimal("0"), tax_amount=Decimal("180.00"),
+        net_amount=Decimal("1180.00"), source_module="CHG", source_ref_id=int(inv.id), source_line_key="CHG-1",
+        meta_json={"gst": {"cgst_amount": "0", "sgst_amount": "0", "igst_amount": "180.00"}}))
+    db.flush()
+    inv.round_off = Decimal("0.40")
+    charge_item_recalc(db, inv)
+    db.flush()
+
+
+def _setup_db(db_uri: Optional[str]):
+    if not db_uri:
+        path = os.path.join(tempfile.mkdtemp(prefix="invtotals_bench_"), "bench.db")
+        db_uri = f"sqlite:///{path}"
+    engine = create_engine(db_uri, future=True)
+    if db_uri.startswith("sqlite"):
+        @event.listens_for(engine, "connect")
+        def _nosync(dbapi_conn, _rec):
+            # measure totals maintenance, not fsync per commit
+            dbapi_conn.execute("PRAGMA synchronous=OFF")
+    Base.metadata.create_all(engine, tables=TABLES)
+    return engine, sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+
+def _run(factory, *, lines: int, mode: str, seed: int) -> None:
+    rng = random.Random(seed)
+    db = factory()
+    user = _User()
+    try:
+        case = BillingCase(patient_id=1, encounter_type=EncounterType.IP, encounter_id=time.time_ns() % 10**12,
+                           case_number=f"BENCH-{mode}-{time.time_ns() % 10**12}")
+        db.add(case)
+        db.flush()
+        inv = BillingInvoice(billing_case_id=case.id, invoice_number=f"BI-{mode}-{time.time_ns() % 10**12}",
+                             module="PHARM", status=DocStatus.DRAFT)
+        db.add(inv)
+        db.flush()
+        db.commit()
+
+        ids = []
+        edits = 0
+        t0 = time.perf_counter()
+        for i in range(lines):
+            ln = add_auto_line_idempotent(
+                db,
+                invoice_id=int(inv.id),
+                billing_case_id=int(case.id),
+                user=user,
+                service_group=ServiceGroup.PHARM,
+                item_type="DRUG",
+                item_id=i,
+                description=f"Drug {i}",
+                qty=Decimal(rng.randint(1, 5)),
+                unit_price=Decimal(rng.randint(100, 99999)) / Decimal("100"),
+                gst_rate=Decimal(rng.choice((0, 5, 12, 18))),
+                source_module="PHARM",
+                source_ref_id=int(inv.id) * 100000 + i // 10,  # ~10 items per sale
+                source_line_key=f"L{i}",
+                intra_state_gst=rng.random() < 0.8,
+            )
+            ids.append(int(ln.id))
+            if i and i % 250 == 0:
+                target = rng.choice(ids)
+                if rng.random() < 0.5:
+                    update_invoice_line(db, line_id=target, user=user, qty=Decimal(rng.randint(1, 9)))
+                else:
+                    delete_invoice_line(db, line_id=target, user=user, reason="bench")
+                edits += 1
+            if i == lines // 2:
+                _foreign_line(db, inv)
+            if mode == "full":
+                _legacy_recalc(db, int(inv.id))
+            db.commit()
+        dt = time.perf_counter() - t0
+
+        rec = reconcile_invoice_totals(db, int(inv.id), fix=False)
+        db.rollback()
+        print(f"{mode:12s}: {lines} lines (+{edits} edits) in {dt:7.2f}s -> {lines / dt:8.1f} lines/s"
+              f"  grand_total={inv.grand_total} drift={rec['drift'] or 'none'}")
+        if mode == "incremental" and rec["drift"]:
+            raise AssertionError(f"incremental totals drifted: {rec['drift']}")
+    finally:
+        db.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="default: temp SQLite file")
+    ap.add_argument("--lines", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=11)
+    ap.add_argument("--skip-full", action="store_true", help="only run the incremental path")
+    args = ap.parse_args()
+
+    engine, factory = _setup_db(args.db_uri)
+    try:
+        _run(factory, lines=args.lines, mode="incremental", seed=args.seed)
+        if not args.skip_full:
+            _run(factory, lines=args.lines, mode="full", seed=args.seed)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
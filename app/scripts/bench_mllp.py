@@ -0,0 +1,176 @@
+# FILE: app/scripts/bench_mllp.py
+"""
+Load test for the MLLP listener.
+
+Starts MLLPServer on an ephemeral port against a throwaway SQLite DB
+(or --db-uri for a local MySQL stand-in), then replays ORU^R01 frames
+from many concurrent sockets and checks that:
+  - every frame gets exactly one ACK, in send order per connection
+  - the event loop stays responsive (max tick lag) while DB work runs
+
+Run:
+    python -m app.scripts.bench_mllp --clients 50 --frames 100 --obx 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.lab_integration.mllp_server import MLLPServer, SB, EB_CR
+from app.models.lab_integration import (
+    IntegrationDevice,
+    IntegrationMessage,
+    LabCodeMapping,
+    LabInboundResult,
+    LabInboundResultItem,
+)
+
+FACILITY = "BENCHLAB"
+TABLES = [
+    IntegrationDevice.__table__,
+    IntegrationMessage.__table__,
+    LabCodeMapping.__table__,
+    LabInboundResult.__table__,
+    LabInboundResultItem.__table__,
+]
+
+
+def build_oru(ctl: str, n_obx: int) -> bytes:
+    ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    segs = [
+        f"MSH|^~\\&|ANALYZER|{FACILITY}|HIMS|HOSP|{ts}||ORU^R01|{ctl}|P|2.3.1",
+        "PID|1||UHID0001||DOE^JOHN",
+        f"OBR|1||BC{ctl}|CBC^Complete Blood Count|||{ts}",
+    ]
+    for i in range(n_obx):
+        segs.append(f"OBX|{i + 1}|NM|T{i:03d}^Test {i}||{10 + i}.5|g/dL|10-20|N|||F")
+    return SB + ("\r".join(segs) + "\r").encode("utf-8") + EB_CR
+
+
+def _setup_db(db_uri: Optional[str], n_obx: int):
+    if not db_uri:
+        path = os.path.join(tempfile.mkdtemp(prefix="mllp_bench_"), "bench.db")
+        db_uri = f"sqlite:///{path}"
+    kwargs = {"connect_args": {"check_same_thread": False, "timeout": 30}} if db_uri.startswith("sqlite") else {}
+    engine = create_engine(db_uri, future=True, **kwargs)
+    Base.metadata.create_all(engine, tables=TABLES)
+
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+    db = factory()
+    try:
+        dev = db.query(IntegrationDevice).filter(IntegrationDevice.sending_facility_code == FACILITY).first()
+        if not dev:
+            dev = IntegrationDevice(tenant_code="BENCH", name="bench", protocol="HL7_MLLP",
+                                    sending_facility_code=FACILITY, enabled=True)
+            db.add(dev)
+            db.flush()
+            for i in range(n_obx):
+                db.add(LabCodeMapping(tenant_code="BENCH", source_device_id=dev.id,
+                                      external_code=f"T{i:03d}", internal_test_id=1000 + i))
+            db.commit()
+    finally:
+        db.close()
+    return engine, factory
+
+
+async def _client(port: int, cid: int, frames: int, n_obx: int, run_id: str, latencies: List[float]) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    ctls = [f"{run_id}-{cid}-{i}" for i in range(frames)]
+    sent_at = {}
+
+    async def send_all():
+        for ctl in ctls:
+            sent_at[ctl] = time.perf_counter()
+            writer.write(build_oru(ctl, n_obx))
+            await writer.drain()
+
+    sender = asyncio.create_task(send_all())
+    buf = b""
+    got = 0
+    while got < frames:
+        chunk = await reader.read(65536)
+        if not chunk:
+            break
+        buf += chunk
+        while True:
+            end = buf.find(EB_CR)
+            if end < 0:
+                break
+            ack = buf[1:end].decode("utf-8", errors="replace")
+            buf = buf[end + len(EB_CR):]
+            msa = next(s for s in ack.split("\r") if s.startswith("MSA|"))
+            ctl = msa.split("|")[2]
+            if ctl != ctls[got]:
+                raise AssertionError(f"client {cid}: out-of-order ACK {ctl} (expected {ctls[got]})")
+            latencies.append(time.perf_counter() - sent_at[ctl])
+            got += 1
+    await sender
+    writer.close()
+    await writer.wait_closed()
+    return got
+
+
+async def _loop_lag(stop: asyncio.Event, out: List[float]) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        out.append(time.perf_counter() - t0 - 0.01)
+
+
+async def run(args) -> None:
+    engine, factory = _setup_db(args.db_uri, args.obx)
+    server = MLLPServer("127.0.0.1", 0, session_factory=factory,
+                        workers=args.workers, queue_max=args.queue_max)
+    await server.start()
+    port = server.sockets[0].getsockname()[1]
+
+    stop = asyncio.Event()
+    lags: List[float] = []
+    lag_task = asyncio.create_task(_loop_lag(stop, lags))
+    latencies: List[float] = []
+    run_id = datetime.utcnow().strftime("%H%M%S%f")
+
+    t0 = time.perf_counter()
+    acked = await asyncio.gather(*[
+        _client(port, c, args.frames, args.obx, run_id, latencies) for c in range(args.clients)
+    ])
+    dt = time.perf_counter() - t0
+
+    stop.set()
+    await lag_task
+    await server.stop()
+    engine.dispose()
+
+    total = sum(acked)
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    print(f"clients={args.clients} frames/client={args.frames} obx={args.obx} workers={args.workers}")
+    print(f"acked {total}/{args.clients * args.frames} in {dt:.2f}s  -> {total / dt:.0f} msg/s")
+    print(f"ack latency ms: p50={p(0.5):.1f} p95={p(0.95):.1f} p99={p(0.99):.1f}")
+    print(f"event-loop max lag: {max(lags or [0]) * 1000:.1f} ms")
+    print(f"server stats: {server.stats}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="default: temp SQLite file")
+    ap.add_argument("--clients", type=int, default=50)
+    ap.add_argument("--frames", type=int, default=100)
+    ap.add_argument("--obx", type=int, default=20)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--queue-max", type=int, default=256)
+    args = ap.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# FILE: app/scripts/bench_mllp_framing.py
+"""
+Fuzz + throughput check for app.lab_integration.mllp_framing.MLLPFramer.
+
+Fuzz: random frames (with noise between them, oversize frames mixed in)
+are split at arbitrary byte boundaries; the framer must return exactly the
+original frames in order and one "oversize" event per oversize frame.
+
+Throughput: one large multi-OBX frame delivered in small TCP-sized
+segments, new framer vs the previous `buf += chunk` / re-slice loop.
+
+Run:
+    python -m app.scripts.bench_mllp_framing --iterations 2000 --segment 64
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+from app.lab_integration.mllp_framing import SB, EB_CR, MLLPFramer
+
+
+def _legacy_frames(chunks: List[bytes]) -> List[bytes]:
+    """The pre-framer loop from MLLPServer._handle (kept for comparison)."""
+    out: List[bytes] = []
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        while True:
+            start = buf.find(SB)
+            if start < 0:
+                if len(buf) > 8192:
+                    buf = buf[-2048:]
+                break
+            end = buf.find(EB_CR, start)
+            if end < 0:
+                break
+            out.append(buf[start + 1 : end])
+            buf = buf[end + len(EB_CR) :]
+    return out
+
+
+def _random_frame(rng: random.Random, max_len: int) -> bytes:
+    n = rng.randint(0, max_len)
+    # payload never contains SB or FS (as in real HL7)
+    alphabet = bytes(b for b in range(256) if b not in (0x0B, 0x1C))
+    return bytes(rng.choice(alphabet) for _ in range(n))
+
+
+def _split(rng: random.Random, data: bytes) -> List[bytes]:
+    chunks, i = [], 0
+    while i < len(data):
+        step = rng.choice((1, 2, 3, 7, 64, 1500, 4096))
+        chunks.append(data[i : i + step])
+        i += step
+    return chunks
+
+
+def fuzz(iterations: int, seed: int) -> None:
+    rng = random.Random(seed)
+    max_frame = 2048
+    for it in range(iterations):
+        expected: List[Tuple[str, bytes]] = []
+        stream = bytearray()
+        for _ in range(rng.randint(1, 12)):
+            if rng.random() < 0.2:
+                stream += b"\r\nnoise" * rng.randint(0, 3)
+            if rng.random() < 0.1:
+                frame = b"MSH|^~\\&|X|" + _random_frame(rng, 10) + b"A" * (max_frame + rng.randint(1, 5000))
+                expected.append(("oversize", b""))
+            else:
+                frame = _random_frame(rng, 600)
+                expected.append(("frame", frame))
+            stream += SB + frame + EB_CR
+
+        framer = MLLPFramer(max_frame_bytes=max_frame)
+        got: List[Tuple[str, bytes]] = []
+        for chunk in _split(rng, bytes(stream)):
+            for ev in framer.feed(chunk):
+                got.append((ev.kind, ev.data if ev.kind == "frame" else b""))
+
+        if got != expected:
+            raise AssertionError(f"iteration {it}: framer mismatch ({len(got)} events vs {len(expected)})")
+        if framer.buffered:
+            raise AssertionError(f"iteration {it}: {framer.buffered} bytes left buffered")
+    print(f"fuzz: {iterations} streams OK (seed={seed})")
+
+
+def throughput(obx: int, segment: int) -> None:
+    segs = ["MSH|^~\\&|ANALYZER|LAB|HIMS|HOSP|20250101120000||ORU^R01|1|P|2.3.1"]
+    segs += [f"OBX|{i}|NM|T{i:05d}^Test||{i}.5|g/dL|10-20|N|||F" for i in range(obx)]
+    frame = SB + "\r".join(segs).encode() + EB_CR
+    chunks = [frame[i : i + segment] for i in range(0, len(frame), segment)]
+
+    t0 = time.perf_counter()
+    legacy = _legacy_frames(chunks)
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    framer = MLLPFramer(max_frame_bytes=len(frame) + 1)
+    new = [ev.data for c in chunks for ev in framer.feed(c)]
+    t_new = time.perf_counter() - t0
+
+    assert legacy == new and len(new) == 1
+    mb = len(frame) / 1e6
+    print(f"throughput: frame={mb:.2f} MB in {len(chunks)} segments of {segment} B")
+    print(f"  legacy buf+=chunk : {t_legacy * 1000:9.1f} ms  ({mb / t_legacy:8.1f} MB/s)")
+    print(f"  MLLPFramer        : {t_new * 1000:9.1f} ms  ({mb / t_new:8.1f} MB/s)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--obx", type=int, default=20000)
+    ap.add_argument("--segment", type=int, default=536)
+    args = ap.parse_args()
+    fuzz(args.iterations, args.seed)
+    throughput(args.obx, args.segment)
+
+
+if __name__ == "__main__":
+    main()
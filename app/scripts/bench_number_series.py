@@ -0,0 +1,138 @@
+# FILE: app/scripts/bench_number_series.py
+"""
+Concurrency benchmark for invoice numbering (app.services.id_gen).
+
+N writer threads each run "billing transactions": open session ->
+next_invoice_number() -> simulated billing work (--work-ms) -> commit.
+Runs once with the series in strict gapless mode (row lock held for the
+whole transaction) and once with hi-lo blocks, then checks that every
+number handed out is unique.
+
+Default DB is a throwaway SQLite file in WAL mode; pass --db-uri for a
+MySQL tenant-like database (tables are created if missing).
+
+Run:
+    python -m app.scripts.bench_number_series --writers 32 --invoices 40 --work-ms 20
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import Base
+from app.models.billing import BillingNumberSeries
+from app.models.ui_branding import UiBranding
+from app.services.id_gen import next_invoice_number
+from app.services.number_allocator import allocator
+
+TABLES = [BillingNumberSeries.__table__, UiBranding.__table__]
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+def _setup_db(db_uri: Optional[str]):
+    if not db_uri:
+        path = os.path.join(tempfile.mkdtemp(prefix="numseries_bench_"), "bench.db")
+        db_uri = f"sqlite:///{path}"
+    sqlite = db_uri.startswith("sqlite")
+    kwargs = {"connect_args": {"check_same_thread": False, "timeout": 60}, "pool_size": 64} if sqlite else {"pool_size": 64}
+    engine = create_engine(db_uri, future=True, **kwargs)
+    if sqlite:
+        @event.listens_for(engine, "connect")
+        def _wal(dbapi_conn, _rec):
+            dbapi_conn.execute("PRAGMA journal_mode=WAL")
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _for_update(conn, cursor, statement, params, context, executemany):
+            # SQLite drops FOR UPDATE; take the write lock instead so the
+            # gapless path serializes like the MySQL row lock does
+            stmt = getattr(getattr(context, "compiled", None), "statement", None)
+            if getattr(stmt, "_for_update_arg", None) is not None:
+                dbapi = conn.connection.dbapi_connection
+                if not dbapi.in_transaction:
+                    cursor.execute("BEGIN IMMEDIATE")
+    Base.metadata.create_all(engine, tables=TABLES)
+    return engine, sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+
+def _run(factory, *, writers: int, invoices: int, work_ms: float, gapless: bool) -> None:
+    settings.NUMBER_SERIES_GAPLESS = "INVOICE" if gapless else ""
+    allocator.discard()
+
+    numbers: List[str] = []
+    errors: List[BaseException] = []
+    out_lock = threading.Lock()
+    start = threading.Barrier(writers + 1)
+
+    def writer():
+        start.wait()
+        for _ in range(invoices):
+            db = factory()
+            try:
+                n = next_invoice_number(db)
+                time.sleep(work_ms / 1000.0)  # rest of the billing transaction
+                db.commit()
+                with out_lock:
+                    numbers.append(n)
+            except BaseException as e:  # noqa: BLE001 - reported below
+                db.rollback()
+                with out_lock:
+                    errors.append(e)
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    dt = time.perf_counter() - t0
+
+    dupes = len(numbers) - len(set(numbers))
+    mode = "gapless (row lock)" if gapless else f"hi-lo blocks of {settings.NUMBER_SERIES_BLOCK_SIZE}"
+    print(f"{mode:28s}: {len(numbers)} invoices in {dt:6.2f}s -> {len(numbers) / dt:8.1f} inv/s"
+          f"  duplicates={dupes} errors={len(errors)}")
+    if errors:
+        print(f"  first error: {errors[0]!r}")
+    if dupes:
+        raise AssertionError("duplicate invoice numbers")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="default: temp SQLite file")
+    ap.add_argument("--writers", type=int, default=32)
+    ap.add_argument("--invoices", type=int, default=40, help="per writer")
+    ap.add_argument("--work-ms", type=float, default=20.0)
+    ap.add_argument("--block-size", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.block_size:
+        settings.NUMBER_SERIES_BLOCK_SIZE = args.block_size
+    engine, factory = _setup_db(args.db_uri)
+    print(f"writers={args.writers} invoices/writer={args.invoices} work={args.work_ms}ms")
+    try:
+        _run(factory, writers=args.writers, invoices=args.invoices, work_ms=args.work_ms, gapless=True)
+        _run(factory, writers=args.writers, invoices=args.invoices, work_ms=args.work_ms, gapless=False)
+        print(f"allocator: {allocator.stats()}")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
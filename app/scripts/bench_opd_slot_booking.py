@@ -0,0 +1,253 @@
+# FILE: app/scripts/bench_opd_slot_booking.py
+"""
+Concurrency benchmark for OPD slot booking (app.services.opd_slots).
+
+A "hot" doctor has --slots slots on one day; --writers threads each try
+--attempts bookings of a random slot. Every booking is a transaction:
+take the slot -> simulated booking work (--work-ms) -> insert the
+appointment -> commit. Two ways of taking the slot are compared:
+
+  check-insert  the previous flow: SELECT for a busy appointment in the
+                slot, then INSERT; the race is only caught by the
+                uq_doctor_date_slot constraint (IntegrityError -> 409 after
+                a rollback, or a lock error)
+  inventory     opd_slots.reserve(): one conditional UPDATE free -> booked
+
+Both must end with at most one holding appointment per slot. Then the
+week's availability of a --doctors department is read once with
+opd_slots.availability() and once the old way (schedule + booked-slot
+queries per doctor per day).
+
+Default DB is a throwaway SQLite file in WAL mode (writes serialize on the
+file lock); pass --db-uri for a MySQL tenant-like database.
+
+Run:
+    python -m app.scripts.bench_opd_slot_booking --writers 16 --attempts 20 --slots 32
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time as _time
+from datetime import date, time, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, create_engine, event, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.department import Department
+from app.models.opd import Appointment, OpdSchedule, OpdSlot
+from app.models.patient import Patient
+from app.models.user import User
+from app.services import opd_slots
+
+TABLES = [Department.__table__, User.__table__, Patient.__table__, OpdSchedule.__table__,
+          Appointment.__table__, OpdSlot.__table__]
+HOT_DOCTOR = 1
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+def _setup_db(db_uri: Optional[str]):
+    if not db_uri:
+        path = os.path.join(tempfile.mkdtemp(prefix="opd_slot_bench_"), "bench.db")
+        db_uri = f"sqlite:///{path}"
+    sqlite = db_uri.startswith("sqlite")
+    kwargs = {"connect_args": {"check_same_thread": False, "timeout": 60}, "pool_size": 64} if sqlite else {"pool_size": 64}
+    engine = create_engine(db_uri, future=True, **kwargs)
+    if sqlite:
+        @event.listens_for(engine, "connect")
+        def _wal(dbapi_conn, _rec):
+            dbapi_conn.execute("PRAGMA journal_mode=WAL")
+    Base.metadata.create_all(engine, tables=TABLES)
+    return engine, sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+
+def _seed(factory, day: date, n_slots: int, n_doctors: int) -> None:
+    with factory() as db:
+        if db.get(Department, 1) is None:
+            db.add(Department(id=1, name="Bench OPD"))
+            for i in range(1, n_doctors + 1):
+                db.add(User(id=i, login_id=f"bench_doc_{i}", name=f"Dr Bench {i}", email=f"doc{i}@bench.local",
+                            password_hash="x", is_doctor=True, department_id=1))
+            db.add(Patient(id=1, uhid="BENCH000001", first_name="Bench", gender="F"))
+            db.flush()
+        db.query(Appointment).filter(Appointment.department_id == 1).delete()
+        db.query(OpdSlot).filter(OpdSlot.department_id == 1).delete()
+        db.query(OpdSchedule).filter(OpdSchedule.doctor_user_id <= n_doctors).delete()
+        end = (_minutes(time(9, 0)) + 15 * n_slots)
+        for doc in range(1, n_doctors + 1):
+            for wd in range(7):
+                db.add(OpdSchedule(doctor_user_id=doc, weekday=wd, start_time=time(9, 0),
+                                   end_time=time(end // 60, end % 60) if doc == HOT_DOCTOR else time(13, 0),
+                                   slot_minutes=15, is_active=True))
+        db.flush()
+        for doc in range(1, n_doctors + 1):
+            opd_slots.regenerate(db, doc, day, day + timedelta(days=6))
+        db.commit()
+
+
+def _minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def _slot_times(n_slots: int) -> List[time]:
+    return [time((540 + 15 * i) // 60, (540 + 15 * i) % 60) for i in range(n_slots)]
+
+
+def _book_check_insert(db, day: date, start: time, queue_no: int) -> None:
+    busy = db.query(Appointment.id).filter(
+        Appointment.doctor_user_id == HOT_DOCTOR, Appointment.date == day,
+        Appointment.slot_start == start, Appointment.status.in_(opd_slots.HOLDING_STATUS)).first()
+    if busy:
+        raise HTTPException(status_code=409, detail="Slot already booked")
+    db.add(_appointment(day, start, queue_no))
+    db.flush()
+
+
+def _book_inventory(db, day: date, start: time, queue_no: int) -> None:
+    opd_slots.reserve(db, HOT_DOCTOR, day, start)
+    ap = _appointment(day, start, queue_no)
+    db.add(ap)
+    db.flush()
+    opd_slots.attach(db, HOT_DOCTOR, day, start, ap.id)
+
+
+def _appointment(day: date, start: time, queue_no: int) -> Appointment:
+    end = _minutes(start) + 15
+    return Appointment(patient_id=1, department_id=1, doctor_user_id=HOT_DOCTOR, date=day,
+                       appointment_type="slot", queue_no=queue_no, slot_start=start,
+                       slot_end=time(end // 60, end % 60), purpose="Bench", status="booked")
+
+
+def _run(factory, name: str, book, *, day: date, writers: int, attempts: int, n_slots: int,
+         work_ms: float, seed: int) -> None:
+    slots = _slot_times(n_slots)
+    queue = itertools.count(1)
+    counts: Dict[str, int] = {"booked": 0, "conflict": 0, "integrity": 0, "lock": 0}
+    out_lock = threading.Lock()
+    start = threading.Barrier(writers + 1)
+
+    def writer(i: int):
+        rng = random.Random(seed * 1000 + i)
+        start.wait()
+        for _ in range(attempts):
+            db = factory()
+            kind = "booked"
+            try:
+                with out_lock:
+                    q = next(queue)
+                book(db, day, rng.choice(slots), q)
+                _time.sleep(work_ms / 1000.0)  # rest of the booking transaction
+                db.commit()
+            except HTTPException:
+                db.rollback()
+                kind = "conflict"
+            except IntegrityError:
+                db.rollback()
+                kind = "integrity"
+            except OperationalError:
+                db.rollback()
+                kind = "lock"
+            finally:
+                db.close()
+            with out_lock:
+                counts[kind] += 1
+
+    threads = [threading.Thread(target=writer, args=(i, )) for i in range(writers)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = _time.perf_counter()
+    for t in threads:
+        t.join()
+    dt = _time.perf_counter() - t0
+
+    with factory() as db:
+        per_slot = (db.query(Appointment.slot_start, func.count(Appointment.id))
+                    .filter(Appointment.doctor_user_id == HOT_DOCTOR, Appointment.date == day,
+                            Appointment.status.in_(opd_slots.HOLDING_STATUS))
+                    .group_by(Appointment.slot_start).all())
+        double = sum(1 for _s, n in per_slot if n > 1)
+        held = (db.query(func.count(OpdSlot.id))
+                .filter(OpdSlot.doctor_user_id == HOT_DOCTOR, OpdSlot.date == day,
+                        OpdSlot.status == opd_slots.BOOKED).scalar())
+    total = writers * attempts
+    print(f"{name:13s}: {total} attempts in {dt:6.2f}s -> {total / dt:7.1f}/s  booked={counts['booked']}"
+          f" 409={counts['conflict']} integrity={counts['integrity']} lock={counts['lock']}"
+          f"  double-booked slots={double}" + (f" inventory booked={held}" if name == "inventory" else ""))
+    if double:
+        raise AssertionError(f"{name}: {double} slot(s) double-booked")
+    if name == "inventory" and held != counts["booked"]:
+        raise AssertionError("inventory rows disagree with booked appointments")
+
+
+def _availability_legacy(db, day: date, n_doctors: int) -> int:
+    free = 0
+    for doc in range(1, n_doctors + 1):
+        for i in range(7):
+            d = day + timedelta(days=i)
+            schedules = db.query(OpdSchedule).filter(
+                OpdSchedule.doctor_user_id == doc, OpdSchedule.weekday == d.weekday(),
+                OpdSchedule.is_active.is_(True)).all()
+            busy = {t for (t, ) in db.query(Appointment.slot_start).filter(
+                Appointment.doctor_user_id == doc, Appointment.date == d,
+                Appointment.status.in_(opd_slots.HOLDING_STATUS), Appointment.slot_start.isnot(None)).all()}
+            for sch in schedules:
+                free += sum(1 for s, _e in opd_slots.grid(sch, d) if s not in busy)
+    return free
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="default: temp SQLite file")
+    ap.add_argument("--writers", type=int, default=16)
+    ap.add_argument("--attempts", type=int, default=20, help="per writer")
+    ap.add_argument("--slots", type=int, default=32, help="slots of the hot doctor")
+    ap.add_argument("--doctors", type=int, default=40, help="doctors in the department (availability)")
+    ap.add_argument("--work-ms", type=float, default=5.0)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    engine, factory = _setup_db(args.db_uri)
+    day = opd_slots.today() + timedelta(days=1)
+    print(f"{engine.dialect.name}: {args.writers} writers x {args.attempts} attempts on {args.slots} slots")
+
+    for name, book in (("check-insert", _book_check_insert), ("inventory", _book_inventory)):
+        _seed(factory, day, args.slots, args.doctors)
+        _run(factory, name, book, day=day, writers=args.writers, attempts=args.attempts,
+             n_slots=args.slots, work_ms=args.work_ms, seed=args.seed)
+
+    stmts = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*_a, **_kw):
+        stmts[0] += 1
+
+    with factory() as db:
+        n0, t0 = stmts[0], _time.perf_counter()
+        legacy = _availability_legacy(db, day, args.doctors)
+        n1, t1 = stmts[0], _time.perf_counter()
+        rows = opd_slots.availability(db, day, day + timedelta(days=6), department_id=1)
+        n2, t2 = stmts[0], _time.perf_counter()
+    print(f"department week availability ({args.doctors} doctors): per doctor/day {n1 - n0} SQL "
+          f"{(t1 - t0) * 1000:.1f} ms, inventory {n2 - n1} SQL {(t2 - t1) * 1000:.1f} ms")
+    if legacy != len(rows):
+        raise SystemExit(f"availability differs: {legacy} vs {len(rows)} free slots")
+    print(f"  {len(rows)} free slots, identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# FILE: app/scripts/bench_patient_search.py
+"""
+Latency benchmark: registration-desk patient search.
+
+Builds a synthetic patient table (Indian first / last names with common
+spelling variants, 10-digit mobiles, UHIDs) plus its search keys, then
+times a query mix against
+  like   : the previous `LIKE '%q%'` OR across uhid / names / phone / email
+  keys   : app.services.patient_search.search_patient_ids (ranked prefix)
+
+Default DB is a throwaway SQLite file; pass --db-uri for MySQL. The data
+is generated once per DB (re-runs against the same --db-uri reuse it).
+
+Run:
+    python -m app.scripts.bench_patient_search --patients 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, event, func, or_
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.patient import Patient, PatientAddress, PatientSearchKey
+from app.services.patient_search import patient_search_terms, search_patient_ids
+
+TABLES = [Patient.__table__, PatientAddress.__table__, PatientSearchKey.__table__]  # addresses: selectin
+
+FIRST = ["Karthik", "Karthick", "Kartik", "Lakshmi", "Laxmi", "Senthil", "Sentil", "Sridhar", "Shreedhar",
+         "Priya", "Preethi", "Priti", "Mohammed", "Mohamed", "Ramesh", "Rameshh", "Suresh", "Dinesh",
+         "Bhavani", "Bavani", "Gowri", "Gouri", "Murugan", "Muruganantham", "Anitha", "Anita", "Vijay",
+         "Wijay", "Deepa", "Dheepa", "Kavya", "Kaviya", "Arun", "Aroon", "Saravanan", "Selvi", "Meena",
+         "Mina", "Ganesh", "Ganesan", "Thilak", "Tilak", "Harish", "Hareesh", "Yamuna", "Jamuna",
+         "Pooja", "Puja", "Rajesh", "Rajkumar", "Sathya", "Satya", "Nithya", "Nitya", "Balaji", "Revathi"]
+LAST = ["Kumar", "Raj", "Subramanian", "Iyer", "Nair", "Reddy", "Sharma", "Pillai", "Naidu", "Krishnan",
+        "Venkatesh", "Rao", "Khan", "Das", "Gupta", "Mani", "Shankar", "Sankar", "Babu", "Devi", ""]
+
+
+def _setup_db(db_uri: Optional[str]):
+    if not db_uri:
+        path = os.path.join(tempfile.mkdtemp(prefix="ptsearch_bench_"), "bench.db")
+        db_uri = f"sqlite:///{path}"
+    engine = create_engine(db_uri, future=True)
+    if db_uri.startswith("sqlite"):
+        @event.listens_for(engine, "connect")
+        def _pragmas(dbapi_conn, _rec):
+            dbapi_conn.execute("PRAGMA journal_mode=WAL")
+            dbapi_conn.execute("PRAGMA synchronous=OFF")
+            # SQLite LIKE is case-insensitive by default, which disables
+            # the prefix-range optimization; terms are lowercase already
+            dbapi_conn.execute("PRAGMA case_sensitive_like=ON")
+    Base.metadata.create_all(engine, tables=TABLES)
+    return engine, sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+
+def _generate(factory, n: int, rng: random.Random, batch: int = 5000) -> None:
+    with factory() as db:
+        have = db.query(func.count(Patient.id)).scalar() or 0
+    if have >= n:
+        print(f"reusing {have} patients")
+        return
+
+    t0 = time.perf_counter()
+    phones = rng.sample(range(6_000_000_000, 9_999_999_999), n - have)
+    for start in range(have, n, batch):
+        stop = min(n, start + batch)
+        rows = []
+        for i in range(start, stop):
+            rows.append(dict(
+                id=i + 1,
+                uhid=f"SMC{(i % 28) + 1:02d}{(i % 12) + 1:02d}2025{i + 1:06d}",
+                first_name=rng.choice(FIRST),
+                last_name=rng.choice(LAST) or None,
+                gender="Female" if i % 2 else "Male",
+                dob=date(1950 + i % 70, 1 + i % 12, 1 + i % 28),
+                phone=str(phones[i - have]),
+                email=f"user{i + 1}@example.test" if i % 5 == 0 else None,
+                is_active=True,
+                is_pregnant=False,
+            ))
+        with factory() as db:
+            db.execute(Patient.__table__.insert(), rows)
+            keys = []
+            for r in rows:
+                p = Patient(**r)
+                keys.extend({"patient_id": r["id"], "kind": k, "term": t} for k, t in patient_search_terms(p))
+            db.execute(PatientSearchKey.__table__.insert(), keys)
+            db.commit()
+        if (stop // batch) % 20 == 0 or stop == n:
+            print(f"  generated {stop} patients ({stop / (time.perf_counter() - t0):.0f}/s)", flush=True)
+
+
+def _like_search(db, q: str) -> List[int]:
+    like = f"%{q}%"
+    rows = (db.query(Patient.id).filter(Patient.is_active.is_(True)).filter(
+        or_(Patient.uhid.ilike(like), Patient.first_name.ilike(like), Patient.last_name.ilike(like),
+            Patient.phone.ilike(like), Patient.email.ilike(like), Patient.rch_id.ilike(like)))
+        .order_by(Patient.id.desc()).limit(50).all())
+    return [r[0] for r in rows]
+
+
+def _queries(factory, rng: random.Random, n: int) -> Dict[str, List[str]]:
+    with factory() as db:
+        sample = [db.get(Patient, rng.randint(1, n)) for _ in range(30)]
+        qs = {
+            "name prefix": [p.first_name[:4] for p in sample[:10]],
+            "full name": [f"{p.first_name} {p.last_name or ''}".strip() for p in sample[:10]],
+            "phone (full)": [p.phone for p in sample[10:20]],
+            "phone (last 4)": [p.phone[-4:] for p in sample[10:20]],
+            "uhid (full)": [p.uhid for p in sample[20:30]],
+            "no match": ["zzqx", "qwrtp", "9999999999x"],
+        }
+        for p in sample:
+            db.expunge(p)
+    return qs
+
+
+def _time(fn: Callable[[str], list], queries: List[str], repeat: int) -> Dict[str, float]:
+    ms = []
+    hits = 0
+    for _ in range(repeat):
+        for q in queries:
+            t0 = time.perf_counter()
+            hits += len(fn(q))
+            ms.append((time.perf_counter() - t0) * 1000.0)
+    ms.sort()
+    return {"p50": statistics.median(ms), "p95": ms[int(len(ms) * 0.95) - 1] if len(ms) > 1 else ms[0],
+            "hits": hits / max(1, repeat * len(queries))}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="default: temp SQLite file")
+    ap.add_argument("--patients", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--skip-like", action="store_true", help="only time the search-key path")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    engine, factory = _setup_db(args.db_uri)
+    try:
+        _generate(factory, args.patients, rng)
+        qs = _queries(factory, rng, args.patients)
+        with factory() as db:
+            db.execute(Patient.__table__.select().limit(1)).all()  # warm connection
+            print(f"{'query':16s} {'path':6s} {'p50 ms':>9s} {'p95 ms':>9s} {'rows':>6s}")
+            for label, queries in qs.items():
+                paths = [("keys", lambda q: search_patient_ids(db, q, limit=50)),
+                         ("phon", lambda q: search_patient_ids(db, q, limit=50, phonetic=True))]
+                if not args.skip_like:
+                    paths.append(("like", lambda q: _like_search(db, q)))
+                for name, fn in paths:
+                    r = _time(fn, queries, args.repeat if name != "like" else 1)
+                    print(f"{label:16s} {name:6s} {r['p50']:9.2f} {r['p95']:9.2f} {r['hits']:6.1f}")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# FILE: app/scripts/bench_pdf_assets.py
+"""
+Per-document branding cost with and without the pdf_assets cache.
+
+Seeds a throwaway SQLite DB with one UiBranding row whose logo, PDF
+header / footer band and letterhead are generated PNGs under a temp
+STORAGE_DIR, then times the branding work every PDF builder repeats:
+  branding row     pdf_assets.branding(db)
+  html header      render_brand_header_html (logo -> downscale -> data URI)
+  reportlab doc    a --pages page canvas: draw_brand_header_reportlab on
+                   page 1, letterhead background + draw_branding_header_footer
+                   on every page
+each run --docs times "cold" (caches dropped before every document, i.e.
+the old per-render cost) and "warm". Prints per-document p50 / p95 and
+fails if a warm document differs in size from its cold render.
+
+Run:
+    python -m app.scripts.bench_pdf_assets --docs 50 --pages 4
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+import app.models.vitals_registers  # noqa: F401  (FK target of the newborn tables)
+from app.db.base import Base  # registers the tenant tables
+from app.models.ui_branding import UiBranding
+from app.pdf.branding_frame import draw_branding_header_footer
+from app.services import pdf_assets
+from app.services.pdf_branding import draw_brand_header_reportlab, render_brand_header_html
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+def _png(path: Path, size, seed: int) -> None:
+    from PIL import Image
+
+    w, h = size
+    im = Image.effect_mandelbrot((w, h), (-2.0 + seed * 0.01, -1.2, 0.8, 1.2), 64).convert("RGB")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    im.save(path, format="PNG")
+
+
+def _seed(db, storage: Path) -> None:
+    _png(storage / "branding" / "logo.png", (1600, 1600), 1)
+    _png(storage / "branding" / "header.png", (2480, 300), 2)
+    _png(storage / "branding" / "footer.png", (2480, 200), 3)
+    _png(storage / "branding" / "letterhead.png", (1240, 1754), 4)
+    db.add(UiBranding(
+        org_name="Bench Multispeciality Hospital",
+        org_tagline="Care beyond cure",
+        org_address="12, Hospital Road, Chennai 600001",
+        org_phone="+91 44 1234 5678",
+        org_email="info@bench.example",
+        org_website="bench.example",
+        org_gstin="33ABCDE1234F1Z5",
+        logo_path="branding/logo.png",
+        pdf_header_path="branding/header.png",
+        pdf_footer_path="branding/footer.png",
+        letterhead_path="branding/letterhead.png",
+        letterhead_position="background",
+        pdf_header_height_mm=24,
+        pdf_footer_height_mm=16,
+    ))
+    db.commit()
+
+
+def _drop_caches() -> None:
+    pdf_assets._branding.clear()
+    pdf_assets._images = pdf_assets._ImageLRU()
+
+
+def _reportlab_doc(db, pages: int) -> bytes:
+    b = pdf_assets.branding(db)
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    w, h = A4
+    for page in range(pages):
+        lh = pdf_assets.image_reader(Path(settings.STORAGE_DIR) / b.letterhead_path)
+        c.drawImage(lh, 0, 0, width=w, height=h, preserveAspectRatio=True, mask="auto")
+        draw_branding_header_footer(c, db)
+        if page == 0:
+            draw_brand_header_reportlab(c, b, 40, h - 40, w - 80)
+        c.drawString(60, 300, f"page {page + 1}")
+        c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def _time(fn, docs: int, cold: bool):
+    out, last = [], None
+    for _ in range(docs):
+        if cold:
+            _drop_caches()
+        t = time.perf_counter()
+        last = fn()
+        out.append(time.perf_counter() - t)
+    return out, last
+
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=50)
+    ap.add_argument("--pages", type=int, default=4)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_pdf_assets_"))
+    settings.STORAGE_DIR = str(tmp)
+    settings.BRANDING_CACHE_TTL_SECONDS = 300
+
+    engine = create_engine(f"sqlite:///{tmp / 'bench.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        _seed(db, tmp)
+
+    failures = 0
+    ms = lambda s: f"{s * 1000:8.2f} ms"  # noqa: E731
+    print(f"{args.docs} documents each, {args.pages}-page ReportLab doc")
+    with Session() as db:
+        cases = [
+            ("branding row", lambda: pdf_assets.branding(db)),
+            ("html header", lambda: render_brand_header_html(pdf_assets.branding(db))),
+            ("reportlab doc", lambda: _reportlab_doc(db, args.pages)),
+        ]
+        for name, fn in cases:
+            cold, cold_out = _time(fn, args.docs, cold=True)
+            warm, warm_out = _time(fn, args.docs, cold=False)
+            if isinstance(cold_out, (bytes, str)) and len(cold_out) != len(warm_out):
+                failures += 1
+                print(f"  {name}: warm output differs ({len(cold_out)} vs {len(warm_out)} bytes)")
+            print(f"  {name:14s} cold p50 {ms(statistics.median(cold))}  p95 {ms(_pct(cold, 95))}"
+                  f"   warm p50 {ms(statistics.median(warm))}  p95 {ms(_pct(warm, 95))}"
+                  f"   x{statistics.median(cold) / max(statistics.median(warm), 1e-9):.1f}")
+
+    if pdf_assets.font_config() is None:
+        print("  (WeasyPrint not installed: css() / font_config() not measured)")
+    if failures:
+        raise SystemExit(f"{failures} case(s) differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# FILE: app/scripts/bench_pdf_render_pool.py
+"""
+Concurrent IPD case-sheet renders: in request workers vs the render pool.
+
+Seeds a throwaway SQLite DB with --admissions admissions, each with a long
+stay worth of vitals, nursing notes and intake/output rows (a multi-page
+case sheet), then renders --renders case sheets two ways:
+  inline : --threads request-worker threads call build_ipd_case_sheet_pdf
+           directly (today's synchronous endpoint)
+  pool   : the same renders submitted to pdf_render_pool (?async=1) and
+           polled until done
+and prints wall time, how long each request holds its worker (p50 / p95),
+and the API process RSS before / after. The pool is warmed first (process
+spawn + imports are reported separately). Fails if any pool job fails or a
+PDF differs in page count from the inline render.
+
+Run:
+    python -m app.scripts.bench_pdf_render_pool --renders 24 --threads 4 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+import app.models.vitals_registers  # noqa: F401  (FK target of the newborn tables)
+from app.db.base import Base  # registers the tenant tables
+from app.models.ipd import IpdAdmission, IpdIntakeOutput, IpdNursingNote, IpdVital
+from app.models.patient import Patient
+from app.services import pdf_render_pool
+from app.services.pdfs.ipd_case_sheet import build_ipd_case_sheet_pdf
+
+TARGET = "app.services.pdfs.ipd_case_sheet:build_ipd_case_sheet_pdf"
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return float("nan")
+
+
+def _pages(pdf: bytes) -> int:
+    return len(re.findall(rb"/Type\s*/Page(?!s)", pdf))
+
+
+def _seed(db, n_adm: int, days: int, rng: random.Random) -> None:
+    start = datetime.utcnow() - timedelta(days=days)
+    for a in range(1, n_adm + 1):
+        db.add(Patient(id=a, uhid=f"UH{a:06d}", first_name=f"Patient{a}", gender="F" if a % 2 else "M"))
+        db.flush()
+        db.add(IpdAdmission(id=a, patient_id=a, admitted_at=start))
+    db.flush()
+
+    vitals, notes, io_rows = [], [], []
+    for a in range(1, n_adm + 1):
+        for h in range(0, days * 24, 4):
+            t = start + timedelta(hours=h)
+            vitals.append({
+                "admission_id": a, "recorded_at": t, "recorded_by": 1,
+                "bp_systolic": rng.randint(100, 150), "bp_diastolic": rng.randint(60, 95),
+                "temp_c": round(rng.uniform(36.4, 38.6), 1), "rr": rng.randint(14, 24),
+                "spo2": rng.randint(92, 100), "pulse": rng.randint(60, 110),
+            })
+        for h in range(0, days * 24, 8):
+            t = start + timedelta(hours=h)
+            notes.append({
+                "admission_id": a, "nurse_id": 1, "entry_time": t, "note_type": "routine",
+                "shift": ("morning", "evening", "night")[(h // 8) % 3],
+                "current_condition": "Stable, afebrile, tolerating oral feeds. " * 3,
+                "nursing_interventions": "Positioning, IV site care, wound dressing inspected. " * 2,
+                "handover_note": "Continue monitoring vitals 4th hourly; strict I/O charting.",
+            })
+            io_rows.append({
+                "admission_id": a, "recorded_at": t, "recorded_by": 1,
+                "intake_oral_ml": rng.randint(200, 800), "intake_iv_ml": rng.randint(0, 500),
+                "urine_voided_ml": rng.randint(200, 900), "stools_count": rng.randint(0, 2),
+            })
+    db.execute(IpdVital.__table__.insert(), vitals)
+    db.execute(IpdNursingNote.__table__.insert(), notes)
+    db.execute(IpdIntakeOutput.__table__.insert(), io_rows)
+    db.commit()
+
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--admissions", type=int, default=4)
+    ap.add_argument("--days", type=int, default=40, help="Length of stay per admission")
+    ap.add_argument("--renders", type=int, default=24)
+    ap.add_argument("--threads", type=int, default=4, help="Request workers for the inline run")
+    ap.add_argument("--workers", type=int, default=4, help="PDF_RENDER_WORKERS for the pool run")
+    ap.add_argument("--jobs-per-worker", type=int, default=settings.PDF_RENDER_JOBS_PER_WORKER)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_pdf_pool_")
+    db_path = Path(tmp) / "bench.db"
+    settings.STORAGE_DIR = tmp
+    settings.PDF_CACHE_MAX_MB = 0
+    settings.PDF_RENDER_WORKERS = args.workers
+    settings.PDF_RENDER_TENANT_CONCURRENCY = args.workers  # one tenant here
+    settings.PDF_RENDER_JOBS_PER_WORKER = args.jobs_per_worker
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    rng = random.Random(7)
+    with Session() as db:
+        t0 = time.perf_counter()
+        _seed(db, args.admissions, args.days, rng)
+        print(f"seeded {args.admissions} admissions x {args.days} days in {time.perf_counter() - t0:.1f}s")
+
+    adm_ids = [1 + i % args.admissions for i in range(args.renders)]
+
+    # ---- reference pages + warm imports
+    ref_pages = {}
+    with Session() as db:
+        for a in sorted(set(adm_ids)):
+            pdf, _ = build_ipd_case_sheet_pdf(db=db, admission_id=a)
+            ref_pages[a] = _pages(pdf)
+    print(f"case sheet pages per admission: {sorted(set(ref_pages.values()))}")
+
+    # ---- inline
+    def inline_one(a):
+        t = time.perf_counter()
+        with Session() as db:
+            build_ipd_case_sheet_pdf(db=db, admission_id=a)
+        return time.perf_counter() - t
+
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as ex:
+        inline_hold = list(ex.map(inline_one, adm_ids))
+    inline_wall = time.perf_counter() - t0
+    rss_inline = _rss_mb()
+
+    # ---- pool
+    failures = 0
+    with Session() as db:
+        # spawn + import cost of the render processes, paid once per recycle
+        t0 = time.perf_counter()
+        warm = [pdf_render_pool.submit(db, TARGET, {"admission_id": 1}, filename="warm.pdf")
+                for _ in range(args.workers)]
+        while any(pdf_render_pool.get_job(db, j["id"])["status"] in (pdf_render_pool.QUEUED, pdf_render_pool.RUNNING)
+                  for j in warm):
+            time.sleep(0.05)
+        print(f"render pool warm-up ({args.workers} processes): {time.perf_counter() - t0:.1f}s")
+
+        hold = []
+        jobs = []
+        t0 = time.perf_counter()
+        for a in adm_ids:
+            t = time.perf_counter()
+            jobs.append((a, pdf_render_pool.submit(db, TARGET, {"admission_id": a},
+                                                   filename=f"IPD_CaseSheet_{a}.pdf")))
+            hold.append(time.perf_counter() - t)
+        pending = {j["id"]: a for a, j in jobs}
+        render_ms = []
+        while pending:
+            time.sleep(0.05)
+            for job_id, a in list(pending.items()):
+                job = pdf_render_pool.get_job(db, job_id)
+                if job["status"] in (pdf_render_pool.QUEUED, pdf_render_pool.RUNNING):
+                    continue
+                pending.pop(job_id)
+                path = pdf_render_pool.result_path(db, job)
+                if job["status"] != pdf_render_pool.DONE or not path:
+                    failures += 1
+                    print(f"  job {job_id} FAILED: {job.get('error')}")
+                elif _pages(path.read_bytes()) != ref_pages[a]:
+                    failures += 1
+                    print(f"  job {job_id}: page count differs")
+                else:
+                    render_ms.append(job.get("render_ms") or 0)
+        pool_wall = time.perf_counter() - t0
+    rss_pool = _rss_mb()
+    pdf_render_pool.shutdown()
+
+    ms = lambda s: f"{s * 1000:8.1f} ms"  # noqa: E731
+    print(f"\n{args.renders} case sheets, {args.threads} request threads vs {args.workers} render processes")
+    print(f"  inline : wall {inline_wall:6.2f}s  worker held p50 {ms(statistics.median(inline_hold))}"
+          f"  p95 {ms(_pct(inline_hold, 95))}  API RSS {rss0:.0f} -> {rss_inline:.0f} MB")
+    print(f"  pool   : wall {pool_wall:6.2f}s  worker held p50 {ms(statistics.median(hold))}"
+          f"  p95 {ms(_pct(hold, 95))}  API RSS {rss_inline:.0f} -> {rss_pool:.0f} MB"
+          f"  (render p50 {statistics.median(render_ms or [0]):.0f} ms in child)")
+    if failures:
+        raise SystemExit(f"{failures} pool job(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# FILE: app/scripts/bench_rbac.py
+"""
+Micro-benchmark: per-call cost of has_perm / prefix checks,
+walking ORM-like role collections (old path) vs compiled permission sets.
+
+Run:
+    python -m app.scripts.bench_rbac --roles 6 --perms-per-role 60 --calls 200000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from types import SimpleNamespace
+
+from app.core.rbac import compiled_perms, has_perm, has_perm_prefix, iter_user_perm_codes
+
+
+def _fake_user(n_roles: int, perms_per_role: int) -> SimpleNamespace:
+    modules = ["billing", "ipd", "opd", "lab", "pharmacy", "radiology", "ot", "patients"]
+    roles = []
+    for r in range(n_roles):
+        perms = [
+            SimpleNamespace(code=f"{modules[(r + i) % len(modules)]}.feature{i}.action{r}")
+            for i in range(perms_per_role)
+        ]
+        roles.append(SimpleNamespace(permissions=perms))
+    return SimpleNamespace(is_admin=False, roles=roles, permissions=None)
+
+
+def _legacy_has_perm(user, code: str) -> bool:
+    return code in iter_user_perm_codes(user)
+
+
+def _legacy_has_prefix(user, prefix: str) -> bool:
+    return any(c.startswith(prefix) for c in iter_user_perm_codes(user))
+
+
+def _timeit(label: str, fn, calls: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<34} {dt * 1e9 / calls:>10.0f} ns/call")
+    return dt
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--roles", type=int, default=6)
+    ap.add_argument("--perms-per-role", type=int, default=60)
+    ap.add_argument("--calls", type=int, default=200_000)
+    args = ap.parse_args()
+
+    user = _fake_user(args.roles, args.perms_per_role)
+    hit = user.roles[-1].permissions[-1].code
+    miss = "billing.nope.never"
+
+    print(f"roles={args.roles} perms/role={args.perms_per_role} calls={args.calls}")
+    a = _timeit("legacy has_perm (hit)", lambda: _legacy_has_perm(user, hit), args.calls)
+    _timeit("legacy has_perm (miss)", lambda: _legacy_has_perm(user, miss), args.calls)
+    c = _timeit("legacy prefix 'billing.'", lambda: _legacy_has_prefix(user, "billing."), args.calls)
+
+    compiled_perms(user)  # first call compiles + memoizes
+    b = _timeit("compiled has_perm (hit)", lambda: has_perm(user, hit), args.calls)
+    _timeit("compiled has_perm (miss)", lambda: has_perm(user, miss), args.calls)
+    d = _timeit("compiled prefix 'billing.'", lambda: has_perm_prefix(user, "billing."), args.calls)
+
+    print(f"speedup has_perm: {a / b:.1f}x   prefix: {c / d:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+# FILE: app/scripts/bench_stock_alerts.py
+"""
+Timing + equivalence check for the pharmacy stock-alerts dashboard.
+
+Seeds a throwaway SQLite DB (default 50k items over 3 pharmacy stores,
+~2 batches per stocked item, 500k stock transactions over 180 days) and
+builds the dashboard three ways:
+  per-query : get_dashboard of app/services/pharmacy_stock_alerts.py as
+              of --baseline (git show), the one-query-per-widget dashboard
+              the engine replaced (reads inv_stock_txns only)
+  snapshot  : get_dashboard, cold cache, after rebuild_stock_movements
+              (single-pass engine over the daily movement summary)
+  cached    : get_dashboard again, no stock movement in between
+The other summary readers (non-moving report, PO suggestions) are run
+before the backfill (ledger fallback) and after it. Then one stock
+transaction is posted to check it lands in the summary and the next call
+rebuilds. Fails if KPIs, location summaries, movement, spikes, FEFO
+suggestions, the alerts preview or the summary readers differ from the
+ledger.
+
+Run (from a git checkout):
+    python -m app.scripts.bench_stock_alerts --items 50000 --txns 500000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import subprocess
+import tempfile
+import time
+import types
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import BigInteger, create_engine, event, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (register every table)
+from app.db.base import Base
+from app.models.pharmacy_inventory import (
+    InventoryItem,
+    InventoryLocation,
+    ItemBatch,
+    ItemLocationStock,
+    StockDailyMovement,
+    StockTransaction,
+)
+from app.schemas.pharmacy_stock_alerts import ReportType
+from app.scripts import rebuild_stock_movements
+from app.services import pharmacy_stock_alert_engine
+from app.services.inventory_suggestions import po_suggestions
+from app.services.pharmacy_stock_alerts import build_report_rows, get_dashboard
+
+OUT_TYPES = ("DISPENSE", "SALE", "ISSUE")
+BASELINE = "2b8fce8"  # last commit with the per-query dashboard
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+def _sqlite_datediff(a, b):
+    # MySQL DATEDIFF(a, b) for the per-query path
+    if a is None or b is None:
+        return None
+    return (date.fromisoformat(str(a)[:10]) - date.fromisoformat(str(b)[:10])).days
+
+
+def _sqlite_greatest(a, b):
+    return max(a, b)
+
+
+def _baseline_dashboard(rev: str):
+    # the service module as committed at rev; it only imports models + schemas
+    name = "app/services/pharmacy_stock_alerts.py"
+    try:
+        src = subprocess.run(["git", "show", f"{rev}:{name}"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise SystemExit(f"cannot read {name} at {rev}: {e}")
+    mod = types.ModuleType(f"baseline_pharmacy_stock_alerts_{rev}")
+    exec(compile(src, f"{rev}:{name}", "exec"), mod.__dict__)
+    return mod.get_dashboard
+
+
+def _seed(db, n_items: int, n_txns: int, rng: random.Random) -> None:
+    today = date.today()
+    now = datetime.utcnow()
+    db.execute(InventoryLocation.__table__.insert(), [
+        {"id": 1, "code": "MAIN", "name": "Main Pharmacy", "expiry_alert_days": 90},
+        {"id": 2, "code": "OPD", "name": "OPD Pharmacy", "expiry_alert_days": 60},
+        {"id": 3, "code": "IPD", "name": "Ward Pharmacy", "expiry_alert_days": 30},
+    ])
+
+    items = []
+    for i in range(1, n_items + 1):
+        reorder = rng.choice([0, 0, 10, 20, 50, 100])
+        items.append({
+            "id": i, "code": f"ITM{i:06d}", "name": f"Item {i:06d}",
+            "item_type": "DRUG" if rng.random() < 0.8 else "CONSUMABLE",
+            "reorder_level": Decimal(reorder),
+            "max_level": Decimal(reorder * rng.choice([0, 3, 5])),
+            "schedule_code": rng.choice(["", "", "", "", "H", "H1", "X", "G"]),
+            "lasa_flag": rng.random() < 0.03,
+            "prescription_status": rng.choice(["RX", "RX", "OTC", "SCHEDULED"]),
+            "is_active": rng.random() < 0.98,
+        })
+    db.execute(InventoryItem.__table__.insert(), items)
+
+    stocks, batches = [], []
+    bid = 0
+    for it in items:
+        for loc in rng.sample([1, 2, 3], rng.choice([1, 1, 2])):
+            total = Decimal("0")
+            for _b in range(rng.choice([0, 1, 2, 2, 3])):
+                bid += 1
+                qty = Decimal(rng.choice([0, rng.randint(1, 400), rng.randint(1, 40)]))
+                if rng.random() < 0.003:
+                    qty = -Decimal(rng.randint(1, 5))
+                exp = None if rng.random() < 0.03 else today + timedelta(days=rng.randint(-60, 720))
+                active = rng.random() < 0.97
+                batches.append({
+                    "id": bid, "item_id": it["id"], "location_id": loc, "batch_no": f"B{bid:07d}",
+                    "expiry_date": exp, "expiry_key": int(exp.strftime("%Y%m%d")) if exp else 0,
+                    "current_qty": qty, "unit_cost": Decimal(rng.randint(100, 90000)) / 100,
+                    "mrp": Decimal(rng.randint(200, 120000)) / 100, "tax_percent": Decimal("12"),
+                    "is_active": active, "is_saleable": rng.random() < 0.95,
+                })
+                if active:
+                    total += qty
+            if rng.random() < 0.02:
+                total += Decimal(rng.randint(-5, 5))  # on-hand vs batch mismatch
+            stocks.append({"item_id": it["id"], "location_id": loc, "on_hand_qty": total})
+    db.execute(ItemLocationStock.__table__.insert(), stocks)
+    db.execute(ItemBatch.__table__.insert(), batches)
+
+    by_key = {}
+    for b in batches:
+        by_key.setdefault((b["location_id"], b["item_id"]), []).append(b["id"])
+    keys = list(by_key)
+    hot = rng.sample(keys, max(len(keys) // 20, 1))  # a few fast movers
+    active = {it["id"] for it in items if it["is_active"]}
+    fast, fast_key = {}, {}
+    txns = []
+    for t in range(1, n_txns + 1):
+        loc, item_id = rng.choice(hot) if rng.random() < 0.3 else rng.choice(keys)
+        r = rng.random()
+        if r < 0.7:
+            ttype, qty = rng.choice(OUT_TYPES), -Decimal(rng.randint(1, 10))
+        elif r < 0.85:
+            ttype, qty = "GRN", Decimal(rng.randint(10, 200))
+        elif r < 0.93:
+            ttype, qty = rng.choice(["RETURN", "PURCHASE_RETURN"]), Decimal(rng.randint(-5, 5))
+        else:
+            ttype, qty = "ADJUSTMENT", Decimal(rng.randint(-5, 5))
+        age = rng.random() ** 2 * 180  # more recent activity
+        if qty < 0 and ttype in OUT_TYPES and age < 30 and item_id in active:
+            fast[item_id] = fast.get(item_id, 0) - qty
+            fast_key[item_id] = loc
+        txns.append({
+            "id": t, "location_id": loc, "item_id": item_id,
+            "batch_id": rng.choice(by_key[(loc, item_id)]) if rng.random() < 0.9 else None,
+            "txn_time": now - timedelta(days=age), "txn_type": ttype, "quantity_change": qty,
+        })
+        if len(txns) >= 50000:
+            db.execute(StockTransaction.__table__.insert(), txns)
+            txns = []
+
+    # The baseline ranks fast movers by outflow only (ties come back in
+    # database order): keep the top 11 distinct so both pick the same ten.
+    t = n_txns
+    while True:
+        ranked = sorted(fast, key=lambda i: (-fast[i], i))[:11]
+        tied = next((b for a, b in zip(ranked, ranked[1:]) if fast[a] == fast[b]), None)
+        if tied is None:
+            break
+        fast[tied] += 1
+        t += 1
+        txns.append({
+            "id": t, "location_id": fast_key[tied], "item_id": tied, "batch_id": None,
+            "txn_time": now, "txn_type": "DISPENSE", "quantity_change": Decimal("-1"),
+        })
+    if txns:
+        db.execute(StockTransaction.__table__.insert(), txns)
+    db.commit()
+
+
+def _norm(x):
+    if isinstance(x, Decimal):
+        return round(float(x), 2)
+    if isinstance(x, float):
+        return round(x, 2)
+    if isinstance(x, dict):
+        return {k: _norm(v) for k, v in x.items() if k != "as_of"}
+    if isinstance(x, (list, tuple)):
+        return [_norm(v) for v in x]
+    return x
+
+
+def _diff(a, b, path=""):
+    if isinstance(a, dict) and isinstance(b, dict):
+        for k in sorted(set(a) | set(b)):
+            yield from _diff(a.get(k), b.get(k), f"{path}.{k}")
+    elif isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        for i, (x, y) in enumerate(zip(a, b)):
+            yield from _diff(x, y, f"{path}[{i}]")
+    elif a != b:
+        yield path
+
+
+def _summary_readers(db):
+    return {
+        # short window: nearly all seeded stock moved within the default 60 days
+        "non-moving report": build_report_rows(db, ReportType.NON_MOVING, non_moving_days=2),
+        "po suggestions": [po_suggestions(db, loc, limit=100000) for loc in (1, 2, 3)],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=50000)
+    ap.add_argument("--txns", type=int, default=500000)
+    ap.add_argument("--preview-limit", type=int, default=120)
+    ap.add_argument("--threshold", type=int, default=5000, help="High-value expiry threshold")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--baseline", default=BASELINE, help="Commit whose per-query get_dashboard is the reference")
+    args = ap.parse_args()
+    get_dashboard_per_query = _baseline_dashboard(args.baseline)
+
+    fd, path = tempfile.mkstemp(suffix=".sqlite")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}", future=True)
+
+    @event.listens_for(engine, "connect")
+    def _setup(dbapi_conn, _rec):
+        dbapi_conn.execute("PRAGMA synchronous=OFF")
+        dbapi_conn.create_function("datediff", 2, _sqlite_datediff)
+        dbapi_conn.create_function("greatest", 2, _sqlite_greatest)
+
+    try:
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+        with factory() as db:
+            t0 = time.perf_counter()
+            _seed(db, args.items, args.txns, random.Random(args.seed))
+            print(f"seeded {args.items} items / {args.txns} txns in {time.perf_counter() - t0:.1f}s")
+
+        kw = dict(high_value_expiry_threshold=Decimal(args.threshold), preview_limit=args.preview_limit)
+        with factory() as db:
+            t0 = time.perf_counter()
+            ref = get_dashboard_per_query(db, **kw)
+            t_ref = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            ledger = _summary_readers(db)
+            t_ledger = time.perf_counter() - t0
+
+        with factory() as db:
+            t0 = time.perf_counter()
+            rebuild_stock_movements.run(db)
+            t_backfill = time.perf_counter() - t0
+            n_rows = db.query(func.count(StockDailyMovement.id)).scalar()
+        with factory() as db:
+            t0 = time.perf_counter()
+            summary = _summary_readers(db)
+            t_summary = time.perf_counter() - t0
+
+        pharmacy_stock_alert_engine.clear_cache()
+        with factory() as db:
+            t0 = time.perf_counter()
+            new = get_dashboard(db, **kw)
+            t_new = time.perf_counter() - t0
+        with factory() as db:
+            t0 = time.perf_counter()
+            get_dashboard(db, **kw)
+            t_hit = time.perf_counter() - t0
+        with factory() as db:
+            mv = StockDailyMovement
+            today_cnt = lambda: db.query(func.coalesce(func.sum(mv.txn_count), 0)).filter(  # noqa: E731
+                mv.day == date.today(), mv.location_id == 1, mv.item_id == 1, mv.txn_type == "ADJUSTMENT").scalar()
+            before = today_cnt()
+            db.add(StockTransaction(location_id=1, item_id=1, txn_type="ADJUSTMENT", quantity_change=Decimal("1")))
+            db.commit()
+            folded = today_cnt() == before + 1
+            misses = pharmacy_stock_alert_engine._cache.misses
+            get_dashboard(db, **kw)
+            rebuilt = pharmacy_stock_alert_engine._cache.misses == misses + 1
+
+        print(f"backfill {n_rows} summary rows in {t_backfill * 1000:.0f} ms")
+        print(f"per-query {t_ref * 1000:.0f} ms, snapshot {t_new * 1000:.0f} ms, cached {t_hit * 1000:.0f} ms")
+        print(f"non-moving report + PO suggestions: ledger {t_ledger * 1000:.0f} ms, summary {t_summary * 1000:.0f} ms")
+        print(f"new stock txn folded into summary: {folded}, invalidates snapshot: {rebuilt}")
+
+        bad = [f"snapshot: {p}" for p in _diff(_norm(ref.model_dump()), _norm(new.model_dump()))]
+        for label in ledger:
+            bad.extend(f"{label}: {p}" for p in _diff(_norm(ledger[label]), _norm(summary[label])))
+        for p in bad[:20]:
+            print(f"  MISMATCH {p}")
+        if bad or not rebuilt or not folded:
+            raise AssertionError("summary-backed reads differ from the ledger")
+        print("OK")
+    finally:
+        engine.dispose()
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
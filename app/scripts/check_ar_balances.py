@@ -0,0 +1,300 @@
+# FILE: app/scripts/check_ar_balances.py
+"""
+Check of the maintained AR balances (app.services.billing_ar).
+
+Seeds a throwaway SQLite DB with the billing mix of check_case_financials
+and then verifies that:
+
+  * the after-commit refresh leaves no drift after the seed and after
+    each billing flow: receipt with allocation, receipt void, allocation
+    void, refund, invoice void, invoice post, advance + application,
+    invoice delete
+  * reconcile() reports drift written outside the ORM (changed amounts,
+    missing / orphan rows) and repair=True removes it
+  * receivables pages (every payer filter and sort) and aging buckets /
+    aging invoice pages match a full recompute with case_ledger(), for
+    several as-of dates
+  * one receivables / aging page is one query
+
+Run:
+    python -m app.scripts.check_ar_balances --cases 30 --invoices 20
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from sqlalchemy import create_engine, delete, insert, update
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (register every table for FK resolution)
+from app.db.base import Base
+from app.models.billing import (
+    AdvanceType,
+    BillingAdvance,
+    BillingAdvanceApplication,
+    BillingCaseBalance,
+    BillingInvoice,
+    BillingInvoiceBalance,
+    BillingInvoiceLine,
+    BillingPayment,
+    BillingPaymentAllocation,
+    DocStatus,
+    PayerType,
+    PaymentDirection,
+    PaymentKind,
+    ReceiptStatus,
+)
+from app.scripts.check_case_financials import _seed, count_queries
+from app.services import billing_ar
+from app.services.billing_finance import case_ledger
+
+AS_OF = [date(2026, 1, 10), date(2026, 2, 1), date(2026, 2, 20), date(2026, 3, 20), date(2026, 6, 1)]
+
+
+def _all_drift(factory, n_cases: int) -> Dict[str, int]:
+    with factory() as db:
+        stats = billing_ar.reconcile(db, range(1, n_cases + 1))
+        stats["case_stale"] += len(billing_ar.stale_case_ids(db))
+        return stats
+
+
+def _expect_clean(factory, n_cases: int, step: str) -> None:
+    stats = _all_drift(factory, n_cases)
+    if billing_ar.drift(stats):
+        raise AssertionError(f"drift after {step}: {stats}")
+    print(f"  {step:32s} no drift")
+
+
+# ------------------------------------------------------------
+# billing flows (ORM, one commit each)
+# ------------------------------------------------------------
+def _open_invoice(db, rng: random.Random) -> BillingInvoice:
+    invs = db.query(BillingInvoice).filter(BillingInvoice.status.in_(billing_ar.OPEN_STATUS),
+                                           BillingInvoice.grand_total > 0).order_by(BillingInvoice.id).all()
+    return rng.choice(invs)
+
+
+def _receipt(db, inv: BillingInvoice, amount: Decimal, direction=PaymentDirection.IN) -> BillingPayment:
+    n = db.query(BillingPayment).count() + 1
+    pay = BillingPayment(billing_case_id=inv.billing_case_id, invoice_id=None, payer_type=inv.payer_type,
+                         amount=amount, direction=direction,
+                         kind=PaymentKind.REFUND if direction == PaymentDirection.OUT else PaymentKind.RECEIPT,
+                         status=ReceiptStatus.ACTIVE, receipt_number=f"RX{n:07d}", received_by=1)
+    db.add(pay)
+    db.flush()
+    db.add(BillingPaymentAllocation(billing_case_id=inv.billing_case_id, payment_id=pay.id, invoice_id=inv.id,
+                                    payer_bucket=inv.payer_type, amount=amount, status=ReceiptStatus.ACTIVE))
+    return pay
+
+
+def _flows(factory, n_cases: int, rng: random.Random) -> None:
+    steps = []
+
+    def step(name):
+        def wrap(fn):
+            steps.append((name, fn))
+            return fn
+        return wrap
+
+    @step("receipt + allocation")
+    def _(db):
+        inv = _open_invoice(db, rng)
+        _receipt(db, inv, (Decimal(str(inv.grand_total)) / 3).quantize(Decimal("0.01")))
+
+    @step("receipt void")
+    def _(db):
+        pay = db.query(BillingPayment).filter(BillingPayment.status == ReceiptStatus.ACTIVE,
+                                              BillingPayment.direction == PaymentDirection.IN).first()
+        pay.status = ReceiptStatus.VOID
+
+    @step("allocation void")
+    def _(db):
+        al = db.query(BillingPaymentAllocation).filter(
+            BillingPaymentAllocation.status == ReceiptStatus.ACTIVE).order_by(BillingPaymentAllocation.id.desc()).first()
+        al.status = ReceiptStatus.VOID
+
+    @step("refund")
+    def _(db):
+        _receipt(db, _open_invoice(db, rng), Decimal("25.00"), PaymentDirection.OUT)
+
+    @step("invoice void")
+    def _(db):
+        _open_invoice(db, rng).status = DocStatus.VOID
+
+    @step("invoice post")
+    def _(db):
+        inv = db.query(BillingInvoice).filter(BillingInvoice.status == DocStatus.DRAFT).first()
+        inv.status = DocStatus.POSTED
+        inv.posted_at = datetime(2026, 3, 1, 10, 0)
+
+    @step("advance + application")
+    def _(db):
+        inv = _open_invoice(db, rng)
+        adv = BillingAdvance(billing_case_id=inv.billing_case_id, entry_type=AdvanceType.ADVANCE,
+                             amount=Decimal("500.00"), entry_by=1)
+        db.add(adv)
+        db.flush()
+        pay = _receipt(db, inv, Decimal("200.00"))
+        pay.kind = PaymentKind.ADVANCE_ADJUSTMENT
+        db.add(BillingAdvanceApplication(billing_case_id=inv.billing_case_id, advance_id=adv.id,
+                                         payment_id=pay.id, amount=Decimal("200.00")))
+
+    @step("invoice delete")
+    def _(db):
+        inv = db.query(BillingInvoice).filter(BillingInvoice.status == DocStatus.DRAFT).order_by(
+            BillingInvoice.id.desc()).first()
+        for model in (BillingPaymentAllocation, BillingInvoiceLine):
+            for row in db.query(model).filter(model.invoice_id == inv.id).all():
+                db.delete(row)
+        db.query(BillingPayment).filter(BillingPayment.invoice_id == inv.id).update({"invoice_id": None})
+        db.delete(inv)
+
+    for name, fn in steps:
+        with factory() as db:
+            fn(db)
+            db.commit()
+        _expect_clean(factory, n_cases, name)
+
+
+# ------------------------------------------------------------
+# drift outside the ORM
+# ------------------------------------------------------------
+def _drift(factory, n_cases: int) -> None:
+    with factory() as db:
+        conn = db.connection()
+        conn.execute(update(BillingInvoiceBalance).where(BillingInvoiceBalance.invoice_id.in_([3, 7, 11]))
+                     .values(outstanding=Decimal("1.23")))
+        conn.execute(delete(BillingInvoiceBalance).where(BillingInvoiceBalance.billing_case_id == 2))
+        conn.execute(delete(BillingCaseBalance).where(BillingCaseBalance.billing_case_id == 4))
+        conn.execute(update(BillingCaseBalance).where(BillingCaseBalance.billing_case_id == 5)
+                     .values(open_invoices=999))
+        conn.execute(insert(BillingCaseBalance).values(billing_case_id=n_cases + 50, patient_id=1))
+        db.commit()
+
+    found = _all_drift(factory, n_cases)
+    if billing_ar.drift(found) < 5:
+        raise AssertionError(f"reconcile missed injected drift: {found}")
+    print(f"  injected drift found: {', '.join(f'{k}={v}' for k, v in found.items() if k != 'cases' and v)}")
+
+    with factory() as db:
+        billing_ar.reconcile(db, list(range(1, n_cases + 1)) + billing_ar.stale_case_ids(db), repair=True)
+        db.commit()
+    _expect_clean(factory, n_cases, "reconcile repair")
+
+
+# ------------------------------------------------------------
+# reads vs full recompute
+# ------------------------------------------------------------
+def _full_scan(db, n_cases: int) -> List[Dict[str, Any]]:
+    out = []
+    for c in range(1, n_cases + 1):
+        for x in case_ledger(db, case_id=c).invoices:
+            inv = x.invoice
+            if inv.status in billing_ar.OPEN_STATUS and x.balance > 0:
+                out.append({"invoice_id": x.id, "case": c, "payer_type": inv.payer_type,
+                            "date": billing_ar._invoice_date(inv), "outstanding": billing_ar._d(x.balance)})
+    return out
+
+
+def _pages(fn, **kw) -> List[Dict[str, Any]]:
+    items, cursor = [], None
+    while True:
+        page = fn(cursor=cursor, limit=7, **kw)
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return items
+
+
+def _reads(factory, engine, n_cases: int) -> None:
+    with factory() as db:
+        scan = _full_scan(db, n_cases)
+
+        by_case: Dict[int, Dict[str, Decimal]] = {}
+        for r in scan:
+            t = by_case.setdefault(r["case"], {"all": Decimal("0.00"), "patient": Decimal("0.00"),
+                                               "payer": Decimal("0.00")})
+            t["all"] += r["outstanding"]
+            t["patient" if r["payer_type"] == PayerType.PATIENT else "payer"] += r["outstanding"]
+        for payer in billing_ar.RECEIVABLE_COLUMNS:
+            want = sorted(((v[payer], c) for c, v in by_case.items() if v[payer] > 0), reverse=True)
+            got = [(Decimal(i["outstanding" if payer == "all" else f"{payer}_outstanding"]), i["billing_case_id"])
+                   for i in _pages(billing_ar.receivables, db=db, payer=payer)]
+            if got != want:
+                raise AssertionError(f"receivables payer={payer} differ:\n  {got}\n  {want}")
+            oldest = {}
+            for r in scan:
+                if by_case[r["case"]][payer] > 0:
+                    oldest[r["case"]] = min(oldest.get(r["case"], r["date"]), r["date"])
+            got = [(date.fromisoformat(i["oldest_open_date"]), i["billing_case_id"])
+                   for i in _pages(billing_ar.receivables, db=db, payer=payer, sort="oldest")]
+            if got != sorted((d, c) for c, d in oldest.items()):
+                raise AssertionError(f"receivables payer={payer} sort=oldest differ")
+
+        for as_of in AS_OF:
+            want: Dict[str, Dict[str, Decimal]] = {}
+            for r in scan:
+                age = (as_of - r["date"]).days
+                if age < 0:
+                    continue
+                name = next(n for n, lo, hi in billing_ar.AGING_BUCKETS if age >= lo and (hi is None or age <= hi))
+                row = want.setdefault(r["payer_type"].value, {n: Decimal("0.00") for n, _lo, _hi in billing_ar.AGING_BUCKETS})
+                row[name] += r["outstanding"]
+            got = {r["payer_type"]: {k: Decimal(v) for k, v in r["buckets"].items()}
+                   for r in billing_ar.aging_summary(db, as_of=as_of)["rows"]}
+            if got != want:
+                raise AssertionError(f"aging as of {as_of} differs:\n  {got}\n  {want}")
+            for name, _lo, _hi in billing_ar.AGING_BUCKETS:
+                ids = [i["invoice_id"] for i in _pages(billing_ar.aging_invoices, db=db, as_of=as_of, bucket=name)]
+                lo, hi = billing_ar.bucket_range(name, as_of)
+                exp = [r["invoice_id"] for r in sorted(scan, key=lambda r: (r["date"], r["invoice_id"]))
+                       if r["date"] <= hi and (lo is None or r["date"] >= lo)]
+                if ids != exp:
+                    raise AssertionError(f"aging invoices {name} as of {as_of} differ")
+        print(f"  receivables / aging match a full recompute ({len(scan)} open invoices, {len(AS_OF)} dates)")
+
+        for label, fn in (("receivables page", lambda: billing_ar.receivables(db, limit=50)),
+                          ("aging summary", lambda: billing_ar.aging_summary(db, as_of=AS_OF[-1])),
+                          ("aging invoices page", lambda: billing_ar.aging_invoices(db, as_of=AS_OF[-1], limit=50))):
+            with count_queries(engine) as box:
+                fn()
+            if box["n"] != 1:
+                raise AssertionError(f"{label}: {box['n']} queries")
+        print("  receivables / aging pages: 1 query each")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", type=int, default=30)
+    ap.add_argument("--invoices", type=int, default=20, help="invoices per case")
+    ap.add_argument("--seed", type=int, default=5)
+    args = ap.parse_args()
+
+    # a file, not :memory:, so the after-commit refresh gets its own connection
+    path = os.path.join(tempfile.mkdtemp(prefix="ar_check_"), "ar.db")
+    engine = create_engine(f"sqlite:///{path}", future=True)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+    rng = random.Random(args.seed)
+
+    with factory() as db:
+        t0 = time.perf_counter()
+        _seed(db, args.cases, args.invoices, rng)
+        print(f"seeded {args.cases} cases x {args.invoices} invoices in {time.perf_counter() - t0:.1f}s")
+    _expect_clean(factory, args.cases, "seed commit")
+
+    _flows(factory, args.cases, rng)
+    _drift(factory, args.cases)
+    _reads(factory, engine, args.cases)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
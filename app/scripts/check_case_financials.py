@@ -0,0 +1,335 @@
+# FILE: app/scripts/check_case_financials.py
+"""
+Equivalence + query-count check for the set-based case ledger
+(billing_finance.case_ledger).
+
+Seeds a throwaway SQLite DB with --cases billing cases of --invoices
+invoices each (DRAFT / APPROVED / POSTED / VOID, patient + insurer line
+splits, removed lines, allocated and legacy direct payments in both
+directions, void receipts / allocations, advances, refunds and advance
+applications), then for every case compares:
+
+  case_financials()                 vs the per-invoice loop it replaced
+  list_case_invoice_outstanding()   vs _paid_map_for_invoices()
+  InvoiceFinance.outstanding()      vs outstanding_for_invoice_bucket()
+  GET /billing/cases/{id}/dashboard vs its previous module / payment /
+                                       advance queries
+
+and fails on any difference, or if the ledger path issues more than a
+fixed number of queries.
+
+Run:
+    python -m app.scripts.check_case_financials --cases 20 --invoices 60
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, create_engine, desc, func
+from sqlalchemy import event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (register every table for FK resolution)
+from app.api import routes_billing
+from app.db.base import Base
+from app.models.billing import (
+    AdvanceType,
+    BillingAdvance,
+    BillingAdvanceApplication,
+    BillingCase,
+    BillingInvoice,
+    BillingInvoiceLine,
+    BillingPayment,
+    BillingPaymentAllocation,
+    DocStatus,
+    EncounterType,
+    InvoiceType,
+    PayerType,
+    PaymentDirection,
+    PaymentKind,
+    ReceiptStatus,
+    ServiceGroup,
+)
+from app.models.patient import Patient
+from app.models.user import User
+from app.services import billing_finance
+from app.services.billing_finance import (
+    _paid_map_for_invoices,
+    allocated_amount_for_invoice_bucket,
+    case_financials,
+    case_ledger,
+    invoice_due_split,
+    list_case_invoice_outstanding,
+    outstanding_for_invoice_bucket,
+)
+
+# invoices, lines, allocations, legacy payments, payments, advances,
+# applications (+ the case lookup of the callers)
+MAX_LEDGER_QUERIES = 8
+
+MODULES = ["OPD", "IPD", "LAB", "RIS", "PHM", "OT", "ROOM", "MISC", None]
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+@contextmanager
+def count_queries(engine):
+    box = {"n": 0}
+
+    def _on_exec(conn, cursor, statement, params, context, executemany):
+        box["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", _on_exec)
+    try:
+        yield box
+    finally:
+        event.remove(engine, "before_cursor_execute", _on_exec)
+
+
+def _money(rng: random.Random, lo: int, hi: int) -> Decimal:
+    return Decimal(rng.randint(lo * 100, hi * 100)) / 100
+
+
+def _seed(db, n_cases: int, n_invoices: int, rng: random.Random) -> None:
+    db.add(User(id=1, login_id="billing", name="Billing", email="billing@x.test", password_hash="x"))
+    t0 = datetime(2026, 1, 1, 9, 0)
+    receipt = 0
+    for c in range(1, n_cases + 1):
+        db.add(Patient(id=c, uhid=f"U{c:06d}", first_name=f"P{c}", gender="F"))
+        case = BillingCase(id=c, patient_id=c, encounter_type=EncounterType.IP, encounter_id=c,
+                           case_number=f"C{c:06d}")
+        db.add(case)
+        db.flush()
+        for i in range(n_invoices):
+            at = t0 + timedelta(days=c, minutes=i * 7)
+            status = rng.choice([DocStatus.POSTED, DocStatus.POSTED, DocStatus.APPROVED, DocStatus.DRAFT,
+                                 DocStatus.VOID])
+            inv = BillingInvoice(billing_case_id=c, invoice_number=f"I{c:04d}-{i:04d}",
+                                 module=rng.choice(MODULES), invoice_type=InvoiceType.PATIENT,
+                                 status=status, payer_type=rng.choice([PayerType.PATIENT, PayerType.INSURER]),
+                                 created_at=at, created_by=1)
+            db.add(inv)
+            db.flush()
+            total = Decimal("0")
+            for k in range(rng.randint(0, 5)):
+                net = _money(rng, 50, 5000)
+                insurer = rng.choice([Decimal("0"), net / 2, net, net + 10]).quantize(Decimal("0.01"))
+                patient = rng.choice([net - min(insurer, net), net])
+                removed = rng.random() < 0.1
+                db.add(BillingInvoiceLine(
+                    billing_case_id=c, invoice_id=inv.id, service_group=ServiceGroup.MISC,
+                    description="svc (REMOVED)" if removed else f"svc {k}", qty=1, unit_price=net,
+                    line_total=net, net_amount=net, patient_pay_amount=patient, insurer_pay_amount=insurer,
+                    approved_amount=insurer, source_module="CHK", source_ref_id=inv.id,
+                    source_line_key=f"{k}"))
+                if not removed:
+                    total += net
+            inv.grand_total = total if rng.random() < 0.9 else total + 1
+
+            for _p in range(rng.randint(0, 3)):
+                receipt += 1
+                legacy = rng.random() < 0.3
+                direction = PaymentDirection.OUT if rng.random() < 0.15 else PaymentDirection.IN
+                bucket = rng.choice([PayerType.PATIENT, PayerType.PATIENT, PayerType.INSURER, PayerType.TPA])
+                amt = _money(rng, 10, 2000)
+                pay = BillingPayment(
+                    billing_case_id=c, invoice_id=inv.id if (legacy or rng.random() < 0.5) else None,
+                    payer_type=bucket, amount=amt, direction=direction,
+                    kind=PaymentKind.REFUND if direction == PaymentDirection.OUT else PaymentKind.RECEIPT,
+                    status=ReceiptStatus.VOID if rng.random() < 0.1 else ReceiptStatus.ACTIVE,
+                    receipt_number=f"R{receipt:07d}", received_by=1, received_at=at)
+                db.add(pay)
+                db.flush()
+                if not legacy:
+                    db.add(BillingPaymentAllocation(
+                        billing_case_id=c, payment_id=pay.id, invoice_id=inv.id, payer_bucket=bucket,
+                        amount=amt,
+                        status=ReceiptStatus.VOID if rng.random() < 0.1 else ReceiptStatus.ACTIVE))
+
+        for _a in range(rng.randint(0, 4)):
+            kind = rng.choice([AdvanceType.ADVANCE, AdvanceType.ADVANCE, AdvanceType.REFUND,
+                               AdvanceType.ADJUSTMENT])
+            adv = BillingAdvance(billing_case_id=c, entry_type=kind, amount=_money(rng, 100, 20000), entry_by=1)
+            db.add(adv)
+            db.flush()
+            if kind == AdvanceType.ADVANCE and rng.random() < 0.5:
+                receipt += 1
+                amt = _money(rng, 10, 100)
+                pay = BillingPayment(billing_case_id=c, payer_type=PayerType.PATIENT, amount=amt,
+                                     kind=PaymentKind.ADVANCE_ADJUSTMENT, direction=PaymentDirection.IN,
+                                     status=ReceiptStatus.ACTIVE, receipt_number=f"R{receipt:07d}",
+                                     received_by=1)
+                db.add(pay)
+                db.flush()
+                db.add(BillingAdvanceApplication(billing_case_id=c, advance_id=adv.id, payment_id=pay.id,
+                                                 amount=amt))
+    db.commit()
+
+
+# ------------------------------------------------------------
+# previous implementations (per invoice / per row)
+# ------------------------------------------------------------
+def _legacy_case_financials(db, case_id: int):
+    inv_ids = [int(x[0]) for x in db.query(BillingInvoice.id).filter(
+        BillingInvoice.billing_case_id == case_id, BillingInvoice.status != DocStatus.VOID).all()]
+    posted_total = billing_finance._d(db.query(func.coalesce(func.sum(BillingInvoice.grand_total), 0)).filter(
+        BillingInvoice.billing_case_id == case_id, BillingInvoice.status == DocStatus.POSTED).scalar() or 0)
+    patient_due = insurer_due = patient_paid = insurer_paid = Decimal("0")
+    for iid in inv_ids:
+        dct = invoice_due_split(db, invoice_id=iid)
+        patient_due += dct["patient_due"]
+        insurer_due += dct["insurer_due"]
+    for iid in inv_ids:
+        patient_paid += allocated_amount_for_invoice_bucket(db, invoice_id=iid, bucket=PayerType.PATIENT)
+        insurer_paid += allocated_amount_for_invoice_bucket(db, invoice_id=iid, bucket=PayerType.INSURER)
+    adv_in = billing_finance.advance_balance(db, billing_case_id=case_id)  # touches the same three sums
+    return {
+        "posted_total": str(posted_total),
+        "due": {"patient_due": str(patient_due), "insurer_due": str(insurer_due)},
+        "paid": {"patient_paid": str(patient_paid), "insurer_paid": str(insurer_paid)},
+        "advance_balance": str(adv_in),
+        "outstanding": (str(max(patient_due - patient_paid, Decimal("0"))),
+                        str(max(insurer_due - insurer_paid, Decimal("0")))),
+    }
+
+
+def _new_case_financials(db, case_id: int):
+    f = case_financials(db, case_id=case_id)
+    return {
+        "posted_total": f["posted_total"],
+        "due": f["due"],
+        "paid": f["paid"],
+        "advance_balance": f["advances"]["advance_balance"],
+        "outstanding": (f["outstanding"]["patient_outstanding"], f["outstanding"]["insurer_outstanding"]),
+    }
+
+
+def _legacy_outstanding(db, case_id: int):
+    invs = (db.query(BillingInvoice).filter(
+        BillingInvoice.billing_case_id == case_id,
+        BillingInvoice.status.in_([DocStatus.APPROVED, DocStatus.POSTED])).order_by(
+            BillingInvoice.id.desc()).all())
+    paid_map = _paid_map_for_invoices(db, [int(i.id) for i in invs])
+    out = []
+    for inv in invs:
+        paid = paid_map.get(int(inv.id), Decimal("0"))
+        out.append((int(inv.id), str(paid), str(max(billing_finance._d(inv.grand_total) - paid, Decimal("0")))))
+    return out
+
+
+def _new_outstanding(db, case_id: int):
+    items = list_case_invoice_outstanding(db, billing_case_id=case_id, status_names=["APPROVED", "POSTED"])
+    return [(x["invoice_id"], x["paid"], x["outstanding"]) for x in items]
+
+
+def _legacy_route_dashboard(db, case_id: int):
+    inv_ids = [int(x.id) for x in db.query(BillingInvoice).filter(
+        BillingInvoice.billing_case_id == case_id).order_by(desc(BillingInvoice.created_at)).all()]
+    modules = {}
+    for m, a in db.query(BillingInvoice.module, func.coalesce(func.sum(BillingInvoice.grand_total), 0)).filter(
+            BillingInvoice.billing_case_id == case_id, BillingInvoice.status != DocStatus.VOID).group_by(
+                BillingInvoice.module).all():
+        m = (m or "MISC").strip().upper() or "MISC"
+        modules[m] = modules.get(m, Decimal("0")) + Decimal(str(a or 0))
+    paid = db.query(func.coalesce(func.sum(BillingPayment.amount), 0)).filter(
+        BillingPayment.billing_case_id == case_id).scalar()
+    adv = {t: Decimal(str(a or 0)) for t, a in db.query(
+        BillingAdvance.entry_type, func.coalesce(func.sum(BillingAdvance.amount), 0)).filter(
+            BillingAdvance.billing_case_id == case_id).group_by(BillingAdvance.entry_type).all()}
+    total_bill = sum(modules.values(), Decimal("0"))
+    paid = Decimal(str(paid or 0))
+    net_deposit = adv.get(AdvanceType.ADVANCE, Decimal("0")) - adv.get(AdvanceType.REFUND, Decimal("0"))
+    return {
+        "modules": {k: round(float(v), 2) for k, v in modules.items() if v},
+        "totals": (round(float(total_bill), 2), float(paid), float(net_deposit), round(float(total_bill - paid), 2)),
+        "invoices": inv_ids,
+    }
+
+
+def _new_route_dashboard(db, case_id: int):
+    d = routes_billing.case_dashboard(case_id, db=db, user=None)
+    t = d["totals"]
+    return {
+        "modules": {p["module"]: round(p["amount"], 2) for p in d["particulars"] if p["amount"]},
+        "totals": (round(t["total_bill"], 2), t["payments_received"], t["net_deposit"], round(t["balance"], 2)),
+        "invoices": [x["id"] for x in d["invoices"]],
+    }
+
+
+def _bucket_outstanding(db, case_id: int, use_ledger: bool):
+    buckets = (PayerType.PATIENT, PayerType.INSURER, PayerType.TPA)
+    if use_ledger:
+        return {(x.id, b): str(x.outstanding(b)) for x in case_ledger(db, case_id=case_id).live for b in buckets}
+    ids = [int(x[0]) for x in db.query(BillingInvoice.id).filter(
+        BillingInvoice.billing_case_id == case_id, BillingInvoice.status != DocStatus.VOID).all()]
+    return {(iid, b): str(outstanding_for_invoice_bucket(db, invoice_id=iid, bucket=b)) for iid in ids for b in buckets}
+
+
+CHECKS = [
+    ("case_financials", _legacy_case_financials, _new_case_financials),
+    ("invoice outstanding list", _legacy_outstanding, _new_outstanding),
+    ("bucket outstanding", lambda db, c: _bucket_outstanding(db, c, False),
+     lambda db, c: _bucket_outstanding(db, c, True)),
+    ("case dashboard route", _legacy_route_dashboard, _new_route_dashboard),
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", type=int, default=20)
+    ap.add_argument("--invoices", type=int, default=60, help="invoices per case")
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+    with factory() as db:
+        t0 = time.perf_counter()
+        _seed(db, args.cases, args.invoices, random.Random(args.seed))
+        print(f"seeded {args.cases} cases x {args.invoices} invoices in {time.perf_counter() - t0:.1f}s")
+
+    bad = []
+    for name, old, new in CHECKS:
+        for c in range(1, args.cases + 1):
+            with factory() as db:
+                a = old(db, c)
+            with factory() as db:
+                b = new(db, c)
+            if a != b:
+                bad.append((name, c, a, b))
+    for name, c, a, b in bad[:10]:
+        print(f"  MISMATCH {name} case {c}:\n    old {a}\n    new {b}")
+    if bad:
+        raise AssertionError(f"{len(bad)} case ledger result(s) differ from the per-invoice functions")
+
+    timings = {}
+    for label, fn in (("per-invoice", _legacy_case_financials), ("ledger", _new_case_financials)):
+        with factory() as db, count_queries(engine) as box:
+            t0 = time.perf_counter()
+            for c in range(1, args.cases + 1):
+                fn(db, c)
+            timings[label] = (box["n"] / args.cases, (time.perf_counter() - t0) * 1000 / args.cases)
+    for label, (n, ms) in timings.items():
+        print(f"case_financials {label:11s}: {n:6.1f} queries, {ms:7.2f} ms per case")
+
+    with factory() as db, count_queries(engine) as box:
+        case_financials(db, case_id=1)
+    if box["n"] > MAX_LEDGER_QUERIES:
+        raise AssertionError(f"case_financials issued {box['n']} queries (max {MAX_LEDGER_QUERIES})")
+    print(f"OK ({len(CHECKS)} checks x {args.cases} cases)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# FILE: app/scripts/check_daily_rollups.py
+"""
+Consistency + timing check for dashboard / MIS daily rollups.
+
+Seeds a throwaway SQLite DB with --days of activity (registrations,
+visits, admissions, posted invoices + lines, payments, LIS / RIS orders,
+pharmacy sales), then builds the admin dashboard and the rollup-backed
+MIS reports twice:
+  live    : no rollups yet (every day aggregated from source tables)
+  rollups : after refresh_days() for all closed days (today stays live)
+and fails if any widget / report differs. Then cancels a pharmacy sale
+from a closed day older than DAILY_ROLLUP_REFRESH_DAYS (out of reach of
+the nightly job) and checks the rollups follow it.
+
+Run:
+    python -m app.scripts.check_daily_rollups --days 365 --per-day 60
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Enum, Integer, Numeric, create_engine, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+
+import app.models  # noqa: F401  (register every table)
+from app.db.base import Base
+from app.models.billing import (
+    BillingCase,
+    BillingInvoice,
+    BillingInvoiceLine,
+    BillingPayment,
+    DocStatus,
+    EncounterType,
+    PayMode,
+    ServiceGroup,
+)
+from app.models.ipd import IpdAdmission
+from app.models.lis import LisOrder, LisOrderItem
+from app.models.opd import Visit
+from app.models.patient import Patient
+from app.models.pharmacy_prescription import PharmacySale, PharmacySaleItem
+from app.models.ris import RisOrder
+from app.models.rollup import DailyRollup, DailyRollupDay
+from app.models.user import User
+from app.schemas.mis import MISFilter
+from app.services.daily_rollups import live_from, refresh_days
+from app.services.dashboard_service import build_dashboard_for_user
+from app.services import mis_service, pharmacy
+
+MIS_CODES = [
+    "patient.registration_summary",
+    "opd.visit_summary",
+    "ipd.admission_summary",
+    "billing.revenue_summary",
+    "billing.collection_summary",
+    "pharmacy.sales_summary",
+]
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(_type, _compiler, **_kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY
+    return "INTEGER"
+
+
+def _filler(col, i: int):
+    t = col.type
+    if isinstance(t, Enum):
+        return t.enums[0]
+    if isinstance(t, Boolean):
+        return False
+    if isinstance(t, (Integer, BigInteger)):
+        return 1
+    if isinstance(t, Numeric):
+        return 0
+    if isinstance(t, DateTime):
+        return datetime(2020, 1, 1)
+    if isinstance(t, Date):
+        return date(2020, 1, 1)
+    return f"x{i}"
+
+
+def _rows(model, items):
+    """Fill NOT NULL columns the seed does not care about."""
+    cols = [c for c in model.__table__.columns
+            if not c.nullable and c.default is None and c.server_default is None and not c.primary_key]
+    out = []
+    for i, values in items:
+        row = {c.name: _filler(c, i) for c in cols if c.name not in values}
+        row.update(values)
+        out.append(row)
+    return out
+
+
+def _seed(db, days: int, per_day: int, rng: random.Random) -> None:
+    today = date.today()
+    start = today - timedelta(days=days - 1)
+    db.execute(User.__table__.insert(), _rows(User, [
+        (i, {"id": i, "login_id": f"doc{i}", "name": f"Dr {i}", "email": f"d{i}@x.test", "is_admin": False})
+        for i in range(1, 21)]))
+
+    ids = {"p": 0, "v": 0, "a": 0, "c": 0, "inv": 0, "ln": 0, "pay": 0, "lo": 0, "li": 0, "ro": 0, "s": 0, "si": 0}
+
+    def nid(k):
+        ids[k] += 1
+        return ids[k]
+
+    tests = [f"Test {i}" for i in range(40)]
+    meds = [f"Medicine {i}" for i in range(120)]
+    groups = [ServiceGroup.LAB, ServiceGroup.PHARM, ServiceGroup.OT, ServiceGroup.ROOM, ServiceGroup.CONSULT]
+    for k in range(days):
+        d = start + timedelta(days=k)
+        batch = {m: [] for m in ("p", "v", "a", "c", "inv", "ln", "pay", "lo", "li", "ro", "s", "si")}
+        for _ in range(per_day):
+            at = datetime.combine(d, datetime.min.time()) + timedelta(minutes=rng.randint(0, 1439))
+            pid = nid("p")
+            batch["p"].append((pid, {"id": pid, "uhid": f"U{pid}", "first_name": f"P{pid}", "gender": "Male",
+                                     "phone": f"9{pid:09d}", "email": None, "created_at": at, "is_active": True}))
+            if rng.random() < 0.7:
+                vid = nid("v")
+                batch["v"].append((vid, {"id": vid, "patient_id": pid, "visit_at": at, "episode_id": f"E{vid}"}))
+            if rng.random() < 0.1:
+                aid = nid("a")
+                batch["a"].append((aid, {"id": aid, "patient_id": pid, "admitted_at": at, "status": "admitted",
+                                         "admission_code": f"IP{aid}"}))
+            # billing: one case + one posted invoice with a few lines
+            cid = nid("c")
+            enc = EncounterType.IP if rng.random() < 0.3 else EncounterType.OP
+            batch["c"].append((cid, {"id": cid, "patient_id": pid, "encounter_type": enc, "encounter_id": cid,
+                                     "case_number": f"C{cid}"}))
+            iid = nid("inv")
+            total = Decimal("0")
+            for _ln in range(rng.randint(1, 4)):
+                amt = Decimal(rng.randint(100, 500000)) / 100
+                total += amt
+                lid = nid("ln")
+                batch["ln"].append((lid, {"id": lid, "invoice_id": iid, "billing_case_id": cid,
+                                          "service_group": rng.choice(groups), "description": "svc",
+                                          "net_amount": amt, "line_total": amt,
+                                          "doctor_id": rng.choice([None, *range(1, 21)])}))
+            posted = rng.random() < 0.85
+            batch["inv"].append((iid, {"id": iid, "billing_case_id": cid, "invoice_number": f"I{iid}",
+                                       "status": DocStatus.POSTED if posted else DocStatus.DRAFT,
+                                       "grand_total": total, "created_at": at,
+                                       "posted_at": at + timedelta(minutes=5) if posted else None}))
+            if posted and rng.random() < 0.8:
+                pay = nid("pay")
+                batch["pay"].append((pay, {"id": pay, "billing_case_id": cid, "invoice_id": iid,
+                                           "mode": rng.choice(list(PayMode)), "amount": total,
+                                           "received_at": at + timedelta(minutes=10)}))
+            if rng.random() < 0.3:
+                oid = nid("lo")
+                batch["lo"].append((oid, {"id": oid, "patient_id": pid, "created_at": at,
+                                          "status": rng.choice(["ordered", "reported", "cancelled"])}))
+                for _t in range(rng.randint(1, 3)):
+                    tid = nid("li")
+                    batch["li"].append((tid, {"id": tid, "order_id": oid, "test_name": rng.choice(tests)}))
+            if rng.random() < 0.1:
+                rid = nid("ro")
+                batch["ro"].append((rid, {"id": rid, "patient_id": pid, "created_at": at, "test_name": rng.choice(tests),
+                                          "test_code": "R", "status": rng.choice(["ordered", "cancelled"])}))
+            if rng.random() < 0.4:
+                sid = nid("s")
+                status = rng.choice(["FINALIZED", "FINALIZED", "CANCELLED", "DRAFT"])
+                net = Decimal("0")
+                for _m in range(rng.randint(1, 4)):
+                    amt = Decimal(rng.randint(100, 50000)) / 100
+                    net += amt
+                    xid = nid("si")
+                    batch["si"].append((xid, {"id": xid, "sale_id": sid, "item_name": rng.choice(meds),
+                                              "quantity": Decimal(rng.randint(1, 30)), "total_amount": amt,
+                                              "item_id": 1}))
+                batch["s"].append((sid, {"id": sid, "patient_id": pid, "bill_datetime": at, "created_at": at,
+                                         "invoice_status": status, "net_amount": net, "bill_number": f"S{sid}"}))
+        for key, model in (("p", Patient), ("v", Visit), ("a", IpdAdmission), ("c", BillingCase),
+                           ("inv", BillingInvoice), ("ln", BillingInvoiceLine), ("pay", BillingPayment),
+                           ("lo", LisOrder), ("li", LisOrderItem), ("ro", RisOrder),
+                           ("s", PharmacySale), ("si", PharmacySaleItem)):
+            if batch[key]:
+                db.execute(model.__table__.insert(), _rows(model, batch[key]))
+    db.commit()
+
+
+class _Admin:
+    id = 1
+    is_admin = True
+
+
+def _snapshot(db, d_from: date, d_to: date):
+    dash = build_dashboard_for_user(db, _Admin(), d_from, d_to)
+    widgets = {w.code: w.data for w in dash.widgets}
+    flt = MISFilter(date_from=d_from, date_to=d_to)
+    reports = {}
+    for code in MIS_CODES:
+        r = mis_service.run_report(db, _Admin(), code, flt)
+        reports[code] = (r.summary, r.rows)
+    return widgets, reports
+
+
+def _norm(x):
+    if isinstance(x, float):
+        return round(x, 2)
+    if isinstance(x, dict):
+        return {k: _norm(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_norm(v) for v in x]
+    return x
+
+
+def _mismatches(a, b):
+    bad = [k for k in a[0] if _norm(a[0][k]) != _norm(b[0].get(k))]
+    return bad + [k for k in a[1] if _norm(a[1][k]) != _norm(b[1].get(k))]
+
+
+def _backdated_cancel(factory, d_from: date, d_to: date, rolled):
+    day = live_from() - timedelta(days=int(settings.DAILY_ROLLUP_REFRESH_DAYS) + 7)
+    if day < d_from:
+        print("back-dated cancel: skipped (--days too short)")
+        return []
+    with factory() as db:
+        start = datetime.combine(day, datetime.min.time())
+        sale = (db.query(PharmacySale)
+                .filter(PharmacySale.invoice_status == "FINALIZED",
+                        PharmacySale.created_at >= start,
+                        PharmacySale.created_at < start + timedelta(days=1))
+                .first())
+        if sale is None:
+            print(f"back-dated cancel: no finalized sale on {day}, skipped")
+            return []
+        sid = int(sale.id)
+        pharmacy.cancel_sale(db, sid, "check_daily_rollups", _Admin())
+        after = _snapshot(db, d_from, d_to)
+        # the same range aggregated live (rollups dropped, then restored)
+        db.query(DailyRollup).delete()
+        db.query(DailyRollupDay).delete()
+        fresh = _snapshot(db, d_from, d_to)
+        db.rollback()
+    changed = _mismatches(rolled, after)
+    print(f"back-dated cancel of sale {sid} ({day}): changed {', '.join(changed) or 'nothing'}")
+    bad = [f"after cancel: {k}" for k in _mismatches(fresh, after)]
+    if not changed:
+        bad.append("after cancel: rollups did not change")
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--per-day", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+
+    engine = create_engine("sqlite://", future=True)
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_conn, _rec):
+        dbapi_conn.execute("PRAGMA synchronous=OFF")
+
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+    d_to = date.today()
+    d_from = d_to - timedelta(days=args.days - 1)
+
+    with factory() as db:
+        t0 = time.perf_counter()
+        _seed(db, args.days, args.per_day, random.Random(args.seed))
+        print(f"seeded {args.days} days x {args.per_day} patients in {time.perf_counter() - t0:.1f}s")
+
+    with factory() as db:
+        t0 = time.perf_counter()
+        live = _snapshot(db, d_from, d_to)
+        t_live = time.perf_counter() - t0
+
+    with factory() as db:
+        t0 = time.perf_counter()
+        rows = refresh_days(db, d_from, live_from() - timedelta(days=1))
+        db.commit()
+        print(f"refresh_days: {rows} rollup rows in {time.perf_counter() - t0:.1f}s")
+
+    with factory() as db:
+        t0 = time.perf_counter()
+        rolled = _snapshot(db, d_from, d_to)
+        t_roll = time.perf_counter() - t0
+
+    print(f"dashboard + {len(MIS_CODES)} MIS reports over {args.days} days:"
+          f" live {t_live * 1000:.0f} ms, rollups {t_roll * 1000:.0f} ms")
+
+    bad = _mismatches(live, rolled)
+    if not bad:
+        bad = _backdated_cancel(factory, d_from, d_to, rolled)
+    if bad:
+        for k in bad:
+            print(f"  MISMATCH {k}")
+        raise AssertionError("rollup-backed results differ from live aggregation")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# FILE: app/scripts/check_patient_list_queries.py
+"""
+Query-count regression check for the patient list page.
+
+Seeds a throwaway SQLite DB with N patients (each with addresses, a
+referring doctor and credit masters), then serializes one page:
+  per-row : [serialize_patient(p, db) for p in page]   (old list path)
+  batch   : serialize_patients(page, db)                (list_patients)
+and fails if the batch path issues more than a fixed number of queries
+or returns different data.
+
+Run:
+    python -m app.scripts.check_patient_list_queries --patients 500
+"""
+from __future__ import annotations
+
+import argparse
+import random
+from contextlib import contextmanager
+from datetime import date
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (register every table for FK resolution)
+from app.api.routes_patients import serialize_patient, serialize_patients
+from app.db.base import Base
+from app.models.patient import Patient, PatientAddress
+from app.models.payer import CreditPlan, Payer, Tpa
+from app.models.user import User
+
+TABLES = [
+    User.__table__,
+    Payer.__table__,
+    Tpa.__table__,
+    CreditPlan.__table__,
+    Patient.__table__,
+    PatientAddress.__table__,
+]
+
+# page query + addresses (selectin) + doctors + payers + tpas + plans
+MAX_BATCH_QUERIES = 6
+
+
+@contextmanager
+def count_queries(engine):
+    box = {"n": 0}
+
+    def _on_exec(conn, cursor, statement, params, context, executemany):
+        box["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", _on_exec)
+    try:
+        yield box
+    finally:
+        event.remove(engine, "before_cursor_execute", _on_exec)
+
+
+def _seed(db, n: int, rng: random.Random) -> None:
+    doctors = [User(login_id=f"doc{i}", email=f"doc{i}@x.test", name=f"Dr {i}", password_hash="x")
+               for i in range(40)]
+    payers = [Payer(code=f"P{i}", name=f"Payer {i}", payer_type="insurance") for i in range(10)]
+    db.add_all(doctors + payers)
+    db.flush()
+    tpas = [Tpa(code=f"T{i}", name=f"TPA {i}", payer_id=payers[i].id) for i in range(10)]
+    db.add_all(tpas)
+    db.flush()
+    plans = [CreditPlan(code=f"C{i}", name=f"Plan {i}", payer_id=payers[i].id, tpa_id=tpas[i].id)
+             for i in range(10)]
+    db.add_all(plans)
+    db.flush()
+
+    for i in range(n):
+        credit = rng.random() < 0.5
+        p = Patient(
+            uhid=f"UH{i:06d}", first_name=f"Pt{i}", gender="Female" if i % 2 else "Male",
+            dob=date(1980 + i % 40, 1 + i % 12, 1 + i % 28), phone=f"9{i:09d}",
+            ref_source="doctor", ref_doctor_id=rng.choice(doctors).id,
+            patient_type="General", is_active=True,
+            credit_payer_id=rng.choice(payers).id if credit else None,
+            credit_tpa_id=rng.choice(tpas).id if credit else None,
+            credit_plan_id=rng.choice(plans).id if credit else None,
+        )
+        db.add(p)
+        db.flush()
+        for k in range(rng.randint(0, 3)):
+            db.add(PatientAddress(patient_id=p.id, type="current", line1=f"{k} Street", city="Coimbatore"))
+    db.commit()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--patients", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=5)
+    args = ap.parse_args()
+
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine, tables=TABLES)
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+    with factory() as db:
+        _seed(db, args.patients, random.Random(args.seed))
+
+    def page(db):
+        return db.query(Patient).filter(Patient.is_active.is_(True)).order_by(Patient.id.desc()).limit(500).all()
+
+    with factory() as db, count_queries(engine) as old:
+        old_out = [serialize_patient(p, db) for p in page(db)]
+    with factory() as db, count_queries(engine) as new:
+        new_out = serialize_patients(page(db), db)
+
+    print(f"patients={len(new_out)}  per-row queries={old['n']}  batch queries={new['n']}")
+    if [o.model_dump() for o in old_out] != [o.model_dump() for o in new_out]:
+        raise AssertionError("batch serializer output differs from serialize_patient")
+    if new["n"] > MAX_BATCH_QUERIES:
+        raise AssertionError(f"patient list page used {new['n']} queries (max {MAX_BATCH_QUERIES})")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
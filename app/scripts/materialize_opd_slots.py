@@ -0,0 +1,86 @@
+# FILE: app/scripts/materialize_opd_slots.py
+"""
+Nightly upkeep of the OPD slot inventory (app.services.opd_slots).
+
+For every doctor with an active OPD schedule, (re)generates slot rows from
+today to OPD_SLOT_HORIZON_DAYS ahead, so department / week availability
+and booking find their rows. Schedule edits regenerate the same window
+immediately; this job moves the horizon forward one day at a time and
+drops slot rows older than --keep-days (appointments keep the history).
+
+Cron (after midnight, every tenant):
+    python -m app.scripts.materialize_opd_slots --all-tenants
+
+One tenant:
+    python -m app.scripts.materialize_opd_slots --db-uri mysql+pymysql://.../nabh_hims_xyz
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import timedelta
+
+from sqlalchemy.orm import Session
+
+from app.models.opd import OpdSchedule
+from app.services import opd_slots
+
+
+def run(db: Session, keep_days: int) -> None:
+    t0 = time.perf_counter()
+    doctors = [d for (d, ) in db.query(OpdSchedule.doctor_user_id).filter(
+        OpdSchedule.is_active.is_(True)).distinct().all()]
+    totals = {"inserted": 0, "updated": 0, "removed": 0}
+    for doctor_user_id in doctors:
+        stats = opd_slots.regenerate_horizon(db, doctor_user_id)
+        db.commit()
+        for k, v in stats.items():
+            totals[k] += v
+    pruned = opd_slots.prune(db, opd_slots.today() - timedelta(days=max(keep_days, 0)))
+    db.commit()
+    print(f"  {len(doctors)} doctors: {totals['inserted']} slots added, {totals['updated']} updated, "
+          f"{totals['removed']} removed, {pruned} old rows pruned in {time.perf_counter() - t0:.1f}s")
+
+
+def _tenant_uris():
+    from app.db.session import MasterSessionLocal
+    from app.models.tenant import Tenant
+
+    with MasterSessionLocal() as mdb:
+        return [(t.code, t.db_uri) for t in mdb.query(Tenant).filter(Tenant.is_active.is_(True)).all()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="Tenant DB URI (mysql+pymysql://...)")
+    ap.add_argument("--all-tenants", action="store_true", help="Run for every active tenant from the master DB")
+    ap.add_argument("--keep-days", type=int, default=1, help="Past days of slot rows to keep")
+    args = ap.parse_args()
+
+    if args.all_tenants:
+        targets = _tenant_uris()
+    elif args.db_uri:
+        targets = [("-", args.db_uri)]
+    else:
+        raise SystemExit("Provide --db-uri or --all-tenants")
+
+    from app.db.session import create_tenant_session
+
+    failed = 0
+    for code, uri in targets:
+        print(f"tenant {code}:")
+        db = create_tenant_session(uri)
+        try:
+            run(db, args.keep_days)
+        except Exception as e:  # keep going for the other tenants
+            db.rollback()
+            failed += 1
+            print(f"  FAILED: {e!r}")
+        finally:
+            db.close()
+    if failed:
+        raise SystemExit(f"{failed} tenant(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# FILE: app/scripts/post_ipd_daily_charges.py
+"""
+Nightly posting of IPD room / nursing / package charges
+(app.services.ipd_daily_charges).
+
+Default run posts yesterday (hospital time zone) for every active
+admission. Re-running a day is safe: lines already posted by this job, by
+the billing particulars screen or by the IPD room sync are skipped.
+--days N catches up the last N closed days (one transaction per day).
+
+Cron (after midnight, every tenant):
+    python -m app.scripts.post_ipd_daily_charges --all-tenants
+
+One tenant, one day:
+    python -m app.scripts.post_ipd_daily_charges --db-uri mysql+pymysql://.../nabh_hims_xyz --date 2024-05-01
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.services.ipd_daily_charges import local_tz, nursing_codes, post_day
+
+
+def run(db: Session, days: list) -> None:
+    t0 = time.perf_counter()
+    for d in days:
+        r = post_day(db, d)
+        db.commit()
+        k = r["by_kind"]
+        print(f"  {d}: {r['admissions']} admissions, {r['lines']} lines "
+              f"(room {k['room']}, nursing {k['nursing']}, package {k['package']}), "
+              f"{r['skipped_existing']} already posted, {r['invoices']} invoices "
+              f"[load {r['ms']['load']:.0f} / build {r['ms']['build']:.0f} / insert {r['ms']['insert']:.0f}"
+              f" / totals {r['ms']['totals']:.0f} ms]", flush=True)
+        if r["cases_created"]:
+            print(f"    billing cases created: {r['cases_created']}")
+        if r["missing_rate_admissions"]:
+            print(f"    no room rate (not posted): admissions {r['missing_rate_admissions']}")
+    print(f"  done in {time.perf_counter() - t0:.1f}s")
+
+
+def _tenant_uris():
+    from app.db.session import MasterSessionLocal
+    from app.models.tenant import Tenant
+
+    with MasterSessionLocal() as mdb:
+        return [(t.code, t.db_uri) for t in mdb.query(Tenant).filter(Tenant.is_active.is_(True)).all()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="Tenant DB URI (mysql+pymysql://...)")
+    ap.add_argument("--all-tenants", action="store_true", help="Post for every active tenant from the master DB")
+    ap.add_argument("--date", dest="day", type=date.fromisoformat, default=None,
+                    help="Day to post (YYYY-MM-DD, default: yesterday)")
+    ap.add_argument("--days", type=int, default=1, help="Closed days to post, ending at --date")
+    args = ap.parse_args()
+
+    if args.all_tenants:
+        targets = _tenant_uris()
+    elif args.db_uri:
+        targets = [("-", args.db_uri)]
+    else:
+        raise SystemExit("Provide --db-uri or --all-tenants")
+
+    last = args.day or (datetime.now(local_tz()).date() - timedelta(days=1))
+    days = [last - timedelta(days=i) for i in range(max(args.days, 1) - 1, -1, -1)]
+    if not nursing_codes():
+        print("IPD_DAILY_NURSING_CODES is empty: no nursing charges will be posted")
+
+    from app.db.session import create_tenant_session
+
+    failed = 0
+    for code, uri in targets:
+        print(f"tenant {code}:")
+        db = create_tenant_session(uri)
+        try:
+            run(db, days)
+        except Exception as e:  # keep going for the other tenants
+            db.rollback()
+            failed += 1
+            print(f"  FAILED: {e!r}")
+        finally:
+            db.close()
+    if failed:
+        raise SystemExit(f"{failed} tenant(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# FILE: app/scripts/rebuild_patient_search_keys.py
+"""
+(Re)build patient_search_keys for one tenant DB or for every active tenant.
+
+Needed once after deploying the search-key table (existing patients have no
+keys yet), and whenever the normalization rules in
+app.services.patient_search change. Safe to re-run: each batch of patients
+has its keys deleted and re-inserted in one transaction.
+
+Run:
+    python -m app.scripts.rebuild_patient_search_keys --db-uri mysql+pymysql://.../nabh_hims_xyz
+    python -m app.scripts.rebuild_patient_search_keys --all-tenants
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from sqlalchemy.orm import Session
+
+from app.models.patient import Patient, PatientSearchKey
+from app.services.patient_search import rebuild_search_keys
+
+
+def rebuild(db: Session, *, batch: int = 2000, verbose: bool = True) -> int:
+    PatientSearchKey.__table__.create(bind=db.get_bind(), checkfirst=True)
+
+    last_id = 0
+    patients = rows = 0
+    t0 = time.perf_counter()
+    while True:
+        page = (db.query(Patient).filter(Patient.id > last_id)
+                .order_by(Patient.id).limit(batch).all())
+        if not page:
+            break
+        rows += rebuild_search_keys(db, page)
+        db.commit()
+        patients += len(page)
+        last_id = page[-1].id
+        db.expunge_all()
+        if verbose:
+            dt = time.perf_counter() - t0
+            print(f"  patients={patients} keys={rows} ({patients / dt:.0f} patients/s)", flush=True)
+    return patients
+
+
+def _tenant_uris():
+    from app.db.session import MasterSessionLocal
+    from app.models.tenant import Tenant
+
+    with MasterSessionLocal() as mdb:
+        return [(t.code, t.db_uri) for t in mdb.query(Tenant).filter(Tenant.is_active.is_(True)).all()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="Tenant DB URI (mysql+pymysql://...)")
+    ap.add_argument("--all-tenants", action="store_true", help="Rebuild every active tenant from the master DB")
+    ap.add_argument("--batch", type=int, default=2000)
+    args = ap.parse_args()
+
+    if args.all_tenants:
+        targets = _tenant_uris()
+    elif args.db_uri:
+        targets = [("-", args.db_uri)]
+    else:
+        raise SystemExit("Provide --db-uri or --all-tenants")
+
+    from app.db.session import create_tenant_session
+
+    for code, uri in targets:
+        print(f"tenant {code}:")
+        db = create_tenant_session(uri)
+        try:
+            n = rebuild(db, batch=args.batch)
+            print(f"  done: {n} patients")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Backfill / nightly refresh of the pharmacy daily stock movement summary
+(inv_stock_daily_movements).
+
+First run on a tenant rebuilds the whole ledger history (or --from) up to
+today in monthly chunks, one transaction per chunk, then marks it covered;
+from then on inv_stock_txns inserts keep it current. Run the first
+backfill at low traffic: today's rows are recomputed while dispensing may
+be writing them.
+
+Later runs re-aggregate the last --days closed days, which heals rows
+written outside the ORM (raw SQL imports).
+
+Cron (after midnight, every tenant):
+    python -m app.scripts.rebuild_stock_movements --all-tenants
+
+Backfill one tenant:
+    python -m app.scripts.rebuild_stock_movements --db-uri mysql+pymysql://.../nabh_hims_xyz --from 2023-01-01
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.pharmacy_inventory import StockDailyMovement, StockMovementCoverage
+from app.services.stock_movements import covered_from, first_ledger_day, rebuild_days, set_covered_from
+
+CHUNK_DAYS = 31
+REFRESH_DAYS = 3
+
+
+def run(db: Session, *, d_from: Optional[date] = None, days: int = REFRESH_DAYS) -> None:
+    bind = db.get_bind()
+    StockDailyMovement.__table__.create(bind=bind, checkfirst=True)
+    StockMovementCoverage.__table__.create(bind=bind, checkfirst=True)
+
+    t0 = time.perf_counter()
+    today = date.today()
+    cover = covered_from(db)
+
+    if d_from is None and cover is not None:
+        rows = rebuild_days(db, today - timedelta(days=days), today - timedelta(days=1))
+        db.commit()
+        print(f"  covered from {cover}; last {days} closed days refreshed: {rows} rows ({time.perf_counter() - t0:.1f}s)")
+        return
+
+    start = d_from or first_ledger_day(db) or today
+    total = 0
+    a = start
+    while a <= today:
+        b = min(today, a + timedelta(days=CHUNK_DAYS - 1))
+        total += rebuild_days(db, a, b)
+        db.commit()
+        print(f"  {a} .. {b}: {total} rows so far ({time.perf_counter() - t0:.1f}s)", flush=True)
+        a = b + timedelta(days=1)
+
+    set_covered_from(db, start if cover is None else min(start, cover))
+    db.commit()
+    print(f"  covered from {covered_from(db)}")
+
+
+def _tenant_uris():
+    from app.db.session import MasterSessionLocal
+    from app.models.tenant import Tenant
+
+    with MasterSessionLocal() as mdb:
+        return [(t.code, t.db_uri) for t in mdb.query(Tenant).filter(Tenant.is_active.is_(True)).all()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="Tenant DB URI (mysql+pymysql://...)")
+    ap.add_argument("--all-tenants", action="store_true", help="Refresh every active tenant from the master DB")
+    ap.add_argument("--days", type=int, default=REFRESH_DAYS, help="Closed days to refresh once covered")
+    ap.add_argument("--from", dest="d_from", type=date.fromisoformat, default=None,
+                    help="Backfill start (YYYY-MM-DD, default: first ledger day)")
+    args = ap.parse_args()
+
+    if args.all_tenants:
+        targets = _tenant_uris()
+    elif args.db_uri:
+        targets = [("-", args.db_uri)]
+    else:
+        raise SystemExit("Provide --db-uri or --all-tenants")
+
+    from app.db.session import create_tenant_session
+
+    failed = 0
+    for code, uri in targets:
+        print(f"tenant {code}:")
+        db = create_tenant_session(uri)
+        try:
+            run(db, d_from=args.d_from, days=args.days)
+        except Exception as e:  # keep going for the other tenants
+            db.rollback()
+            failed += 1
+            print(f"  FAILED: {e!r}")
+        finally:
+            db.close()
+    if failed:
+        raise SystemExit(f"{failed} tenant(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# FILE: app/scripts/reconcile_ar_balances.py
+"""
+Reconcile the AR balance tables (app.services.billing_ar) with the billing
+data they summarize.
+
+Balances are refreshed after every commit that touches an invoice,
+payment, allocation, advance or advance application. This job catches
+what that cannot: writes made outside the ORM (SQL fixes, imports), a
+refresh that failed after its billing commit, and tenants that have the
+new tables but no rows yet (first run = backfill). Cases are recomputed
+in --batch sized id ranges, each batch in its own transaction.
+
+  --check   report drift only; exits non-zero if any tenant has drift
+
+Cron (nightly, every tenant):
+    python -m app.scripts.reconcile_ar_balances --all-tenants
+
+One tenant, dry run:
+    python -m app.scripts.reconcile_ar_balances --db-uri mysql+pymysql://.../nabh_hims_xyz --check
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+from app.services import billing_ar
+
+
+def run(db: Session, batch: int, repair: bool) -> Dict[str, int]:
+    t0 = time.perf_counter()
+    totals: Dict[str, int] = {}
+    last = 0
+    while True:
+        ids = billing_ar.case_ids_after(db, last, batch)
+        if not ids:
+            break
+        stats = billing_ar.reconcile(db, ids, repair=repair)
+        if repair:
+            db.commit()
+        else:
+            db.rollback()
+        for k, v in stats.items():
+            totals[k] = totals.get(k, 0) + v
+        last = ids[-1]
+
+    stale = billing_ar.stale_case_ids(db)
+    if stale:
+        stats = billing_ar.reconcile(db, stale, repair=repair)
+        totals["case_stale"] = totals.get("case_stale", 0) + stats["case_stale"]
+        totals["invoice_stale"] = totals.get("invoice_stale", 0) + stats["invoice_stale"]
+        if repair:
+            db.commit()
+
+    n = billing_ar.drift(totals)
+    detail = ", ".join(f"{k}={v}" for k, v in sorted(totals.items()) if k != "cases" and v)
+    print(f"  {totals.get('cases', 0)} cases: {n} drifted rows{' repaired' if repair and n else ''}"
+          f"{' (' + detail + ')' if detail else ''} in {time.perf_counter() - t0:.1f}s")
+    return totals
+
+
+def _tenant_uris():
+    from app.db.session import MasterSessionLocal
+    from app.models.tenant import Tenant
+
+    with MasterSessionLocal() as mdb:
+        return [(t.code, t.db_uri) for t in mdb.query(Tenant).filter(Tenant.is_active.is_(True)).all()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="Tenant DB URI (mysql+pymysql://...)")
+    ap.add_argument("--all-tenants", action="store_true", help="Run for every active tenant from the master DB")
+    ap.add_argument("--batch", type=int, default=500, help="Cases per transaction")
+    ap.add_argument("--check", action="store_true", help="Only report drift, do not repair")
+    args = ap.parse_args()
+
+    if args.all_tenants:
+        targets = _tenant_uris()
+    elif args.db_uri:
+        targets = [("-", args.db_uri)]
+    else:
+        raise SystemExit("Provide --db-uri or --all-tenants")
+
+    from app.db.session import create_tenant_session
+
+    failed = drifted = 0
+    for code, uri in targets:
+        print(f"tenant {code}:")
+        db = create_tenant_session(uri)
+        try:
+            totals = run(db, max(args.batch, 1), repair=not args.check)
+            if args.check and billing_ar.drift(totals):
+                drifted += 1
+        except Exception as e:  # keep going for the other tenants
+            db.rollback()
+            failed += 1
+            print(f"  FAILED: {e!r}")
+        finally:
+            db.close()
+    if failed:
+        raise SystemExit(f"{failed} tenant(s) failed")
+    if drifted:
+        raise SystemExit(f"{drifted} tenant(s) have AR balance drift")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# FILE: app/scripts/refresh_daily_rollups.py
+"""
+Nightly refresh / backfill of dashboard + MIS daily rollups.
+
+Default run re-aggregates the last DAILY_ROLLUP_REFRESH_DAYS closed days
+(late entries land there). --from/--to backfills a history range in
+monthly chunks, one transaction per chunk.
+
+Cron (after midnight, every tenant):
+    python -m app.scripts.refresh_daily_rollups --all-tenants
+
+Backfill one tenant:
+    python -m app.scripts.refresh_daily_rollups --db-uri mysql+pymysql://.../nabh_hims_xyz --from 2023-01-01
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.rollup import DailyRollup, DailyRollupDay
+from app.services.daily_rollups import live_from, refresh_days, refresh_recent
+
+CHUNK_DAYS = 31
+
+
+def run(db: Session, *, d_from: Optional[date] = None, d_to: Optional[date] = None,
+        days: Optional[int] = None) -> None:
+    bind = db.get_bind()
+    DailyRollup.__table__.create(bind=bind, checkfirst=True)
+    DailyRollupDay.__table__.create(bind=bind, checkfirst=True)
+
+    t0 = time.perf_counter()
+    if d_from is None:
+        rows = refresh_recent(db, days)
+        db.commit()
+        print(f"  recent days refreshed: {rows} rows ({time.perf_counter() - t0:.1f}s)")
+        return
+
+    last = min(d_to or date.max, live_from() - timedelta(days=1))
+    total = 0
+    a = d_from
+    while a <= last:
+        b = min(last, a + timedelta(days=CHUNK_DAYS - 1))
+        total += refresh_days(db, a, b)
+        db.commit()
+        print(f"  {a} .. {b}: {total} rows so far ({time.perf_counter() - t0:.1f}s)", flush=True)
+        a = b + timedelta(days=1)
+
+
+def _tenant_uris():
+    from app.db.session import MasterSessionLocal
+    from app.models.tenant import Tenant
+
+    with MasterSessionLocal() as mdb:
+        return [(t.code, t.db_uri) for t in mdb.query(Tenant).filter(Tenant.is_active.is_(True)).all()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db-uri", default=None, help="Tenant DB URI (mysql+pymysql://...)")
+    ap.add_argument("--all-tenants", action="store_true", help="Refresh every active tenant from the master DB")
+    ap.add_argument("--days", type=int, default=None, help="Closed days to refresh (default: DAILY_ROLLUP_REFRESH_DAYS)")
+    ap.add_argument("--from", dest="d_from", type=date.fromisoformat, default=None, help="Backfill start (YYYY-MM-DD)")
+    ap.add_argument("--to", dest="d_to", type=date.fromisoformat, default=None, help="Backfill end (default: yesterday)")
+    args = ap.parse_args()
+
+    if args.all_tenants:
+        targets = _tenant_uris()
+    elif args.db_uri:
+        targets = [("-", args.db_uri)]
+    else:
+        raise SystemExit("Provide --db-uri or --all-tenants")
+
+    from app.db.session import create_tenant_session
+
+    failed = 0
+    for code, uri in targets:
+        print(f"tenant {code}:")
+        db = create_tenant_session(uri)
+        try:
+            run(db, d_from=args.d_from, d_to=args.d_to, days=args.days)
+        except Exception as e:  # keep going for the other tenants
+            db.rollback()
+            failed += 1
+            print(f"  FAILED: {e!r}")
+        finally:
+            db.close()
+    if failed:
+        raise SystemExit(f"{failed} tenant(s) failed")
+
+
+if __name__ == "__main__":
+    main()
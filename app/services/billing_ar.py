@@ -0,0 +1,500 @@
+# FILE: app/services/billing_ar.py
+"""
+Accounts-receivable balances: billing_invoice_balances (one row per
+invoice) and billing_case_balances (one row per case), so receivables and
+aging read a few indexed rows instead of re-summing lines, allocations
+and payments of every invoice.
+
+  * every flush that adds, edits or deletes an invoice, payment,
+    allocation, advance or advance application (payment, refund, void,
+    advance apply, invoice approve / post / edit) marks its case; after
+    the commit the marked cases are recomputed with
+    billing_finance.case_ledgers() in a separate transaction, under a
+    row lock on the cases so two concurrent payments of the same case
+    cannot leave the older numbers behind
+  * sync() is the recompute itself; refresh_cases() writes, reconcile()
+    only reports (or repairs) drift for writes made outside the ORM and
+    refreshes that failed (app.scripts.reconcile_ar_balances)
+  * receivables(), aging_summary(), aging_invoices() read the tables with
+    keyset pagination ("value|id" cursors), never OFFSET
+
+Numbers are those of the case outstanding list: paid = active receipts
+of the invoice, outstanding = grand_total - paid (never negative). An
+invoice is open when it is APPROVED / POSTED with outstanding > 0; its
+aging date is DATE(COALESCE(posted_at, approved_at, created_at)), the
+revenue dashboard's invoice event date.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case as sa_case, delete, event, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models.billing import (
+    BillingAdvance,
+    BillingAdvanceApplication,
+    BillingCase,
+    BillingCaseBalance,
+    BillingInvoice,
+    BillingInvoiceBalance,
+    BillingPayment,
+    BillingPaymentAllocation,
+    DocStatus,
+    PayerType,
+)
+from app.models.patient import Patient
+from app.services.billing_finance import case_ledgers
+
+logger = logging.getLogger(__name__)
+
+_PENDING = "billing_ar_pending"
+
+D0 = Decimal("0.00")
+
+OPEN_STATUS = (DocStatus.APPROVED, DocStatus.POSTED)
+
+# (label, min age days, max age days or None)
+AGING_BUCKETS: Tuple[Tuple[str, int, Optional[int]], ...] = (
+    ("0_30", 0, 30),
+    ("31_60", 31, 60),
+    ("61_90", 61, 90),
+    ("90_plus", 91, None),
+)
+
+# case list filters -> outstanding column
+RECEIVABLE_COLUMNS = {
+    "all": BillingCaseBalance.outstanding,
+    "patient": BillingCaseBalance.patient_outstanding,
+    "payer": BillingCaseBalance.payer_outstanding,
+}
+
+_TRACKED = (BillingInvoice, BillingPayment, BillingPaymentAllocation, BillingAdvance, BillingAdvanceApplication)
+
+_INV_FIELDS = ("billing_case_id", "payer_type", "payer_id", "status", "invoice_date",
+               "grand_total", "paid", "outstanding", "is_open")
+_CASE_FIELDS = ("patient_id", "billed_total", "paid_total", "outstanding", "patient_outstanding",
+                "payer_outstanding", "advance_balance", "open_invoices", "oldest_open_date")
+
+
+def _d(v: Any) -> Decimal:
+    return Decimal(str(v or 0)).quantize(D0)
+
+
+# ============================================================
+# Recompute
+# ============================================================
+def _invoice_date(inv: BillingInvoice) -> date:
+    at = inv.posted_at or inv.approved_at or inv.created_at
+    return at.date() if at else date.today()
+
+
+def _compute(db: Session, cases: Dict[int, int]) -> Tuple[Dict[int, Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+    """({invoice_id: row}, {case_id: row}) for cases {case_id: patient_id}."""
+    inv_rows: Dict[int, Dict[str, Any]] = {}
+    case_rows: Dict[int, Dict[str, Any]] = {}
+    for cid, led in case_ledgers(db, case_ids=cases.keys()).items():
+        tot = {"patient_id": cases[cid], "billed_total": D0, "paid_total": D0, "outstanding": D0,
+               "patient_outstanding": D0, "payer_outstanding": D0,
+               "advance_balance": _d(led.advance_balance), "open_invoices": 0, "oldest_open_date": None}
+        for x in led.invoices:
+            inv = x.invoice
+            billed = inv.status in OPEN_STATUS
+            gt, paid, out = _d(inv.grand_total), _d(x.received), _d(x.balance)
+            is_open = billed and out > 0
+            d = _invoice_date(inv)
+            inv_rows[x.id] = {"billing_case_id": cid, "payer_type": inv.payer_type, "payer_id": inv.payer_id,
+                              "status": inv.status, "invoice_date": d, "grand_total": gt, "paid": paid,
+                              "outstanding": out, "is_open": is_open}
+            if not billed:
+                continue
+            tot["billed_total"] += gt
+            tot["paid_total"] += paid
+            tot["outstanding"] += out
+            if inv.payer_type == PayerType.PATIENT:
+                tot["patient_outstanding"] += out
+            else:
+                tot["payer_outstanding"] += out
+            if is_open:
+                tot["open_invoices"] += 1
+                if tot["oldest_open_date"] is None or d < tot["oldest_open_date"]:
+                    tot["oldest_open_date"] = d
+        case_rows[cid] = tot
+    return inv_rows, case_rows
+
+
+def _stored(db: Session, case_ids: List[int]):
+    inv = {int(r.invoice_id): r for r in db.query(BillingInvoiceBalance).filter(
+        BillingInvoiceBalance.billing_case_id.in_(case_ids)).all()}
+    cas = {int(r.billing_case_id): r for r in db.query(BillingCaseBalance).filter(
+        BillingCaseBalance.billing_case_id.in_(case_ids)).all()}
+    return inv, cas
+
+
+def _differs(row, want: Dict[str, Any], fields: Tuple[str, ...]) -> bool:
+    for f in fields:
+        have = getattr(row, f)
+        if isinstance(want[f], Decimal):
+            have = _d(have)
+        if have != want[f]:
+            return True
+    return False
+
+
+def _upsert(conn, table, key: str, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda r: r[key])  # key order = lock order
+    cols = [c for c in rows[0] if c != key]
+    dialect = conn.dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in cols})
+        conn.execute(stmt, rows)
+        return
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=[key], set_={c: stmt.excluded[c] for c in cols})
+        conn.execute(stmt, rows)
+        return
+
+    # generic: update, then insert what did not exist (callers hold the case locks)
+    k = table.c[key]
+    for r in rows:
+        res = conn.execute(update(table).where(k == r[key]).values({c: r[c] for c in cols}))
+        if not res.rowcount:
+            conn.execute(insert(table).values(**r))
+
+
+def sync(db: Session, case_ids: Iterable[int], *, write: bool = True) -> Dict[str, int]:
+    """
+    Recompute the balances of the cases and compare them with the stored
+    rows; write=True brings the rows in line. Counts of rows missing /
+    different / stale (invoice or case gone). Takes FOR UPDATE locks on
+    the cases when writing; the caller commits.
+    """
+    ids = sorted({int(c) for c in case_ids})
+    stats = {"cases": len(ids), "invoice_missing": 0, "invoice_changed": 0, "invoice_stale": 0,
+             "case_missing": 0, "case_changed": 0, "case_stale": 0}
+    if not ids:
+        return stats
+
+    q = db.query(BillingCase.id, BillingCase.patient_id).filter(BillingCase.id.in_(ids)).order_by(BillingCase.id)
+    if write:
+        # lock before the first read, so the snapshot below sees every
+        # commit that happened before a concurrent refresh of these cases
+        q = q.with_for_update()
+    cases = {int(cid): pid for cid, pid in q.all()}
+
+    want_inv, want_case = _compute(db, cases)
+    have_inv, have_case = _stored(db, ids)
+
+    inv_up: List[Dict[str, Any]] = []
+    for iid, want in want_inv.items():
+        have = have_inv.get(iid)
+        if have is None:
+            stats["invoice_missing"] += 1
+        elif _differs(have, want, _INV_FIELDS):
+            stats["invoice_changed"] += 1
+        else:
+            continue
+        inv_up.append(dict(want, invoice_id=iid))
+    inv_gone = sorted(set(have_inv) - set(want_inv))
+    stats["invoice_stale"] = len(inv_gone)
+
+    case_up: List[Dict[str, Any]] = []
+    for cid, want in want_case.items():
+        have = have_case.get(cid)
+        if have is None:
+            stats["case_missing"] += 1
+        elif _differs(have, want, _CASE_FIELDS):
+            stats["case_changed"] += 1
+        else:
+            continue
+        case_up.append(dict(want, billing_case_id=cid))
+    case_gone = sorted(set(have_case) - set(want_case))
+    stats["case_stale"] = len(case_gone)
+
+    if not write:
+        return stats
+
+    now = datetime.utcnow()
+    conn = db.connection()
+    if inv_gone:
+        conn.execute(delete(BillingInvoiceBalance).where(BillingInvoiceBalance.invoice_id.in_(inv_gone)))
+    if case_gone:
+        conn.execute(delete(BillingCaseBalance).where(BillingCaseBalance.billing_case_id.in_(case_gone)))
+    _upsert(conn, BillingInvoiceBalance.__table__, "invoice_id", [dict(r, updated_at=now) for r in inv_up])
+    _upsert(conn, BillingCaseBalance.__table__, "billing_case_id", [dict(r, updated_at=now) for r in case_up])
+    if inv_gone or case_gone or inv_up or case_up:
+        db.expire_all()
+    return stats
+
+
+def refresh_cases(db: Session, case_ids: Iterable[int]) -> Dict[str, int]:
+    """Bring the balance rows of the cases up to date (caller commits)."""
+    return sync(db, case_ids, write=True)
+
+
+def reconcile(db: Session, case_ids: Iterable[int], *, repair: bool = False) -> Dict[str, int]:
+    """Drift of the stored rows against a recompute; repair=True also fixes it."""
+    return sync(db, case_ids, write=repair)
+
+
+def drift(stats: Dict[str, int]) -> int:
+    return sum(v for k, v in stats.items() if k != "cases")
+
+
+# ============================================================
+# Maintenance (Session hooks; app.db.session imports this module before
+# the first tenant engine, so API, cron and worker sessions all get them)
+# ============================================================
+@event.listens_for(Session, "after_flush")
+def _mark_cases(session: Session, _flush_context) -> None:
+    ids: Set[int] = set()
+    for o in session.new:
+        if isinstance(o, _TRACKED + (BillingCase, )):
+            cid = o.id if isinstance(o, BillingCase) else o.billing_case_id
+            if cid:
+                ids.add(int(cid))
+    for o in session.dirty:
+        if isinstance(o, _TRACKED) and o.billing_case_id and session.is_modified(o, include_collections=False):
+            ids.add(int(o.billing_case_id))
+    for o in session.deleted:
+        if isinstance(o, _TRACKED) and o.billing_case_id:
+            ids.add(int(o.billing_case_id))
+    if ids:
+        session.info.setdefault(_PENDING, set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _refresh_marked(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    bind = session.get_bind()
+    try:
+        with Session(bind=bind, autoflush=False) as db:
+            refresh_cases(db, pending)
+            db.commit()
+    except Exception:
+        # the billing change is committed; the reconcile job repairs the balances
+        logger.warning("AR balance refresh failed for cases %s", sorted(pending), exc_info=True)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted(session: Session, transaction) -> None:
+    # after_commit has already taken the committed ones
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+# ============================================================
+# Reading
+# ============================================================
+def _split_cursor(cursor: Optional[str]) -> Optional[Tuple[str, int]]:
+    if not cursor:
+        return None
+    try:
+        value, _, last_id = cursor.rpartition("|")
+        return value, int(last_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _money_cursor(value: str) -> Decimal:
+    try:
+        return Decimal(value)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _date_cursor(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _patient_name(first: Optional[str], last: Optional[str]) -> str:
+    return " ".join(p for p in (first, last) if p)
+
+
+def receivables(
+    db: Session,
+    *,
+    payer: str = "all",
+    sort: str = "outstanding",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Cases with something outstanding, one page at a time.
+    sort=outstanding: largest first; sort=oldest: oldest open invoice first.
+    payer=patient / payer limits to the patient or insurer / TPA / corporate share.
+    """
+    col = RECEIVABLE_COLUMNS.get(payer)
+    if col is None:
+        raise HTTPException(status_code=400, detail="payer must be all, patient or payer")
+    b = BillingCaseBalance
+    q = (db.query(b, BillingCase.case_number, Patient.uhid, Patient.first_name, Patient.last_name)
+         .join(BillingCase, BillingCase.id == b.billing_case_id)
+         .join(Patient, Patient.id == b.patient_id)
+         .filter(col > 0))
+    cur = _split_cursor(cursor)
+    if sort == "outstanding":
+        if cur:
+            v, last = _money_cursor(cur[0]), cur[1]
+            q = q.filter(or_(col < v, and_(col == v, b.billing_case_id < last)))
+        q = q.order_by(col.desc(), b.billing_case_id.desc())
+    elif sort == "oldest":
+        q = q.filter(b.oldest_open_date.isnot(None))
+        if cur:
+            v, last = _date_cursor(cur[0]), cur[1]
+            q = q.filter(or_(b.oldest_open_date > v, and_(b.oldest_open_date == v, b.billing_case_id > last)))
+        q = q.order_by(b.oldest_open_date.asc(), b.billing_case_id.asc())
+    else:
+        raise HTTPException(status_code=400, detail="sort must be outstanding or oldest")
+
+    rows = q.limit(limit + 1).all()
+    items = []
+    for r, case_number, uhid, first, last in rows[:limit]:
+        items.append({
+            "billing_case_id": int(r.billing_case_id),
+            "case_number": case_number,
+            "patient_id": r.patient_id,
+            "uhid": uhid,
+            "patient_name": _patient_name(first, last),
+            "billed_total": str(_d(r.billed_total)),
+            "paid_total": str(_d(r.paid_total)),
+            "outstanding": str(_d(r.outstanding)),
+            "patient_outstanding": str(_d(r.patient_outstanding)),
+            "payer_outstanding": str(_d(r.payer_outstanding)),
+            "advance_balance": str(_d(r.advance_balance)),
+            "open_invoices": int(r.open_invoices or 0),
+            "oldest_open_date": r.oldest_open_date.isoformat() if r.oldest_open_date else None,
+        })
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1][0]
+        v = str(_d(getattr(last, col.key))) if sort == "outstanding" else last.oldest_open_date.isoformat()
+        next_cursor = f"{v}|{int(last.billing_case_id)}"
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def bucket_range(label: str, as_of: date) -> Tuple[Optional[date], date]:
+    """(oldest, newest) invoice_date of an aging bucket as of a day."""
+    for name, lo, hi in AGING_BUCKETS:
+        if name == label:
+            return (as_of - timedelta(days=hi) if hi is not None else None), as_of - timedelta(days=lo)
+    raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(b[0] for b in AGING_BUCKETS)}")
+
+
+def aging_summary(db: Session, *, as_of: date, payer_type: Optional[PayerType] = None) -> Dict[str, Any]:
+    """Open outstanding per payer type and aging bucket (invoice dates up to as_of)."""
+    b = BillingInvoiceBalance
+    cols = []
+    for name, lo, hi in AGING_BUCKETS:
+        cond = b.invoice_date <= as_of - timedelta(days=lo)
+        if hi is not None:
+            cond = and_(cond, b.invoice_date >= as_of - timedelta(days=hi))
+        cols.append(func.coalesce(func.sum(sa_case((cond, b.outstanding), else_=0)), 0))
+    q = (db.query(b.payer_type, func.count(b.invoice_id), *cols)
+         .filter(b.is_open.is_(True), b.invoice_date <= as_of))
+    if payer_type is not None:
+        q = q.filter(b.payer_type == payer_type)
+
+    names = [x[0] for x in AGING_BUCKETS]
+    total = {n: D0 for n in names}
+    rows = []
+    for pt, n, *sums in q.group_by(b.payer_type).order_by(b.payer_type).all():
+        buckets = {name: _d(v) for name, v in zip(names, sums)}
+        for name, v in buckets.items():
+            total[name] += v
+        rows.append({
+            "payer_type": getattr(pt, "value", pt),
+            "invoices": int(n or 0),
+            "buckets": {k: str(v) for k, v in buckets.items()},
+            "total": str(sum(buckets.values(), D0)),
+        })
+    return {
+        "as_of": as_of.isoformat(),
+        "buckets": names,
+        "rows": rows,
+        "totals": {"buckets": {k: str(v) for k, v in total.items()}, "total": str(sum(total.values(), D0))},
+    }
+
+
+def aging_invoices(
+    db: Session,
+    *,
+    as_of: date,
+    bucket: Optional[str] = None,
+    payer_type: Optional[PayerType] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Open invoices oldest first, optionally one bucket / payer type."""
+    b = BillingInvoiceBalance
+    lo, hi = bucket_range(bucket, as_of) if bucket else (None, as_of)
+    q = (db.query(b, BillingInvoice.invoice_number, BillingInvoice.module, BillingCase.case_number)
+         .join(BillingInvoice, BillingInvoice.id == b.invoice_id)
+         .join(BillingCase, BillingCase.id == b.billing_case_id)
+         .filter(b.is_open.is_(True), b.invoice_date <= hi))
+    if lo is not None:
+        q = q.filter(b.invoice_date >= lo)
+    if payer_type is not None:
+        q = q.filter(b.payer_type == payer_type)
+    cur = _split_cursor(cursor)
+    if cur:
+        v, last = _date_cursor(cur[0]), cur[1]
+        q = q.filter(or_(b.invoice_date > v, and_(b.invoice_date == v, b.invoice_id > last)))
+    rows = q.order_by(b.invoice_date.asc(), b.invoice_id.asc()).limit(limit + 1).all()
+
+    items = []
+    for r, invoice_number, module, case_number in rows[:limit]:
+        items.append({
+            "invoice_id": int(r.invoice_id),
+            "invoice_number": invoice_number,
+            "module": module or "MISC",
+            "billing_case_id": int(r.billing_case_id),
+            "case_number": case_number,
+            "payer_type": getattr(r.payer_type, "value", r.payer_type),
+            "payer_id": r.payer_id,
+            "status": getattr(r.status, "value", r.status),
+            "invoice_date": r.invoice_date.isoformat(),
+            "age_days": (as_of - r.invoice_date).days,
+            "grand_total": str(_d(r.grand_total)),
+            "paid": str(_d(r.paid)),
+            "outstanding": str(_d(r.outstanding)),
+        })
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1][0]
+        next_cursor = f"{last.invoice_date.isoformat()}|{int(last.invoice_id)}"
+    return {"as_of": as_of.isoformat(), "items": items, "next_cursor": next_cursor}
+
+
+def case_ids_after(db: Session, after: int, limit: int) -> List[int]:
+    """Next batch of billing case ids (reconcile job keyset)."""
+    return [int(c) for (c, ) in db.query(BillingCase.id).filter(BillingCase.id > after)
+            .order_by(BillingCase.id).limit(limit).all()]
+
+
+def stale_case_ids(db: Session) -> List[int]:
+    """Cases that still have balance rows but no longer exist."""
+    q = select(BillingCaseBalance.billing_case_id).where(
+        ~select(BillingCase.id).where(BillingCase.id == BillingCaseBalance.billing_case_id).exists())
+    return [int(c) for (c, ) in db.execute(q).all()]
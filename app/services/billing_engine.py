@@ -13,6 +13,7 @@ from app.models.billing import (BillingCase, BillingCaseLink, BillingInvoice,
                                 BillingCaseStatus, InvoiceType, DocStatus,
                                 PayerType, ServiceGroup, CoverageFlag, PayMode,
                                 AdvanceType)
+from app.services.billing_finance import case_ledger
 from app.services.id_gen import (
     next_billing_case_number,
     next_invoice_number,
@@ -802,23 +803,13 @@ def case_dashboard(db: Session, case_id: int) -> Dict[str, Any]:
     if not c:
         raise ValueError("Case not found")
 
-    invoices = db.query(BillingInvoice).filter(
-        BillingInvoice.billing_case_id == case_id).order_by(
-            BillingInvoice.id.desc()).all()
-    payments = db.query(BillingPayment).filter(
-        BillingPayment.billing_case_id == case_id).order_by(
-            BillingPayment.id.desc()).all()
-    advances = db.query(BillingAdvance).filter(
-        BillingAdvance.billing_case_id == case_id).order_by(
-            BillingAdvance.id.desc()).all()
-
-    total_invoiced = sum(
-        [_d(x.grand_total) for x in invoices if x.status != DocStatus.VOID],
-        Decimal("0.00"))
-    total_paid = sum([_d(x.amount) for x in payments], Decimal("0.00"))
-    total_adv = sum([
-        _d(x.amount) for x in advances if x.entry_type == AdvanceType.ADVANCE
-    ], Decimal("0.00"))
+    led = case_ledger(db, case_id=int(case_id))
+    invoices = [x.invoice for x in reversed(led.invoices)]
+
+    total_invoiced = sum([_d(x.invoice.grand_total) for x in led.live],
+                         Decimal("0.00"))
+    total_paid = led.payments_total
+    total_adv = led.advance_in
 
     due = _round2(total_invoiced - total_paid - total_adv)
 
@@ -1,13 +1,14 @@
 # FILE: app/services/billing_finance.py
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from typing import Sequence
 from fastapi import HTTPException
 from sqlalchemy import case as sa_case, func, or_
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, lazyload
 from zoneinfo import ZoneInfo
 
 from app.core.config import settings
@@ -304,7 +305,10 @@ def invoice_due_split(db: Session, *, invoice_id: int) -> Dict[str, Decimal]:
 
     q = _apply_active_line_filter(q)
     total, patient_due, insurer_due = q.first() or (0, 0, 0)
+    return _cap_due_split(total, patient_due, insurer_due)
+
 
+def _cap_due_split(total, patient_due, insurer_due) -> Dict[str, Decimal]:
     total = _d(total)
     patient_due = min(_d(patient_due), total)
     insurer_due = min(_d(insurer_due), total)
@@ -380,6 +384,190 @@ def outstanding_for_invoice_bucket(db: Session, *, invoice_id: int,
     return out
 
 
+# -------------------------
+# Case ledger (set-based)
+# -------------------------
+@dataclass
+class InvoiceFinance:
+    invoice: BillingInvoice
+    # invoice_due_split()
+    line_total: Decimal = Decimal("0")
+    patient_due: Decimal = Decimal("0")
+    insurer_due: Decimal = Decimal("0")
+    # allocated_amount_for_invoice_bucket(): allocations (OUT negative)
+    # + legacy direct payments, per payer bucket
+    bucket_paid: Dict[Any, Decimal] = field(default_factory=dict)
+    # _paid_map_for_invoices(): active IN allocations + legacy IN payments
+    received: Decimal = Decimal("0")
+
+    @property
+    def id(self) -> int:
+        return int(self.invoice.id)
+
+    def paid(self, bucket: PayerType) -> Decimal:
+        return self.bucket_paid.get(bucket, Decimal("0"))
+
+    def outstanding(self, bucket: PayerType) -> Decimal:
+        """outstanding_for_invoice_bucket()"""
+        want = self.patient_due if bucket == PayerType.PATIENT else self.insurer_due
+        return max(want - self.paid(bucket), Decimal("0"))
+
+    @property
+    def balance(self) -> Decimal:
+        """grand_total - received, never negative (outstanding invoice list)."""
+        return max(_d(self.invoice.grand_total) - self.received, Decimal("0"))
+
+
+@dataclass
+class CaseLedger:
+    case_id: int
+    invoices: List[InvoiceFinance] = field(default_factory=list)  # every invoice of the case (VOID too), by id
+    payments_total: Decimal = Decimal("0")  # all payment rows of the case (dashboards)
+    advance_in: Decimal = Decimal("0")
+    advance_refund: Decimal = Decimal("0")
+    advance_applied: Decimal = Decimal("0")
+
+    @property
+    def live(self) -> List[InvoiceFinance]:
+        return [x for x in self.invoices if x.invoice.status != DocStatus.VOID]
+
+    @property
+    def advance_balance(self) -> Decimal:
+        return max(self.advance_in - self.advance_refund - self.advance_applied, Decimal("0"))
+
+
+def _add_bucket(row: InvoiceFinance, bucket, amount: Decimal) -> None:
+    row.bucket_paid[bucket] = row.bucket_paid.get(bucket, Decimal("0")) + amount
+
+
+def case_ledger(db: Session, *, case_id: int) -> CaseLedger:
+    """
+    Per-invoice due / paid / outstanding of a case plus its advance wallet,
+    in a fixed number of grouped queries (7) whatever the invoice count.
+    Same numbers as invoice_due_split(), allocated_amount_for_invoice_bucket()
+    and _paid_map_for_invoices() called per invoice. Does not check that the
+    case exists.
+    """
+    return case_ledgers(db, case_ids=[case_id])[int(case_id)]
+
+
+def case_ledgers(db: Session, *, case_ids: Iterable[int]) -> Dict[int, CaseLedger]:
+    """case_ledger() for many cases in the same 7 queries (batch jobs)."""
+    cids = sorted({int(c) for c in case_ids})
+    out = {cid: CaseLedger(case_id=cid) for cid in cids}
+    if not cids:
+        return out
+
+    invs = (db.query(BillingInvoice).options(
+        lazyload(BillingInvoice.pharmacy_sales),
+        lazyload(BillingInvoice.payment_allocations),
+    ).filter(BillingInvoice.billing_case_id.in_(cids)).order_by(
+        BillingInvoice.id.asc()).all())
+    rows = {int(inv.id): InvoiceFinance(invoice=inv) for inv in invs}
+    for r in rows.values():
+        out[int(r.invoice.billing_case_id)].invoices.append(r)
+
+    if rows:
+        # 1) line split per invoice
+        insurer_expr = getattr(BillingInvoiceLine, "insurer_pay_amount",
+                               BillingInvoiceLine.approved_amount)
+        q = db.query(
+            BillingInvoiceLine.invoice_id,
+            func.coalesce(func.sum(BillingInvoiceLine.net_amount), 0),
+            func.coalesce(func.sum(BillingInvoiceLine.patient_pay_amount), 0),
+            func.coalesce(func.sum(insurer_expr), 0),
+        ).join(BillingInvoice,
+               BillingInvoice.id == BillingInvoiceLine.invoice_id).filter(
+                   BillingInvoice.billing_case_id.in_(cids))
+        q = _apply_active_line_filter(q).group_by(BillingInvoiceLine.invoice_id)
+        for iid, total, patient_due, insurer_due in q.all():
+            r = rows[int(iid)]
+            split = _cap_due_split(total, patient_due, insurer_due)
+            r.line_total = split["total"]
+            r.patient_due = split["patient_due"]
+            r.insurer_due = split["insurer_due"]
+
+        # 2) allocations of active payments
+        aq = db.query(
+            BillingPaymentAllocation.invoice_id,
+            BillingPaymentAllocation.payer_bucket,
+            BillingPayment.direction,
+            BillingPaymentAllocation.status,
+            func.coalesce(func.sum(BillingPaymentAllocation.amount), 0),
+        ).join(BillingPayment,
+               BillingPayment.id == BillingPaymentAllocation.payment_id).join(
+                   BillingInvoice,
+                   BillingInvoice.id == BillingPaymentAllocation.invoice_id).filter(
+                       BillingInvoice.billing_case_id.in_(cids),
+                       BillingPayment.status == ReceiptStatus.ACTIVE,
+                   ).group_by(
+                       BillingPaymentAllocation.invoice_id,
+                       BillingPaymentAllocation.payer_bucket,
+                       BillingPayment.direction,
+                       BillingPaymentAllocation.status,
+                   )
+        for iid, bucket, direction, st, amt in aq.all():
+            r = rows[int(iid)]
+            amt = _d(amt)
+            _add_bucket(r, bucket, -amt if direction == PaymentDirection.OUT else amt)
+            if st == ReceiptStatus.ACTIVE and direction == PaymentDirection.IN:
+                r.received += amt
+
+        # 3) legacy direct payments (payment.invoice_id, no allocations)
+        any_alloc = exists().where(
+            BillingPaymentAllocation.payment_id == BillingPayment.id)
+        active_alloc = exists().where(
+            and_(BillingPaymentAllocation.payment_id == BillingPayment.id,
+                 BillingPaymentAllocation.status == ReceiptStatus.ACTIVE))
+        lq = db.query(
+            BillingPayment.invoice_id,
+            BillingPayment.payer_type,
+            BillingPayment.direction,
+            func.coalesce(func.sum(sa_case((~any_alloc, BillingPayment.amount), else_=0)), 0),
+            func.coalesce(func.sum(sa_case((~active_alloc, BillingPayment.amount), else_=0)), 0),
+        ).join(BillingInvoice,
+               BillingInvoice.id == BillingPayment.invoice_id).filter(
+                   BillingInvoice.billing_case_id.in_(cids),
+                   BillingPayment.status == ReceiptStatus.ACTIVE,
+               ).group_by(
+                   BillingPayment.invoice_id,
+                   BillingPayment.payer_type,
+                   BillingPayment.direction,
+               )
+        for iid, payer_type, direction, unallocated, no_active_alloc in lq.all():
+            r = rows[int(iid)]
+            amt = _d(unallocated)
+            _add_bucket(r, payer_type, -amt if direction == PaymentDirection.OUT else amt)
+            if direction == PaymentDirection.IN:
+                r.received += _d(no_active_alloc)
+
+    # 4) case payments, advances, advance applications
+    for cid, amt in db.query(
+            BillingPayment.billing_case_id,
+            func.coalesce(func.sum(BillingPayment.amount), 0)).filter(
+                BillingPayment.billing_case_id.in_(cids)).group_by(
+                    BillingPayment.billing_case_id).all():
+        out[int(cid)].payments_total = _d(amt)
+    for cid, entry_type, amt in db.query(
+            BillingAdvance.billing_case_id,
+            BillingAdvance.entry_type,
+            func.coalesce(func.sum(BillingAdvance.amount), 0)).filter(
+                BillingAdvance.billing_case_id.in_(cids)).group_by(
+                    BillingAdvance.billing_case_id,
+                    BillingAdvance.entry_type).all():
+        if entry_type == AdvanceType.ADVANCE:
+            out[int(cid)].advance_in = _d(amt)
+        elif entry_type == AdvanceType.REFUND:
+            out[int(cid)].advance_refund = _d(amt)
+    for cid, amt in db.query(
+            BillingAdvanceApplication.billing_case_id,
+            func.coalesce(func.sum(BillingAdvanceApplication.amount), 0)).filter(
+                BillingAdvanceApplication.billing_case_id.in_(cids)).group_by(
+                    BillingAdvanceApplication.billing_case_id).all():
+        out[int(cid)].advance_applied = _d(amt)
+    return out
+
+
 # -------------------------
 # Case financials (dashboard)
 # -------------------------
@@ -388,56 +576,21 @@ def case_financials(db: Session, *, case_id: int) -> Dict[str, Any]:
     if not case:
         raise HTTPException(status_code=404, detail="Billing case not found")
 
-    inv_ids = (db.query(BillingInvoice.id).filter(
-        BillingInvoice.billing_case_id == int(case_id),
-        BillingInvoice.status != DocStatus.VOID,
-    ).all())
-    inv_ids = [int(x[0]) for x in inv_ids]
+    led = case_ledger(db, case_id=int(case_id))
+    live = led.live
 
-    posted_total = (db.query(
-        func.coalesce(func.sum(BillingInvoice.grand_total), 0)).filter(
-            BillingInvoice.billing_case_id == int(case_id),
-            BillingInvoice.status == DocStatus.POSTED,
-        ).scalar() or 0)
-    posted_total = _d(posted_total)
-
-    patient_due = Decimal("0")
-    insurer_due = Decimal("0")
-    for iid in inv_ids:
-        dct = invoice_due_split(db, invoice_id=iid)
-        patient_due += dct["patient_due"]
-        insurer_due += dct["insurer_due"]
-
-    patient_paid = Decimal("0")
-    insurer_paid = Decimal("0")
-    for iid in inv_ids:
-        patient_paid += allocated_amount_for_invoice_bucket(
-            db, invoice_id=iid, bucket=PayerType.PATIENT)
-        insurer_paid += allocated_amount_for_invoice_bucket(
-            db, invoice_id=iid, bucket=PayerType.INSURER)
+    posted_total = sum((_d(x.invoice.grand_total) for x in live
+                        if x.invoice.status == DocStatus.POSTED), Decimal("0"))
 
-    adv_in = (db.query(func.coalesce(func.sum(
-        BillingAdvance.amount), 0)).filter(
-            BillingAdvance.billing_case_id == int(case_id),
-            BillingAdvance.entry_type == AdvanceType.ADVANCE,
-        ).scalar() or 0)
-    adv_out = (db.query(func.coalesce(func.sum(
-        BillingAdvance.amount), 0)).filter(
-            BillingAdvance.billing_case_id == int(case_id),
-            BillingAdvance.entry_type == AdvanceType.REFUND,
-        ).scalar() or 0)
-    adv_in = _d(adv_in)
-    adv_out = _d(adv_out)
+    patient_due = sum((x.patient_due for x in live), Decimal("0"))
+    insurer_due = sum((x.insurer_due for x in live), Decimal("0"))
+    patient_paid = sum((x.paid(PayerType.PATIENT) for x in live), Decimal("0"))
+    insurer_paid = sum((x.paid(PayerType.INSURER) for x in live), Decimal("0"))
 
-    adv_applied = (db.query(
-        func.coalesce(func.sum(BillingAdvanceApplication.amount),
-                      0)).filter(BillingAdvanceApplication.billing_case_id ==
-                                 int(case_id)).scalar() or 0)
-    adv_applied = _d(adv_applied)
-
-    advance_balance_val = adv_in - adv_out - adv_applied
-    if advance_balance_val < 0:
-        advance_balance_val = Decimal("0")
+    adv_in = led.advance_in
+    adv_out = led.advance_refund
+    adv_applied = led.advance_applied
+    advance_balance_val = led.advance_balance
 
     # ✅ IMPORTANT:
     # Outstanding must NOT be reduced by advance balance.
@@ -601,12 +754,11 @@ def record_payment(
             status_code=409,
             detail="No payable invoice found to allocate payment")
 
+    led = {x.id: x for x in case_ledger(db, case_id=int(billing_case_id)).invoices}
     total_out = Decimal("0")
     outs: List[Tuple[BillingInvoice, Decimal]] = []
     for inv in targets:
-        out = outstanding_for_invoice_bucket(db,
-                                             invoice_id=int(inv.id),
-                                             bucket=bucket)
+        out = led[int(inv.id)].outstanding(bucket)
         if out > 0:
             outs.append((inv, out))
             total_out += out
@@ -934,23 +1086,16 @@ def list_case_invoice_outstanding(
     if not sts:
         sts = [DocStatus.APPROVED, DocStatus.POSTED]
 
-    invs = (db.query(BillingInvoice).filter(
-        BillingInvoice.billing_case_id == int(billing_case_id)).filter(
-            BillingInvoice.status.in_(sts)).filter(
-                BillingInvoice.status != DocStatus.VOID).order_by(
-                    BillingInvoice.id.desc()).all())
-
-    ids = [int(i.id) for i in invs]
-    paid_map = _paid_map_for_invoices(db, ids)
+    led = case_ledger(db, case_id=int(billing_case_id))
+    rows = [x for x in reversed(led.live) if x.invoice.status in sts]
 
     out: List[Dict[str, Any]] = []
-    for inv in invs:
-        iid = int(inv.id)
+    for row in rows:
+        inv = row.invoice
+        iid = row.id
         gt = _d(getattr(inv, "grand_total", 0))
-        paid = paid_map.get(iid, Decimal("0"))
-        due = gt - paid
-        if due < 0:
-            due = Decimal("0")
+        paid = row.received
+        due = row.balance
 
         out.append({
             "invoice_id":
@@ -33,6 +33,7 @@ from app.models.lis import LisOrder, LisOrderItem
 from app.models.ris import RisOrder
 from app.models.pharmacy_prescription import PharmacySale, PharmacySaleItem
 from app.services.billing_invoice_create import create_new_invoice_for_case
+from app.services.daily_rollups import touch as touch_rollups
 
 IST = ZoneInfo("Asia/Kolkata")
 
@@ -637,6 +638,7 @@ def add_pharmacy_payment_for_sale(
         notes="Payment captured from Pharmacy module",
     )
     db.flush()
+    touch_rollups(db, p.received_at, "payments")
     return {
         "ok": True,
         "payment_id": int(p.id),
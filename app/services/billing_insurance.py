@@ -37,6 +37,8 @@ from app.models.billing import (
     ReceiptStatus,
 )
 
+from app.services.daily_rollups import touch as touch_rollups
+
 logger = logging.getLogger(__name__)
 
 D0 = Decimal("0.00")
@@ -584,6 +586,7 @@ def split_invoices_for_insurance(
             _recalc_invoice_totals(i_loaded)
         db.flush()
 
+        was_posted_at = orig.posted_at if orig.status == DocStatus.POSTED else None
         orig.status = DocStatus.VOID
         reason = f"Split into PATIENT:{patient_inv.invoice_number}"
         if insurer_inv:
@@ -604,6 +607,9 @@ def split_invoices_for_insurance(
              "VOID_SPLIT",
              user_id,
              reason=reason)
+        if was_posted_at is not None:
+            db.flush()
+            touch_rollups(db, was_posted_at, "billing")
 
         results.append({
             "from":
@@ -103,6 +103,8 @@ def _next_number(
     padding: int = 5,
 ) -> str:
     """
+    Not called: create_new_invoice_for_case() numbers invoices through
+    id_gen.next_invoice_number() (gapless INVOICE series / number_allocator).
     ✅ Locks the series row for concurrency safety.
     ✅ Supports tenant_id if the column exists.
     ✅ Filters by doc_type + prefix + reset_period (safe even if multiple rows exist).
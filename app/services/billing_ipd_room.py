@@ -1,14 +1,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import date, datetime, time, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional
 
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from app.models.ipd import IpdAdmission, IpdBed, IpdRoom, IpdBedAssignment, IpdBedRate
+from app.models.ipd import IpdAdmission
 from app.models.billing import (
     BillingCase,
     BillingCaseLink,
@@ -25,6 +25,8 @@ from app.models.billing import (
 )
 from app.services.id_gen import next_billing_case_number, next_invoice_number
 from app.services.ipd_billing import sync_ipd_room_charges
+from app.services.ipd_daily_charges import bed_line_days
+from app.services.ipd_room_charges import room_days
 IST = timezone(timedelta(hours=5, minutes=30))
 
 
@@ -60,15 +62,6 @@ def _to_ist(dt: Optional[datetime]) -> Optional[datetime]:
     return u.astimezone(IST) if u else None
 
 
-def _ist_day_bounds(d: date) -> Tuple[datetime, datetime]:
-    """
-    Returns IST-aware [start, end] for the given date.
-    """
-    start = datetime.combine(d, time.min).replace(tzinfo=IST)
-    end = datetime.combine(d, time.max).replace(tzinfo=IST)
-    return start, end
-
-
 def _safe_add_case_link(db: Session, billing_case_id: int, entity_type: str,
                         entity_id: int) -> None:
     if not entity_id:
@@ -149,18 +142,6 @@ def _norm_room_type(x: Optional[str]) -> str:
     return s.title()
 
 
-def _resolve_daily_rate(db: Session, room_type: str,
-                        for_date: date) -> Optional[Decimal]:
-    rt = _norm_room_type(room_type)
-    r = (db.query(IpdBedRate).filter(IpdBedRate.is_active.is_(True)).filter(
-        IpdBedRate.room_type == rt).filter(
-            IpdBedRate.effective_from <= for_date).filter(
-                (IpdBedRate.effective_to.is_(None))
-                | (IpdBedRate.effective_to >= for_date)).order_by(
-                    IpdBedRate.effective_from.desc()).first())
-    return _d(r.daily_rate) if r else None
-
-
 @dataclass
 class _DayCharge:
     day: date
@@ -179,57 +160,31 @@ def _compute_daily_charges_ist(
     to_date: date,
 ) -> List[_DayCharge]:
     """
-    One row per IST day: determine active bed assignment for that day,
-    then resolve rate by room_type + date.
-    Mirrors your preview logic, but uses IST day boundaries safely.
+    One row per IST day: the bed assignment active that day and the rate
+    for its room_type on that date (see app.services.ipd_room_charges).
     """
-    assigns = (db.query(IpdBedAssignment).filter(
-        IpdBedAssignment.admission_id == admission_id).order_by(
-            IpdBedAssignment.from_ts.asc()).all())
-
     out: List[_DayCharge] = []
-    cursor = from_date
-    while cursor <= to_date:
-        day_start_ist, day_end_ist = _ist_day_bounds(cursor)
-
-        active: Optional[IpdBedAssignment] = None
-        for a in assigns:
-            a_start = _to_ist(a.from_ts)
-            a_end = _to_ist(a.to_ts) if a.to_ts else None
-            if not a_start:
-                continue
-
-            start_ok = a_start <= day_end_ist
-            end_ok = (a_end is None) or (a_end >= day_start_ist)
-            if start_ok and end_ok:
-                active = a  # keep last overlap => latest started
-
-        if not active:
-            cursor += timedelta(days=1)
-            continue
-
-        bed = db.query(IpdBed).get(active.bed_id) if active.bed_id else None
-        room = db.query(IpdRoom).get(
-            bed.room_id) if bed and bed.room_id else None
-        room_type = _norm_room_type(getattr(room, "type", None) or "General")
-
-        rate = _resolve_daily_rate(db, room_type, cursor)
-        missing = rate is None
-        rate_val = rate if rate is not None else Decimal("0")
-
+    for rd in room_days(
+            db,
+            admission_id,
+            from_date,
+            to_date,
+            room_type=lambda room: _norm_room_type(
+                getattr(room, "type", None) or "General"),
+            tz=IST,
+    ):
+        bed = rd.bed
         out.append(
             _DayCharge(
-                day=cursor,
-                assignment_id=int(active.id),
+                day=rd.day,
+                assignment_id=int(rd.assignment.id),
                 bed_id=int(bed.id) if bed else None,
                 bed_code=getattr(bed, "code", None) if bed else None,
-                room_type=room_type,
-                rate=rate_val,
-                missing_rate=missing,
+                room_type=rd.room_type,
+                rate=rd.rate if rd.rate is not None else Decimal("0"),
+                missing_rate=rd.rate is None,
             ))
 
-        cursor += timedelta(days=1)
-
     return out
 
 
@@ -248,6 +203,7 @@ def sync_ipd_room_charges(
     - Creates/ensures BillingCase (Encounter=IP, encounter_id=admission_id)
     - Ensures PATIENT invoice
     - Upserts one room line per IST day (idempotent)
+    - Skips days already billed with a ROOM bed line (nightly charge job)
     - Updates amounts if room/rate changes
     """
 
@@ -332,6 +288,9 @@ def sync_ipd_room_charges(
     missing_days = sum(1 for d in days if d.missing_rate)
     missing_room_types = sorted({d.room_type for d in days if d.missing_rate})
 
+    # days already billed with a ROOM bed line (nightly job / particulars)
+    bed_days = bed_line_days(db, int(case.id))
+
     # 4) Upsert per day
     for d in days:
         key = f"ROOM:{d.day.isoformat()}"  # idempotent key per day
@@ -342,6 +301,10 @@ def sync_ipd_room_charges(
             BillingInvoiceLine.source_ref_id == int(admission_id),
             BillingInvoiceLine.source_line_key == key,
         ).first())
+        if d.day.isoformat() in bed_days:
+            if line:
+                db.delete(line)
+            continue
 
         qty = Decimal("1")
         unit_price = _d(d.rate)
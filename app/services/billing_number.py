@@ -5,6 +5,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 
 from app.models.billing import BillingNumberSeries, NumberDocType, NumberResetPeriod
+from app.services.number_allocator import is_gapless, take_billing_number
 
 
 def _period_key(now: datetime, reset: NumberResetPeriod) -> str | None:
@@ -29,6 +30,18 @@ def next_number(
     now = now or datetime.now()
     key = _period_key(now, reset_period)
 
+    if not is_gapless(doc_type.value):
+        # hi-lo block (no row lock held for the caller's transaction)
+        n, pad = take_billing_number(
+            db,
+            doc_type=doc_type,
+            prefix=prefix or "",
+            reset_period=reset_period,
+            padding=padding,
+            period_key=key,
+        )
+        return f"{prefix or ''}{str(n).zfill(int(pad or padding))}"
+
     row = (db.query(BillingNumberSeries).filter(
         BillingNumberSeries.doc_type == doc_type).filter(
             BillingNumberSeries.prefix == (prefix or "")).filter(
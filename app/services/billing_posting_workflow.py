@@ -24,6 +24,7 @@ from app.models.billing import (
 
 from app.services.billing_finance import BillingStateError
 from app.services.billing_claims_service import upsert_draft_claim_from_invoice
+from app.services.daily_rollups import touch as touch_rollups
 
 
 def _enum_value(x):
@@ -268,6 +269,7 @@ def post_invoice_workflow(
     inv.posted_by = getattr(user, "id", None)
     db.add(inv)
     db.flush()
+    touch_rollups(db, inv.posted_at, "billing")
 
     # ✅ Create claim ONLY if insurer payable exists AND insurance context
     if insurance_ctx and _invoice_insurer_due(db, invoice_id=int(inv.id)) > 0:
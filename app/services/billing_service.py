@@ -995,52 +995,58 @@ def get_or_create_active_module_invoice(
     )
 
 
-def _recalc_invoice_totals(db: Session, invoice_id: int) -> None:
-    inv = db.get(BillingInvoice, int(invoice_id))
-    if not inv:
-        return
-
-    q = (db.query(
-        func.coalesce(func.sum(BillingInvoiceLine.line_total), 0),
-        func.coalesce(func.sum(BillingInvoiceLine.discount_amount), 0),
-        func.coalesce(func.sum(BillingInvoiceLine.tax_amount), 0),
-        func.coalesce(func.sum(BillingInvoiceLine.net_amount), 0),
-    ).filter(BillingInvoiceLine.invoice_id == int(inv.id)))
-    q = _apply_active_line_filter(q)
-    row = q.first()
-
-    inv.sub_total = _d(row[0] if row else 0)
-    inv.discount_total = _d(row[1] if row else 0)
-    inv.tax_total = _d(row[2] if row else 0)
-    inv.round_off = Decimal("0")
-    inv.grand_total = _d(row[3] if row else 0)
+# ============================================================
+# Invoice totals
+#   - line add/edit/delete: apply (new - old) line contribution (O(1))
+#   - reconcile_invoice_totals(): full re-aggregation, reports drift
+#     (approve / print / POST /invoices/{id}/recalculate)
+# ============================================================
+_ZERO6 = Decimal("0.000000")
+_TOTAL_ATTRS = ("sub_total", "discount_total", "tax_total", "round_off",
+                "grand_total", "meta_json")
+_NO_CONTRIBUTION: Tuple[Decimal, ...] = (Decimal("0"), ) * 7
 
-    # GST split totals
-    ql = db.query(BillingInvoiceLine).filter(
-        BillingInvoiceLine.invoice_id == int(inv.id))
-    ql = _apply_active_line_filter(ql)
-    lines = ql.all()
 
-    cgst = Decimal("0")
-    sgst = Decimal("0")
-    igst = Decimal("0")
+def _line_gst_split(tax: Decimal, meta: Any) -> Tuple[Decimal, Decimal, Decimal]:
+    if tax <= 0:
+        return Decimal("0"), Decimal("0"), Decimal("0")
+    if isinstance(meta, dict) and isinstance(meta.get("gst"), dict):
+        g = meta["gst"]
+        return _d(g.get("cgst_amount")), _d(g.get("sgst_amount")), _d(
+            g.get("igst_amount"))
+    return tax / Decimal("2"), tax / Decimal("2"), Decimal("0")
 
-    for ln in lines:
-        tax = _d(getattr(ln, "tax_amount", None))
-        if tax <= 0:
-            continue
 
-        mj = getattr(ln, "meta_json", None)
-        if isinstance(mj, dict) and isinstance(mj.get("gst"), dict):
-            g = mj["gst"]
-            cgst += _d(g.get("cgst_amount"))
-            sgst += _d(g.get("sgst_amount"))
-            igst += _d(g.get("igst_amount"))
-            continue
+def _line_contribution(ln: BillingInvoiceLine) -> Tuple[Decimal, ...]:
+    """
+    What one line adds to its invoice:
+      (line_total, discount, tax, net, cgst, sgst, igst)
+    Same rules as reconcile_invoice_totals(): tombstoned "(REMOVED)" lines
+    count as zero (see _apply_active_line_filter); amounts rounded like the
+    NUMERIC(14,2) columns store them.
+    """
+    if "(REMOVED)" in (getattr(ln, "description", "") or "").upper():
+        return _NO_CONTRIBUTION
+    tax = _q2(_d(getattr(ln, "tax_amount", None)))
+    cgst, sgst, igst = _line_gst_split(tax, getattr(ln, "meta_json", None))
+    return (
+        _q2(_d(getattr(ln, "line_total", None))),
+        _q2(_d(getattr(ln, "discount_amount", None))),
+        tax,
+        _q2(_d(getattr(ln, "net_amount", None))),
+        cgst,
+        sgst,
+        igst,
+    )
 
-        cgst += (tax / Decimal("2"))
-        sgst += (tax / Decimal("2"))
 
+def _write_invoice_totals(inv: BillingInvoice, totals: Tuple[Decimal, ...]) -> None:
+    sub, disc, tax, net, cgst, sgst, igst = totals
+    inv.sub_total = sub
+    inv.discount_total = disc
+    inv.tax_total = tax
+    inv.round_off = Decimal("0")
+    inv.grand_total = net
     _merge_meta(
         inv,
         {
@@ -1048,23 +1054,147 @@ def _recalc_invoice_totals(db: Session, invoice_id: int) -> None:
                 "cgst_total": _dec_s(cgst),
                 "sgst_total": _dec_s(sgst),
                 "igst_total": _dec_s(igst),
-                "tax_total": _dec_s(_d(inv.tax_total)),
-            }
+                "tax_total": _dec_s(tax),
+            },
+            # column values this module wrote (see _gst_meta_current)
+            "totals": {
+                "sub_total": _dec_s(sub),
+                "discount_total": _dec_s(disc),
+                "grand_total": _dec_s(net),
+            },
         },
     )
-
     _set_if_has(inv, "updated_at", _utcnow_naive())
+
+
+def _stored_invoice_totals(inv: BillingInvoice) -> Optional[Tuple[Decimal, ...]]:
+    mj = getattr(inv, "meta_json", None)
+    g = mj.get("gst") if isinstance(mj, dict) else None
+    if not isinstance(g, dict) or "cgst_total" not in g:
+        return None  # never maintained by this module -> caller reconciles
+    return (
+        _d(inv.sub_total),
+        _d(inv.discount_total),
+        _d(inv.tax_total),
+        _d(inv.grand_total),
+        _d(g.get("cgst_total")),
+        _d(g.get("sgst_total")),
+        _d(g.get("igst_total")),
+    )
+
+
+def _gst_meta_current(inv: BillingInvoice) -> bool:
+    """
+    meta.gst / meta.totals were written together with the current column
+    totals. Other recalculations (routes_billing, charge item, IPD / room
+    charges) rewrite the columns but not the meta, which leaves a stale
+    GST split (and, with round_off, a grand_total deltas cannot build on).
+    """
+    mj = getattr(inv, "meta_json", None)
+    g = mj.get("gst") if isinstance(mj, dict) else None
+    t = mj.get("totals") if isinstance(mj, dict) else None
+    if not isinstance(g, dict) or not isinstance(t, dict):
+        return False
+    pairs = ((g.get("tax_total"), inv.tax_total), (t.get("sub_total"), inv.sub_total),
+             (t.get("discount_total"), inv.discount_total), (t.get("grand_total"), inv.grand_total))
+    return all(a is not None and _q2(_d(a)) == _q2(_d(b)) for a, b in pairs)
+
+
+def _compute_invoice_totals(db: Session, invoice_id: int) -> Tuple[Decimal, ...]:
+    q = (db.query(
+        func.coalesce(func.sum(BillingInvoiceLine.line_total), 0),
+        func.coalesce(func.sum(BillingInvoiceLine.discount_amount), 0),
+        func.coalesce(func.sum(BillingInvoiceLine.tax_amount), 0),
+        func.coalesce(func.sum(BillingInvoiceLine.net_amount), 0),
+    ).filter(BillingInvoiceLine.invoice_id == int(invoice_id)))
+    row = _apply_active_line_filter(q).first()
+
+    # GST split lives in meta_json: read only taxed lines, two columns (no ORM objects)
+    ql = (db.query(BillingInvoiceLine.tax_amount,
+                   BillingInvoiceLine.meta_json).filter(
+                       BillingInvoiceLine.invoice_id == int(invoice_id),
+                       BillingInvoiceLine.tax_amount > 0,
+                   ))
+    cgst = sgst = igst = Decimal("0")
+    for tax, meta in _apply_active_line_filter(ql).all():
+        c, s_, i = _line_gst_split(_d(tax), meta)
+        cgst += c
+        sgst += s_
+        igst += i
+
+    return (
+        _d(row[0] if row else 0),
+        _d(row[1] if row else 0),
+        _d(row[2] if row else 0),
+        _d(row[3] if row else 0),
+        cgst,
+        sgst,
+        igst,
+    )
+
+
+def reconcile_invoice_totals(db: Session, invoice_id: int, *,
+                             fix: bool = True) -> Dict[str, Any]:
+    """
+    Full re-aggregation of an invoice's lines vs its stored totals.
+    Returns {"invoice_id", "drift": {field: stored - computed}, "fixed"};
+    with fix=True (default) the stored totals are overwritten.
+    """
+    inv = db.get(BillingInvoice, int(invoice_id))
+    if not inv:
+        return {"invoice_id": int(invoice_id), "drift": {}, "fixed": False}
+
+    computed = _compute_invoice_totals(db, int(inv.id))
+    stored = _stored_invoice_totals(inv)
+
+    names = ("sub_total", "discount_total", "tax_total", "grand_total",
+             "cgst_total", "sgst_total", "igst_total")
+    drift: Dict[str, str] = {}
+    if stored is None:
+        drift["gst_meta"] = "missing"
+    else:
+        if not _gst_meta_current(inv):
+            drift["gst_meta"] = "stale"
+        for name, a, b in zip(names, stored, computed):
+            if (_d(a) - _d(b)).quantize(_ZERO6) != 0:
+                drift[name] = _dec_s(_d(a) - _d(b))
+
+    if fix:
+        _write_invoice_totals(inv, computed)
+        db.flush()
+    return {"invoice_id": int(inv.id), "drift": drift, "fixed": bool(fix)}
+
+
+def _recalc_invoice_totals(db: Session, invoice_id: int) -> None:
+    reconcile_invoice_totals(db, int(invoice_id), fix=True)
+
+
+def _apply_line_delta(db: Session, inv: BillingInvoice,
+                      old: Tuple[Decimal, ...],
+                      new: Tuple[Decimal, ...]) -> None:
+    """
+    Incremental totals maintenance for one line change.
+    Locks the invoice row (latest committed totals, no lost updates between
+    two cashiers editing the same invoice), then adds new - old.
+    """
+    db.refresh(inv, attribute_names=list(_TOTAL_ATTRS), with_for_update=True)
+    stored = _stored_invoice_totals(inv)
+    if stored is None or not _gst_meta_current(inv):
+        # no split, or the columns were rewritten by another recalculation
+        reconcile_invoice_totals(db, int(inv.id), fix=True)
+        return
+    _write_invoice_totals(
+        inv, tuple(s + (n - o) for s, o, n in zip(stored, old, new)))
     db.flush()
 
 
 # ============================================================
 # Lines (AUTO idempotent + MANUAL)
 # ============================================================
-def add_auto_line_idempotent(
-    db: Session,
+def build_auto_line(
     *,
-    invoice_id: int,
     billing_case_id: int,
+    invoice_id: int,
     user,
     service_group: ServiceGroup,
     item_type: Optional[str],
@@ -1082,44 +1212,24 @@ def add_auto_line_idempotent(
     is_manual: bool = False,
     manual_reason: Optional[str] = None,
     meta_patch: Optional[Dict[str, Any]] = None,
-) -> Optional[BillingInvoiceLine]:
-    inv = db.get(BillingInvoice, int(invoice_id))
-    if not inv:
-        raise BillingError("Invoice not found")
-
-    if inv.status not in (DocStatus.DRAFT, DocStatus.APPROVED):
-        raise BillingStateError("Cannot add lines to POSTED/VOID invoice")
-
-    # ✅ Idempotency check must match your model's unique key:
-    # Usually (source_module, source_ref_id, source_line_key)
-    existing_any = (db.query(BillingInvoiceLine).filter(
-        BillingInvoiceLine.source_module == str(source_module),
-        BillingInvoiceLine.source_ref_id == int(source_ref_id),
-        BillingInvoiceLine.source_line_key == str(source_line_key),
-    ).order_by(BillingInvoiceLine.id.desc()).first())
-    if existing_any:
-        # collision protection across cases
-        if hasattr(existing_any, "billing_case_id") and int(
-                getattr(existing_any, "billing_case_id")
-                or 0) != int(billing_case_id):
-            raise BillingError(
-                f"Idempotency key collision for source ({source_module},{source_ref_id},{source_line_key}). "
-                f"Existing line belongs to billing_case_id={getattr(existing_any,'billing_case_id',None)}"
-            )
-        if _line_is_removed(existing_any):
-            return None
-        return existing_any
-
+    service_date: Optional[datetime] = None,
+) -> BillingInvoiceLine:
+    """
+    New (unsaved) AUTO line with amounts + GST meta, as add_auto_line_idempotent
+    stores it. Bulk posters add these themselves and refresh invoice totals once.
+    """
     qty = _d(qty)
     unit_price = _d(unit_price)
     gst_rate = _d(gst_rate)
 
-    line_total = qty * unit_price
+    # rounded like the NUMERIC(14,2) columns (same as update_invoice_line),
+    # so the incremental invoice totals add exactly what is stored
+    line_total = _q2(qty * unit_price)
     discount_amount = Decimal("0")
     taxable = max(line_total - discount_amount, Decimal("0"))
-    tax_amount = (taxable *
-                  gst_rate) / Decimal("100") if gst_rate > 0 else Decimal("0")
-    net_amount = taxable + tax_amount
+    tax_amount = _q2((taxable * gst_rate) /
+                     Decimal("100")) if gst_rate > 0 else Decimal("0")
+    net_amount = _q2(taxable + tax_amount)
 
     split_rates = _gst_split(gst_rate, intra_state=intra_state_gst)
     split_amt = _gst_amount_split(tax_amount, split_rates)
@@ -1177,10 +1287,85 @@ def add_auto_line_idempotent(
     )
     if meta_patch:
         _merge_meta(ln, meta_patch)
+    if service_date is not None:
+        ln.service_date = service_date
+    return ln
+
+
+def add_auto_line_idempotent(
+    db: Session,
+    *,
+    invoice_id: int,
+    billing_case_id: int,
+    user,
+    service_group: ServiceGroup,
+    item_type: Optional[str],
+    item_id: Optional[int],
+    item_code: Optional[str] = None,
+    description: str,
+    qty: Decimal,
+    unit_price: Decimal,
+    gst_rate: Decimal,
+    source_module: str,
+    source_ref_id: int,
+    source_line_key: str,
+    doctor_id: Optional[int] = None,
+    intra_state_gst: bool = True,
+    is_manual: bool = False,
+    manual_reason: Optional[str] = None,
+    meta_patch: Optional[Dict[str, Any]] = None,
+) -> Optional[BillingInvoiceLine]:
+    inv = db.get(BillingInvoice, int(invoice_id))
+    if not inv:
+        raise BillingError("Invoice not found")
 
+    if inv.status not in (DocStatus.DRAFT, DocStatus.APPROVED):
+        raise BillingStateError("Cannot add lines to POSTED/VOID invoice")
+
+    # ✅ Idempotency check must match your model's unique key:
+    # Usually (source_module, source_ref_id, source_line_key)
+    existing_any = (db.query(BillingInvoiceLine).filter(
+        BillingInvoiceLine.source_module == str(source_module),
+        BillingInvoiceLine.source_ref_id == int(source_ref_id),
+        BillingInvoiceLine.source_line_key == str(source_line_key),
+    ).order_by(BillingInvoiceLine.id.desc()).first())
+    if existing_any:
+        # collision protection across cases
+        if hasattr(existing_any, "billing_case_id") and int(
+                getattr(existing_any, "billing_case_id")
+                or 0) != int(billing_case_id):
+            raise BillingError(
+                f"Idempotency key collision for source ({source_module},{source_ref_id},{source_line_key}). "
+                f"Existing line belongs to billing_case_id={getattr(existing_any,'billing_case_id',None)}"
+            )
+        if _line_is_removed(existing_any):
+            return None
+        return existing_any
+
+    ln = build_auto_line(
+        billing_case_id=billing_case_id,
+        invoice_id=invoice_id,
+        user=user,
+        service_group=service_group,
+        item_type=item_type,
+        item_id=item_id,
+        item_code=item_code,
+        description=description,
+        qty=qty,
+        unit_price=unit_price,
+        gst_rate=gst_rate,
+        source_module=source_module,
+        source_ref_id=source_ref_id,
+        source_line_key=source_line_key,
+        doctor_id=doctor_id,
+        intra_state_gst=intra_state_gst,
+        is_manual=is_manual,
+        manual_reason=manual_reason,
+        meta_patch=meta_patch,
+    )
     db.add(ln)
     db.flush()
-    _recalc_invoice_totals(db, int(invoice_id))
+    _apply_line_delta(db, inv, _NO_CONTRIBUTION, _line_contribution(ln))
     return ln
 
 
@@ -1263,18 +1448,19 @@ def add_manual_line(
     discount_percent = _d(discount_percent)
     discount_amount = _d(discount_amount)
 
-    line_total = qty * unit_price
+    line_total = _q2(qty * unit_price)
     if discount_amount <= 0 and discount_percent > 0:
         discount_amount = (line_total * discount_percent) / Decimal("100")
     if discount_amount < 0:
         discount_amount = Decimal("0")
     if discount_amount > line_total:
         discount_amount = line_total
+    discount_amount = _q2(discount_amount)
 
     taxable = max(line_total - discount_amount, Decimal("0"))
-    tax_amount = (taxable *
-                  gst_rate) / Decimal("100") if gst_rate > 0 else Decimal("0")
-    net_amount = taxable + tax_amount
+    tax_amount = _q2((taxable * gst_rate) /
+                     Decimal("100")) if gst_rate > 0 else Decimal("0")
+    net_amount = _q2(taxable + tax_amount)
 
     key = f"MNL:{secrets.token_hex(8)}"
 
@@ -1335,7 +1521,7 @@ def add_manual_line(
 
     db.add(ln)
     db.flush()
-    _recalc_invoice_totals(db, int(inv.id))
+    _apply_line_delta(db, inv, _NO_CONTRIBUTION, _line_contribution(ln))
     return ln
 
 
@@ -1388,6 +1574,8 @@ def update_invoice_line(
     if inv.status not in (DocStatus.DRAFT, DocStatus.APPROVED):
         raise BillingStateError("Can edit lines only in DRAFT/APPROVED invoice")
 
+    old_contribution = _line_contribution(ln)
+
     # ✅ apply fields (use is not None, so 0 values work)
     if description is not None:
         ln.description = str(description or "")[:255]
@@ -1470,7 +1658,7 @@ def update_invoice_line(
     _set_if_has(ln, "updated_at", _utcnow_naive())
     db.flush()
 
-    _recalc_invoice_totals(db, int(inv.id))
+    _apply_line_delta(db, inv, old_contribution, _line_contribution(ln))
     _set_if_has(inv, "updated_by", getattr(user, "id", None))
     db.flush()
     return ln
@@ -1499,6 +1687,7 @@ def delete_invoice_line(
         raise BillingStateError(
             "Can delete lines only in DRAFT/APPROVED invoices")
 
+    old_contribution = _line_contribution(ln)
     now = _utcnow_naive()
 
     if hasattr(ln, "is_deleted"):
@@ -1544,7 +1733,7 @@ def delete_invoice_line(
     db.add(ln)
     db.flush()
 
-    _recalc_invoice_totals(db, int(inv.id))
+    _apply_line_delta(db, inv, old_contribution, _line_contribution(ln))
     _set_if_has(inv, "updated_by", getattr(user, "id", None))
     _set_if_has(inv, "updated_at", now)
     db.add(inv)
@@ -2119,8 +2308,6 @@ def ensure_op_visit_consultation_fee(
         },
     )
 
-    _recalc_invoice_totals(db, int(inv.id))
-
     return {
         "billing_case_id": int(case.id),
         "case_number": getattr(case, "case_number", None),
@@ -2501,7 +2688,6 @@ def add_lines_from_lis_order(db: Session, *, invoice_id: int,
             else:
                 added.append(int(ln.id))
 
-        _recalc_invoice_totals(db, int(inv.id))
         return {
             "invoice_id": int(inv.id),
             "lis_order_id": int(lis_order_id),
@@ -2549,7 +2735,6 @@ def add_lines_from_lis_order(db: Session, *, invoice_id: int,
     else:
         added.append(int(ln.id))
 
-    _recalc_invoice_totals(db, int(inv.id))
     return {
         "invoice_id": int(inv.id),
         "lis_order_id": int(lis_order_id),
@@ -2634,7 +2819,6 @@ def add_line_from_ris_order(db: Session, *, invoice_id: int, ris_order_id: int,
             else:
                 added.append(int(ln.id))
 
-        _recalc_invoice_totals(db, int(inv.id))
         return {
             "invoice_id": int(inv.id),
             "ris_order_id": int(ris_order_id),
@@ -2679,7 +2863,6 @@ def add_line_from_ris_order(db: Session, *, invoice_id: int, ris_order_id: int,
 
     added2 = [int(ln.id)] if ln else []
     skipped2 = 0 if ln else 1
-    _recalc_invoice_totals(db, int(inv.id))
     return {
         "invoice_id": int(inv.id),
         "ris_order_id": int(ris_order_id),
@@ -0,0 +1,403 @@
+# FILE: app/services/daily_rollups.py
+"""
+Daily rollups for dashboard / MIS.
+
+The landing dashboard and MIS reports used to aggregate patients, visits,
+admissions, invoices, invoice lines, payments, LIS / RIS orders and
+pharmacy sales over the whole selected range on every load. Closed days
+never change (or change only through a few known flows), so their
+figures are stored once in `daily_rollups` and only the open window
+("today") is aggregated live.
+
+  - refresh_days()   recompute whole days (nightly job / backfill)
+  - touch()          posting hooks: re-aggregate one metric group for the
+                     day a late change landed on (no-op for open days)
+  - RollupReader     read a date range: stored rows for complete closed
+                     days + live aggregates for everything else
+
+A closed day counts as complete once it has a `daily_rollup_days` row;
+until the job has covered it, reads fall back to live aggregation, so
+results never depend on the job having run.
+"""
+from __future__ import annotations
+
+import logging
+from collections import namedtuple
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import delete, func, literal
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.billing import (
+    BillingCase,
+    BillingInvoice,
+    BillingInvoiceLine,
+    BillingPayment,
+    DocStatus,
+)
+from app.models.ipd import IpdAdmission
+from app.models.lis import LisOrder, LisOrderItem
+from app.models.opd import Visit
+from app.models.patient import Patient
+from app.models.pharmacy_prescription import PharmacySale, PharmacySaleItem
+from app.models.ris import RisOrder
+from app.models.rollup import DailyRollup, DailyRollupDay
+
+logger = logging.getLogger(__name__)
+
+DIM_MAX = 191
+# more uncovered gaps than this -> aggregate the closed range live in one go
+_MAX_LIVE_GAPS = 8
+
+Agg = namedtuple("Agg", "count amount qty")
+_ZERO = Agg(0, Decimal("0"), Decimal("0"))
+
+
+# ============================================================
+# Metric definitions
+# ============================================================
+@dataclass(frozen=True)
+class _Metric:
+    name: str
+    group: str                      # touched together by posting hooks
+    source: Any                     # FROM entity
+    ts: Callable[[], Any]           # timestamp column deciding the day
+    count: Callable[[], Any]
+    dim: Optional[Callable[[], Any]] = None
+    amount: Optional[Callable[[], Any]] = None
+    qty: Optional[Callable[[], Any]] = None
+    joins: Tuple[Tuple[Any, Callable[[], Any], bool], ...] = ()   # (target, onclause, outer)
+    filters: Callable[[], Sequence[Any]] = lambda: ()
+
+
+def _posted_dt():
+    # POSTED date is revenue recognition; fallback to created_at (as dashboard)
+    return func.coalesce(BillingInvoice.posted_at, BillingInvoice.created_at)
+
+
+def _posted():
+    return (BillingInvoice.status == DocStatus.POSTED,)
+
+
+def _pharmacy_finalized():
+    return (func.lower(func.coalesce(PharmacySale.invoice_status, "")) == "finalized",)
+
+
+def _pharmacy_not_cancelled():
+    return (PharmacySale.invoice_status != "CANCELLED",)
+
+
+_INVOICE_JOIN = ((BillingInvoice, lambda: BillingInvoiceLine.invoice_id == BillingInvoice.id, False),)
+_SALE_JOIN = ((PharmacySale, lambda: PharmacySaleItem.sale_id == PharmacySale.id, False),)
+
+_METRIC_LIST: Tuple[_Metric, ...] = (
+    _Metric("patients.registered", "patients", Patient,
+            ts=lambda: Patient.created_at, count=lambda: Patient.id),
+    _Metric("opd.visits", "opd", Visit,
+            ts=lambda: Visit.visit_at, count=lambda: Visit.id),
+    _Metric("ipd.admissions", "ipd", IpdAdmission,
+            ts=lambda: IpdAdmission.admitted_at, count=lambda: IpdAdmission.id),
+    # billed (POSTED invoices) by encounter type
+    _Metric("billing.billed", "billing", BillingInvoice,
+            ts=_posted_dt, count=lambda: BillingInvoice.id,
+            dim=lambda: BillingCase.encounter_type,
+            amount=lambda: BillingInvoice.grand_total,
+            joins=((BillingCase, lambda: BillingInvoice.billing_case_id == BillingCase.id, True),),
+            filters=_posted),
+    # billed lines by service group / doctor
+    _Metric("billing.stream", "billing", BillingInvoiceLine,
+            ts=_posted_dt, count=lambda: BillingInvoiceLine.id,
+            dim=lambda: BillingInvoiceLine.service_group,
+            amount=lambda: BillingInvoiceLine.net_amount,
+            joins=_INVOICE_JOIN, filters=_posted),
+    _Metric("billing.doctor", "billing", BillingInvoiceLine,
+            ts=_posted_dt, count=lambda: BillingInvoiceLine.id,
+            dim=lambda: BillingInvoiceLine.doctor_id,
+            amount=lambda: BillingInvoiceLine.net_amount,
+            joins=_INVOICE_JOIN,
+            filters=lambda: _posted() + (BillingInvoiceLine.doctor_id.isnot(None),)),
+    # collections by payment mode
+    _Metric("billing.collected", "payments", BillingPayment,
+            ts=lambda: BillingPayment.received_at, count=lambda: BillingPayment.id,
+            dim=lambda: BillingPayment.mode,
+            amount=lambda: BillingPayment.amount),
+    _Metric("lab.tests", "lab", LisOrderItem,
+            ts=lambda: LisOrder.created_at, count=lambda: LisOrderItem.id,
+            dim=lambda: LisOrderItem.test_name,
+            joins=((LisOrder, lambda: LisOrderItem.order_id == LisOrder.id, False),),
+            filters=lambda: (LisOrder.status != "cancelled",)),
+    _Metric("ris.tests", "ris", RisOrder,
+            ts=lambda: RisOrder.created_at, count=lambda: RisOrder.id,
+            dim=lambda: RisOrder.test_name,
+            filters=lambda: (RisOrder.status != "cancelled",)),
+    # dispensed medicines (dashboard: finalized bills by bill time)
+    _Metric("pharmacy.medicines", "pharmacy", PharmacySaleItem,
+            ts=lambda: PharmacySale.bill_datetime, count=lambda: PharmacySaleItem.id,
+            dim=lambda: PharmacySaleItem.item_name,
+            amount=lambda: PharmacySaleItem.total_amount,
+            qty=lambda: PharmacySaleItem.quantity,
+            joins=_SALE_JOIN, filters=_pharmacy_finalized),
+    # pharmacy sales (MIS: non-cancelled bills by created_at)
+    _Metric("pharmacy.sales", "pharmacy", PharmacySale,
+            ts=lambda: PharmacySale.created_at, count=lambda: PharmacySale.id,
+            amount=lambda: PharmacySale.net_amount,
+            filters=_pharmacy_not_cancelled),
+    _Metric("pharmacy.sold_items", "pharmacy", PharmacySaleItem,
+            ts=lambda: PharmacySale.created_at, count=lambda: PharmacySaleItem.id,
+            dim=lambda: PharmacySaleItem.item_name,
+            amount=lambda: PharmacySaleItem.total_amount,
+            qty=lambda: PharmacySaleItem.quantity,
+            joins=_SALE_JOIN, filters=_pharmacy_not_cancelled),
+)
+
+METRICS: Dict[str, _Metric] = {m.name: m for m in _METRIC_LIST}
+
+
+# ============================================================
+# Helpers
+# ============================================================
+def live_from() -> date:
+    """
+    First day that is still open. Timestamps are stored naive (some UTC,
+    some server-local), so a day is closed only once both clocks passed it.
+    """
+    return min(date.today(), datetime.utcnow().date())
+
+
+def _day_range(d_from: date, d_to: date) -> Tuple[datetime, datetime]:
+    return datetime.combine(d_from, time.min), datetime.combine(d_to + timedelta(days=1), time.min)
+
+
+def _as_date(v: Any) -> Optional[date]:
+    if isinstance(v, datetime):
+        return v.date()
+    if v is None or isinstance(v, date):
+        return v
+    return date.fromisoformat(str(v)[:10])  # SQLite DATE() returns text
+
+
+def _dim_key(v: Any) -> str:
+    v = getattr(v, "value", v)
+    return "" if v is None else str(v)[:DIM_MAX]
+
+
+def _dec(v: Any) -> Decimal:
+    return v if isinstance(v, Decimal) else Decimal(str(v or 0))
+
+
+def _add(a: Agg, count: Any, amount: Any, qty: Any) -> Agg:
+    return Agg(a.count + int(count or 0), a.amount + _dec(amount), a.qty + _dec(qty))
+
+
+def _aggregate(db: Session, m: _Metric, d_from: date, d_to: date, *, by_day: bool) -> List[Tuple]:
+    """(day | None, dim, count, amount, qty) straight from the source tables."""
+    start_dt, end_dt = _day_range(d_from, d_to)
+    ts = m.ts()
+    day_c = func.date(ts)
+    dim_c = m.dim() if m.dim else None
+    cols = [
+        (day_c if by_day else literal(None)).label("day"),
+        (dim_c if dim_c is not None else literal("")).label("dim"),
+        func.count(m.count()).label("cnt"),
+        (func.coalesce(func.sum(m.amount()), 0) if m.amount else literal(0)).label("amt"),
+        (func.coalesce(func.sum(m.qty()), 0) if m.qty else literal(0)).label("qty"),
+    ]
+    q = db.query(*cols).select_from(m.source)
+    for target, onclause, outer in m.joins:
+        q = q.outerjoin(target, onclause()) if outer else q.join(target, onclause())
+    q = q.filter(ts >= start_dt, ts < end_dt, *m.filters())
+    group = ([day_c] if by_day else []) + ([dim_c] if dim_c is not None else [])
+    if group:
+        q = q.group_by(*group)
+    return [(_as_date(r.day) if by_day else None, _dim_key(r.dim), r.cnt, r.amt, r.qty) for r in q.all()]
+
+
+def _metric(name: str) -> _Metric:
+    m = METRICS.get(name)
+    if m is None:
+        raise KeyError(f"Unknown rollup metric: {name}")
+    return m
+
+
+# ============================================================
+# Writing
+# ============================================================
+def _write_metric_days(db: Session, m: _Metric, d_from: date, d_to: date) -> int:
+    merged: Dict[Tuple[date, str], Agg] = {}
+    for day, dim, cnt, amt, qty in _aggregate(db, m, d_from, d_to, by_day=True):
+        if day is None:
+            continue
+        merged[(day, dim)] = _add(merged.get((day, dim), _ZERO), cnt, amt, qty)
+
+    db.execute(delete(DailyRollup).where(
+        DailyRollup.metric == m.name,
+        DailyRollup.day >= d_from,
+        DailyRollup.day <= d_to,
+    ))
+    if merged:
+        db.execute(DailyRollup.__table__.insert(), [
+            {"day": day, "metric": m.name, "dim": dim,
+             "count": a.count, "amount": a.amount, "qty": a.qty}
+            for (day, dim), a in merged.items()
+        ])
+    return len(merged)
+
+
+def refresh_days(db: Session, d_from: date, d_to: date, *,
+                 metrics: Optional[Iterable[str]] = None) -> int:
+    """
+    Recompute closed days in [d_from, d_to] (open days are skipped) and
+    mark them complete when every metric was refreshed. One grouped query
+    per metric for the whole range. Caller commits. Returns rows written.
+    """
+    d_to = min(d_to, live_from() - timedelta(days=1))
+    if d_to < d_from:
+        return 0
+    names = list(metrics) if metrics is not None else list(METRICS)
+    rows = 0
+    for name in names:
+        rows += _write_metric_days(db, _metric(name), d_from, d_to)
+
+    if metrics is None:
+        db.execute(delete(DailyRollupDay).where(DailyRollupDay.day >= d_from, DailyRollupDay.day <= d_to))
+        now = datetime.utcnow()
+        db.execute(DailyRollupDay.__table__.insert(), [
+            {"day": d_from + timedelta(days=i), "refreshed_at": now}
+            for i in range((d_to - d_from).days + 1)
+        ])
+    db.flush()
+    return rows
+
+
+def refresh_recent(db: Session, days: Optional[int] = None) -> int:
+    """Nightly job: refresh the last `days` closed days (late writes land here)."""
+    n = max(1, int(days or getattr(settings, "DAILY_ROLLUP_REFRESH_DAYS", 3) or 1))
+    last = live_from() - timedelta(days=1)
+    return refresh_days(db, last - timedelta(days=n - 1), last)
+
+
+def touch(db: Session, when: Union[date, datetime, None], group: str) -> None:
+    """
+    Posting hook: a change affecting `group` metrics landed on `when`.
+    Re-aggregates that day if it is closed and already rolled up; open
+    days are read live anyway. Never fails the caller's transaction.
+    """
+    if when is None or not isinstance(when, (date, datetime)):
+        return
+    day = _as_date(when)
+    if day >= live_from():
+        return
+    try:
+        with db.begin_nested():
+            if db.get(DailyRollupDay, day) is None:
+                return
+            for m in _METRIC_LIST:
+                if m.group == group:
+                    _write_metric_days(db, m, day, day)
+    except Exception:
+        logger.warning("daily rollup refresh failed for %s %s", group, day, exc_info=True)
+
+
+# ============================================================
+# Reading
+# ============================================================
+class RollupReader:
+    """
+    Reads metrics for [d_from, d_to]: complete closed days from
+    daily_rollups, uncovered closed days and the open window live.
+    Coverage is looked up once per reader.
+    """
+
+    def __init__(self, db: Session, d_from: date, d_to: date):
+        if d_to < d_from:
+            d_from, d_to = d_to, d_from
+        self.db = db
+        self.d_from = d_from
+        self.d_to = d_to
+        self.live_start = max(d_from, live_from())
+        closed_to = min(d_to, live_from() - timedelta(days=1))
+        self.closed = (d_from, closed_to) if closed_to >= d_from else None
+        self._gaps: List[Tuple[date, date]] = []
+        self._use_rollups = False
+        if self.closed:
+            self._plan_closed(*self.closed)
+
+    def _plan_closed(self, a: date, b: date) -> None:
+        covered = {
+            _as_date(r[0]) for r in self.db.query(DailyRollupDay.day)
+            .filter(DailyRollupDay.day >= a, DailyRollupDay.day <= b).all()
+        }
+        gaps: List[Tuple[date, date]] = []
+        d = a
+        while d <= b:
+            if d not in covered:
+                g0 = d
+                while d + timedelta(days=1) <= b and (d + timedelta(days=1)) not in covered:
+                    d += timedelta(days=1)
+                gaps.append((g0, d))
+            d += timedelta(days=1)
+        if not covered or len(gaps) > _MAX_LIVE_GAPS:
+            self._gaps = [(a, b)]
+            self._use_rollups = False
+        else:
+            self._gaps = gaps
+            self._use_rollups = True
+
+    def _live_ranges(self) -> List[Tuple[date, date]]:
+        ranges = list(self._gaps)
+        if self.live_start <= self.d_to:
+            ranges.append((self.live_start, self.d_to))
+        return ranges
+
+    def _stored(self, m: _Metric, *, by_day: bool) -> List[Tuple]:
+        if not self._use_rollups:
+            return []
+        a, b = self.closed
+        day_c = DailyRollup.day
+        cols = [
+            (day_c if by_day else literal(None)).label("day"),
+            DailyRollup.dim.label("dim"),
+            func.sum(DailyRollup.count).label("cnt"),
+            func.sum(DailyRollup.amount).label("amt"),
+            func.sum(DailyRollup.qty).label("qty"),
+        ]
+        q = (self.db.query(*cols)
+             .join(DailyRollupDay, DailyRollupDay.day == DailyRollup.day)
+             .filter(DailyRollup.metric == m.name, DailyRollup.day >= a, DailyRollup.day <= b))
+        q = q.group_by(day_c, DailyRollup.dim) if by_day else q.group_by(DailyRollup.dim)
+        return [(_as_date(r.day) if by_day else None, r.dim, r.cnt, r.amt, r.qty) for r in q.all()]
+
+    def _rows(self, name: str, *, by_day: bool) -> List[Tuple]:
+        m = _metric(name)
+        rows = self._stored(m, by_day=by_day)
+        for a, b in self._live_ranges():
+            rows.extend(_aggregate(self.db, m, a, b, by_day=by_day))
+        return rows
+
+    def by_dim(self, name: str) -> Dict[str, Agg]:
+        out: Dict[str, Agg] = {}
+        for _day, dim, cnt, amt, qty in self._rows(name, by_day=False):
+            out[dim] = _add(out.get(dim, _ZERO), cnt, amt, qty)
+        return out
+
+    def total(self, name: str) -> Agg:
+        out = _ZERO
+        for a in self.by_dim(name).values():
+            out = _add(out, a.count, a.amount, a.qty)
+        return out
+
+    def by_day(self, name: str) -> Dict[date, Agg]:
+        out: Dict[date, Agg] = {}
+        for day, _dim, cnt, amt, qty in self._rows(name, by_day=True):
+            if day is not None:
+                out[day] = _add(out.get(day, _ZERO), cnt, amt, qty)
+        return out
+
+    def top(self, name: str, n: int, *, key: str = "count") -> List[Tuple[str, Agg]]:
+        items = [(d, a) for d, a in self.by_dim(name).items() if getattr(a, key)]
+        items.sort(key=lambda kv: getattr(kv[1], key), reverse=True)
+        return items[:n]
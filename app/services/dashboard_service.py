@@ -1,26 +1,24 @@
 # FILE: app/services/dashboard_service.py
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import date, datetime, time, timedelta
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Callable, Dict, Iterable, List, Tuple, Any, Optional
 
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func
 
+from app.core.config import settings
+from app.core.rbac import compiled_perms
 from app.models.user import User
-from app.models.patient import Patient
-from app.models.opd import Appointment, Visit
+from app.models.opd import Appointment
 from app.models.ipd import IpdAdmission, IpdBed
 
-from app.models.pharmacy_prescription import PharmacySale, PharmacySaleItem
-from app.models.lis import LisOrder, LisOrderItem
-from app.models.ris import RisOrder
-
 # ✅ USE YOUR BILLING MODELS (not old Invoice/Payment)
 from app.models.billing import (
-    BillingCase,
     BillingInvoice,
-    BillingInvoiceLine,
     BillingPayment,
     EncounterType,
     DocStatus,
@@ -28,6 +26,7 @@ from app.models.billing import (
 )
 
 from app.schemas.dashboard import DashboardDataResponse, DashboardWidget
+from app.services.daily_rollups import RollupReader
 
 
 # ---------- Helpers: time range ----------
@@ -65,15 +64,8 @@ def _get_role_for_dashboard(user: User) -> str:
     if getattr(user, "is_admin", False):
         return "admin"
 
-    perm_codes = set()
-    for role in getattr(user, "roles", []) or []:
-        for p in getattr(role, "permissions", []) or []:
-            code = getattr(p, "code", None)
-            if code:
-                perm_codes.add(code)
-
-    def has(prefix: str) -> bool:
-        return any(c.startswith(prefix) for c in perm_codes)
+    perms = compiled_perms(user)
+    has = perms.has_prefix
 
     if has("pharmacy."):
         return "pharmacy"
@@ -94,13 +86,7 @@ def _get_role_for_dashboard(user: User) -> str:
 def _collect_perm_codes(user: User) -> set[str]:
     if getattr(user, "is_admin", False):
         return {"*"}
-    codes: set[str] = set()
-    for role in getattr(user, "roles", []) or []:
-        for p in getattr(role, "permissions", []) or []:
-            code = getattr(p, "code", None)
-            if code:
-                codes.add(code)
-    return codes
+    return set(compiled_perms(user).codes)
 
 
 def _build_capabilities(user: User) -> Dict[str, bool]:
@@ -116,12 +102,7 @@ def _build_capabilities(user: User) -> Dict[str, bool]:
             "can_billing": True,
         }
 
-    codes = _collect_perm_codes(user)
-
-    def has(prefix: str) -> bool:
-        if "*" in codes:
-            return True
-        return any(c.startswith(prefix) for c in codes)
+    has = compiled_perms(user).has_prefix
 
     can_opd = has("opd.") or has("appointments.") or has("visits.")
     can_ipd = has("ipd.") or has("ipd.beds.") or has("ipd.packages.")
@@ -145,204 +126,245 @@ def _build_capabilities(user: User) -> Dict[str, bool]:
     }
 
 
-def _filter_widgets_by_perm(widgets: List[DashboardWidget],
-                            caps: Dict[str, bool]) -> List[DashboardWidget]:
-    out: List[DashboardWidget] = []
-
-    for w in widgets:
-        code = w.code
-
-        # PATIENTS
-        if code.startswith("metric_new_patients") and not caps.get(
-                "can_patients", False):
-            continue
+@dataclass(frozen=True)
+class DashboardWidgetDef:
+    """
+    One dashboard tile. `build` runs only when the user holds one of
+    `caps` (empty = everyone) and the tile was requested. `sources` are
+    shared data producers (see _SOURCES) computed once per task.
+    """
+    code: str
+    build: Callable[["_WidgetContext"], DashboardWidget]
+    caps: Tuple[str, ...] = ()
+    sources: Tuple[str, ...] = ()
 
-        # OPD
-        if code in {"metric_opd_visits", "appointment_status"
-                    } and not caps.get("can_opd", False):
-            continue
 
-        if code == "patient_flow" and not (caps.get("can_opd")
-                                           or caps.get("can_ipd")
-                                           or caps.get("can_patients")):
-            continue
+@dataclass(frozen=True)
+class _SourceDef:
+    fn: Callable[["_WidgetContext"], Any]
+    deps: Tuple[str, ...] = ()
 
-        # IPD
-        if code in {
-                "metric_ipd_admissions", "ipd_bed_occupancy", "ipd_status",
-                "recent_ipd_admissions"
-        } and not caps.get("can_ipd", False):
-            continue
 
-        # PHARMACY
-        if code in {"top_medicines"} and not caps.get("can_pharmacy", False):
-            continue
+class _WidgetContext:
+    """
+    State for one group of widgets evaluated on one session: the period,
+    a RollupReader (created on first use) and memoized data sources.
+    """
 
-        # LAB
-        if code in {"top_lab_tests"} and not caps.get("can_lab", False):
-            continue
+    def __init__(self, db: Session, date_from: date, date_to: date):
+        self.db = db
+        self.date_from = date_from
+        self.date_to = date_to
+        self.start_dt, self.end_dt = _dt_range(date_from, date_to)
+        self._rollups: Optional[RollupReader] = None
+        self._data: Dict[str, Any] = {}
+
+    @property
+    def rollups(self) -> RollupReader:
+        # closed days from daily_rollups, today live (see daily_rollups)
+        if self._rollups is None:
+            self._rollups = RollupReader(self.db, self.date_from, self.date_to)
+        return self._rollups
+
+    def need(self, name: str) -> Any:
+        if name not in self._data:
+            self._data[name] = _SOURCES[name].fn(self)
+        return self._data[name]
+
+
+def _allowed(defn: DashboardWidgetDef, caps: Dict[str, bool]) -> bool:
+    return not defn.caps or any(caps.get(c, False) for c in defn.caps)
+
+
+def _source_closure(names: Iterable[str]) -> set[str]:
+    out: set[str] = set()
+    stack = list(names)
+    while stack:
+        n = stack.pop()
+        if n not in out:
+            out.add(n)
+            stack.extend(_SOURCES[n].deps)
+    return out
 
-        # RADIOLOGY
-        if code in {"top_radiology_tests"
-                    } and not caps.get("can_radiology", False):
-            continue
 
-        # BILLING (Revenue/Collections)
-        if code.startswith("rev_") and not caps.get("can_billing", False):
-            continue
-        if code in {"payment_modes", "billing_summary"
-                    } and not caps.get("can_billing", False):
-            continue
+def _plan_tasks(defs: List[DashboardWidgetDef],
+                n_tasks: int) -> List[List[DashboardWidgetDef]]:
+    """
+    Split widgets into at most `n_tasks` tasks. Widgets sharing a data
+    source stay in one task so every source is computed once; groups are
+    then packed largest-first into the least loaded task.
+    """
+    groups: List[Tuple[set[str], List[DashboardWidgetDef]]] = []
+    for d in defs:
+        srcs = _source_closure(d.sources)
+        hit = [g for g in groups if srcs and g[0] & srcs]
+        merged_srcs, merged_defs = set(srcs), []
+        for g in hit:
+            merged_srcs |= g[0]
+            merged_defs.extend(g[1])
+            groups.remove(g)
+        merged_defs.append(d)
+        groups.append((merged_srcs, merged_defs))
+
+    tasks: List[List[DashboardWidgetDef]] = [[] for _ in range(max(1, min(n_tasks, len(groups))))]
+    for _srcs, g in sorted(groups, key=lambda g: len(g[1]), reverse=True):
+        min(tasks, key=len).extend(g)
+    return [t for t in tasks if t]
+
+
+def _run_task(db: Session, date_from: date, date_to: date,
+              defs: List[DashboardWidgetDef]) -> Dict[str, DashboardWidget]:
+    ctx = _WidgetContext(db, date_from, date_to)
+    return {d.code: d.build(ctx) for d in defs}
+
+
+def _run_task_own_session(bind: Engine, date_from: date, date_to: date,
+                          defs: List[DashboardWidgetDef]
+                          ) -> Dict[str, DashboardWidget]:
+    db = Session(bind=bind, autoflush=False, future=True)
+    try:
+        return _run_task(db, date_from, date_to, defs)
+    finally:
+        db.rollback()
+        db.close()
 
-        out.append(w)
 
-    return out
+def _parallel_bind(db: Session) -> Optional[Engine]:
+    """Engine usable from other threads, or None (run serially)."""
+    bind = db.get_bind()
+    if not isinstance(bind, Engine):
+        return None
+    if bind.dialect.name == "sqlite" and bind.url.database in (None, "", ":memory:"):
+        return None  # every connection would see its own empty DB
+    return bind
 
 
 # ---------- Core builder ----------
-def build_dashboard_for_user(db: Session, user: User, date_from: date,
-                             date_to: date) -> DashboardDataResponse:
-    start_dt, end_dt = _dt_range(date_from, date_to)
+def build_dashboard_for_user(db: Session,
+                             user: User,
+                             date_from: date,
+                             date_to: date,
+                             widgets: Optional[Iterable[str]] = None,
+                             workers: Optional[int] = None
+                             ) -> DashboardDataResponse:
+    """
+    Builds the widgets `user` may see (all of them, or the requested
+    `widgets` codes; unknown codes are ignored). Only permitted widgets
+    and the data sources they need are evaluated.
+
+    With more than one worker, independent widget groups run on their own
+    sessions / connections in parallel; the first group uses `db`.
+    """
     role = _get_role_for_dashboard(user)
     caps = _build_capabilities(user)
 
-    widgets: List[DashboardWidget] = []
-
-    widgets.extend(_build_patient_and_visit_metrics(db, start_dt, end_dt))
-
-    revenue_data = _build_revenue_metrics_v2(db, start_dt, end_dt)
-    widgets.extend(revenue_data["widgets"])
-
-    # (keep your existing ops widgets)
-    widgets.append(_build_ipd_bed_occupancy_widget(db))
-    widgets.append(_build_top_medicines_widget(db, start_dt, end_dt))
-    widgets.append(_build_patient_flow_chart(db, date_to))
-    widgets.append(_build_revenue_stream_chart(revenue_data["streams"]))
-    widgets.append(_build_revenue_doctor_chart(revenue_data["top_doctors"]))
-    widgets.append(_build_recent_admissions_widget(db))
-    widgets.append(_build_appointment_status_widget(db, date_from, date_to))
-    widgets.append(_build_ipd_status_widget(db, start_dt, end_dt))
-    widgets.append(_build_payment_mode_widget_v2(db, start_dt, end_dt))
-    lab_widget, ris_widget = _build_top_tests_widgets(db, start_dt, end_dt)
-    widgets.append(lab_widget)
-    widgets.append(ris_widget)
-    widgets.append(_build_billing_summary_widget_v2(db, start_dt, end_dt))
-
-    widgets = _filter_widgets_by_perm(widgets, caps)
+    available = [d for d in _WIDGETS if _allowed(d, caps)]
+    if widgets is not None:
+        wanted = {w.strip() for w in widgets if w and w.strip()}
+        selected = [d for d in available if d.code in wanted]
+    else:
+        selected = available
+
+    n_workers = settings.DASHBOARD_WIDGET_WORKERS if workers is None else workers
+    bind = _parallel_bind(db) if n_workers > 1 else None
+    tasks = _plan_tasks(selected, n_workers if bind is not None else 1)
+
+    built: Dict[str, DashboardWidget] = {}
+    if len(tasks) == 1:
+        built.update(_run_task(db, date_from, date_to, tasks[0]))
+    elif tasks:
+        # Threads of this request only: a slow widget on one tenant never
+        # queues another user's dashboard. The request session takes the
+        # first (largest) task, each other task holds one pooled connection.
+        with ThreadPoolExecutor(max_workers=len(tasks) - 1,
+                                thread_name_prefix="dashboard") as pool:
+            futures = [
+                pool.submit(_run_task_own_session, bind, date_from, date_to, defs)
+                for defs in tasks[1:]
+            ]
+            built.update(_run_task(db, date_from, date_to, tasks[0]))
+            for fut in futures:
+                built.update(fut.result())
 
     return DashboardDataResponse(
         role=role,
         date_from=date_from,
         date_to=date_to,
-        filters={"caps": caps},
-        widgets=widgets,
+        filters={
+            "caps": caps,
+            "available_widgets": [d.code for d in available],
+        },
+        widgets=[built[d.code] for d in selected],
     )
 
 
 # ---------- Widgets ----------
-def _build_patient_and_visit_metrics(
-        db: Session, start_dt: datetime,
-        end_dt: datetime) -> List[DashboardWidget]:
-    total_patients = db.query(func.count(Patient.id)).filter(
-        Patient.created_at >= start_dt, Patient.created_at
-        < end_dt).scalar() or 0
-    opd_visits = db.query(func.count(Visit.id)).filter(
-        Visit.visit_at >= start_dt, Visit.visit_at < end_dt).scalar() or 0
-    ipd_admissions = db.query(func.count(IpdAdmission.id)).filter(
-        IpdAdmission.admitted_at >= start_dt, IpdAdmission.admitted_at
-        < end_dt).scalar() or 0
-
-    return [
-        DashboardWidget(
-            code="metric_new_patients",
-            title="New Patients",
-            widget_type="metric",
-            description="Patients registered in selected period",
-            data=int(total_patients),
-        ),
-        DashboardWidget(
-            code="metric_opd_visits",
-            title="OPD Visits",
-            widget_type="metric",
-            description="OPD visits completed in selected period",
-            data=int(opd_visits),
-        ),
-        DashboardWidget(
-            code="metric_ipd_admissions",
-            title="IPD Admissions",
-            widget_type="metric",
-            description="IPD admissions in selected period",
-            data=int(ipd_admissions),
-        ),
-    ]
+def _build_new_patients_widget(rollups: RollupReader) -> DashboardWidget:
+    return DashboardWidget(
+        code="metric_new_patients",
+        title="New Patients",
+        widget_type="metric",
+        description="Patients registered in selected period",
+        data=int(rollups.total("patients.registered").count),
+    )
 
 
-def _build_revenue_metrics_v2(db: Session, start_dt: datetime,
-                              end_dt: datetime) -> Dict[str, Any]:
-    """
-    ✅ Correct revenue engine for your schema.
-
-    Revenue recognition:
-      - Billed Revenue = POSTED invoices (posted_at in date range)
-      - Collections    = payments received (received_at in date range)
-      - Outstanding(A/R) = sum(invoice.grand_total - paid_to_date) as of end_dt
-    Breakdown:
-      - OP vs IP by BillingCase.encounter_type
-      - Stream by BillingInvoiceLine.service_group
-      - Doctor-wise by BillingInvoiceLine.doctor_id
-    """
+def _build_opd_visits_widget(rollups: RollupReader) -> DashboardWidget:
+    return DashboardWidget(
+        code="metric_opd_visits",
+        title="OPD Visits",
+        widget_type="metric",
+        description="OPD visits completed in selected period",
+        data=int(rollups.total("opd.visits").count),
+    )
+
+
+def _build_ipd_admissions_widget(rollups: RollupReader) -> DashboardWidget:
+    return DashboardWidget(
+        code="metric_ipd_admissions",
+        title="IPD Admissions",
+        widget_type="metric",
+        description="IPD admissions in selected period",
+        data=int(rollups.total("ipd.admissions").count),
+    )
 
-    posted_dt = _invoice_posted_dt_expr()
 
-    # ----------------------------
-    # Billed (POSTED) - Total
-    # ----------------------------
-    billed_total = db.query(
-        func.coalesce(func.sum(BillingInvoice.grand_total), 0)).filter(
-            BillingInvoice.status == DocStatus.POSTED,
-            posted_dt >= start_dt,
-            posted_dt < end_dt,
-        ).scalar() or 0
-
-    # ----------------------------
-    # OP/IP billed using BillingCase.encounter_type
-    # ----------------------------
+# ---------- Revenue data sources ----------
+# Revenue recognition:
+#   - Billed Revenue = POSTED invoices (posted_at in date range)
+#   - Collections    = payments received (received_at in date range)
+#   - Outstanding(A/R) = sum(invoice.grand_total - paid_to_date) as of end_dt
+# Breakdown:
+#   - OP vs IP by BillingCase.encounter_type
+#   - Stream by BillingInvoiceLine.service_group
+#   - Doctor-wise by BillingInvoiceLine.doctor_id
+# Billed / collected / streams / doctors come from daily rollups;
+# outstanding is an as-of figure and stays live.
+def _billed_source(ctx: _WidgetContext) -> Dict[str, float]:
+    billed_by_enc = ctx.rollups.by_dim("billing.billed")
+
     def _billed_by_encounter(enc: EncounterType) -> float:
-        return _safe_scalar(
-            db.query(func.coalesce(func.sum(
-                BillingInvoice.grand_total), 0)).join(
-                    BillingCase,
-                    BillingInvoice.billing_case_id == BillingCase.id).filter(
-                        BillingInvoice.status == DocStatus.POSTED,
-                        posted_dt >= start_dt,
-                        posted_dt < end_dt,
-                        BillingCase.encounter_type == enc,
-                    ).scalar())
-
-    billed_op = _billed_by_encounter(EncounterType.OP)
-    billed_ip = _billed_by_encounter(EncounterType.IP)
-
-    # ----------------------------
-    # Stream-wise billed using invoice lines (more accurate split)
-    # ----------------------------
+        agg = billed_by_enc.get(enc.value)
+        return _safe_scalar(agg.amount if agg else 0)
+
+    return {
+        "total": _safe_scalar(sum((a.amount for a in billed_by_enc.values()), 0)),
+        "op": _billed_by_encounter(EncounterType.OP),
+        "ip": _billed_by_encounter(EncounterType.IP),
+    }
+
+
+def _streams_source(ctx: _WidgetContext) -> Dict[str, float]:
+    """Stream-wise billed using invoice lines (more accurate split)."""
+    billed = ctx.need("billed")
     sg_lab = _sg("LAB")
     sg_rad = _sg("RAD", "RADIOLOGY")
     sg_pharm = _sg("PHARM", "PHARMACY")
     sg_ot = _sg("OT")
 
-    sg_rows = (db.query(
-        BillingInvoiceLine.service_group.label("sg"),
-        func.coalesce(func.sum(BillingInvoiceLine.net_amount), 0).label("amt"),
-    ).join(BillingInvoice,
-           BillingInvoiceLine.invoice_id == BillingInvoice.id).filter(
-               BillingInvoice.status == DocStatus.POSTED,
-               posted_dt >= start_dt,
-               posted_dt < end_dt,
-           ).group_by(BillingInvoiceLine.service_group).all())
-
     streams: Dict[str, float] = {
-        "op": _safe_scalar(billed_op),
-        "ip": _safe_scalar(billed_ip),
+        "op": billed["op"],
+        "ip": billed["ip"],
         "lab": 0.0,
         "radiology": 0.0,
         "pharmacy": 0.0,
@@ -350,34 +372,35 @@ def _build_revenue_metrics_v2(db: Session, start_dt: datetime,
         "misc": 0.0,
     }
 
-    # map enum -> labels
-    for r in sg_rows:
-        sg = r.sg
-        amt = _safe_scalar(r.amt)
-        if sg_lab is not None and sg == sg_lab:
+    # map enum -> labels (rollup dims hold the enum value)
+    for sg, agg in ctx.rollups.by_dim("billing.stream").items():
+        amt = _safe_scalar(agg.amount)
+        if sg_lab is not None and sg == sg_lab.value:
             streams["lab"] += amt
-        elif sg_rad is not None and sg == sg_rad:
+        elif sg_rad is not None and sg == sg_rad.value:
             streams["radiology"] += amt
-        elif sg_pharm is not None and sg == sg_pharm:
+        elif sg_pharm is not None and sg == sg_pharm.value:
             streams["pharmacy"] += amt
-        elif sg_ot is not None and sg == sg_ot:
+        elif sg_ot is not None and sg == sg_ot.value:
             streams["ot"] += amt
         else:
             streams["misc"] += amt
+    return streams
+
+
+def _collections_source(ctx: _WidgetContext) -> Dict[str, Any]:
+    """Payments received in range, by mode."""
+    return ctx.rollups.by_dim("billing.collected")
+
+
+def _outstanding_source(ctx: _WidgetContext) -> float:
+    """
+    Outstanding (A/R) as of end_dt: invoices posted before end_dt minus
+    payments received before end_dt.
+    """
+    db, end_dt = ctx.db, ctx.end_dt
+    posted_dt = _invoice_posted_dt_expr()
 
-    # ----------------------------
-    # Collections (payments received) - date range
-    # ----------------------------
-    collected_total = db.query(
-        func.coalesce(func.sum(BillingPayment.amount), 0)).filter(
-            BillingPayment.received_at >= start_dt,
-            BillingPayment.received_at < end_dt,
-        ).scalar() or 0
-
-    # ----------------------------
-    # Outstanding (A/R) as of end_dt
-    # invoices posted before end_dt minus payments received before end_dt
-    # ----------------------------
     paid_sq = (db.query(
         BillingPayment.invoice_id.label("invoice_id"),
         func.coalesce(func.sum(BillingPayment.amount), 0).label("paid"),
@@ -395,24 +418,17 @@ def _build_revenue_metrics_v2(db: Session, start_dt: datetime,
                              BillingInvoice.status == DocStatus.POSTED,
                              posted_dt < end_dt,
                          ).scalar() or 0
+    return _safe_scalar(outstanding_total)
 
-    # ----------------------------
-    # Doctor-wise revenue (Top 10) for POSTED invoices in range
-    # ----------------------------
-    doc_rows = (db.query(
-        BillingInvoiceLine.doctor_id.label("doctor_id"),
-        func.coalesce(func.sum(BillingInvoiceLine.net_amount), 0).label("amt"),
-    ).join(BillingInvoice,
-           BillingInvoiceLine.invoice_id == BillingInvoice.id).filter(
-               BillingInvoice.status == DocStatus.POSTED,
-               posted_dt >= start_dt,
-               posted_dt < end_dt,
-               BillingInvoiceLine.doctor_id.isnot(None),
-           ).group_by(BillingInvoiceLine.doctor_id).order_by(
-               desc("amt")).limit(10).all())
-
-    doctor_ids = [int(r.doctor_id) for r in doc_rows if r.doctor_id]
-    users = db.query(User).filter(
+
+def _top_doctors_source(ctx: _WidgetContext) -> List[Dict[str, Any]]:
+    """Doctor-wise revenue (Top 10) for POSTED invoices in range."""
+    doc_rows = [(int(dim), agg.amount)
+                for dim, agg in ctx.rollups.top("billing.doctor", 10, key="amount")
+                if dim.isdigit()]
+
+    doctor_ids = [doctor_id for doctor_id, _amt in doc_rows]
+    users = ctx.db.query(User).filter(
         User.id.in_(doctor_ids)).all() if doctor_ids else []
     umap: Dict[int, str] = {}
     for u in users:
@@ -426,101 +442,40 @@ def _build_revenue_metrics_v2(db: Session, start_dt: datetime,
               or f"Doctor #{getattr(u, 'id', '')}")
         umap[int(u.id)] = (nm or f"Doctor #{u.id}")
 
-    top_doctors = [{
+    return [{
         "doctor_id":
-        int(r.doctor_id),
+        doctor_id,
         "doctor_name":
-        umap.get(int(r.doctor_id), f"Doctor #{int(r.doctor_id)}"),
+        umap.get(doctor_id, f"Doctor #{doctor_id}"),
         "amount":
-        _safe_scalar(r.amt),
-    } for r in doc_rows]
-
-    # ----------------------------
-    # Widgets
-    # ----------------------------
-    widgets: List[DashboardWidget] = [
-        DashboardWidget(
-            code="rev_billed_total",
-            title="Billed Revenue",
-            widget_type="metric",
-            description="Sum of POSTED invoices (posted_at in selected range)",
-            data=_safe_scalar(billed_total),
-            config={"currency": "INR"},
-        ),
-        DashboardWidget(
-            code="rev_collected_total",
-            title="Collections",
-            widget_type="metric",
-            description="Payments received (received_at in selected range)",
-            data=_safe_scalar(collected_total),
-            config={"currency": "INR"},
-        ),
-        DashboardWidget(
-            code="rev_outstanding_total",
-            title="Outstanding (A/R)",
-            widget_type="metric",
-            description=
-            "As of end date: POSTED invoice total - payments received till end date",
-            data=_safe_scalar(outstanding_total),
-            config={"currency": "INR"},
-        ),
-        DashboardWidget(
-            code="rev_op_billed",
-            title="OP Revenue (Billed)",
-            widget_type="metric",
-            description="POSTED invoices for OP billing cases",
-            data=_safe_scalar(billed_op),
-            config={"currency": "INR"},
-        ),
-        DashboardWidget(
-            code="rev_ip_billed",
-            title="IP Revenue (Billed)",
-            widget_type="metric",
-            description="POSTED invoices for IP billing cases",
-            data=_safe_scalar(billed_ip),
-            config={"currency": "INR"},
-        ),
-        DashboardWidget(
-            code="rev_stream_pharmacy",
-            title="Pharmacy Revenue",
-            widget_type="metric",
-            description=
-            "Sum of POSTED invoice lines (service_group=PHARM/PHARMACY)",
-            data=_safe_scalar(streams.get("pharmacy", 0)),
-            config={"currency": "INR"},
-        ),
-        DashboardWidget(
-            code="rev_stream_lab",
-            title="Lab Revenue",
-            widget_type="metric",
-            description="Sum of POSTED invoice lines (service_group=LAB)",
-            data=_safe_scalar(streams.get("lab", 0)),
-            config={"currency": "INR"},
-        ),
-        DashboardWidget(
-            code="rev_stream_radiology",
-            title="Radiology Revenue",
-            widget_type="metric",
-            description=
-            "Sum of POSTED invoice lines (service_group=RAD/RADIOLOGY)",
-            data=_safe_scalar(streams.get("radiology", 0)),
-            config={"currency": "INR"},
-        ),
-        DashboardWidget(
-            code="rev_stream_ot",
-            title="OT Revenue",
-            widget_type="metric",
-            description="Sum of POSTED invoice lines (service_group=OT)",
-            data=_safe_scalar(streams.get("ot", 0)),
-            config={"currency": "INR"},
-        ),
-    ]
+        _safe_scalar(amt),
+    } for doctor_id, amt in doc_rows]
 
-    return {
-        "widgets": widgets,
-        "streams": streams,
-        "top_doctors": top_doctors,
-    }
+
+_SOURCES: Dict[str, _SourceDef] = {
+    "billed": _SourceDef(_billed_source),
+    "streams": _SourceDef(_streams_source, deps=("billed", )),
+    "collections": _SourceDef(_collections_source),
+    "outstanding": _SourceDef(_outstanding_source),
+    "top_doctors": _SourceDef(_top_doctors_source),
+}
+
+
+def _inr_metric(code: str, title: str, description: str,
+                value: Any) -> DashboardWidget:
+    return DashboardWidget(
+        code=code,
+        title=title,
+        widget_type="metric",
+        description=description,
+        data=_safe_scalar(value),
+        config={"currency": "INR"},
+    )
+
+
+def _collected_total(ctx: _WidgetContext) -> float:
+    return _safe_scalar(
+        sum((a.amount for a in ctx.need("collections").values()), 0))
 
 
 def _build_ipd_bed_occupancy_widget(db: Session) -> DashboardWidget:
@@ -545,23 +500,9 @@ def _build_ipd_bed_occupancy_widget(db: Session) -> DashboardWidget:
     )
 
 
-def _build_top_medicines_widget(db: Session, start_dt: datetime,
-                                end_dt: datetime) -> DashboardWidget:
-    date_col = getattr(PharmacySale, "bill_datetime", None) or getattr(
-        PharmacySale, "created_at", None)
-    status_lc = func.lower(func.coalesce(PharmacySale.invoice_status, ""))
-
-    q = db.query(
-        PharmacySaleItem.item_name.label("medicine"),
-        func.coalesce(func.sum(PharmacySaleItem.quantity), 0).label("qty"),
-    ).join(PharmacySale, PharmacySaleItem.sale_id == PharmacySale.id)
-
-    if date_col is not None:
-        q = q.filter(date_col >= start_dt, date_col < end_dt)
-
-    rows = q.filter(status_lc == "finalized").group_by(
-        PharmacySaleItem.item_name).order_by(
-            func.sum(PharmacySaleItem.quantity).desc()).limit(10).all()
+def _build_top_medicines_widget(rollups: RollupReader) -> DashboardWidget:
+    # finalized pharmacy bills, by bill_datetime (see daily_rollups)
+    rows = rollups.top("pharmacy.medicines", 10, key="qty")
 
     return DashboardWidget(
         code="top_medicines",
@@ -569,9 +510,9 @@ def _build_top_medicines_widget(db: Session, start_dt: datetime,
         widget_type="chart",
         description="Most frequently dispensed medicines in selected period",
         data=[{
-            "label": r.medicine,
-            "value": int(r.qty or 0)
-        } for r in rows],
+            "label": medicine,
+            "value": int(agg.qty or 0)
+        } for medicine, agg in rows],
         config={"chart_type": "bar"},
     )
 
@@ -580,26 +521,10 @@ def _build_patient_flow_chart(db: Session, end_date: date) -> DashboardWidget:
     start_date = end_date - timedelta(days=6)
     start_dt, end_dt = _dt_range(start_date, end_date)
 
-    patient_rows = db.query(
-        func.date(Patient.created_at).label("d"),
-        func.count(Patient.id).label("c"),
-    ).filter(Patient.created_at >= start_dt, Patient.created_at
-             < end_dt).group_by(func.date(Patient.created_at)).all()
-    patient_map = {r.d: r.c for r in patient_rows}
-
-    visit_rows = db.query(
-        func.date(Visit.visit_at).label("d"),
-        func.count(Visit.id).label("c"),
-    ).filter(Visit.visit_at >= start_dt, Visit.visit_at
-             < end_dt).group_by(func.date(Visit.visit_at)).all()
-    visit_map = {r.d: r.c for r in visit_rows}
-
-    adm_rows = db.query(
-        func.date(IpdAdmission.admitted_at).label("d"),
-        func.count(IpdAdmission.id).label("c"),
-    ).filter(IpdAdmission.admitted_at >= start_dt, IpdAdmission.admitted_at
-             < end_dt).group_by(func.date(IpdAdmission.admitted_at)).all()
-    adm_map = {r.d: r.c for r in adm_rows}
+    rollups = RollupReader(db, start_date, end_date)
+    patient_map = {d: a.count for d, a in rollups.by_day("patients.registered").items()}
+    visit_map = {d: a.count for d, a in rollups.by_day("opd.visits").items()}
+    adm_map = {d: a.count for d, a in rollups.by_day("ipd.admissions").items()}
 
     data = []
     for i in range(7):
@@ -786,15 +711,7 @@ def _build_ipd_status_widget(db: Session, start_dt: datetime,
 
 
 # ✅ Updated payment mode widget to BillingPayment
-def _build_payment_mode_widget_v2(db: Session, start_dt: datetime,
-                                  end_dt: datetime) -> DashboardWidget:
-    rows = db.query(
-        BillingPayment.mode.label("mode"),
-        func.coalesce(func.sum(BillingPayment.amount), 0).label("amount"),
-    ).filter(
-        BillingPayment.received_at >= start_dt,
-        BillingPayment.received_at < end_dt,
-    ).group_by(BillingPayment.mode).all()
+def _build_payment_mode_widget_v2(rows: Dict[str, Any]) -> DashboardWidget:
 
     return DashboardWidget(
         code="payment_modes",
@@ -802,82 +719,48 @@ def _build_payment_mode_widget_v2(db: Session, start_dt: datetime,
         widget_type="chart",
         description="Payments received split by mode (selected range)",
         data=[{
-            "label":
-            str(getattr(r.mode, "value", r.mode)).replace("_", " ").title(),
-            "value":
-            float(r.amount or 0),
-        } for r in rows],
+            "label": mode.replace("_", " ").title(),
+            "value": float(agg.amount or 0),
+        } for mode, agg in rows.items()],
         config={"chart_type": "pie"},
     )
 
 
-def _build_top_tests_widgets(
-        db: Session, start_dt: datetime,
-        end_dt: datetime) -> Tuple[DashboardWidget, DashboardWidget]:
-    lab_rows = db.query(
-        LisOrderItem.test_name.label("name"),
-        func.count(LisOrderItem.id).label("count"),
-    ).join(LisOrder, LisOrderItem.order_id == LisOrder.id).filter(
-        LisOrder.created_at >= start_dt,
-        LisOrder.created_at < end_dt,
-        LisOrder.status != "cancelled",
-    ).group_by(LisOrderItem.test_name).order_by(
-        func.count(LisOrderItem.id).desc()).limit(5).all()
-
-    lab_widget = DashboardWidget(
+def _build_top_lab_tests_widget(rollups: RollupReader) -> DashboardWidget:
+    lab_rows = rollups.top("lab.tests", 5)
+
+    return DashboardWidget(
         code="top_lab_tests",
         title="Top 5 Lab Tests",
         widget_type="chart",
         description="Most frequently ordered lab investigations",
         data=[{
-            "label": r.name,
-            "value": int(r.count or 0)
-        } for r in lab_rows],
+            "label": name,
+            "value": int(agg.count or 0)
+        } for name, agg in lab_rows],
         config={"chart_type": "bar"},
     )
 
-    ris_rows = db.query(
-        RisOrder.test_name.label("name"),
-        func.count(RisOrder.id).label("count"),
-    ).filter(
-        RisOrder.created_at >= start_dt,
-        RisOrder.created_at < end_dt,
-        RisOrder.status != "cancelled",
-    ).group_by(RisOrder.test_name).order_by(func.count(
-        RisOrder.id).desc()).limit(5).all()
 
-    ris_widget = DashboardWidget(
+def _build_top_radiology_tests_widget(
+        rollups: RollupReader) -> DashboardWidget:
+    ris_rows = rollups.top("ris.tests", 5)
+
+    return DashboardWidget(
         code="top_radiology_tests",
         title="Top 5 Radiology Tests",
         widget_type="chart",
         description="Most frequently ordered imaging tests",
         data=[{
-            "label": r.name,
-            "value": int(r.count or 0)
-        } for r in ris_rows],
+            "label": name,
+            "value": int(agg.count or 0)
+        } for name, agg in ris_rows],
         config={"chart_type": "bar"},
     )
 
-    return lab_widget, ris_widget
-
-
-def _build_billing_summary_widget_v2(db: Session, start_dt: datetime,
-                                     end_dt: datetime) -> DashboardWidget:
-    posted_dt = _invoice_posted_dt_expr()
-
-    billed = db.query(func.coalesce(func.sum(
-        BillingInvoice.grand_total), 0)).filter(
-            BillingInvoice.status == DocStatus.POSTED,
-            posted_dt >= start_dt,
-            posted_dt < end_dt,
-        ).scalar() or 0
-
-    collected = db.query(func.coalesce(func.sum(
-        BillingPayment.amount), 0)).filter(
-            BillingPayment.received_at >= start_dt,
-            BillingPayment.received_at < end_dt,
-        ).scalar() or 0
 
+def _build_billing_summary_widget_v2(billed: float,
+                                     collected: float) -> DashboardWidget:
     return DashboardWidget(
         code="billing_summary",
         title="Billing Summary (Billed vs Collected)",
@@ -896,3 +779,137 @@ def _build_billing_summary_widget_v2(db: Session, start_dt: datetime,
         ],
         config={"chart_type": "bar"},
     )
+
+
+# ---------- Registry (response order) ----------
+_CAN_BILLING = ("can_billing", )
+
+_WIDGETS: Tuple[DashboardWidgetDef, ...] = (
+    DashboardWidgetDef(
+        "metric_new_patients",
+        lambda c: _build_new_patients_widget(c.rollups),
+        caps=("can_patients", )),
+    DashboardWidgetDef(
+        "metric_opd_visits",
+        lambda c: _build_opd_visits_widget(c.rollups),
+        caps=("can_opd", )),
+    DashboardWidgetDef(
+        "metric_ipd_admissions",
+        lambda c: _build_ipd_admissions_widget(c.rollups),
+        caps=("can_ipd", )),
+    DashboardWidgetDef(
+        "rev_billed_total",
+        lambda c: _inr_metric(
+            "rev_billed_total", "Billed Revenue",
+            "Sum of POSTED invoices (posted_at in selected range)",
+            c.need("billed")["total"]),
+        caps=_CAN_BILLING, sources=("billed", )),
+    DashboardWidgetDef(
+        "rev_collected_total",
+        lambda c: _inr_metric(
+            "rev_collected_total", "Collections",
+            "Payments received (received_at in selected range)",
+            _collected_total(c)),
+        caps=_CAN_BILLING, sources=("collections", )),
+    DashboardWidgetDef(
+        "rev_outstanding_total",
+        lambda c: _inr_metric(
+            "rev_outstanding_total", "Outstanding (A/R)",
+            "As of end date: POSTED invoice total - payments received till end date",
+            c.need("outstanding")),
+        caps=_CAN_BILLING, sources=("outstanding", )),
+    DashboardWidgetDef(
+        "rev_op_billed",
+        lambda c: _inr_metric(
+            "rev_op_billed", "OP Revenue (Billed)",
+            "POSTED invoices for OP billing cases",
+            c.need("billed")["op"]),
+        caps=_CAN_BILLING, sources=("billed", )),
+    DashboardWidgetDef(
+        "rev_ip_billed",
+        lambda c: _inr_metric(
+            "rev_ip_billed", "IP Revenue (Billed)",
+            "POSTED invoices for IP billing cases",
+            c.need("billed")["ip"]),
+        caps=_CAN_BILLING, sources=("billed", )),
+    DashboardWidgetDef(
+        "rev_stream_pharmacy",
+        lambda c: _inr_metric(
+            "rev_stream_pharmacy", "Pharmacy Revenue",
+            "Sum of POSTED invoice lines (service_group=PHARM/PHARMACY)",
+            c.need("streams").get("pharmacy", 0)),
+        caps=_CAN_BILLING, sources=("streams", )),
+    DashboardWidgetDef(
+        "rev_stream_lab",
+        lambda c: _inr_metric(
+            "rev_stream_lab", "Lab Revenue",
+            "Sum of POSTED invoice lines (service_group=LAB)",
+            c.need("streams").get("lab", 0)),
+        caps=_CAN_BILLING, sources=("streams", )),
+    DashboardWidgetDef(
+        "rev_stream_radiology",
+        lambda c: _inr_metric(
+            "rev_stream_radiology", "Radiology Revenue",
+            "Sum of POSTED invoice lines (service_group=RAD/RADIOLOGY)",
+            c.need("streams").get("radiology", 0)),
+        caps=_CAN_BILLING, sources=("streams", )),
+    DashboardWidgetDef(
+        "rev_stream_ot",
+        lambda c: _inr_metric(
+            "rev_stream_ot", "OT Revenue",
+            "Sum of POSTED invoice lines (service_group=OT)",
+            c.need("streams").get("ot", 0)),
+        caps=_CAN_BILLING, sources=("streams", )),
+    DashboardWidgetDef(
+        "ipd_bed_occupancy",
+        lambda c: _build_ipd_bed_occupancy_widget(c.db),
+        caps=("can_ipd", )),
+    DashboardWidgetDef(
+        "top_medicines",
+        lambda c: _build_top_medicines_widget(c.rollups),
+        caps=("can_pharmacy", )),
+    DashboardWidgetDef(
+        "patient_flow",
+        lambda c: _build_patient_flow_chart(c.db, c.date_to),
+        caps=("can_opd", "can_ipd", "can_patients")),
+    DashboardWidgetDef(
+        "rev_by_stream",
+        lambda c: _build_revenue_stream_chart(c.need("streams")),
+        caps=_CAN_BILLING, sources=("streams", )),
+    DashboardWidgetDef(
+        "rev_by_doctor",
+        lambda c: _build_revenue_doctor_chart(c.need("top_doctors")),
+        caps=_CAN_BILLING, sources=("top_doctors", )),
+    DashboardWidgetDef(
+        "recent_ipd_admissions",
+        lambda c: _build_recent_admissions_widget(c.db),
+        caps=("can_ipd", )),
+    DashboardWidgetDef(
+        "appointment_status",
+        lambda c: _build_appointment_status_widget(c.db, c.date_from,
+                                                   c.date_to),
+        caps=("can_opd", )),
+    DashboardWidgetDef(
+        "ipd_status",
+        lambda c: _build_ipd_status_widget(c.db, c.start_dt, c.end_dt),
+        caps=("can_ipd", )),
+    DashboardWidgetDef(
+        "payment_modes",
+        lambda c: _build_payment_mode_widget_v2(c.need("collections")),
+        caps=_CAN_BILLING, sources=("collections", )),
+    DashboardWidgetDef(
+        "top_lab_tests",
+        lambda c: _build_top_lab_tests_widget(c.rollups),
+        caps=("can_lab", )),
+    DashboardWidgetDef(
+        "top_radiology_tests",
+        lambda c: _build_top_radiology_tests_widget(c.rollups),
+        caps=("can_radiology", )),
+    DashboardWidgetDef(
+        "billing_summary",
+        lambda c: _build_billing_summary_widget_v2(c.need("billed")["total"],
+                                                   _collected_total(c)),
+        caps=_CAN_BILLING, sources=("billed", "collections")),
+)
+
+WIDGET_CODES: Tuple[str, ...] = tuple(d.code for d in _WIDGETS)
@@ -0,0 +1,344 @@
+# FILE: app/services/event_bus.py
+"""
+Tenant-scoped pub/sub behind the realtime WebSockets (/lab/ws, /ris/ws and
+the OPD queue / bed board / pharmacy feeds).
+
+Channels are (tenant, topic) pairs. The tenant is the tenant DB name
+(tenant_of(db) on the publishing side, the token's tenant on the socket
+side), so an event from one hospital never reaches another hospital's
+screens. Topics are the module prefixes of the event "type" ("lab",
+"ris", "opd.queue", ...).
+
+  publish()   fan an event out to every subscriber of (tenant, topic);
+              callable from async routes and from threadpool (sync) routes
+  serve()     accept a socket and stream its channels until it disconnects
+
+Fan-out never awaits a client: the event is serialised once and put on
+each subscriber's bounded queue (EVENT_BUS_CLIENT_QUEUE); a per-socket
+sender task drains it. A socket whose queue is full, or whose send takes
+longer than EVENT_BUS_SEND_TIMEOUT_SECONDS, is evicted (closed with 1013,
+the client reconnects and reloads), so one stalled tablet cannot hold up
+the lab bench or grow memory without bound.
+
+Delivery across API workers goes through the backend (EVENT_BUS_BACKEND):
+
+  memory  this process only (single worker / dev)
+  unix    every worker on the host binds a datagram socket under
+          EVENT_BUS_SOCKET_DIR; publish() sends the event to each peer,
+          which delivers it to its own subscribers. Sockets of dead
+          workers are removed when a send is refused.
+
+Events are notifications ("order 12 finalized, reload"), not a durable
+log: a client that was disconnected or evicted refetches on reconnect.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import WebSocket
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# topics
+LAB = "lab"
+RIS = "ris"
+OPD_QUEUE = "opd.queue"
+IPD_BEDS = "ipd.beds"
+PHARMACY = "pharmacy"
+
+_MAX_DGRAM = 60 * 1024
+
+
+def tenant_of(db: Session) -> str:
+    url = getattr(db.get_bind(), "url", None)
+    return str(getattr(url, "database", None) or "default")
+
+
+def _dumps(payload: Dict[str, Any]) -> str:
+    # same encoding as WebSocket.send_json, plus datetimes / Decimals as str
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+# ============================================================
+# Subscribers (event-loop side)
+# ============================================================
+class _Subscriber:
+    __slots__ = ("ws", "tenant", "topics", "queue", "sender", "closed")
+
+    def __init__(self, ws: WebSocket, tenant: str, topics: Tuple[str, ...]):
+        self.ws = ws
+        self.tenant = tenant
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(int(settings.EVENT_BUS_CLIENT_QUEUE), 1))
+        self.sender: Optional[asyncio.Task] = None
+        self.closed = False
+
+
+_channels: Dict[Tuple[str, str], Set[_Subscriber]] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_backend: Optional["_Backend"] = None
+_lock = threading.Lock()
+_stats = {"delivered": 0, "evicted": 0}
+
+
+def _add(sub: _Subscriber) -> None:
+    for topic in sub.topics:
+        _channels.setdefault((sub.tenant, topic), set()).add(sub)
+
+
+def _remove(sub: _Subscriber) -> None:
+    for topic in sub.topics:
+        key = (sub.tenant, topic)
+        subs = _channels.get(key)
+        if subs is None:
+            continue
+        subs.discard(sub)
+        if not subs:
+            del _channels[key]
+
+
+def _evict(sub: _Subscriber, reason: str) -> None:
+    if sub.closed:
+        return
+    sub.closed = True
+    _remove(sub)
+    _stats["evicted"] += 1
+    logger.info("event bus: evicting %s socket (%s)", sub.tenant, reason)
+    if sub.sender is not None and sub.sender is not asyncio.current_task():
+        sub.sender.cancel()
+    asyncio.ensure_future(_close(sub.ws, 1013, reason))
+
+
+async def _close(ws: WebSocket, code: int, reason: str) -> None:
+    try:
+        await ws.close(code=code, reason=reason)
+    except Exception:
+        pass
+
+
+def _deliver(tenant: str, topic: str, text: str) -> None:
+    """Queue one serialised event on every local subscriber of the channel."""
+    subs = _channels.get((tenant, topic))
+    if not subs:
+        return
+    for sub in list(subs):
+        try:
+            sub.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            _evict(sub, "slow consumer")
+        else:
+            _stats["delivered"] += 1
+
+
+async def _pump(sub: _Subscriber) -> None:
+    timeout = float(settings.EVENT_BUS_SEND_TIMEOUT_SECONDS)
+    while True:
+        text = await sub.queue.get()
+        try:
+            await asyncio.wait_for(sub.ws.send_text(text), timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            _evict(sub, "send timeout")
+            return
+        except Exception:
+            _evict(sub, "send failed")
+            return
+
+
+# ============================================================
+# Backends (cross-worker delivery)
+# ============================================================
+class _Backend:
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        pass
+
+    def send(self, tenant: str, topic: str, text: str) -> None:
+        """Forward an event to the other workers (local delivery is done by the bus)."""
+
+    def stop(self) -> None:
+        pass
+
+
+class _MemoryBackend(_Backend):
+    pass
+
+
+class _UnixBackend(_Backend):
+    def __init__(self, directory: Path):
+        self.dir = directory
+        self.path = directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        self.sock: Optional[socket.socket] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        s.setblocking(False)
+        s.bind(str(self.path))
+        self.sock = s
+        self.loop = loop
+        loop.add_reader(s.fileno(), self._on_readable)
+        logger.info("event bus: unix backend at %s", self.path)
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                data = self.sock.recv(_MAX_DGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                logger.exception("event bus: receive failed")
+                return
+            try:
+                msg = json.loads(data)
+                _deliver(msg["t"], msg["c"], msg["p"])
+            except Exception:
+                logger.warning("event bus: dropped malformed datagram")
+
+    def send(self, tenant: str, topic: str, text: str) -> None:
+        if self.sock is None:
+            return
+        data = json.dumps({"t": tenant, "c": topic, "p": text}, separators=(",", ":")).encode("utf-8")
+        if len(data) > _MAX_DGRAM:
+            logger.warning("event bus: %s/%s event of %d bytes not forwarded", tenant, topic, len(data))
+            return
+        try:
+            peers = [p for p in self.dir.iterdir() if p.suffix == ".sock" and p != self.path]
+        except OSError:
+            return
+        for peer in peers:
+            try:
+                self.sock.sendto(data, str(peer))
+            except (ConnectionRefusedError, FileNotFoundError):
+                # worker gone without cleaning up
+                try:
+                    peer.unlink()
+                except OSError:
+                    pass
+            except (BlockingIOError, InterruptedError):
+                logger.warning("event bus: peer %s busy, event dropped", peer.name)
+            except OSError as e:
+                logger.warning("event bus: send to %s failed: %s", peer.name, e)
+
+    def stop(self) -> None:
+        if self.sock is None:
+            return
+        try:
+            if self.loop is not None and not self.loop.is_closed():
+                self.loop.remove_reader(self.sock.fileno())
+        except Exception:
+            pass
+        self.sock.close()
+        self.sock = None
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def _make_backend() -> _Backend:
+    kind = (settings.EVENT_BUS_BACKEND or "memory").strip().lower()
+    if kind == "unix":
+        d = settings.EVENT_BUS_SOCKET_DIR or str(Path(tempfile.gettempdir()) / "hims_event_bus")
+        return _UnixBackend(Path(d))
+    if kind != "memory":
+        logger.warning("event bus: unknown EVENT_BUS_BACKEND=%r, using memory", kind)
+    return _MemoryBackend()
+
+
+# ============================================================
+# Public API
+# ============================================================
+def start() -> None:
+    """Bind the bus to the running event loop (app startup)."""
+    global _loop, _backend
+    loop = asyncio.get_running_loop()
+    with _lock:
+        if _loop is loop and _backend is not None:
+            return
+        if _backend is not None:
+            _backend.stop()
+        backend = _make_backend()
+        try:
+            backend.start(loop)
+        except OSError:
+            logger.exception("event bus: backend failed to start, events stay in this process")
+            backend = _MemoryBackend()
+        _loop, _backend = loop, backend
+
+
+def stop() -> None:
+    global _loop, _backend
+    with _lock:
+        if _backend is not None:
+            _backend.stop()
+        _loop, _backend = None, None
+
+
+def _publish_on_loop(tenant: str, topic: str, text: str) -> None:
+    _deliver(tenant, topic, text)
+    if _backend is not None:
+        _backend.send(tenant, topic, text)
+
+
+def publish(tenant: str, topic: str, payload: Dict[str, Any]) -> None:
+    """
+    Send `payload` to every socket subscribed to (tenant, topic), in this
+    and the other API workers. Never blocks on clients. A no-op before
+    start() (CLI scripts, background jobs outside the API).
+    """
+    loop = _loop
+    if loop is None or loop.is_closed():
+        return
+    text = _dumps(payload)
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        _publish_on_loop(tenant, topic, text)
+    else:
+        loop.call_soon_threadsafe(_publish_on_loop, tenant, topic, text)
+
+
+async def serve(websocket: WebSocket, tenant: str, topics: Iterable[str]) -> None:
+    """Accept `websocket` and stream (tenant, topic) events to it until it disconnects."""
+    if _loop is None:
+        start()
+    await websocket.accept()
+    sub = _Subscriber(websocket, tenant, tuple(dict.fromkeys(topics)))
+    _add(sub)
+    sub.sender = asyncio.create_task(_pump(sub))
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg.get("type") == "websocket.disconnect":
+                break
+    except Exception:
+        pass
+    finally:
+        sub.closed = True
+        _remove(sub)
+        sub.sender.cancel()
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "backend": type(_backend).__name__.strip("_") if _backend else None,
+        "channels": len(_channels),
+        "subscribers": len({s for subs in _channels.values() for s in subs}),
+        **_stats,
+    }
@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.models.ui_branding import UiBranding
 from app.models.billing import BillingNumberSeries, NumberDocType, NumberResetPeriod
+from app.services.number_allocator import is_gapless, take_billing_number
 
 IST = ZoneInfo("Asia/Kolkata")
 
@@ -196,12 +197,29 @@ def _next_series_number(
     """
     Returns: output_prefix + zero_padded(next_number)
     Applies YEAR/MONTH reset using last_period_key.
+
+    Default: number comes from this worker's reserved block (number_allocator),
+    the series row is NOT locked in the caller's transaction.
+    Gapless series (settings.NUMBER_SERIES_GAPLESS): row lock held until the
+    caller commits, so a rollback never burns a number.
     """
     series_prefix = (series_prefix or "").strip().upper()
     output_prefix = (output_prefix or "").strip().upper()
 
     pkey = _period_key(reset_period, on_date)
 
+    if not is_gapless(doc_type.value):
+        n, _pad = take_billing_number(
+            db,
+            doc_type=doc_type,
+            prefix=series_prefix,
+            reset_period=reset_period,
+            padding=int(padding or 6),
+            period_key=pkey,
+            require_active=True,
+        )
+        return f"{output_prefix}{n:0{int(padding or 6)}d}"
+
     row = _get_or_create_series_row(
         db,
         doc_type=doc_type,
@@ -11,6 +11,7 @@ from sqlalchemy.inspection import inspect as sa_inspect
 
 from app.models.pharmacy_inventory import ItemBatch, StockTransaction
 from app.models.user import User
+from app.services import stock_movements  # noqa: F401  (registers the daily movement summary hook)
 
 
 # ============================================================
@@ -84,6 +85,10 @@ def create_stock_transaction(
     ✅ Doctor behavior:
     - If doctor_id is provided and column exists -> saved
     - Else if user.is_doctor == True and doctor_id column exists -> uses user.id
+
+    ✅ Movement summary:
+    - On flush the row is folded into inv_stock_daily_movements
+      (app.services.stock_movements), same transaction
     """
     cols = _model_columns(StockTransaction)
     data: Dict[str, Any] = {}
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
 from app.models.pharmacy_inventory import InvNumberSeries
+from app.services.number_allocator import is_gapless, take_inventory_number
 
 
 def _date_key(d: date) -> int:
@@ -22,11 +23,18 @@ def next_document_number(
     """
     Concurrency-safe number generator using InvNumberSeries with UNIQUE(key, date_key).
     Works correctly in multi-user hospitals.
+    Numbers come from a per-worker block unless `key` is listed in
+    settings.NUMBER_SERIES_GAPLESS (then the row stays locked until commit).
 
     Example: GRN20251214001
     """
     dk = _date_key(doc_date)
 
+    if not is_gapless(key):
+        # hi-lo block reserved in its own short transaction (see number_allocator)
+        seq = take_inventory_number(db, key=key, date_key=dk)
+        return f"{prefix}{doc_date.strftime('%Y%m%d')}{seq:0{pad}d}"
+
     # Try to fetch row FOR UPDATE (lock)
     row = (
         db.query(InvNumberSeries)
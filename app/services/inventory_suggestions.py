@@ -1,5 +1,6 @@
 # FILE: app/services/inventory_suggestions.py
 from __future__ import annotations
+from datetime import datetime, timedelta
 from decimal import Decimal
 from sqlalchemy.orm import Session
 from sqlalchemy import func
@@ -7,30 +8,48 @@ from sqlalchemy import func
 from app.models.pharmacy_inventory import (
     InventoryItem, ItemLocationStock, ItemPriceHistory
 )
+from app.services.stock_movements import consumption_sq
 
 D0 = Decimal("0")
 
-def po_suggestions(db: Session, location_id: int, supplier_id: int | None = None, limit: int = 200):
+def po_suggestions(
+    db: Session,
+    location_id: int,
+    supplier_id: int | None = None,
+    limit: int = 200,
+    consumption_days: int = 30,
+    lead_time_days: int = 7,
+):
     """
     Returns low-stock suggestions:
     - on_hand < reorder_level  => suggest reorder to max_level
+    - no reorder_level: reorder point = avg daily consumption × lead time
+      (daily movement summary), refill to max_level or 2× reorder point
     - includes last price for auto-fill (supplier/location/item)
     """
+    since = datetime.utcnow() - timedelta(days=int(consumption_days))
+    cons = consumption_sq(db, [location_id], since)
     q = (
-        db.query(InventoryItem, ItemLocationStock)
+        db.query(InventoryItem, ItemLocationStock, func.coalesce(cons.c.out_qty, 0))
         .join(ItemLocationStock, (ItemLocationStock.item_id == InventoryItem.id) & (ItemLocationStock.location_id == location_id))
+        .outerjoin(cons, (cons.c.location_id == ItemLocationStock.location_id) & (cons.c.item_id == ItemLocationStock.item_id))
         .filter(InventoryItem.is_active == True)
         .order_by(InventoryItem.name.asc())
     )
 
     out = []
-    for item, stock in q.limit(limit).all():
+    for item, stock, out_qty in q.limit(limit).all():
         reorder = Decimal(str(item.reorder_level or 0))
         maxlvl = Decimal(str(item.max_level or 0))
         onhand = Decimal(str(stock.on_hand_qty or 0))
+        avg_daily = Decimal(str(out_qty or 0)) / Decimal(consumption_days) if consumption_days > 0 else D0
+        point = reorder if reorder > 0 else avg_daily * Decimal(lead_time_days)
 
-        if reorder > 0 and onhand < reorder:
-            suggested = max(D0, maxlvl - onhand) if maxlvl > 0 else max(D0, reorder - onhand)
+        if point > 0 and onhand < point:
+            if maxlvl > 0:
+                suggested = max(D0, maxlvl - onhand)
+            else:
+                suggested = max(D0, (reorder if reorder > 0 else point * 2) - onhand)
 
             # price hint: supplier-specific last purchase first
             price = None
@@ -62,6 +81,8 @@ def po_suggestions(db: Session, location_id: int, supplier_id: int | None = None
                 "generic_name": item.generic_name or "",
                 "on_hand_qty": str(onhand),
                 "reorder_level": str(reorder),
+                "reorder_point": str(point.quantize(Decimal("0.0001"))),
+                "avg_daily_consumption": str(avg_daily.quantize(Decimal("0.0001"))),
                 "max_level": str(maxlvl),
                 "suggested_qty": str(suggested),
                 "unit_cost": str(unit_cost or 0),
@@ -0,0 +1,63 @@
+# FILE: app/services/ipd_bed_feed.py
+"""
+Push feed for the IPD bed board (GET /ipd/bedboard).
+
+  * every flush that inserts, edits or deletes an IpdBed (state changes on
+    admission, transfer, discharge, reserve / release, bed master edits)
+    marks the bed from a Session hook, so no route has to opt in
+  * after commit the marked beds are pushed on the event bus under
+    event_bus.IPD_BEDS as {"type": "ipd.beds.changed", "bed_ids": [...]};
+    the board reloads /ipd/bedboard
+
+Ward / room master edits (names, room types, rates) show up on the next
+full load.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.ipd import IpdBed
+from app.services import event_bus
+
+logger = logging.getLogger(__name__)
+
+_PENDING = "ipd_beds_pending"
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_beds(session: Session, _flush_context) -> None:
+    ids: Set[int] = set()
+    for o in session.new:
+        if isinstance(o, IpdBed) and o.id:
+            ids.add(int(o.id))
+    for o in session.dirty:
+        if isinstance(o, IpdBed) and session.is_modified(o, include_collections=False):
+            ids.add(int(o.id))
+    for o in session.deleted:
+        if isinstance(o, IpdBed) and o.id:
+            ids.add(int(o.id))
+    if ids:
+        session.info.setdefault(_PENDING, set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_beds(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    try:
+        event_bus.publish(event_bus.tenant_of(session), event_bus.IPD_BEDS,
+                          {"type": "ipd.beds.changed", "bed_ids": sorted(pending)})
+    except Exception:
+        logger.warning("bed board push failed", exc_info=True)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted(session: Session, transaction) -> None:
+    # after_commit has already taken the committed ones
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
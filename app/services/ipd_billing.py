@@ -8,16 +8,14 @@ from typing import Optional, List, Dict, Any, Tuple
 
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 
 from app.models.ipd import (
     IpdAdmission,
     IpdBedAssignment,
-    IpdBed,
-    IpdRoom,
-    IpdBedRate,
     IpdDischargeSummary,
 )
+from app.services.ipd_daily_charges import bed_line_days
+from app.services.ipd_room_charges import room_days
 
 from app.models.billing import (
     BillingCase,
@@ -56,45 +54,13 @@ def today_local() -> date:
 
 
 # =========================================================
-# Date range helper
-# =========================================================
-def _date_range_inclusive(d1: date, d2: date):
-    cur = d1
-    while cur <= d2:
-        yield cur
-        cur += timedelta(days=1)
-
-
-# =========================================================
-# Room type / rate helpers
+# Room type helper
 # =========================================================
 def _normalize_room_type(x: Optional[str]) -> str:
     s = (x or "General").strip()
     return s.title()
 
 
-def _get_room_type(db: Session, bed_id: int) -> str:
-    bed = db.get(IpdBed, bed_id)
-    if not bed or not getattr(bed, "room_id", None):
-        return "General"
-    room = db.get(IpdRoom, bed.room_id)
-    return _normalize_room_type(getattr(room, "type", None))
-
-
-def _resolve_rate(db: Session, room_type: str, for_date: date) -> Decimal:
-    rt = _normalize_room_type(room_type)
-    r = (
-        db.query(IpdBedRate)
-        .filter(IpdBedRate.is_active.is_(True))
-        .filter(IpdBedRate.room_type == rt)
-        .filter(IpdBedRate.effective_from <= for_date)
-        .filter(or_(IpdBedRate.effective_to.is_(None), IpdBedRate.effective_to >= for_date))
-        .order_by(IpdBedRate.effective_from.desc())
-        .first()
-    )
-    return Decimal(str(r.daily_rate)) if r and r.daily_rate is not None else Decimal("0.00")
-
-
 def _get_admission_or_404(db: Session, admission_id: int) -> IpdAdmission:
     adm = db.get(IpdAdmission, admission_id)
     if not adm:
@@ -167,19 +133,19 @@ def _compute_ipd_room_breakdown_daily(
         raise HTTPException(status_code=400, detail="to_date must be >= from_date")
 
     _get_admission_or_404(db, admission_id)
-    assigns = fetch_assignments(db, admission_id)
 
     days: List[Dict[str, Any]] = []
     total = Decimal("0.00")
     missing_rate_days = 0
 
-    for d in _date_range_inclusive(from_date, to_date):
-        a = active_assignment_for_day(assigns, d)
-        if not a:
-            continue
-
-        room_type = _get_room_type(db, a.bed_id)
-        rate = _resolve_rate(db, room_type, d)
+    for rd in room_days(
+        db,
+        admission_id,
+        from_date,
+        to_date,
+        room_type=lambda room: _normalize_room_type(getattr(room, "type", None)),
+    ):
+        rate = rd.rate if rd.rate is not None else Decimal("0.00")
 
         if rate <= 0:
             missing_rate_days += 1
@@ -188,10 +154,10 @@ def _compute_ipd_room_breakdown_daily(
 
         days.append(
             {
-                "date": d.isoformat(),
-                "assignment_id": a.id,
-                "bed_id": a.bed_id,
-                "room_type": room_type,
+                "date": rd.day.isoformat(),
+                "assignment_id": rd.assignment.id,
+                "bed_id": rd.assignment.bed_id,
+                "room_type": rd.room_type,
                 "rate": float(rate),
             }
         )
@@ -497,6 +463,7 @@ def sync_ipd_room_charges(
             "created": 0,
             "updated": 0,
             "deleted_future": 0,
+            "skipped_bed_days": 0,
             "missing_rate_days": 0,
             "room_total": 0,
             "from_date": (from_date.isoformat() if from_date else None),
@@ -567,9 +534,12 @@ def sync_ipd_room_charges(
             .all()
         )
         by_key = {str(x.source_line_key or ""): x for x in existing}
+        # days already billed with a ROOM bed line (nightly job / particulars)
+        bed_days = bed_line_days(db, case.id)
 
         created = 0
         updated = 0
+        skipped_bed_days = 0
 
         for row in days:
             d = date.fromisoformat(row["date"])
@@ -577,6 +547,12 @@ def sync_ipd_room_charges(
             rate = Decimal(str(row.get("rate") or 0))
 
             line_key = f"ROOM:{d.isoformat()}"
+            if d.isoformat() in bed_days:
+                ln = by_key.pop(line_key, None)
+                if ln:
+                    db.delete(ln)
+                skipped_bed_days += 1
+                continue
             desc = f"Observation / Bed Charges ({room_type}) - {d.strftime('%d-%m-%Y')}"
 
             qty = Decimal("1.0000")
@@ -659,6 +635,7 @@ def sync_ipd_room_charges(
             "created": created,
             "updated": updated,
             "deleted_future": did_delete,
+            "skipped_bed_days": skipped_bed_days,
             "missing_rate_days": breakdown.get("missing_rate_days", 0),
             "room_total": breakdown.get("total_amount", 0),
             "from_date": start.isoformat(),
@@ -0,0 +1,383 @@
+# FILE: app/services/ipd_daily_charges.py
+"""
+Nightly posting of one day's IPD room, nursing and package charges for
+every active admission of a tenant (app.scripts.post_ipd_daily_charges).
+
+Lines carry the same idempotency keys as the billing particulars screen
+(billing_particulars._mk_idem), so a day posted by hand, by an earlier run
+or by this job is never posted twice:
+
+  ROOM     ROOM invoice, CASE:{case}:BED:{bed_id}:{day}; rate = case tariff
+           (BED) > IpdBedRate of the room type. Days already billed by
+           the IPD room syncs ("ROOM:{day}") or with any other bed are skipped,
+           and the syncs in turn leave days carrying one of these lines alone
+           (bed_line_days), so a (case, day) gets a single room charge.
+  NURSING  ChargeItemMaster codes in IPD_DAILY_NURSING_CODES, on the item's
+           module invoice, CASE:{case}:CHG:{item_id}:{day}
+  PACKAGE  IpdPackage.charges once per admission, ADM invoice,
+           CASE:{case}:PKG:{package_id}:{admission day}
+
+Everything is loaded for the whole batch (admissions, cases, invoices,
+existing keys, bed assignments, rates, tariffs), new lines go in with one
+bulk INSERT and each touched invoice gets a single totals reconcile.
+Nothing is committed here.
+"""
+from __future__ import annotations
+
+import time
+from datetime import date, datetime, time as dtime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import insert, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.billing import (
+    BillingCase,
+    BillingCaseStatus,
+    BillingInvoice,
+    BillingInvoiceLine,
+    BillingTariffRate,
+    DocStatus,
+    EncounterType,
+    InvoiceType,
+    PayerType,
+    ServiceGroup,
+)
+from app.models.charge_item_master import ChargeItemMaster
+from app.models.ipd import IpdAdmission, IpdPackage, IpdRoom
+from app.services.billing_charge_item_service import (
+    expected_invoice_module_for_charge_item,
+    resolve_service_group,
+)
+from app.services.billing_particulars import _mk_idem
+from app.services.billing_service import (
+    build_auto_line,
+    get_or_create_active_module_invoice,
+    get_or_create_case_for_ip_admission,
+    reconcile_invoice_totals,
+)
+from app.services.ipd_room_charges import room_days_many
+
+ACTIVE_STATUSES = ("admitted", "transferred")
+ROOM_MODULE = "ROOM"
+PACKAGE_MODULE = "ADM"
+_CHUNK = 500
+
+
+def local_tz():
+    return ZoneInfo(getattr(settings, "TIMEZONE", "Asia/Kolkata"))
+
+
+def _local_day(ts: datetime) -> date:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)  # stored naive UTC
+    return ts.astimezone(local_tz()).date()
+
+
+def _d(x) -> Decimal:
+    return Decimal(str(x if x is not None else 0))
+
+
+def _chunks(ids: List[int]) -> Iterable[List[int]]:
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i:i + _CHUNK]
+
+
+def _room_type(room: Optional[IpdRoom]) -> Optional[str]:
+    # billing_particulars: room.type (or room_type), compared case-insensitively
+    rt = (getattr(room, "type", None) or getattr(room, "room_type", None)
+          or "") if room else ""
+    return rt.strip() or None
+
+
+def nursing_codes() -> List[str]:
+    raw = getattr(settings, "IPD_DAILY_NURSING_CODES", "") or ""
+    return [c.strip() for c in raw.split(",") if c.strip()]
+
+
+def _active_admissions(db: Session, day: date) -> List[IpdAdmission]:
+    rows = (db.query(IpdAdmission)
+            .filter(IpdAdmission.status.in_(ACTIVE_STATUSES))
+            .filter(IpdAdmission.discharge_at.is_(None))
+            .filter(IpdAdmission.billing_locked.is_(False))
+            .order_by(IpdAdmission.id.asc())
+            .all())
+    return [a for a in rows if a.admitted_at is not None and _local_day(a.admitted_at) <= day]
+
+
+def _cases(db: Session, admissions: List[IpdAdmission], user) -> Tuple[Dict[int, BillingCase], int]:
+    out: Dict[int, BillingCase] = {}
+    ids = [int(a.id) for a in admissions]
+    for chunk in _chunks(ids):
+        for c in (db.query(BillingCase)
+                  .filter(BillingCase.encounter_type == EncounterType.IP)
+                  .filter(BillingCase.encounter_id.in_(chunk))
+                  .order_by(BillingCase.id.asc())
+                  .all()):
+            out.setdefault(int(c.encounter_id), c)
+    created = 0
+    for a in admissions:
+        if int(a.id) not in out:
+            out[int(a.id)] = get_or_create_case_for_ip_admission(db, admission_id=int(a.id), user=user)
+            created += 1
+    return out, created
+
+
+def _existing_keys(db: Session, case_ids: List[int], modules: Set[str]) -> Set[Tuple[int, str, str]]:
+    keys: Set[Tuple[int, str, str]] = set()
+    for chunk in _chunks(case_ids):
+        rows = (db.query(BillingInvoiceLine.billing_case_id,
+                         BillingInvoiceLine.source_module,
+                         BillingInvoiceLine.source_line_key)
+                .filter(BillingInvoiceLine.billing_case_id.in_(chunk))
+                .filter(BillingInvoiceLine.source_module.in_(sorted(modules)))
+                .all())
+        keys.update((int(c), str(m), str(k or "")) for c, m, k in rows)
+    return keys
+
+
+def _room_billed_days(keys: Set[Tuple[int, str, str]]) -> Set[Tuple[int, str]]:
+    """(case_id, day) already carrying a room charge, whatever path posted it."""
+    out: Set[Tuple[int, str]] = set()
+    for case_id, module, key in keys:
+        if module in ("IPD", "IPD_ROOM") and key.startswith("ROOM:"):
+            out.add((case_id, key[5:15]))
+        elif module == ROOM_MODULE:
+            parts = key.split(":")
+            if len(parts) >= 5 and parts[2] == "BED":
+                out.add((case_id, parts[4]))
+    return out
+
+
+def bed_line_days(db: Session, case_id: int) -> Set[str]:
+    """
+    ISO days of a case already billed with a ROOM bed line (this job or the
+    billing particulars screen). The IPD room syncs skip these days.
+    """
+    keys = _existing_keys(db, [int(case_id)], {ROOM_MODULE})
+    return {day for _case, day in _room_billed_days(keys)}
+
+
+def _tariffs(db: Session, plan_ids: Set[int], item_type: str,
+             item_ids: Set[int]) -> Dict[Tuple[int, int], Tuple[Decimal, Decimal]]:
+    if not plan_ids or not item_ids:
+        return {}
+    out: Dict[Tuple[int, int], Tuple[Decimal, Decimal]] = {}
+    for r in (db.query(BillingTariffRate)
+              .filter(BillingTariffRate.tariff_plan_id.in_(sorted(plan_ids)))
+              .filter(BillingTariffRate.item_type == item_type)
+              .filter(BillingTariffRate.item_id.in_(sorted(item_ids)))
+              .filter(BillingTariffRate.is_active.is_(True))
+              .order_by(BillingTariffRate.id.asc())
+              .all()):
+        out.setdefault((int(r.tariff_plan_id), int(r.item_id)), (_d(r.rate), _d(r.gst_rate)))
+    return out
+
+
+def _invoices(db: Session, case_ids: List[int], modules: Set[str]) -> Dict[Tuple[int, str], BillingInvoice]:
+    # same pick as get_or_create_active_module_invoice (latest open PATIENT invoice)
+    out: Dict[Tuple[int, str], BillingInvoice] = {}
+    for chunk in _chunks(case_ids):
+        for inv in (db.query(BillingInvoice)
+                    .filter(BillingInvoice.billing_case_id.in_(chunk))
+                    .filter(BillingInvoice.module.in_(sorted(modules)))
+                    .filter(BillingInvoice.invoice_type == InvoiceType.PATIENT)
+                    .filter(BillingInvoice.payer_type == PayerType.PATIENT)
+                    .filter(BillingInvoice.payer_id.is_(None))
+                    .filter(BillingInvoice.status.in_([DocStatus.DRAFT, DocStatus.APPROVED]))
+                    .order_by(BillingInvoice.id.desc())
+                    .all()):
+            out.setdefault((int(inv.billing_case_id), str(inv.module)), inv)
+    return out
+
+
+def _row(ln: BillingInvoiceLine, cols: List[str]) -> Dict[str, Any]:
+    return {c: getattr(ln, c) for c in cols}
+
+
+def post_day(db: Session, day: date, *, user=None) -> Dict[str, Any]:
+    """
+    Post `day`'s charges for every active admission. Returns counts and
+    per-phase timings (ms); the caller commits.
+    """
+    t0 = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    def lap(name: str, since: float) -> float:
+        now = time.perf_counter()
+        timings[name] = round((now - since) * 1000, 1)
+        return now
+
+    admissions = _active_admissions(db, day)
+    cases, cases_created = _cases(db, admissions, user)
+    admissions = [a for a in admissions
+                  if cases[int(a.id)].status not in (BillingCaseStatus.CLOSED, BillingCaseStatus.CANCELLED)]
+    case_ids = sorted({int(cases[int(a.id)].id) for a in admissions})
+
+    items = []
+    codes = nursing_codes()
+    if codes:
+        items = (db.query(ChargeItemMaster)
+                 .filter(ChargeItemMaster.code.in_(codes))
+                 .filter(ChargeItemMaster.is_active.is_(True))
+                 .order_by(ChargeItemMaster.id.asc())
+                 .all())
+    item_module = {int(it.id): expected_invoice_module_for_charge_item(it) for it in items}
+    item_group = {int(it.id): resolve_service_group(db, getattr(it, "service_header", None)) for it in items}
+
+    modules = {ROOM_MODULE, PACKAGE_MODULE, *item_module.values()}
+    keys = _existing_keys(db, case_ids, modules | {"IPD", "IPD_ROOM"})
+    room_billed = _room_billed_days(keys)
+    invoices = _invoices(db, case_ids, modules)
+
+    pkg_ids = {int(a.package_id) for a in admissions if a.package_id}
+    packages = ({p.id: p for p in db.query(IpdPackage).filter(IpdPackage.id.in_(sorted(pkg_ids))).all()}
+                if pkg_ids else {})
+    rooms = room_days_many(db, [int(a.id) for a in admissions], day, day,
+                           room_type=_room_type, tz=local_tz())
+    plan_ids = {int(c.tariff_plan_id) for c in cases.values() if c.tariff_plan_id}
+    bed_ids = {int(rd.bed.id) for days in rooms.values() for rd in days if rd.bed is not None}
+    bed_tariff = _tariffs(db, plan_ids, "BED", bed_ids)
+    item_tariff = _tariffs(db, plan_ids, "CHARGE_ITEM", set(item_module))
+    t = lap("load", t0)
+
+    def invoice_for(case: BillingCase, module: str) -> BillingInvoice:
+        inv = invoices.get((int(case.id), module))
+        if inv is None:
+            inv = invoices[(int(case.id), module)] = get_or_create_active_module_invoice(
+                db, billing_case_id=int(case.id), user=user, module=module)
+        return inv
+
+    svc_dt = datetime.combine(day, dtime.min)
+    new_lines: List[BillingInvoiceLine] = []
+    counts = {"room": 0, "nursing": 0, "package": 0}
+    skipped = 0
+    missing_rate: List[int] = []
+
+    def add(case: BillingCase, module: str, prefix: str, key_id: int, key_dt: str, **kw) -> bool:
+        ref, key = _mk_idem(case, prefix, key_id, key_dt)
+        if (int(case.id), module, key) in keys:
+            return False
+        keys.add((int(case.id), module, key))
+        inv = invoice_for(case, module)
+        new_lines.append(build_auto_line(
+            billing_case_id=int(case.id),
+            invoice_id=int(inv.id),
+            user=user,
+            qty=Decimal("1"),
+            source_module=module,
+            source_ref_id=ref,
+            source_line_key=key,
+            **kw,
+        ))
+        return True
+
+    for adm in admissions:
+        case = cases[int(adm.id)]
+        plan = int(case.tariff_plan_id) if case.tariff_plan_id else None
+
+        # ---- room
+        for rd in rooms.get(int(adm.id), []):
+            if rd.bed is None:
+                continue
+            if (int(case.id), day.isoformat()) in room_billed:
+                skipped += 1
+                continue
+            rate, gst = bed_tariff.get((plan, int(rd.bed.id)), (Decimal("0"), Decimal("0")))
+            if rate <= 0:
+                rate, gst = _d(rd.rate), Decimal("0")
+            if rate <= 0:
+                missing_rate.append(int(adm.id))
+                continue
+            room = rd.room
+            if add(case, ROOM_MODULE, "BED", int(rd.bed.id), day.isoformat(),
+                   service_group=ServiceGroup.ROOM,
+                   item_type="BED",
+                   item_id=int(rd.bed.id),
+                   item_code=getattr(rd.bed, "code", None),
+                   description=f"OBSERVATION/BED CHARGES - {getattr(rd.bed, 'code', rd.bed.id)}",
+                   unit_price=rate,
+                   gst_rate=gst,
+                   service_date=svc_dt,
+                   meta_patch={
+                       "bed": {
+                           "bed_id": int(rd.bed.id),
+                           "bed_code": getattr(rd.bed, "code", None),
+                           "ward_id": int(room.ward_id) if room and room.ward_id else None,
+                           "room_id": int(room.id) if room else None,
+                           "room_number": getattr(room, "number", None) if room else None,
+                           "room_type": rd.room_type or "",
+                       },
+                       "auto": {"job": "ipd_daily_charges", "day": day.isoformat()},
+                   }):
+                counts["room"] += 1
+            else:
+                skipped += 1
+
+        # ---- nursing
+        for it in items:
+            iid = int(it.id)
+            rate, gst = item_tariff.get((plan, iid), (Decimal("0"), Decimal("0")))
+            if rate <= 0:
+                rate, gst = _d(it.price), _d(it.gst_rate)
+            if rate <= 0:
+                continue
+            if add(case, item_module[iid], "CHG", iid, day.isoformat(),
+                   service_group=item_group[iid],
+                   item_type="CHARGE_ITEM",
+                   item_id=iid,
+                   item_code=it.code,
+                   description=f"{it.name} - {day.isoformat()}",
+                   unit_price=rate,
+                   gst_rate=gst,
+                   service_date=svc_dt,
+                   meta_patch={
+                       "charge_item": {"id": iid, "category": it.category, "code": it.code, "name": it.name},
+                       "auto": {"job": "ipd_daily_charges", "day": day.isoformat()},
+                   }):
+                counts["nursing"] += 1
+            else:
+                skipped += 1
+
+        # ---- package (once, on the admission day)
+        pkg = packages.get(int(adm.package_id)) if adm.package_id else None
+        if pkg is not None and _d(pkg.charges) > 0:
+            adm_day = _local_day(adm.admitted_at)
+            if add(case, PACKAGE_MODULE, "PKG", int(pkg.id), adm_day.isoformat(),
+                   service_group=ServiceGroup.IPD,
+                   item_type="PACKAGE",
+                   item_id=int(pkg.id),
+                   description=f"IPD Package - {pkg.name}",
+                   unit_price=_d(pkg.charges),
+                   gst_rate=Decimal("0"),
+                   service_date=datetime.combine(adm_day, dtime.min),
+                   meta_patch={"package": {"id": int(pkg.id), "name": pkg.name}}):
+                counts["package"] += 1
+    t = lap("build", t)
+
+    if new_lines:
+        cols = [c.key for c in sa_inspect(BillingInvoiceLine).column_attrs
+                if c.key not in ("id", "created_at", "updated_at")]
+        db.execute(insert(BillingInvoiceLine), [_row(ln, cols) for ln in new_lines])
+    t = lap("insert", t)
+
+    touched = sorted({int(ln.invoice_id) for ln in new_lines})
+    for inv_id in touched:
+        reconcile_invoice_totals(db, inv_id, fix=True)
+    lap("totals", t)
+
+    return {
+        "day": day.isoformat(),
+        "admissions": len(admissions),
+        "cases_created": cases_created,
+        "lines": sum(counts.values()),
+        "by_kind": counts,
+        "skipped_existing": skipped,
+        "missing_rate_admissions": missing_rate,
+        "invoices": len(touched),
+        "ms": timings,
+        "total_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
@@ -0,0 +1,163 @@
+# FILE: app/services/ipd_room_charges.py
+"""
+Day-by-day IPD room charges for one admission, computed from a single
+load of its bed assignments, their beds / rooms and the bed-rate table.
+
+Shared by the bed-charge preview (routes_ipd), ipd_billing (breakdown and
+sync_ipd_room_charges) and billing_ipd_room (transfer / discharge sync).
+The billing rules are the ones those callers applied day by day:
+
+  * a day belongs to the assignment active at any moment of it; on a
+    transfer day the latest-started assignment wins
+  * the rate is the active IpdBedRate of the room type with the latest
+    effective_from on or before the day (effective_to inclusive)
+
+Each assignment's [from_ts, to_ts] interval is clamped to the requested
+window and laid over the days it covers (later starts overwrite earlier
+ones), so a 120-day stay costs four queries instead of three per day.
+room_days_many() does the same for a batch of admissions (the nightly
+charge job) in the same four queries.
+Callers keep their own room-type normalisation and day boundary (naive
+timestamps as stored, or UTC converted to IST).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.ipd import IpdBed, IpdBedAssignment, IpdBedRate, IpdRoom
+
+
+@dataclass
+class RoomDay:
+    day: date
+    assignment: IpdBedAssignment
+    bed: Optional[IpdBed]
+    room: Optional[IpdRoom]
+    room_type: Optional[str]
+    rate: Optional[Decimal]  # None: no active rate for room_type on this day
+
+
+def _rate_key(room_type: str) -> str:
+    # ipd_bed_rates.room_type compares under utf8mb4_unicode_ci
+    # (case-insensitive, trailing spaces ignored)
+    return room_type.rstrip().casefold()
+
+
+class RateTable:
+    """Active IpdBedRate rows for a set of room types, resolved in memory."""
+
+    def __init__(self, db: Session, room_types: Iterable[Optional[str]]):
+        types = sorted({t for t in room_types if t is not None})
+        self._rows: Dict[str, List[IpdBedRate]] = {}
+        if not types:
+            return
+        rows = (db.query(IpdBedRate)
+                .filter(IpdBedRate.is_active.is_(True))
+                .filter(IpdBedRate.room_type.in_(types))
+                .order_by(IpdBedRate.id.asc())
+                .all())
+        for r in sorted(rows, key=lambda r: r.effective_from, reverse=True):
+            self._rows.setdefault(_rate_key(r.room_type), []).append(r)
+
+    def rate(self, room_type: Optional[str], day: date) -> Optional[Decimal]:
+        if room_type is None:
+            return None
+        for r in self._rows.get(_rate_key(room_type), ()):
+            if r.effective_from <= day and (r.effective_to is None or r.effective_to >= day):
+                return Decimal(str(r.daily_rate))
+        return None
+
+
+def _day_of(ts: datetime, tz: Optional[tzinfo]) -> date:
+    if tz is None:
+        return ts.date()
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)  # stored naive UTC
+    return ts.astimezone(tz).date()
+
+
+def room_days(
+    db: Session,
+    admission_id: int,
+    from_date: date,
+    to_date: date,
+    *,
+    room_type: Callable[[Optional[IpdRoom]], Optional[str]],
+    tz: Optional[tzinfo] = None,
+) -> List[RoomDay]:
+    """
+    One RoomDay per billable day in [from_date, to_date].
+    `room_type(room)` maps the assigned room (None when the bed / room is
+    missing) to the room type used for display and rate lookup; `tz`
+    converts stored UTC timestamps before taking the calendar day.
+    """
+    return room_days_many(db, [admission_id], from_date, to_date,
+                          room_type=room_type, tz=tz).get(admission_id, [])
+
+
+def room_days_many(
+    db: Session,
+    admission_ids: Iterable[int],
+    from_date: date,
+    to_date: date,
+    *,
+    room_type: Callable[[Optional[IpdRoom]], Optional[str]],
+    tz: Optional[tzinfo] = None,
+) -> Dict[int, List[RoomDay]]:
+    """room_days() for several admissions with the same four queries."""
+    ids = sorted({int(x) for x in admission_ids})
+    if not ids:
+        return {}
+    assigns = (db.query(IpdBedAssignment)
+               .filter(IpdBedAssignment.admission_id.in_(ids))
+               .order_by(IpdBedAssignment.from_ts.asc())
+               .all())
+
+    by_adm: Dict[int, Dict[date, IpdBedAssignment]] = {}
+    one = timedelta(days=1)
+    for a in assigns:
+        if a.from_ts is None:
+            continue
+        by_day = by_adm.setdefault(int(a.admission_id), {})
+        d = max(_day_of(a.from_ts, tz), from_date)
+        end = min(_day_of(a.to_ts, tz), to_date) if a.to_ts else to_date
+        while d <= end:
+            by_day[d] = a
+            d += one
+
+    used = {a for by_day in by_adm.values() for a in by_day.values()}
+    if not used:
+        return {}
+
+    bed_ids = {a.bed_id for a in used if a.bed_id}
+    beds = {b.id: b for b in db.query(IpdBed).filter(IpdBed.id.in_(bed_ids)).all()} if bed_ids else {}
+    room_ids = {b.room_id for b in beds.values() if b.room_id}
+    rooms = {r.id: r for r in db.query(IpdRoom).filter(IpdRoom.id.in_(room_ids)).all()} if room_ids else {}
+
+    types: Dict[int, Optional[str]] = {}
+    for a in used:
+        bed = beds.get(a.bed_id)
+        types[a.id] = room_type(rooms.get(bed.room_id) if bed else None)
+    rates = RateTable(db, types.values())
+
+    out: Dict[int, List[RoomDay]] = {}
+    for adm_id, by_day in by_adm.items():
+        days = out[adm_id] = []
+        for d in sorted(by_day):
+            a = by_day[d]
+            bed = beds.get(a.bed_id)
+            rt = types[a.id]
+            days.append(RoomDay(
+                day=d,
+                assignment=a,
+                bed=bed,
+                room=rooms.get(bed.room_id) if bed else None,
+                room_type=rt,
+                rate=rates.rate(rt, d),
+            ))
+    return out
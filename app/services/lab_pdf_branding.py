@@ -7,10 +7,10 @@ from typing import Any, Optional
 
 from reportlab.lib import colors
 from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase.pdfmetrics import stringWidth
 
 from app.core.config import settings
+from app.services import pdf_assets
 
 logger = logging.getLogger(__name__)
 
@@ -93,7 +93,7 @@ def draw_clean_brand_header(
 
     if logo_path:
         try:
-            img = ImageReader(str(logo_path))
+            img = pdf_assets.image_reader(logo_path)
             c.drawImage(
                 img,
                 left,
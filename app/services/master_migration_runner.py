@@ -0,0 +1,438 @@
+# FILE: app/services/master_migration_runner.py
+"""
+Background executor for master tenant migrations (routes_master_migrations).
+
+POST /master/migrations/apply records the job and one PENDING row per
+tenant in master_migration_job_targets, then hands the job to start() and
+returns. The tenant DDL runs off-request:
+
+  * up to MIGRATION_WORKERS tenants of a job at once, and never more than
+    MIGRATION_HOST_CONCURRENCY statements against one MySQL server
+    (host:port of the tenant's db_uri) across all jobs of this process
+  * transient errors (lock wait timeout, deadlock, lost connection) are
+    retried up to MIGRATION_MAX_ATTEMPTS times with backoff; on a retry or
+    a resumed target, a statement that turns out to be applied already
+    (table / column / key exists, nothing to drop) is noted and skipped
+  * cancel_requested is polled about once a second: targets not started
+    become SKIPPED, running ones finish their tenant
+  * the first permanent failure stops scheduling; the job ends FAILED and
+    the targets not started are SKIPPED
+
+Targets are claimed PENDING -> RUNNING with a conditional UPDATE and each
+finished tenant is committed at once, so GET /jobs and /jobs/{id} show
+progress while the job runs. A job belongs to whoever holds the MySQL
+named lock for it (GET_LOCK on a master connection kept for the run). On
+startup every API process calls resume_running(); one of them takes each
+unfinished job, puts its orphaned RUNNING targets back to PENDING and
+carries on.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+from app.db.session import MasterSessionLocal, master_engine
+from app.services.master_ddl import build_sql_for_op
+
+logger = logging.getLogger(__name__)
+
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+DONE = "DONE"
+FAILED = "FAILED"
+SKIPPED = "SKIPPED"
+CANCELLED = "CANCELLED"
+
+# MySQL error codes
+_ALREADY_APPLIED = {1050, 1060, 1061, 1091}  # table / column / key exists, can't DROP
+_TRANSIENT = {1040, 1158, 1159, 1205, 1213, 2003, 2006, 2013}
+
+_POLL_SECONDS = 1.0
+
+
+# ============================================================
+# Admin DDL engines (one per MySQL server, cached)
+# ============================================================
+_lock = threading.Lock()
+_engines: Dict[str, Engine] = {}
+
+
+def _mysql_admin_base_url(host: Optional[str] = None, port: Optional[int] = None) -> str:
+    """
+    Uses MYSQL_ADMIN_* if set; fallback to app MYSQL_*.
+    Matches your session.py pool settings.
+    """
+    from urllib.parse import quote_plus
+
+    driver = getattr(settings, "DB_DRIVER", "pymysql")
+    host = host or getattr(settings, "MYSQL_HOST", "localhost")
+    port = port or getattr(settings, "MYSQL_PORT", 3306)
+
+    user = getattr(settings, "MYSQL_ADMIN_USER", None) or getattr(settings, "MYSQL_USER", "root")
+    pw_raw = getattr(settings, "MYSQL_ADMIN_PASSWORD", None)
+    if pw_raw is None:
+        pw_raw = getattr(settings, "MYSQL_PASSWORD", "")
+
+    pw = quote_plus(pw_raw or "")
+    return f"mysql+{driver}://{user}:{pw}@{host}:{port}"
+
+
+def admin_engine(db: str) -> Engine:
+    """
+    db: 'mysql' for global db ops, or tenant db_name for tenant ops.
+    """
+    eng = _engines.get(db)
+    if eng is None:
+        with _lock:
+            eng = _engines.get(db)
+            if eng is None:
+                eng = create_engine(
+                    f"{_mysql_admin_base_url()}/{db}",
+                    pool_pre_ping=True,
+                    pool_recycle=280,
+                    pool_size=10,
+                    max_overflow=20,
+                    future=True,
+                )
+                _engines[db] = eng
+    return eng
+
+
+def host_of(db_uri: Optional[str]) -> Tuple[str, int]:
+    """(host, port) of the MySQL server holding a tenant DB."""
+    try:
+        u = make_url(db_uri or "")
+        return (u.host or settings.MYSQL_HOST, int(u.port or 3306))
+    except Exception:
+        return (settings.MYSQL_HOST, int(settings.MYSQL_PORT))
+
+
+def _host_engine(host: Tuple[str, int]) -> Engine:
+    key = f"@{host[0]}:{host[1]}"
+    eng = _engines.get(key)
+    if eng is None:
+        with _lock:
+            eng = _engines.get(key)
+            if eng is None:
+                n = max(1, int(settings.MIGRATION_HOST_CONCURRENCY))
+                # tenant DDL is schema-qualified (`db`.`table`), so one
+                # connection pool per server serves every tenant on it
+                eng = create_engine(
+                    f"{_mysql_admin_base_url(*host)}/mysql",
+                    pool_pre_ping=True,
+                    pool_recycle=280,
+                    pool_size=n,
+                    max_overflow=n,
+                    future=True,
+                )
+                _engines[key] = eng
+    return eng
+
+
+def _execute(host: Tuple[str, int], sql: str) -> None:
+    with _host_engine(host).connect() as conn:
+        conn.execute(text(sql))
+        conn.commit()
+
+
+def _mysql_errno(e: BaseException) -> Optional[int]:
+    orig = getattr(e, "orig", None) if isinstance(e, DBAPIError) else e
+    args = getattr(orig, "args", None) or ()
+    return args[0] if args and isinstance(args[0], int) else None
+
+
+# ============================================================
+# Master rows
+# ============================================================
+def _exec(sql: str, params: Dict[str, Any]) -> int:
+    with MasterSessionLocal() as mdb:
+        n = mdb.execute(text(sql), params).rowcount
+        mdb.commit()
+        return int(n or 0)
+
+
+def _claim(job_id: int, tenant_id: int) -> bool:
+    return _exec("""
+        UPDATE master_migration_job_targets
+        SET status='RUNNING', started_at=CURRENT_TIMESTAMP, finished_at=NULL, error=NULL
+        WHERE job_id=:j AND tenant_id=:t AND status='PENDING'
+    """, {"j": job_id, "t": tenant_id}) == 1
+
+
+def _finish_target(job_id: int, tenant_id: int, status: str, executed: List[str],
+                   error: Optional[str] = None) -> None:
+    _exec("""
+        UPDATE master_migration_job_targets
+        SET status=:s, finished_at=CURRENT_TIMESTAMP, error=:err, executed_sql=:sql
+        WHERE job_id=:j AND tenant_id=:t
+    """, {"j": job_id, "t": tenant_id, "s": status, "err": error, "sql": "\n".join(executed)})
+
+
+def _skip_pending(job_id: int, reason: str) -> None:
+    _exec("""
+        UPDATE master_migration_job_targets
+        SET status='SKIPPED', finished_at=CURRENT_TIMESTAMP, error=:r
+        WHERE job_id=:j AND status='PENDING'
+    """, {"j": job_id, "r": reason})
+
+
+def _set_job_status(job_id: int, status: str) -> None:
+    _exec("UPDATE master_migration_jobs SET status=:s WHERE id=:id", {"id": job_id, "s": status})
+
+
+def _cancel_requested(job_id: int) -> bool:
+    with MasterSessionLocal() as mdb:
+        return bool(mdb.execute(text("SELECT cancel_requested FROM master_migration_jobs WHERE id=:id"),
+                                {"id": job_id}).scalar())
+
+
+def progress(mdb, job_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """{job_id: {status: count, ..., "total": n}} for the /jobs endpoints."""
+    if not job_ids:
+        return {}
+    rows = mdb.execute(text("""
+        SELECT job_id, status, COUNT(*) AS n
+        FROM master_migration_job_targets
+        WHERE job_id IN :ids
+        GROUP BY job_id, status
+    """).bindparams(bindparam("ids", expanding=True)), {"ids": list(job_ids)}).all()
+    out: Dict[int, Dict[str, int]] = {int(j): {"total": 0} for j in job_ids}
+    for job_id, status, n in rows:
+        p = out.setdefault(int(job_id), {"total": 0})
+        p[str(status)] = int(n)
+        p["total"] += int(n)
+    return out
+
+
+# ============================================================
+# Job lock (one owner per job across API processes)
+# ============================================================
+def _acquire(job_id: int) -> Optional[Connection]:
+    conn = master_engine.connect()
+    try:
+        if conn.dialect.name == "mysql":
+            name = f"{settings.MASTER_MYSQL_DB}:migration_job:{job_id}"[-64:]
+            if conn.execute(text("SELECT GET_LOCK(:n, 0)"), {"n": name}).scalar() != 1:
+                conn.close()
+                return None
+            conn.info["migration_lock"] = name
+        return conn
+    except Exception:
+        conn.close()
+        raise
+
+
+def _release(conn: Connection) -> None:
+    try:
+        name = conn.info.pop("migration_lock", None)
+        if name:
+            conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": name})
+    finally:
+        conn.close()
+
+
+# ============================================================
+# Runner
+# ============================================================
+_active: Set[int] = set()  # jobs coordinated by this process
+_host_running: Dict[Tuple[str, int], int] = defaultdict(int)
+
+
+@dataclass
+class _Target:
+    tenant_id: int
+    db_name: str
+    host: Tuple[str, int]
+    resumed: bool = False
+    executed: List[str] = field(default_factory=list)
+
+
+def _run_target(job_id: int, t: _Target, tenant_ops: List[Dict[str, Any]], dry_run: bool) -> Tuple[str, Optional[str]]:
+    try:
+        statements = [sql for op in tenant_ops for sql in build_sql_for_op(op, db_name=t.db_name)]
+    except ValueError as e:
+        return FAILED, str(e)
+
+    attempts = max(1, int(settings.MIGRATION_MAX_ATTEMPTS))
+    attempt = 1
+    i = 0
+    while i < len(statements):
+        sql = statements[i]
+        if dry_run:
+            t.executed.append(sql)
+            i += 1
+            continue
+        try:
+            _execute(t.host, sql)
+            t.executed.append(sql)
+            i += 1
+        except Exception as e:
+            code = _mysql_errno(e)
+            if code in _ALREADY_APPLIED and (t.resumed or attempt > 1):
+                t.executed.append(f"-- already applied ({code}): {sql}")
+                i += 1
+                continue
+            if code in _TRANSIENT and attempt < attempts:
+                logger.warning("migration job %s tenant %s: attempt %s failed (%s), retrying",
+                               job_id, t.tenant_id, attempt, code)
+                time.sleep(min(2 ** attempt, 30))
+                attempt += 1
+                continue
+            suffix = f" (after {attempt} attempts)" if attempt > 1 else ""
+            return FAILED, f"{e}{suffix}"
+    return DONE, None
+
+
+def _load(job_id: int):
+    with MasterSessionLocal() as mdb:
+        job = mdb.execute(text("""
+            SELECT id, status, ops_json, dry_run FROM master_migration_jobs WHERE id=:id
+        """), {"id": job_id}).mappings().first()
+        if not job or job["status"] != RUNNING:
+            return None, []
+        # orphaned by a crashed / restarted owner: we hold the job lock now
+        orphaned = set(mdb.execute(text("""
+            SELECT tenant_id FROM master_migration_job_targets WHERE job_id=:j AND status='RUNNING'
+        """), {"j": job_id}).scalars().all())
+        if orphaned:
+            mdb.execute(text("""
+                UPDATE master_migration_job_targets SET status='PENDING'
+                WHERE job_id=:j AND status='RUNNING'
+            """), {"j": job_id})
+            mdb.commit()
+        rows = mdb.execute(text("""
+            SELECT jt.tenant_id, t.db_name, t.db_uri
+            FROM master_migration_job_targets jt
+            JOIN tenants t ON t.id = jt.tenant_id
+            WHERE jt.job_id=:j AND jt.status='PENDING'
+            ORDER BY jt.tenant_id
+        """), {"j": job_id}).all()
+    targets = [_Target(int(tid), str(dbn), host_of(uri), resumed=int(tid) in orphaned)
+               for tid, dbn, uri in rows]
+    return job, targets
+
+
+def _coordinate(job_id: int) -> None:
+    conn = _acquire(job_id)
+    if conn is None:
+        return  # another process owns it
+    try:
+        job, targets = _load(job_id)
+        if job is None:
+            return
+        ops = job["ops_json"]
+        ops = json.loads(ops) if isinstance(ops, (str, bytes)) else (ops or [])
+        tenant_ops = [op for op in ops if op.get("op") not in ("create_database", "drop_database")]
+        dry_run = bool(job["dry_run"])
+
+        # one queue per server, served round-robin so a busy server does
+        # not hold back tenants that live elsewhere
+        queues: Dict[Tuple[str, int], Deque[_Target]] = defaultdict(deque)
+        for t in targets:
+            queues[t.host].append(t)
+        per_host = max(1, int(settings.MIGRATION_HOST_CONCURRENCY))
+        workers = max(1, int(settings.MIGRATION_WORKERS))
+        running: Dict[Future, _Target] = {}
+        stop: Optional[str] = None
+        last_poll = 0.0
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"migration-{job_id}") as pool:
+            while True:
+                now = time.monotonic()
+                if stop is None and now - last_poll >= _POLL_SECONDS:
+                    last_poll = now
+                    if _cancel_requested(job_id):
+                        stop = CANCELLED
+
+                if stop is None:
+                    for host in list(queues):
+                        while queues[host] and len(running) < workers:
+                            with _lock:
+                                if _host_running[host] >= per_host:
+                                    break
+                                _host_running[host] += 1
+                            t = queues[host].popleft()
+                            if not _claim(job_id, t.tenant_id):
+                                with _lock:
+                                    _host_running[host] -= 1
+                                continue
+                            running[pool.submit(_run_target, job_id, t, tenant_ops, dry_run)] = t
+                        if not queues[host]:
+                            queues.pop(host)
+
+                if not running:
+                    if stop is not None or not queues:
+                        break
+                    time.sleep(0.2)  # every server with work is busy with other jobs
+                    continue
+
+                done, _ = wait(list(running), timeout=_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    t = running.pop(fut)
+                    with _lock:
+                        _host_running[t.host] -= 1
+                    try:
+                        status, error = fut.result()
+                    except Exception as e:  # bug / master DB down mid-target
+                        status, error = FAILED, str(e) or type(e).__name__
+                    _finish_target(job_id, t.tenant_id, status, t.executed, error)
+                    if status == FAILED:
+                        stop = stop or FAILED
+
+        with MasterSessionLocal() as mdb:
+            counts = progress(mdb, [job_id]).get(job_id, {})
+        if stop == CANCELLED:
+            _skip_pending(job_id, "Cancelled")
+            _set_job_status(job_id, CANCELLED)
+        elif counts.get(FAILED):
+            _skip_pending(job_id, "Not run: job stopped after a failure")
+            _set_job_status(job_id, FAILED)
+        else:
+            _set_job_status(job_id, DONE)
+    except Exception:
+        logger.exception("migration job %s: runner crashed (resumes on next start)", job_id)
+    finally:
+        _release(conn)
+
+
+def _thread_main(job_id: int) -> None:
+    try:
+        _coordinate(job_id)
+    finally:
+        with _lock:
+            _active.discard(job_id)
+
+
+def start(job_id: int) -> bool:
+    """Run (or resume) a job in a background thread; False if it already runs here."""
+    with _lock:
+        if job_id in _active:
+            return False
+        _active.add(job_id)
+    threading.Thread(target=_thread_main, args=(int(job_id),), name=f"migration-job-{job_id}",
+                     daemon=True).start()
+    return True
+
+
+def resume_running() -> None:
+    """Pick up jobs left RUNNING by a previous process (called on startup)."""
+    try:
+        with MasterSessionLocal() as mdb:
+            ids = mdb.execute(text("SELECT id FROM master_migration_jobs WHERE status='RUNNING' ORDER BY id")
+                              ).scalars().all()
+    except Exception:
+        logger.exception("migration runner: could not list unfinished jobs")
+        return
+    for job_id in ids:
+        start(int(job_id))
@@ -8,16 +8,14 @@ from typing import Any, Callable, Dict, List
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
+from app.core.rbac import compiled_perms
 from app.models.user import User
 from app.models.patient import Patient
-from app.models.opd import Appointment, Visit  # noqa: F401
-from app.models.ipd import IpdAdmission
-# ✅ use NEW pharmacy models
-from app.models.pharmacy_prescription import PharmacySale, PharmacySaleItem
+from app.models.opd import Appointment  # noqa: F401
 from app.models.lis import LisOrder
 from app.models.ris import RisOrder
 from app.models.ot import OtSchedule, OtCase  
-from app.models.billing import BillingInvoice as Invoice, BillingInvoiceLine as InvoiceItem, BillingPayment as Payment
+from app.services.daily_rollups import RollupReader
 
 from app.schemas.mis import (
     MISFilter,
@@ -38,16 +36,7 @@ def _user_has_perm_prefix(user: User, prefixes: List[str]) -> bool:
     if user.is_admin:
         return True
 
-    perm_codes = set()
-    for role in user.roles:
-        for p in getattr(role, "permissions", []):
-            perm_codes.add(p.code)
-
-    for pref in prefixes:
-        for c in perm_codes:
-            if c.startswith(pref):
-                return True
-    return False
+    return compiled_perms(user).has_any_prefix(prefixes)
 
 
 def _date_range(filters: MISFilter) -> tuple[datetime, datetime]:
@@ -75,6 +64,12 @@ def _safe_float(val: Any) -> float:
     return float(val or 0)
 
 
+def _rollups(db: Session, filters: MISFilter) -> RollupReader:
+    """Daily rollups for the filter range (closed days stored, today live)."""
+    start_dt, end_dt = _date_range(filters)
+    return RollupReader(db, start_dt.date(), (end_dt - timedelta(days=1)).date())
+
+
 # ---------- MIS Definition object ----------
 
 
@@ -94,38 +89,32 @@ class MISDefinition:
 
 def _report_patient_registration_summary(
         db: Session, user: User, filters: MISFilter) -> MISRawReportResult:
-    start_dt, end_dt = _date_range(filters)
-
-    q = db.query(
-        func.count(Patient.id).label("total"),
-        func.coalesce(func.min(Patient.created_at), None).label("first_at"),
-        func.coalesce(func.max(Patient.created_at), None).label("last_at"),
-    ).filter(
-        Patient.created_at >= start_dt,
-        Patient.created_at < end_dt,
-    )
-
     # If you store department on Patient, you can filter here.
     if filters.department_id:
         # Example (adjust field name):
         # q = q.filter(Patient.department_id == filters.department_id)
         pass
 
-    row = q.one()
-
-    rows = (db.query(
-        func.date(Patient.created_at).label("day"),
-        func.count(Patient.id).label("count"),
-    ).filter(
-        Patient.created_at >= start_dt,
-        Patient.created_at < end_dt,
-    ).group_by(func.date(Patient.created_at)).order_by(
-        func.date(Patient.created_at)).all())
+    per_day = sorted((d, a.count) for d, a in _rollups(
+        db, filters).by_day("patients.registered").items() if a.count)
 
     data_rows = [{
-        "day": r.day.isoformat() if r.day else None,
-        "count": int(r.count or 0),
-    } for r in rows]
+        "day": d.isoformat(),
+        "count": int(c),
+    } for d, c in per_day]
+
+    # first / last registration: only the first and last busy day are scanned
+    first_at = last_at = None
+    if per_day:
+        first_day, last_day = per_day[0][0], per_day[-1][0]
+        first_at = db.query(func.min(Patient.created_at)).filter(
+            Patient.created_at >= datetime.combine(first_day, time.min),
+            Patient.created_at < datetime.combine(first_day + timedelta(days=1), time.min),
+        ).scalar()
+        last_at = db.query(func.max(Patient.created_at)).filter(
+            Patient.created_at >= datetime.combine(last_day, time.min),
+            Patient.created_at < datetime.combine(last_day + timedelta(days=1), time.min),
+        ).scalar()
 
     columns = [
         MISColumn(key="day", label="Date", type="date", align="left"),
@@ -154,11 +143,11 @@ def _report_patient_registration_summary(
         filters_applied=filters,
         summary={
             "total_patients":
-            int(row.total or 0),
+            sum(r["count"] for r in data_rows),
             "first_registration_at":
-            row.first_at.isoformat() if row.first_at else None,
+            first_at.isoformat() if first_at else None,
             "last_registration_at":
-            row.last_at.isoformat() if row.last_at else None,
+            last_at.isoformat() if last_at else None,
         },
         columns=columns,
         rows=data_rows,
@@ -178,15 +167,8 @@ def _report_opd_visit_summary(db: Session, user: User,
     This implementation returns an overall OPD visit count (all doctors).
     Once the Visit model is shared, we can extend this to true doctor-wise summary.
     """
-    start_dt, end_dt = _date_range(filters)
-
     # Count all visits in date range
-    total_row = (db.query(func.count(Visit.id).label("visits"), ).filter(
-        Visit.visit_at >= start_dt,
-        Visit.visit_at < end_dt,
-    ).one())
-
-    total_visits = int(total_row.visits or 0)
+    total_visits = int(_rollups(db, filters).total("opd.visits").count)
 
     # Single aggregate row (All doctors)
     data_rows = [{
@@ -235,21 +217,12 @@ def _report_opd_visit_summary(db: Session, user: User,
 
 def _report_ipd_admission_summary(db: Session, user: User,
                                   filters: MISFilter) -> MISRawReportResult:
-    start_dt, end_dt = _date_range(filters)
-
-    rows = (db.query(
-        func.date(IpdAdmission.admitted_at).label("day"),
-        func.count(IpdAdmission.id).label("admissions"),
-    ).filter(
-        IpdAdmission.admitted_at >= start_dt,
-        IpdAdmission.admitted_at < end_dt,
-    ).group_by(func.date(IpdAdmission.admitted_at)).order_by(
-        func.date(IpdAdmission.admitted_at)).all())
+    per_day = _rollups(db, filters).by_day("ipd.admissions")
 
     data_rows = [{
-        "day": r.day.isoformat(),
-        "admissions": int(r.admissions or 0)
-    } for r in rows if r.day]
+        "day": d.isoformat(),
+        "admissions": int(a.count)
+    } for d, a in sorted(per_day.items()) if a.count]
 
     total_admissions = sum(r["admissions"] for r in data_rows)
 
@@ -288,43 +261,22 @@ def _report_ipd_admission_summary(db: Session, user: User,
 
 def _report_billing_revenue_summary(db: Session, user: User,
                                     filters: MISFilter) -> MISRawReportResult:
-    start_dt, end_dt = _date_range(filters)
-
-    base_q = db.query(Invoice).filter(
-        Invoice.status == "finalized",
-        Invoice.finalized_at >= start_dt,
-        Invoice.finalized_at < end_dt,
-    )
+    """
+    Billed revenue (POSTED invoices, by posted date) split by encounter
+    type of the billing case, from daily rollups.
+    """
+    rollups = _rollups(db, filters)
+    billed = rollups.by_dim("billing.billed")
 
     if filters.context_type == "opd":
-        base_q = base_q.filter(Invoice.context_type == "opd")
+        billed = {k: v for k, v in billed.items() if k == "OP"}
     elif filters.context_type == "ipd":
-        base_q = base_q.filter(Invoice.context_type == "ipd")
-
-    total_row = (db.query(
-        func.count(Invoice.id).label("count"),
-        func.coalesce(func.sum(Invoice.net_total), 0).label("net_total"),
-        func.coalesce(func.sum(Invoice.amount_paid), 0).label("amount_paid"),
-        func.coalesce(func.sum(Invoice.balance_due), 0).label("balance_due"),
-    ).filter(
-        Invoice.status == "finalized",
-        Invoice.finalized_at >= start_dt,
-        Invoice.finalized_at < end_dt,
-    ).one())
-
-    ctx_rows = (db.query(
-        func.coalesce(Invoice.context_type, "other").label("ctx"),
-        func.coalesce(func.sum(Invoice.net_total), 0).label("net_total"),
-    ).filter(
-        Invoice.status == "finalized",
-        Invoice.finalized_at >= start_dt,
-        Invoice.finalized_at < end_dt,
-    ).group_by(Invoice.context_type).all())
+        billed = {k: v for k, v in billed.items() if k == "IP"}
 
     data_rows = [{
-        "stream": (r.ctx or "other").upper(),
-        "net_total": _safe_float(r.net_total),
-    } for r in ctx_rows]
+        "stream": (enc or "other").upper(),
+        "net_total": _safe_float(agg.amount),
+    } for enc, agg in sorted(billed.items())]
 
     columns = [
         MISColumn(key="stream", label="Stream", type="enum", align="left"),
@@ -354,10 +306,9 @@ def _report_billing_revenue_summary(db: Session, user: User,
             "period."),
         filters_applied=filters,
         summary={
-            "invoice_count": int(total_row.count or 0),
-            "total_net": _safe_float(total_row.net_total),
-            "total_paid": _safe_float(total_row.amount_paid),
-            "total_balance_due": _safe_float(total_row.balance_due),
+            "invoice_count": sum(int(a.count) for a in billed.values()),
+            "total_net": sum(_safe_float(a.amount) for a in billed.values()),
+            "total_paid": _safe_float(rollups.total("billing.collected").amount),
         },
         columns=columns,
         rows=data_rows,
@@ -369,39 +320,22 @@ def _report_billing_revenue_summary(db: Session, user: User,
 def _report_billing_collection_summary(
         db: Session, user: User, filters: MISFilter) -> MISRawReportResult:
     """
-    Collection summary report (by payment mode).
+    Collection summary report (by payment mode): payments received in
+    the selected period, from daily rollups.
     """
-    start_dt, end_dt = _date_range(filters)
-
-    totals = (db.query(
-        func.count(Invoice.id).label("invoice_count"),
-        func.coalesce(func.sum(Invoice.net_total), 0).label("net_total"),
-        func.coalesce(func.sum(Invoice.amount_paid), 0).label("amount_paid"),
-        func.coalesce(func.sum(Invoice.balance_due), 0).label("balance_due"),
-    ).filter(
-        Invoice.status == "finalized",
-        Invoice.finalized_at >= start_dt,
-        Invoice.finalized_at < end_dt,
-    ).one())
-
-    pay_q = (db.query(
-        Payment.mode.label("mode"),
-        func.coalesce(func.sum(Payment.amount), 0).label("amount"),
-    ).join(Invoice, Payment.invoice_id == Invoice.id).filter(
-        Invoice.status == "finalized",
-        Invoice.finalized_at >= start_dt,
-        Invoice.finalized_at < end_dt,
-    ).group_by(Payment.mode))
+    rollups = _rollups(db, filters)
+    by_mode = rollups.by_dim("billing.collected")
 
     if filters.payment_mode:
-        pay_q = pay_q.filter(Payment.mode == filters.payment_mode)
-
-    pay_rows = pay_q.all()
+        want = str(getattr(filters.payment_mode, "value", filters.payment_mode)).upper()
+        by_mode = {k: v for k, v in by_mode.items() if k.upper() == want}
 
     data_rows = [{
-        "mode": r.mode or "Unknown",
-        "amount": _safe_float(r.amount)
-    } for r in pay_rows]
+        "mode": mode or "Unknown",
+        "amount": _safe_float(agg.amount)
+    } for mode, agg in sorted(by_mode.items())]
+
+    billed = rollups.total("billing.billed")
 
     columns = [
         MISColumn(key="mode", label="Payment Mode", type="enum", align="left"),
@@ -430,10 +364,10 @@ def _report_billing_collection_summary(
         "Collection breakdown by payment mode (cash/card/UPI/credit).",
         filters_applied=filters,
         summary={
-            "invoice_count": int(totals.invoice_count or 0),
-            "total_net": _safe_float(totals.net_total),
-            "total_paid": _safe_float(totals.amount_paid),
-            "total_balance_due": _safe_float(totals.balance_due),
+            "invoice_count": int(billed.count),
+            "total_net": _safe_float(billed.amount),
+            "payment_count": sum(int(a.count) for a in by_mode.values()),
+            "total_paid": sum(_safe_float(a.amount) for a in by_mode.values()),
         },
         columns=columns,
         rows=data_rows,
@@ -449,37 +383,19 @@ def _report_pharmacy_sales_summary(db: Session, user: User,
     - Totals from PharmacySale (net_amount)
     - Top 10 items from PharmacySaleItem grouped by item_name
     """
-    start_dt, end_dt = _date_range(filters)
+    rollups = _rollups(db, filters)
 
     # ✅ Use net_amount (amount + tax) and ignore cancelled bills
-    total_row = (db.query(
-        func.coalesce(func.sum(PharmacySale.net_amount),
-                      0).label("total_amount"),
-        func.count(PharmacySale.id).label("sale_count"),
-    ).filter(
-        PharmacySale.created_at >= start_dt,
-        PharmacySale.created_at < end_dt,
-        PharmacySale.invoice_status != "CANCELLED",
-    ).one())
+    sales = rollups.total("pharmacy.sales")
 
     # ✅ Top items from NEW PharmacySaleItem
-    top_rows = (db.query(
-        PharmacySaleItem.item_name.label("medicine"),
-        func.coalesce(func.sum(PharmacySaleItem.quantity), 0).label("qty"),
-        func.coalesce(func.sum(PharmacySaleItem.total_amount),
-                      0).label("amount"),
-    ).join(PharmacySale, PharmacySaleItem.sale_id == PharmacySale.id).filter(
-        PharmacySale.created_at >= start_dt,
-        PharmacySale.created_at < end_dt,
-        PharmacySale.invoice_status != "CANCELLED",
-    ).group_by(PharmacySaleItem.item_name).order_by(
-        func.sum(PharmacySaleItem.quantity).desc()).limit(10).all())
+    top_rows = rollups.top("pharmacy.sold_items", 10, key="qty")
 
     data_rows = [{
-        "medicine": r.medicine,
-        "qty": int(r.qty or 0),
-        "amount": _safe_float(r.amount),
-    } for r in top_rows]
+        "medicine": medicine,
+        "qty": int(agg.qty or 0),
+        "amount": _safe_float(agg.amount),
+    } for medicine, agg in top_rows]
 
     columns = [
         MISColumn(
@@ -513,8 +429,8 @@ def _report_pharmacy_sales_summary(db: Session, user: User,
         description="Top 10 medicines by quantity sold in the selected period.",
         filters_applied=filters,
         summary={
-            "total_sales_amount": _safe_float(total_row.total_amount),
-            "sale_count": int(total_row.sale_count or 0),
+            "total_sales_amount": _safe_float(sales.amount),
+            "sale_count": int(sales.count),
         },
         columns=columns,
         rows=data_rows,
@@ -0,0 +1,286 @@
+# FILE: app/services/number_allocator.py
+"""
+Hi-lo block allocation for document number series.
+
+The classic path (SELECT ... FOR UPDATE on the series row, increment, keep
+the lock until the caller commits) serializes every cashier on one row for
+the full length of their billing transaction.
+
+Here each worker process reserves a block of N numbers in a short,
+independent transaction (lock -> next_number += N -> commit) and hands
+numbers out from memory. The series row is locked for milliseconds once
+per N documents instead of once per document for the whole transaction.
+
+Trade-offs (why strict mode exists):
+  - numbers are unique but not globally ordered across workers
+  - a rolled-back document or a worker restart leaves gaps
+Series listed in settings.NUMBER_SERIES_GAPLESS keep the old row-lock path;
+by default those are the statutory GST series (INVOICE, NOTE, RECEIPT),
+which must be consecutive, so blocks only serve CASE and inventory numbers.
+"""
+from __future__ import annotations
+
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.billing import BillingNumberSeries, NumberDocType, NumberResetPeriod
+from app.models.pharmacy_inventory import InvNumberSeries
+
+_MAX_KEYS = 4096
+
+
+# ============================================================
+# Config
+# ============================================================
+@lru_cache(maxsize=8)
+def _gapless_set(raw: str) -> frozenset:
+    return frozenset(x.strip().upper() for x in (raw or "").split(",") if x.strip())
+
+
+def is_gapless(series: str) -> bool:
+    """series = NumberDocType value ("INVOICE") or inventory key ("GRN")."""
+    names = _gapless_set(getattr(settings, "NUMBER_SERIES_GAPLESS", "") or "")
+    return "*" in names or (series or "").strip().upper() in names
+
+
+def block_size() -> int:
+    return max(1, int(getattr(settings, "NUMBER_SERIES_BLOCK_SIZE", 20) or 1))
+
+
+# ============================================================
+# In-memory blocks
+# ============================================================
+class _Block:
+    __slots__ = ("next", "end", "padding")
+
+    def __init__(self, first: int, count: int, padding: int):
+        self.next = first
+        self.end = first + count
+        self.padding = padding
+
+
+class NumberBlockAllocator:
+    """
+    Process-wide holder of reserved blocks, one per (tenant DB, series key).
+    A per-key lock makes the refill single-flight; other series never wait.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._blocks: Dict[Hashable, _Block] = {}
+        self.reservations = 0
+        self.handed_out = 0
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            lk = self._key_locks.get(key)
+            if lk is None:
+                if len(self._key_locks) >= _MAX_KEYS:
+                    self._prune_locked()
+                lk = self._key_locks[key] = threading.Lock()
+            return lk
+
+    def _prune_locked(self) -> None:
+        # drop exhausted blocks (old daily series); live blocks are kept
+        for k in [k for k, b in self._blocks.items() if b.next >= b.end]:
+            self._blocks.pop(k, None)
+            lk = self._key_locks.get(k)
+            if lk is not None and not lk.locked():
+                self._key_locks.pop(k, None)
+
+    def take(
+        self,
+        key: Hashable,
+        reserve: Callable[[int], Tuple[int, int]],
+        count: int,
+    ) -> Tuple[int, int]:
+        """
+        Returns (number, padding). `reserve(count)` must durably reserve
+        [first, first + count) and return (first, padding).
+        """
+        with self._key_lock(key):
+            b = self._blocks.get(key)
+            if b is None or b.next >= b.end:
+                first, padding = reserve(count)
+                b = _Block(int(first), int(count), int(padding))
+                self._blocks[key] = b
+                self.reservations += 1
+            n = b.next
+            b.next += 1
+            self.handed_out += 1
+            return n, b.padding
+
+    def discard(self, key: Optional[Hashable] = None) -> None:
+        """Forget cached blocks (their unused numbers become gaps)."""
+        with self._lock:
+            if key is None:
+                self._blocks.clear()
+            else:
+                self._blocks.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = sum(1 for b in self._blocks.values() if b.next < b.end)
+            remaining = sum(max(0, b.end - b.next) for b in self._blocks.values())
+        return {
+            "block_size": block_size(),
+            "gapless": sorted(_gapless_set(getattr(settings, "NUMBER_SERIES_GAPLESS", "") or "")),
+            "series": live,
+            "numbers_in_memory": remaining,
+            "reservations": self.reservations,
+            "handed_out": self.handed_out,
+        }
+
+
+allocator = NumberBlockAllocator()
+
+
+# ============================================================
+# Reservation transactions (independent of the caller's session)
+# ============================================================
+def _engine_of(db: Session):
+    bind = db.get_bind()
+    # a Session bound to a Connection would join the caller's transaction
+    return getattr(bind, "engine", bind)
+
+
+def _engine_key(engine) -> str:
+    return engine.url.render_as_string(hide_password=True)
+
+
+def _reserve(engine, lock_row: Callable[[Session], Any], create_row: Callable[[], Any],
+             advance: Callable[[Any], Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Short transaction on its own connection: lock (or create) the series
+    row, advance it by one block, commit. Creation races retry once.
+    """
+    for attempt in (1, 2):
+        s = Session(bind=engine, autoflush=False, expire_on_commit=False)
+        try:
+            row = lock_row(s)
+            if row is None:
+                row = create_row()
+                s.add(row)
+                s.flush()
+            out = advance(row)
+            s.commit()
+            return out
+        except IntegrityError:
+            s.rollback()
+            if attempt == 2:
+                raise
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+    raise RuntimeError("number block reservation failed")
+
+
+def reserve_billing_block(
+    engine,
+    *,
+    doc_type: NumberDocType,
+    prefix: str,
+    reset_period: NumberResetPeriod,
+    padding: int,
+    period_key: Optional[str],
+    count: int,
+    require_active: bool = False,
+) -> Tuple[int, int]:
+    def lock_row(s: Session):
+        return (s.query(BillingNumberSeries).filter(
+            BillingNumberSeries.doc_type == doc_type,
+            BillingNumberSeries.reset_period == reset_period,
+            BillingNumberSeries.prefix == prefix,
+        ).with_for_update().first())
+
+    def create_row():
+        return BillingNumberSeries(
+            doc_type=doc_type,
+            prefix=prefix,
+            reset_period=reset_period,
+            padding=int(padding or 6),
+            next_number=1,
+            last_period_key=period_key,
+            is_active=True,
+        )
+
+    def advance(row) -> Tuple[int, int]:
+        if require_active and not row.is_active:
+            raise RuntimeError("Number series is inactive")
+        if reset_period != NumberResetPeriod.NONE and (row.last_period_key or "") != (period_key or ""):
+            row.next_number = 1
+            row.last_period_key = period_key
+        first = int(row.next_number or 1)
+        row.next_number = first + count
+        return first, int(row.padding or padding or 6)
+
+    return _reserve(engine, lock_row, create_row, advance)
+
+
+def reserve_inventory_block(engine, *, key: str, date_key: int, count: int) -> Tuple[int, int]:
+    def lock_row(s: Session):
+        return (s.query(InvNumberSeries).filter(
+            InvNumberSeries.key == key,
+            InvNumberSeries.date_key == date_key,
+        ).with_for_update().first())
+
+    def create_row():
+        return InvNumberSeries(key=key, date_key=date_key, next_seq=1)
+
+    def advance(row) -> Tuple[int, int]:
+        first = int(row.next_seq or 1)
+        row.next_seq = first + count
+        return first, 0
+
+    return _reserve(engine, lock_row, create_row, advance)
+
+
+# ============================================================
+# PUBLIC helpers used by the numbering services
+# ============================================================
+def take_billing_number(
+    db: Session,
+    *,
+    doc_type: NumberDocType,
+    prefix: str,
+    reset_period: NumberResetPeriod,
+    padding: int,
+    period_key: Optional[str],
+    require_active: bool = False,
+) -> Tuple[int, int]:
+    """(number, stored padding) from this worker's block for the series."""
+    engine = _engine_of(db)
+    count = block_size()
+    key = (_engine_key(engine), "billing", doc_type.value, reset_period.value, prefix, period_key)
+    return allocator.take(
+        key,
+        lambda n: reserve_billing_block(
+            engine,
+            doc_type=doc_type,
+            prefix=prefix,
+            reset_period=reset_period,
+            padding=padding,
+            period_key=period_key,
+            count=n,
+            require_active=require_active,
+        ),
+        count,
+    )
+
+
+def take_inventory_number(db: Session, *, key: str, date_key: int) -> int:
+    engine = _engine_of(db)
+    n, _pad = allocator.take(
+        (_engine_key(engine), "inventory", key, date_key),
+        lambda count: reserve_inventory_block(engine, key=key, date_key=date_key, count=count),
+        block_size(),
+    )
+    return n
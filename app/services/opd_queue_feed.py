@@ -0,0 +1,176 @@
+# FILE: app/services/opd_queue_feed.py
+"""
+Change feed for the OPD appointment queue (reception and doctor screens).
+
+Screens used to re-poll GET /opd/appointments for the whole day. Now:
+
+  * every flush that inserts, edits or deletes an Appointment, or adds a
+    Visit / Vitals linked to one, writes opd_queue_changes rows
+    (date, doctor, appointment) from a Session hook, so status changes,
+    reschedules (old and new day), vitals capture, visit creation and
+    follow-up booking are recorded without each route opting in
+  * version() is the ETag of a day's list (max change id + row count, so
+    a late commit of a lower id still changes it)
+  * changed_since() gives the appointments changed after a cursor; rows
+    written in the last OPD_QUEUE_FEED_SETTLE_SECONDS are always
+    re-sent, because ids are allocated at flush and may commit out of order
+  * after commit the touched (date, doctor) pairs are pushed on the event
+    bus under topic(day, doctor) and topic(day)
+
+The feed only tracks appointment-level changes; a patient rename shows
+up on the next full load.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, insert, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.opd import Appointment, OpdQueueChange, Visit, Vitals
+from app.services import event_bus
+
+logger = logging.getLogger(__name__)
+
+_PENDING = "opd_queue_pending"
+
+Key = Tuple[date, int, int]  # (date, doctor_user_id, appointment_id)
+
+
+def topic(day: date, doctor_id: Optional[int] = None) -> str:
+    t = f"{event_bus.OPD_QUEUE}.{day.isoformat()}"
+    return f"{t}.{int(doctor_id)}" if doctor_id else t
+
+
+# ============================================================
+# Writing (Session hooks)
+# ============================================================
+def _previous_slot(ap: Appointment) -> Optional[Tuple[date, int]]:
+    """(date, doctor) the appointment had before this flush, if either changed."""
+    st = inspect(ap)
+    d_old = st.attrs.date.history.deleted
+    doc_old = st.attrs.doctor_user_id.history.deleted
+    if not d_old and not doc_old:
+        return None
+    return (d_old[0] if d_old else ap.date, doc_old[0] if doc_old else ap.doctor_user_id)
+
+
+@event.listens_for(Appointment.date, "set", active_history=True)
+@event.listens_for(Appointment.doctor_user_id, "set", active_history=True)
+def _load_previous_slot(_target, _value, _oldvalue, _initiator) -> None:
+    # active_history: keep the old date / doctor even when the attribute
+    # was expired (e.g. after a commit) so a reschedule also touches the old day
+    pass
+
+
+@event.listens_for(Session, "after_flush")
+def _record_changes(session: Session, _flush_context) -> None:
+    keys: Set[Key] = set()
+    by_id: Set[int] = set()  # appointments known only by id (visit / vitals)
+
+    for o in session.new:
+        if isinstance(o, Appointment):
+            keys.add((o.date, o.doctor_user_id, o.id))
+        elif isinstance(o, (Visit, Vitals)) and getattr(o, "appointment_id", None):
+            by_id.add(int(o.appointment_id))
+    for o in session.dirty:
+        if isinstance(o, Appointment) and session.is_modified(o, include_collections=False):
+            keys.add((o.date, o.doctor_user_id, o.id))
+            prev = _previous_slot(o)
+            if prev is not None:
+                keys.add((prev[0], prev[1], o.id))
+    for o in session.deleted:
+        if isinstance(o, Appointment):
+            keys.add((o.date, o.doctor_user_id, o.id))
+
+    if not keys and not by_id:
+        return
+    conn = session.connection()
+    try:
+        with conn.begin_nested():
+            if by_id:
+                rows = conn.execute(
+                    select(Appointment.id, Appointment.date, Appointment.doctor_user_id)
+                    .where(Appointment.id.in_(sorted(by_id))))
+                keys.update((d, doc, aid) for aid, d, doc in rows)
+            keys = {k for k in keys if k[0] is not None and k[1] is not None}
+            if keys:
+                now = datetime.utcnow()
+                conn.execute(insert(OpdQueueChange.__table__), [
+                    {"date": d, "doctor_user_id": int(doc), "appointment_id": int(aid), "created_at": now}
+                    for d, doc, aid in sorted(keys)
+                ])
+    except Exception:
+        # never fail the OPD change itself; screens still get it on a full load
+        logger.warning("opd queue change feed write failed", exc_info=True)
+        return
+    session.info.setdefault(_PENDING, set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    try:
+        tenant = event_bus.tenant_of(session)
+        by_slot: Dict[Tuple[date, int], List[int]] = {}
+        for d, doc, aid in pending:
+            by_slot.setdefault((d, int(doc)), []).append(int(aid))
+        for (d, doc), ids in sorted(by_slot.items()):
+            payload = {"type": "opd.queue.changed", "date": d.isoformat(),
+                       "doctor_id": doc, "appointment_ids": sorted(ids)}
+            event_bus.publish(tenant, topic(d, doc), payload)
+            event_bus.publish(tenant, topic(d), payload)
+    except Exception:
+        logger.warning("opd queue change push failed", exc_info=True)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted(session: Session, transaction) -> None:
+    # after_commit has already taken the committed ones
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+# ============================================================
+# Reading
+# ============================================================
+def _filtered(q, day: date, doctor_id: Optional[int]):
+    q = q.filter(OpdQueueChange.date == day)
+    if doctor_id:
+        q = q.filter(OpdQueueChange.doctor_user_id == doctor_id)
+    return q
+
+
+def version(db: Session, day: date, doctor_id: Optional[int] = None) -> str:
+    """Weak ETag of the (day, doctor) appointment list."""
+    top, n = _filtered(db.query(func.max(OpdQueueChange.id), func.count(OpdQueueChange.id)),
+                       day, doctor_id).one()
+    return f'W/"opdq-{day.isoformat()}-{int(doctor_id or 0)}-{int(top or 0)}-{int(n or 0)}"'
+
+
+def changed_since(
+    db: Session,
+    day: date,
+    doctor_id: Optional[int],
+    since: int,
+) -> Tuple[int, List[int]]:
+    """
+    (new cursor, ids of appointments changed after `since`) for one day.
+    since=0 only returns the current cursor (the caller sends the full list).
+    """
+    c = OpdQueueChange
+    if not since:
+        top = _filtered(db.query(func.max(c.id)), day, doctor_id).scalar()
+        return int(top or 0), []
+
+    settle = datetime.utcnow() - timedelta(seconds=int(settings.OPD_QUEUE_FEED_SETTLE_SECONDS))
+    rows = (_filtered(db.query(c.id, c.appointment_id), day, doctor_id)
+            .filter(or_(c.id > since, c.created_at >= settle))
+            .all())
+    cursor = max([int(since)] + [int(r[0]) for r in rows])
+    return cursor, sorted({int(r[1]) for r in rows})
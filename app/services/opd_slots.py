@@ -0,0 +1,256 @@
+# FILE: app/services/opd_slots.py
+"""
+OPD slot inventory (opd_slots): one row per doctor / date / slot start,
+materialized from the active OpdSchedule windows.
+
+  regenerate()          bring a doctor's rows for a date range in line
+                        with the schedules (schedule create / edit /
+                        delete, nightly horizon extension)
+  ensure_day()          materialize one day on first use (dates beyond
+                        the horizon, tenants that never ran the job)
+  reserve() / attach()  book a slot: one conditional UPDATE
+                        free -> booked; the row lock it takes lasts until
+                        commit, so a concurrent booking of the same slot
+                        matches no row and gets 409. No table locks.
+  release()             give an appointment's slot back (cancel, no-show,
+                        reschedule)
+  availability()        free slots of a department or doctor over a date
+                        range in one indexed query
+
+The grid is the one get_slots always offered: start, start + slot_minutes,
+... while the slot still ends inside the window. A slot that is booked
+when the schedule changes is kept (schedule_id NULL) until its appointment
+releases it; free slots outside the new schedule are dropped.
+"""
+from __future__ import annotations
+
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.opd import Appointment, OpdSchedule, OpdSlot
+from app.models.user import User
+
+LOCAL_TZ = ZoneInfo(os.getenv("LOCAL_TZ", "Asia/Kolkata"))
+
+FREE = "free"
+BOOKED = "booked"
+
+# appointment statuses that hold their slot (routes_opd.BUSY_STATUS)
+HOLDING_STATUS = ("booked", "checked_in", "in_progress")
+
+
+def today() -> date:
+    return datetime.now(LOCAL_TZ).date()
+
+
+def grid(sch: OpdSchedule, d: date) -> List[Tuple[time, time]]:
+    step = timedelta(minutes=int(sch.slot_minutes or 15))
+    cur = datetime.combine(d, sch.start_time)
+    end = datetime.combine(d, sch.end_time)
+    out = []
+    while cur + step <= end:
+        out.append((cur.time(), (cur + step).time()))
+        cur += step
+    return out
+
+
+# ============================================================
+# Materialization
+# ============================================================
+def regenerate(db: Session, doctor_user_id: int, d_from: date, d_to: Optional[date] = None) -> Dict[str, int]:
+    """Sync the doctor's slot rows for [d_from, d_to] with the active schedules."""
+    d_to = d_to or d_from
+    existing = {
+        (r.date, r.slot_start): r
+        for r in db.query(OpdSlot).filter(
+            OpdSlot.doctor_user_id == doctor_user_id,
+            OpdSlot.date >= d_from,
+            OpdSlot.date <= d_to,
+        ).all()
+    }
+    by_weekday: Dict[int, List[OpdSchedule]] = {}
+    for sch in db.query(OpdSchedule).filter(
+            OpdSchedule.doctor_user_id == doctor_user_id,
+            OpdSchedule.is_active.is_(True)).all():
+        by_weekday.setdefault(int(sch.weekday), []).append(sch)
+
+    want: Dict[Tuple[date, time], Tuple[time, int]] = {}
+    d = d_from
+    while d <= d_to:
+        for sch in by_weekday.get(d.weekday(), ()):
+            for start, end in grid(sch, d):
+                want.setdefault((d, start), (end, sch.id))
+        d += timedelta(days=1)
+
+    stats = {"inserted": 0, "updated": 0, "removed": 0}
+    if not want and not existing:
+        return stats
+
+    dept = db.query(User.department_id).filter(User.id == doctor_user_id).scalar()
+    holding: Dict[Tuple[date, time], int] = {}
+    if any(k not in existing for k in want):
+        holding = {
+            (a_date, a_start): a_id
+            for a_id, a_date, a_start in db.query(
+                Appointment.id, Appointment.date, Appointment.slot_start).filter(
+                    Appointment.doctor_user_id == doctor_user_id,
+                    Appointment.date >= d_from,
+                    Appointment.date <= d_to,
+                    Appointment.slot_start.isnot(None),
+                    Appointment.status.in_(HOLDING_STATUS),
+                ).all()
+        }
+
+    now = datetime.utcnow()
+    rows: List[Dict[str, Any]] = []
+    for key, (end, sch_id) in want.items():
+        r = existing.get(key)
+        if r is None:
+            appt_id = holding.get(key)
+            rows.append({
+                "doctor_user_id": doctor_user_id,
+                "department_id": dept,
+                "date": key[0],
+                "slot_start": key[1],
+                "slot_end": end,
+                "schedule_id": sch_id,
+                "status": BOOKED if appt_id else FREE,
+                "appointment_id": appt_id,
+                "updated_at": now,
+            })
+        elif (r.slot_end, r.schedule_id, r.department_id) != (end, sch_id, dept):
+            r.slot_end, r.schedule_id, r.department_id = end, sch_id, dept
+            stats["updated"] += 1
+
+    stale = []
+    for key, r in existing.items():
+        if key in want:
+            continue
+        if r.status == FREE:
+            stale.append(r.id)
+        elif r.schedule_id is not None:
+            r.schedule_id = None
+            stats["updated"] += 1
+
+    if stale:
+        db.execute(delete(OpdSlot).where(OpdSlot.id.in_(stale)).execution_options(synchronize_session=False))
+        stats["removed"] = len(stale)
+    if rows:
+        try:
+            with db.begin_nested():
+                db.execute(insert(OpdSlot), rows)
+            stats["inserted"] = len(rows)
+        except IntegrityError:
+            # a concurrent request materialized the same day first
+            pass
+    return stats
+
+
+def regenerate_horizon(db: Session, doctor_user_id: int) -> Dict[str, int]:
+    """Today .. OPD_SLOT_HORIZON_DAYS ahead (schedule changes, nightly job)."""
+    d0 = today()
+    return regenerate(db, doctor_user_id, d0, d0 + timedelta(days=max(int(settings.OPD_SLOT_HORIZON_DAYS), 1) - 1))
+
+
+def day_slots(db: Session, doctor_user_id: int, d: date) -> List[OpdSlot]:
+    """The doctor's schedule slots for one day, by start time."""
+    return (db.query(OpdSlot).filter(
+        OpdSlot.doctor_user_id == doctor_user_id,
+        OpdSlot.date == d,
+        OpdSlot.schedule_id.isnot(None),
+    ).order_by(OpdSlot.slot_start.asc()).all())
+
+
+def ensure_day(db: Session, doctor_user_id: int, d: date) -> bool:
+    """Materialize (doctor, d) if it has no rows yet. True if rows were added."""
+    has_rows = db.query(OpdSlot.id).filter(
+        OpdSlot.doctor_user_id == doctor_user_id, OpdSlot.date == d).first()
+    if has_rows:
+        return False
+    return bool(regenerate(db, doctor_user_id, d)["inserted"])
+
+
+# ============================================================
+# Booking
+# ============================================================
+def _slot_key(doctor_user_id: int, d: date, slot_start: time):
+    return (OpdSlot.doctor_user_id == doctor_user_id, OpdSlot.date == d, OpdSlot.slot_start == slot_start)
+
+
+def reserve(db: Session, doctor_user_id: int, d: date, slot_start: time) -> None:
+    """
+    Take the slot for the current transaction (409 if someone holds it,
+    400 if it is not a slot of the doctor's schedule). Call attach() once
+    the appointment has an id; a rollback gives the slot back.
+    """
+    stmt = (update(OpdSlot)
+            .where(*_slot_key(doctor_user_id, d, slot_start), OpdSlot.status == FREE)
+            .values(status=BOOKED, appointment_id=None, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False))
+    for _ in range(2):
+        if db.execute(stmt).rowcount == 1:
+            return
+        if db.query(OpdSlot.id).filter(*_slot_key(doctor_user_id, d, slot_start)).first():
+            raise HTTPException(status_code=409, detail="Slot already booked")
+        if not ensure_day(db, doctor_user_id, d):
+            break
+    raise HTTPException(status_code=400, detail="slot_start is not a slot of the doctor's schedule")
+
+
+def attach(db: Session, doctor_user_id: int, d: date, slot_start: time, appointment_id: int) -> None:
+    db.execute(update(OpdSlot)
+               .where(*_slot_key(doctor_user_id, d, slot_start), OpdSlot.status == BOOKED)
+               .values(appointment_id=appointment_id)
+               .execution_options(synchronize_session=False))
+
+
+def release(db: Session, appointment_id: int) -> None:
+    """Free the appointment's slot (or drop it if the schedule no longer has it)."""
+    db.execute(delete(OpdSlot)
+               .where(OpdSlot.appointment_id == appointment_id, OpdSlot.schedule_id.is_(None))
+               .execution_options(synchronize_session=False))
+    db.execute(update(OpdSlot)
+               .where(OpdSlot.appointment_id == appointment_id)
+               .values(status=FREE, appointment_id=None, updated_at=datetime.utcnow())
+               .execution_options(synchronize_session=False))
+
+
+# ============================================================
+# Availability
+# ============================================================
+def availability(
+    db: Session,
+    d_from: date,
+    d_to: date,
+    *,
+    department_id: Optional[int] = None,
+    doctor_user_ids: Optional[Iterable[int]] = None,
+) -> List[Tuple[int, str, date, time, time]]:
+    """
+    Free slots in [d_from, d_to] as (doctor_user_id, doctor_name, date,
+    start, end), ordered by doctor / date / start. Only materialized days
+    (the horizon) are covered.
+    """
+    q = (db.query(OpdSlot.doctor_user_id, User.name, OpdSlot.date, OpdSlot.slot_start, OpdSlot.slot_end)
+         .join(User, User.id == OpdSlot.doctor_user_id)
+         .filter(OpdSlot.date >= d_from, OpdSlot.date <= d_to,
+                 OpdSlot.status == FREE, OpdSlot.schedule_id.isnot(None)))
+    if department_id is not None:
+        q = q.filter(OpdSlot.department_id == department_id)
+    if doctor_user_ids is not None:
+        q = q.filter(OpdSlot.doctor_user_id.in_(list(doctor_user_ids)))
+    return q.order_by(OpdSlot.doctor_user_id, OpdSlot.date, OpdSlot.slot_start).all()
+
+
+def prune(db: Session, before: date) -> int:
+    """Drop slot rows of days before `before` (appointments keep the history)."""
+    res = db.execute(delete(OpdSlot).where(OpdSlot.date < before).execution_options(synchronize_session=False))
+    return int(res.rowcount or 0)
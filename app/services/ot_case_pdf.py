@@ -26,6 +26,7 @@ from reportlab.lib.utils import ImageReader
 from xml.sax.saxutils import escape
 
 from app.core.config import settings
+from app.services import pdf_assets
 
 # ============================================================
 #  Timezone (IST) helpers
@@ -392,7 +393,7 @@ def _branding_logo_reader(branding: Any) -> Optional[ImageReader]:
         abs_path = Path(settings.STORAGE_DIR).joinpath(rel)
         if not abs_path.exists() or not abs_path.is_file():
             return None
-        return ImageReader(str(abs_path))
+        return pdf_assets.image_reader(abs_path)
     except Exception:
         return None
 
@@ -0,0 +1,293 @@
+# FILE: app/services/patient_search.py
+"""
+Patient search keys.
+
+`ILIKE '%q%'` across uhid / names / phone / email cannot use an index, so
+every keystroke on the registration desk was a full scan of `patients`.
+Instead each patient gets a handful of normalized terms in
+`patient_search_keys` (see PatientSearchKey) and a query becomes a few
+index range scans on (kind, term):
+
+  NAME   lowercased name tokens            "ram", "kumar"
+  PHON   phonetic form of each name token  "kartik" for Karthick / Kartik
+  PHONE  digits only, last 10              "9876543210"
+  PHONER PHONE reversed (suffix search)    "0123456789"
+  UHID   lowercased alphanumeric UHID      "smc1612202501"
+  UHIDR  UHID reversed (suffix search)
+  RCH    lowercased alphanumeric RCH id
+  EMAIL  lowercased email
+
+Ranking: exact term > prefix > suffix (UHID / phone tail) > phonetic;
+within a tier shorter / alphabetically closer terms come first (index
+order), so scans stop as soon as the page is full.
+
+Keys are refreshed explicitly from the patient create / update routes;
+`python -m app.scripts.rebuild_patient_search_keys` rebuilds them.
+"""
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import and_, delete, exists, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.patient import Patient, PatientSearchKey
+
+TERM_MAX = 64
+PHONE_DIGITS = 10
+MIN_SUFFIX_LEN = 3
+_SCAN_BATCH = 200
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NON_DIGIT_RE = re.compile(r"\D+")
+_PHONE_QUERY_RE = re.compile(r"^[\d\s+\-()]+$")
+
+# Spelling variants common in Indian names (transliteration from Tamil,
+# Hindi, Telugu ...). Applied in order on a lowercased letters-only token.
+_PHONETIC_RULES: Tuple[Tuple[re.Pattern, str], ...] = tuple(
+    (re.compile(p), r) for p, r in (
+        (r"^(shree|shri|sree|sri)", "sri"),
+        (r"ck", "k"),
+        (r"q", "k"),
+        (r"x", "ks"),
+        (r"z", "j"),
+        (r"ow", "ou"),
+        (r"w", "v"),
+        (r"(?<=.)y", "i"),
+        (r"th", "t"),
+        (r"dh", "d"),
+        (r"bh", "b"),
+        (r"kh", "k"),
+        (r"gh", "g"),
+        (r"ph", "f"),
+        (r"jh", "j"),
+        (r"sh", "s"),
+        (r"ee", "i"),
+        (r"ii", "i"),
+        (r"oo", "u"),
+        (r"aa", "a"),
+        (r"(.)\1+", r"\1"),
+        (r"(?<=.)h$", ""),
+    ))
+
+
+# ============================================================
+# Normalization
+# ============================================================
+def name_tokens(value: Optional[str]) -> List[str]:
+    return [t[:TERM_MAX] for t in _TOKEN_RE.findall((value or "").lower())]
+
+
+def phonetic_key(token: str) -> str:
+    """Karthick / Karthik / Kartik -> "kartik"; Lakshmi / Laxmi -> "laksmi"."""
+    s = re.sub(r"[^a-z]", "", (token or "").lower())
+    for rx, repl in _PHONETIC_RULES:
+        s = rx.sub(repl, s)
+    return s[:TERM_MAX]
+
+
+def phone_digits(value: Optional[str]) -> str:
+    return _NON_DIGIT_RE.sub("", value or "")[-PHONE_DIGITS:]
+
+
+def _alnum(value: Optional[str]) -> str:
+    return "".join(_TOKEN_RE.findall((value or "").lower()))[:TERM_MAX]
+
+
+def patient_search_terms(p: Patient) -> Set[Tuple[str, str]]:
+    terms: Set[Tuple[str, str]] = set()
+    for tok in name_tokens(p.first_name) + name_tokens(p.last_name):
+        terms.add(("NAME", tok))
+        ph = phonetic_key(tok)
+        if ph:
+            terms.add(("PHON", ph))
+
+    digits = phone_digits(p.phone)
+    if digits:
+        terms.add(("PHONE", digits))
+        terms.add(("PHONER", digits[::-1]))
+
+    uhid = _alnum(p.uhid)
+    if uhid:
+        terms.add(("UHID", uhid))
+        terms.add(("UHIDR", uhid[::-1]))
+
+    rch = _alnum(p.rch_id)
+    if rch:
+        terms.add(("RCH", rch))
+
+    email = (p.email or "").strip().lower()[:TERM_MAX]
+    if email:
+        terms.add(("EMAIL", email))
+    return terms
+
+
+# ============================================================
+# Maintenance
+# ============================================================
+def refresh_patient_search_keys(db: Session, p: Patient) -> None:
+    """
+    Bring the patient's search keys in line with its current fields.
+    Call after the patient is flushed (needs p.id), inside the caller's
+    transaction; only changed terms are written.
+    """
+    want = patient_search_terms(p)
+    rows = (db.query(PatientSearchKey.id, PatientSearchKey.kind, PatientSearchKey.term)
+            .filter(PatientSearchKey.patient_id == p.id).all())
+    have = {(r.kind, r.term): r.id for r in rows}
+
+    stale = [rid for key, rid in have.items() if key not in want]
+    if stale:
+        db.execute(delete(PatientSearchKey).where(PatientSearchKey.id.in_(stale)))
+    for kind, term in want - set(have):
+        db.add(PatientSearchKey(patient_id=p.id, kind=kind, term=term))
+
+
+def rebuild_search_keys(db: Session, patients: Iterable[Patient]) -> int:
+    """Bulk (re)build for a batch of patients; returns rows written."""
+    batch = list(patients)
+    if not batch:
+        return 0
+    db.execute(delete(PatientSearchKey).where(
+        PatientSearchKey.patient_id.in_([p.id for p in batch])))
+    rows = [{"patient_id": p.id, "kind": kind, "term": term}
+            for p in batch for kind, term in patient_search_terms(p)]
+    if rows:
+        db.execute(PatientSearchKey.__table__.insert(), rows)
+    return len(rows)
+
+
+# ============================================================
+# Search
+# ============================================================
+def _like_prefix(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class _Tier:
+    __slots__ = ("kinds", "term", "exact")
+
+    def __init__(self, kinds: Sequence[str], term: str, exact: bool):
+        self.kinds = tuple(kinds)
+        self.term = term
+        self.exact = exact
+
+
+def _plan(q: str, phonetic: bool) -> Tuple[List[_Tier], List[str]]:
+    """
+    Returns (tiers for the driving term in rank order, other name tokens
+    that must also match).
+    """
+    ql = q.strip().lower()
+
+    if "@" in ql:
+        email = ql[:TERM_MAX]
+        return [_Tier(("EMAIL",), email, True), _Tier(("EMAIL",), email, False)], []
+
+    if _PHONE_QUERY_RE.match(ql):
+        raw = _NON_DIGIT_RE.sub("", ql)
+        digits = raw[-PHONE_DIGITS:] if len(raw) > PHONE_DIGITS else raw
+        tiers = [
+            _Tier(("PHONE", "UHID", "RCH"), digits, True),
+            _Tier(("PHONE", "UHID", "RCH"), digits, False),
+        ]
+        if len(digits) >= MIN_SUFFIX_LEN:
+            tiers.append(_Tier(("PHONER", "UHIDR"), digits[::-1], False))
+        return tiers, []
+
+    tokens = name_tokens(ql)
+    if not tokens:
+        return [], []
+
+    if len(tokens) == 1 and any(ch.isdigit() for ch in tokens[0]):
+        tok = tokens[0]
+        tiers = [
+            _Tier(("UHID", "RCH", "NAME"), tok, True),
+            _Tier(("UHID", "RCH", "NAME"), tok, False),
+        ]
+        if len(tok) >= MIN_SUFFIX_LEN:
+            tiers.append(_Tier(("UHIDR",), tok[::-1], False))
+        return tiers, []
+
+    # names: the longest token drives the scan, the rest are filters
+    drive = max(tokens, key=len)
+    rest = list(tokens)
+    rest.remove(drive)
+    tiers = [_Tier(("NAME",), drive, True), _Tier(("NAME",), drive, False)]
+    if phonetic:
+        ph = phonetic_key(drive)
+        if ph:
+            tiers.append(_Tier(("PHON",), ph, False))
+    return tiers, rest
+
+
+def _token_filter(tok: str, phonetic: bool):
+    k = PatientSearchKey.__table__.alias()
+    cond = and_(k.c.kind == "NAME", k.c.term.like(_like_prefix(tok), escape="\\"))
+    ph = phonetic_key(tok) if phonetic else ""
+    if ph:
+        cond = or_(cond, and_(k.c.kind == "PHON", k.c.term.like(_like_prefix(ph), escape="\\")))
+    return exists().where(k.c.patient_id == PatientSearchKey.patient_id, cond)
+
+
+def search_patient_ids(
+    db: Session,
+    q: str,
+    *,
+    limit: int = 50,
+    offset: int = 0,
+    phonetic: bool = False,
+    filters: Sequence = (),
+) -> List[int]:
+    """
+    Ranked patient ids for the search box text `q` (active patients only).
+    `filters` are extra criteria on Patient (e.g. patient_type).
+    """
+    need = max(0, int(offset)) + max(0, int(limit))
+    tiers, rest = _plan(q or "", phonetic)
+    if not tiers or need <= 0:
+        return []
+
+    extra = [_token_filter(t, phonetic) for t in rest]
+    found: Dict[int, None] = {}
+    K = PatientSearchKey
+
+    for tier in tiers:
+        for kind in tier.kinds:
+            if len(found) >= need:
+                break
+            match = K.term == tier.term if tier.exact else K.term.like(_like_prefix(tier.term), escape="\\")
+            after: Optional[Tuple[str, int]] = None
+            while len(found) < need:
+                stmt = (
+                    select(K.term, K.patient_id)
+                    .join(Patient, Patient.id == K.patient_id)
+                    .where(K.kind == kind, match, Patient.is_active.is_(True), *filters, *extra)
+                )
+                if after is not None:
+                    stmt = stmt.where(or_(K.term > after[0], and_(K.term == after[0], K.patient_id > after[1])))
+                rows = db.execute(stmt.order_by(K.term, K.patient_id).limit(_SCAN_BATCH)).all()
+                for term, pid in rows:
+                    found.setdefault(int(pid), None)
+                if len(rows) < _SCAN_BATCH:
+                    break
+                after = (rows[-1][0], int(rows[-1][1]))
+
+    return list(found)[offset:need]
+
+
+def search_patients(
+    db: Session,
+    q: str,
+    *,
+    limit: int = 50,
+    offset: int = 0,
+    phonetic: bool = False,
+    filters: Sequence = (),
+) -> List[Patient]:
+    ids = search_patient_ids(db, q, limit=limit, offset=offset, phonetic=phonetic, filters=filters)
+    if not ids:
+        return []
+    by_id = {p.id: p for p in db.query(Patient).filter(Patient.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
@@ -4,6 +4,7 @@ import io, re, os
 from typing import Tuple, Optional, Any, Dict
 from urllib.parse import urlparse
 from app.core.config import settings
+from app.services import pdf_assets
 
 # ---------- CSS helpers (WeasyPrint-ready; xhtml2pdf gets a sanitized version) ----------
 
@@ -274,7 +275,7 @@ def generate_pdf(
         pdf = HTML(
             string=html_for_weasy,
             base_url=base_url or settings.SITE_URL,
-        ).write_pdf()
+        ).write_pdf(font_config=pdf_assets.font_config())
         return pdf, "weasyprint"
 
     # default: try weasy, then fallback
@@ -289,7 +290,7 @@ def generate_pdf(
             pdf = HTML(
                 string=html_for_weasy,
                 base_url=base_url or settings.SITE_URL,
-            ).write_pdf()
+            ).write_pdf(font_config=pdf_assets.font_config())
             return pdf, "weasyprint"
         except Exception:
             pass
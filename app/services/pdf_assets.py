@@ -0,0 +1,254 @@
+# FILE: app/services/pdf_assets.py
+"""
+Branding / font assets shared by the PDF builders.
+
+Every render used to re-query UiBranding, re-read the logo from disk and
+re-run the Pillow downscale + PNG optimise + base64 encode, open the
+letterhead / header / footer images again, and WeasyPrint re-parsed the
+same stylesheet strings. This module keeps them per process:
+
+  branding(db)            the tenant's UiBranding row (lowest id: the row
+                          routes_ui_branding edits) as a SimpleNamespace
+                          copy, reused for BRANDING_CACHE_TTL_SECONDS
+  logo(path, max_px)      downscaled PNG bytes, data URI and a decoded
+                          ImageReader, keyed by file path + mtime + size
+  image_reader(path)      decoded ImageReader for full-size assets
+  css(text)               compiled WeasyPrint CSS
+  font_config()           one FontConfiguration per render thread
+
+Image entries are LRU-bounded by PDF_ASSET_CACHE_MB (decoded size) and
+miss on their own when a file is replaced. routes_ui_branding calls
+invalidate(db) after every branding save / asset upload; other API
+workers pick the change up within the TTL. Context overrides
+(UiBrandingContext) are not cached.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import mimetypes
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple, Union
+
+from reportlab.lib.utils import ImageReader
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.ui_branding import UiBranding
+
+_lock = threading.Lock()
+_local = threading.local()
+
+_CSS_PER_THREAD = 32
+
+
+@dataclass(frozen=True)
+class LogoAsset:
+    png: bytes
+    mime: str
+    width: int
+    height: int
+    data_uri: str
+    reader: Optional[ImageReader]
+
+
+# ============================================================
+# Branding row
+# ============================================================
+_branding: Dict[str, Tuple[float, Optional[SimpleNamespace]]] = {}
+
+
+def _tenant(db: Session) -> str:
+    url = getattr(db.get_bind(), "url", None)
+    return str(getattr(url, "database", None) or "default")
+
+
+def branding(db: Session) -> Optional[SimpleNamespace]:
+    """UiBranding columns as a fresh SimpleNamespace (callers may mutate it)."""
+    ttl = int(settings.BRANDING_CACHE_TTL_SECONDS or 0)
+    key = _tenant(db)
+    now = time.monotonic()
+    hit = _branding.get(key) if ttl > 0 else None
+    if hit is None or hit[0] <= now:
+        row = db.query(UiBranding).order_by(UiBranding.id.asc()).first()
+        snap = None
+        if row is not None:
+            snap = SimpleNamespace(**{a.key: getattr(row, a.key) for a in sa_inspect(UiBranding).column_attrs})
+        hit = (now + ttl, snap)
+        if ttl > 0 and snap is not None:
+            with _lock:
+                _branding[key] = hit
+    return None if hit[1] is None else SimpleNamespace(**vars(hit[1]))
+
+
+def invalidate(db: Session) -> None:
+    with _lock:
+        _branding.pop(_tenant(db), None)
+
+
+# ============================================================
+# Images
+# ============================================================
+class _ImageLRU:
+    def __init__(self):
+        self._items: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: tuple) -> Any:
+        with _lock:
+            hit = self._items.get(key)
+            if hit is None:
+                return None
+            self._items.move_to_end(key)
+            return hit[0]
+
+    def put(self, key: tuple, value: Any, size: int) -> None:
+        cap = int(settings.PDF_ASSET_CACHE_MB or 0) * 1024 * 1024
+        if size > cap:
+            return
+        with _lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            while self._bytes > cap and self._items:
+                _k, (_v, s) = self._items.popitem(last=False)
+                self._bytes -= s
+
+
+_images = _ImageLRU()
+
+
+class _JpegBytes(bytes):
+    pass
+
+
+def _file_key(path: Union[str, Path, None]) -> Optional[tuple]:
+    if not path:
+        return None
+    try:
+        p = Path(str(path)).resolve()
+        st = p.stat()
+    except OSError:
+        return None
+    if not p.is_file():
+        return None
+    return (str(p), st.st_mtime_ns, st.st_size)
+
+
+def _decoded(raw: bytes) -> Tuple[Optional[ImageReader], int, int, int]:
+    """ImageReader with its pixel data already decoded (shared read-only)."""
+    try:
+        ir = ImageReader(BytesIO(raw))
+        iw, ih = ir.getSize()
+        ir.getRGBData()
+        return ir, int(iw or 0), int(ih or 0), int(iw or 0) * int(ih or 0) * 4
+    except Exception:
+        return None, 0, 0, 0
+
+
+def logo(path: Union[str, Path, None], *, max_px: int = 320) -> Optional[LogoAsset]:
+    """Logo downscaled to max_px (no upscaling) when Pillow is available."""
+    fk = _file_key(path)
+    if fk is None:
+        return None
+    key = ("logo", max_px) + fk
+    hit = _images.get(key)
+    if hit is not None:
+        return hit
+
+    try:
+        raw = Path(fk[0]).read_bytes()
+    except OSError:
+        return None
+    mime = mimetypes.guess_type(fk[0])[0] or "image/png"
+    try:
+        from PIL import Image  # type: ignore
+
+        im = Image.open(BytesIO(raw))
+        im.load()
+        im.thumbnail((max_px, max_px))
+        out = BytesIO()
+        im.save(out, format="PNG", optimize=True)
+        raw = out.getvalue()
+        mime = "image/png"
+    except Exception:
+        pass
+
+    ir, iw, ih, decoded = _decoded(raw)
+    data_uri = f"data:{mime};base64,{base64.b64encode(raw).decode('ascii')}"
+    asset = LogoAsset(png=raw, mime=mime, width=iw, height=ih, data_uri=data_uri, reader=ir)
+    _images.put(key, asset, len(raw) + len(data_uri) + decoded)
+    return asset
+
+
+def image_reader(path: Union[str, Path, None]) -> Optional[ImageReader]:
+    """Full-size image (letterhead, header / footer band) as a decoded ImageReader."""
+    fk = _file_key(path)
+    if fk is None:
+        return None
+    key = ("image",) + fk
+    hit = _images.get(key)
+    if isinstance(hit, _JpegBytes):
+        return ImageReader(BytesIO(hit))
+    if hit is not None:
+        return hit
+    try:
+        raw = Path(fk[0]).read_bytes()
+    except OSError:
+        return None
+    ir, _w, _h, decoded = _decoded(raw)
+    if ir is None:
+        return None
+    if hasattr(ir, "jpeg_fh"):
+        # JPEGs are embedded straight from the reader's file handle, which
+        # must not be shared between concurrent renders: keep the bytes only.
+        _images.put(key, _JpegBytes(raw), len(raw))
+        return ir
+    _images.put(key, ir, len(raw) + decoded)
+    return ir
+
+
+# ============================================================
+# WeasyPrint
+# ============================================================
+def font_config() -> Any:
+    """FontConfiguration reused by every render on this thread (None without WeasyPrint)."""
+    fc = getattr(_local, "font_config", None)
+    if fc is None:
+        try:
+            from weasyprint.text.fonts import FontConfiguration  # type: ignore
+        except ImportError:
+            try:
+                from weasyprint.fonts import FontConfiguration  # type: ignore
+            except ImportError:
+                return None
+        fc = _local.font_config = FontConfiguration()
+    return fc
+
+
+def css(text: str) -> Any:
+    """Compiled weasyprint.CSS for a stylesheet string (raises ImportError without WeasyPrint)."""
+    from weasyprint import CSS  # type: ignore
+
+    cache: "OrderedDict[str, Any]" = getattr(_local, "css", None)
+    if cache is None:
+        cache = _local.css = OrderedDict()
+    key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    sheet = cache.get(key)
+    if sheet is None:
+        sheet = CSS(string=text, font_config=font_config())
+        cache[key] = sheet
+        if len(cache) > _CSS_PER_THREAD:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return sheet
@@ -1,18 +1,15 @@
 #app/service/pdf_branding.py
 from __future__ import annotations
 
-import base64
-import mimetypes
-from io import BytesIO
 from pathlib import Path
 from typing import Optional, Any
 
 from app.core.config import settings
 from app.models.ui_branding import UiBranding
+from app.services import pdf_assets
 
 # --- ADD BELOW AT END OF: app/services/pdf_branding.py ---
 
-from io import BytesIO
 from pathlib import Path
 from typing import Optional, Any, Tuple
 
@@ -40,38 +37,8 @@ def _logo_data_uri(branding: UiBranding,
     if not rel:
         return None
 
-    abs_path = Path(settings.STORAGE_DIR).joinpath(rel)
-    if not abs_path.exists() or not abs_path.is_file():
-        return None
-
-    mime, _ = mimetypes.guess_type(str(abs_path))
-    if not mime:
-        mime = "image/png"
-
-    try:
-        raw = abs_path.read_bytes()
-    except Exception:
-        return None
-
-    # Optional: downscale to reduce PDF weight (and improve consistent quality)
-    try:
-        from PIL import Image  # type: ignore
-
-        im = Image.open(BytesIO(raw))
-        im.load()
-
-        # Don't upscale (thumbnail only shrinks)
-        im.thumbnail((max_px, max_px))
-
-        out = BytesIO()
-        im.save(out, format="PNG", optimize=True)
-        raw = out.getvalue()
-        mime = "image/png"
-    except Exception:
-        pass
-
-    enc = base64.b64encode(raw).decode("ascii")
-    return f"data:{mime};base64,{enc}"
+    asset = pdf_assets.logo(Path(settings.STORAGE_DIR).joinpath(rel), max_px=max_px)
+    return asset.data_uri if asset else None
 
 
 def brand_header_css() -> str:
@@ -269,47 +236,28 @@ def resolve_asset_path(path_str: Optional[str]) -> Optional[Path]:
     return None
 
 
+def _logo_asset_reader(path: Optional[Path],
+                       max_px: int) -> Optional[Tuple[ImageReader, int, int]]:
+    asset = pdf_assets.logo(path, max_px=max_px)
+    if not asset or asset.reader is None:
+        return None
+    return asset.reader, asset.width, asset.height
+
+
 def _logo_reader_reportlab(
         branding: Any,
         *,
         max_px: int = 320) -> Optional[Tuple[ImageReader, int, int]]:
     """
     ✅ same idea as _logo_data_uri (but for ReportLab):
-    - read logo bytes
-    - optionally downscale with Pillow (if available)
-    - return ImageReader(BytesIO(png_bytes))
+    - downscaled logo (Pillow, if available) from pdf_assets
+    - return (ImageReader, width, height)
     """
     rel = (getattr(branding, "logo_path", None) or "").strip()
     if not rel:
         return None
 
-    p = resolve_asset_path(rel)
-    if not p or not p.exists() or not p.is_file():
-        return None
-
-    try:
-        raw = p.read_bytes()
-    except Exception:
-        return None
-
-    # Optional downscale (no upscaling) – improves crispness and reduces file size
-    try:
-        from PIL import Image  # type: ignore
-        im = Image.open(BytesIO(raw))
-        im.load()
-        im.thumbnail((max_px, max_px))
-        out = BytesIO()
-        im.save(out, format="PNG", optimize=True)
-        raw = out.getvalue()
-    except Exception:
-        pass
-
-    try:
-        ir = ImageReader(BytesIO(raw))
-        iw, ih = ir.getSize()
-        return ir, int(iw or 0), int(ih or 0)
-    except Exception:
-        return None
+    return _logo_asset_reader(resolve_asset_path(rel), max_px)
 
 
 def _resolve_brand_asset(path_str: Optional[str]) -> Optional[Path]:
@@ -352,40 +300,13 @@ def _load_logo_image_reader(
 ) -> Optional[Tuple[ImageReader, int, int]]:
     """
     Like your HTML helper:
-    - read logo file
-    - optionally downscale with Pillow (thumbnail) => crisp + lighter PDF
+    - downscaled logo (Pillow thumbnail) from pdf_assets => crisp + lighter PDF
     """
     rel = (branding.logo_path or "").strip()
     if not rel:
         return None
 
-    abs_path = _resolve_brand_asset(rel)
-    if not abs_path or not abs_path.exists() or not abs_path.is_file():
-        return None
-
-    try:
-        raw = abs_path.read_bytes()
-    except Exception:
-        return None
-
-    try:
-        from PIL import Image  # type: ignore
-
-        im = Image.open(BytesIO(raw))
-        im.load()
-        im.thumbnail((max_px, max_px))
-        out = BytesIO()
-        im.save(out, format="PNG", optimize=True)
-        raw = out.getvalue()
-    except Exception:
-        pass
-
-    try:
-        ir = ImageReader(BytesIO(raw))
-        iw, ih = ir.getSize()
-        return ir, int(iw or 0), int(ih or 0)
-    except Exception:
-        return None
+    return _logo_asset_reader(_resolve_brand_asset(rel), max_px)
 
 
 
@@ -418,33 +339,7 @@ def _read_logo_imagereader(
     if not rel:
         return None
 
-    fp = _resolve_storage_path(rel)
-    if not fp or not fp.exists() or not fp.is_file():
-        return None
-
-    try:
-        raw = fp.read_bytes()
-    except Exception:
-        return None
-
-    # ✅ optional downscale like your HTML logic (crisp + smaller PDF)
-    try:
-        from PIL import Image  # type: ignore
-        im = Image.open(BytesIO(raw))
-        im.load()
-        im.thumbnail((max_px, max_px))
-        out = BytesIO()
-        im.save(out, format="PNG", optimize=True)
-        raw = out.getvalue()
-    except Exception:
-        pass
-
-    try:
-        ir = ImageReader(BytesIO(raw))
-        iw, ih = ir.getSize()
-        return ir, int(iw or 0), int(ih or 0)
-    except Exception:
-        return None
+    return _logo_asset_reader(_resolve_storage_path(rel), max_px)
 
 
 def draw_brand_header_reportlab(
@@ -492,7 +387,7 @@ def draw_brand_header_reportlab(
         try:
             fp = _resolve_storage_path(str(branding.pdf_header_path))
             if fp:
-                img = ImageReader(str(fp))
+                img = pdf_assets.image_reader(fp)
                 c.drawImage(img,
                             x,
                             y1,
@@ -0,0 +1,260 @@
+# FILE: app/services/pdf_cache.py
+"""
+Rendered-PDF cache for documents whose content can no longer change
+(POSTED invoices, reported lab orders, finalized discharge summaries) or
+whose render inputs are hashed (OPD visit summary).
+
+Files live under STORAGE_DIR/pdf_cache/<tenant db>/<doc type>/<doc id>/
+named by the SHA-256 of (doc type, id, content version, branding
+version, paper / orientation / printed-by options). A changed version
+simply misses; invalidate() drops every rendition of a document (invoice
+reopened, lab report amended, discharge summary edited).
+
+The directory is bounded to PDF_CACHE_MAX_MB: a hit touches the file's
+mtime, and after a write the least recently used files are evicted until
+the total is back under 90% of the cap. The same key is sent as ETag so
+reprints answer If-None-Match with 304.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+@dataclass(frozen=True)
+class CachedPdf:
+    data: bytes
+    etag: Optional[str] = None   # None: not cacheable, rendered for this request
+    hit: bool = False
+
+
+# ============================================================
+# Keys / versions
+# ============================================================
+def _json_default(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    return str(v)
+
+
+def digest(*parts: Any) -> str:
+    raw = json.dumps(parts, default=_json_default, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def row_digest(*rows: Any) -> str:
+    """Digest of every column value of the given ORM rows (None entries allowed)."""
+    out = []
+    for r in rows:
+        if r is None:
+            out.append(None)
+            continue
+        try:
+            attrs = sa_inspect(r).mapper.column_attrs
+        except Exception:
+            out.append(repr(r))
+            continue
+        out.append([type(r).__name__] + [getattr(r, a.key, None) for a in attrs])
+    return digest(out)
+
+
+def branding_version(branding: Any) -> Any:
+    if branding is None:
+        return None
+    return [getattr(branding, "id", None), getattr(branding, "updated_at", None)]
+
+
+# ============================================================
+# Store
+# ============================================================
+class _Store:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # bytes on disk (this process' view)
+
+    @property
+    def root(self) -> Path:
+        return Path(settings.STORAGE_DIR).resolve() / "pdf_cache"
+
+    @property
+    def max_bytes(self) -> int:
+        return int(settings.PDF_CACHE_MAX_MB or 0) * 1024 * 1024
+
+    def doc_dir(self, tenant: str, doc_type: str, doc_id: Any) -> Path:
+        return self.root / _SAFE.sub("_", tenant) / _SAFE.sub("_", doc_type) / _SAFE.sub("_", str(doc_id))
+
+    def read(self, path: Path) -> Optional[bytes]:
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # LRU: mtime = last use
+        except OSError:
+            pass
+        return data
+
+    def write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _files(self) -> Iterable[os.DirEntry]:
+        stack = [str(self.root)]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False):
+                            stack.append(e.path)
+                        elif e.name.endswith(".pdf"):
+                            yield e
+            except FileNotFoundError:
+                continue
+
+    def _scan_size(self) -> int:
+        total = 0
+        for e in self._files():
+            try:
+                total += e.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def evict(self) -> None:
+        """Drop least recently used files until under 90% of the cap."""
+        with self._lock:
+            files = []
+            for e in self._files():
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, e.path))
+            total = sum(f[1] for f in files)
+            target = int(self.max_bytes * 0.9)
+            for _mtime, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._size = total
+
+    def drop_dir(self, path: Path) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._size = None
+
+
+_store = _Store()
+
+
+def _tenant(db: Session) -> str:
+    bind = db.get_bind()
+    url = getattr(bind, "url", None)
+    return str(getattr(url, "database", None) or "default")
+
+
+# ============================================================
+# Public API
+# ============================================================
+def get_or_render(
+    db: Session,
+    doc_type: str,
+    doc_id: Any,
+    version: Optional[Sequence[Any]],
+    render: Callable[[], bytes],
+    *,
+    options: Sequence[Any] = (),
+) -> CachedPdf:
+    """
+    Cached rendition of a document. `version=None` means the content can
+    still change: render every time, nothing stored. Cache failures never
+    fail the download.
+    """
+    if version is None or _store.max_bytes <= 0:
+        return CachedPdf(render())
+
+    key = digest(doc_type, str(doc_id), list(version), list(options))
+    path = _store.doc_dir(_tenant(db), doc_type, doc_id) / f"{key}.pdf"
+    try:
+        data = _store.read(path)
+    except Exception:
+        logger.warning("pdf cache read failed: %s", path, exc_info=True)
+        data = None
+    if data is not None:
+        return CachedPdf(data, key, hit=True)
+
+    data = render()
+    try:
+        _store.write(path, data)
+    except Exception:
+        logger.warning("pdf cache write failed: %s", path, exc_info=True)
+    return CachedPdf(data, key)
+
+
+def invalidate(db: Session, doc_type: str, doc_id: Any) -> None:
+    """Drop every cached rendition of one document."""
+    try:
+        _store.drop_dir(_store.doc_dir(_tenant(db), doc_type, doc_id))
+    except Exception:
+        logger.warning("pdf cache invalidate failed: %s %s", doc_type, doc_id, exc_info=True)
+
+
+def pdf_response(request: Optional[Request], pdf: CachedPdf, filename: str, disposition: str = "inline") -> Response:
+    """PDF response with ETag; 304 when the client already holds this rendition."""
+    headers = {"Content-Disposition": f'{disposition}; filename="{filename}"'}
+    if pdf.etag is None:
+        return Response(content=pdf.data, media_type="application/pdf", headers=headers)
+
+    etag = f'"{pdf.etag}"'
+    headers["ETag"] = etag
+    headers["Cache-Control"] = "private, no-cache"
+    inm = request.headers.get("if-none-match") if request is not None else None
+    if inm and etag in [t.strip() for t in inm.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=pdf.data, media_type="application/pdf", headers=headers)
@@ -36,6 +36,7 @@ from app.models.patient import Patient
 from app.models.user import User
 from app.models.department import Department
 from app.models.ui_branding import UiBranding
+from app.services import pdf_assets, pdf_cache
 
 logger = logging.getLogger(__name__)
 
@@ -64,7 +65,7 @@ def _try_image_reader(path: Path | None) -> Optional[ImageReader]:
     if not path:
         return None
     try:
-        return ImageReader(str(path))
+        return pdf_assets.image_reader(path)
     except Exception:
         logger.exception("Image load failed: %s", path)
         return None
@@ -223,7 +224,7 @@ def _user_display_name(user: Optional[User]) -> str:
 
 def _load_branding(db: Session) -> Optional[UiBranding]:
     try:
-        return db.query(UiBranding).order_by(UiBranding.id.asc()).first()
+        return pdf_assets.branding(db)
     except Exception:
         return None
 
@@ -667,6 +668,21 @@ def build_discharge_context(db: Session, admission_id: int) -> dict:
 def render_discharge_summary_pdf(db: Session, admission_id: int) -> bytes:
     ctx = build_discharge_context(db, admission_id)
     branding = _load_branding(db)
+
+    # Finalized summaries are cached, keyed by the rendered context itself
+    # (post-finalize edits still change the digest and miss).
+    version = [pdf_cache.digest(ctx)] if ctx.get("finalized") else None
+    return pdf_cache.get_or_render(
+        db,
+        "discharge_summary",
+        admission_id,
+        version,
+        lambda: _render_discharge_pdf(ctx, branding),
+        options=(pdf_cache.branding_version(branding),),
+    ).data
+
+
+def _render_discharge_pdf(ctx: dict, branding: Optional[UiBranding]) -> bytes:
     storage_dir = _get_storage_dir()
 
     header_h_mm = int(getattr(branding, "pdf_header_height_mm", None) or 28) if branding else 40
@@ -16,6 +16,7 @@ from reportlab.lib import colors
 from reportlab.lib.utils import ImageReader
 
 from app.core.config import settings
+from app.services import pdf_assets
 
 # Optional: if available, we can generate default branding header HTML/CSS internally
 try:
@@ -114,7 +115,7 @@ def _load_branding_images(
         if header_path:
             hp = Path(settings.STORAGE_DIR).joinpath(str(header_path))
             if hp.exists():
-                header_img = ImageReader(str(hp))
+                header_img = pdf_assets.image_reader(hp)
     except Exception:
         header_img = None
 
@@ -123,7 +124,7 @@ def _load_branding_images(
         if footer_path:
             fp = Path(settings.STORAGE_DIR).joinpath(str(footer_path))
             if fp.exists():
-                footer_img = ImageReader(str(fp))
+                footer_img = pdf_assets.image_reader(fp)
     except Exception:
         footer_img = None
 
@@ -309,7 +310,7 @@ def _load_logo_image_from_branding(
     if not p.exists() or not p.is_file():
         return None
     try:
-        return ImageReader(str(p))
+        return pdf_assets.image_reader(p)
     except Exception:
         return None
 
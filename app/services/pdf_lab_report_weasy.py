@@ -24,6 +24,7 @@ from reportlab.graphics.barcode import createBarcodeDrawing
 from reportlab.graphics.barcode.qr import QrCodeWidget
 
 from app.core.config import settings
+from app.services import pdf_assets
 from app.services.pdf_branding import brand_header_css
 
 logger = logging.getLogger(__name__)
@@ -916,7 +917,7 @@ def _draw_letterhead_background(c: canvas.Canvas, branding: Any, page_num: int =
         return
 
     try:
-        img = ImageReader(str(full_path))
+        img = pdf_assets.image_reader(full_path)
         w, h = A4
         c.drawImage(img, 0, 0, width=w, height=h, preserveAspectRatio=True, mask="auto")
     except Exception:
@@ -937,7 +938,7 @@ def _logo_reader(branding: Any) -> Optional[ImageReader]:
     try:
         abs_path = Path(settings.STORAGE_DIR).joinpath(rel)
         if abs_path.exists() and abs_path.is_file():
-            return ImageReader(str(abs_path))
+            return pdf_assets.image_reader(abs_path)
     except Exception:
         return None
     return None
@@ -1458,7 +1459,7 @@ def build_lab_report_pdf_bytes(
         pdf_url = _lab_report_pdf_url(request, order_id_int, download=True) or None
 
     try:
-        from weasyprint import HTML, CSS  # type: ignore
+        from weasyprint import HTML  # type: ignore
 
         html = _build_lab_report_html(
             branding=branding,
@@ -1471,7 +1472,8 @@ def build_lab_report_pdf_bytes(
             base_url=base_url,
         )
         return HTML(string=html, base_url=str(settings.STORAGE_DIR)).write_pdf(
-            stylesheets=[CSS(string=_css())]
+            stylesheets=[pdf_assets.css(_css())],
+            font_config=pdf_assets.font_config(),
         )
     except Exception as e:
         logger.warning("WeasyPrint unavailable, using ReportLab fallback. Reason: %s", e)
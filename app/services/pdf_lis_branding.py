@@ -10,6 +10,8 @@ from reportlab.lib import colors
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 
+from app.services import pdf_assets
+
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------
@@ -47,7 +49,7 @@ def _try_image_reader(path: Path | None) -> Optional[ImageReader]:
     if not path:
         return None
     try:
-        return ImageReader(str(path))
+        return pdf_assets.image_reader(path)
     except Exception:
         logger.exception("Image load failed: %s", path)
         return None
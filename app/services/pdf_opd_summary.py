@@ -11,7 +11,6 @@ from sqlalchemy.orm import Session, joinedload
 from fastapi import HTTPException
 from sqlalchemy import case
 from app.core.config import settings
-from app.models.ui_branding import UiBranding
 from app.models.patient import Patient
 from app.models.department import Department
 from app.models.user import User
@@ -27,6 +26,7 @@ from app.models.opd import (
     FollowUp,
 )
 
+from app.services import pdf_assets, pdf_cache
 from app.services.pdf_branding import brand_header_css, render_brand_header_html
 
 
@@ -774,7 +774,7 @@ def _build_visit_summary_pdf_reportlab(
         try:
             abs_path = Path(settings.STORAGE_DIR).joinpath(logo_path)
             if abs_path.exists() and abs_path.is_file():
-                return ImageReader(str(abs_path))
+                return pdf_assets.image_reader(abs_path)
         except Exception:
             return None
         return None
@@ -1400,7 +1400,7 @@ def build_visit_summary_pdf(db: Session, visit_id: int) -> BytesIO:
     dept: Department = v.department
     doctor: User = v.doctor
 
-    branding = db.query(UiBranding).order_by(UiBranding.id.desc()).first()
+    branding = pdf_assets.branding(db)
     if not branding:
 
         class _B:
@@ -1464,42 +1464,58 @@ def build_visit_summary_pdf(db: Session, visit_id: int) -> BytesIO:
             FollowUp.id.desc(),
         ).limit(10).all())
 
-    # Try WeasyPrint first
-    try:
-        from weasyprint import HTML  # type: ignore
-
-        html = _build_visit_summary_html(
-            branding_obj=branding,
-            visit=v,
-            patient=patient,
-            dept=dept,
-            doctor=doctor,
-            vitals=vit,
-            rx=rx,
-            rx_items=rx_items,
-            lab_names=lab_names,
-            rad_names=rad_names,
-            followups=followups,
-        )
-        pdf_bytes = HTML(string=html,
-                         base_url=str(settings.STORAGE_DIR)).write_pdf()
-        buff = BytesIO(pdf_bytes)
-        buff.seek(0)
-        return buff
-    except Exception:
-        pdf_bytes = _build_visit_summary_pdf_reportlab(
-            branding_obj=branding,
-            visit=v,
-            patient=patient,
-            dept=dept,
-            doctor=doctor,
-            vitals=vit,
-            rx=rx,
-            rx_items=rx_items,
-            lab_names=lab_names,
-            rad_names=rad_names,
-            followups=followups,
-        )
-        buff = BytesIO(pdf_bytes)
-        buff.seek(0)
-        return buff
+    def _render() -> bytes:
+        # Try WeasyPrint first
+        try:
+            from weasyprint import HTML  # type: ignore
+
+            html = _build_visit_summary_html(
+                branding_obj=branding,
+                visit=v,
+                patient=patient,
+                dept=dept,
+                doctor=doctor,
+                vitals=vit,
+                rx=rx,
+                rx_items=rx_items,
+                lab_names=lab_names,
+                rad_names=rad_names,
+                followups=followups,
+            )
+            return HTML(string=html,
+                        base_url=str(settings.STORAGE_DIR)).write_pdf(
+                            font_config=pdf_assets.font_config())
+        except Exception:
+            return _build_visit_summary_pdf_reportlab(
+                branding_obj=branding,
+                visit=v,
+                patient=patient,
+                dept=dept,
+                doctor=doctor,
+                vitals=vit,
+                rx=rx,
+                rx_items=rx_items,
+                lab_names=lab_names,
+                rad_names=rad_names,
+                followups=followups,
+            )
+
+    # Visits carry no status / updated_at: the version is a digest of every
+    # row loaded above (age is printed, hence today's date).
+    version = [
+        pdf_cache.row_digest(v, patient, dept, doctor, vit, rx, *rx_items,
+                             *(o for o, _ in lab_rows), *(o for o, _ in rad_rows),
+                             *followups),
+        lab_names,
+        rad_names,
+        date.today(),
+    ]
+    pdf = pdf_cache.get_or_render(db,
+                                  "opd_visit_summary",
+                                  visit_id,
+                                  version,
+                                  _render,
+                                  options=(pdf_cache.branding_version(branding), ))
+    buff = BytesIO(pdf.data)
+    buff.seek(0)
+    return buff
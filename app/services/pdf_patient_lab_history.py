@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 
 from app.models.lis import LisOrder
 from app.services.emr_lab_report import build_emr_lab_report_object_for_pdf
-from app.services.ui_branding import get_ui_branding
+from app.services import pdf_assets
 from app.services.pdf_lab_report_weasy import build_lab_report_pdf_bytes
 
 
@@ -39,7 +39,7 @@ def build_patient_lab_history_pdf(
     if not orders:
         raise HTTPException(status_code=404, detail="No lab reports found")
 
-    branding = get_ui_branding(db)
+    branding = pdf_assets.branding(db)
 
     pdf_list: list[bytes] = []
     for o in orders:
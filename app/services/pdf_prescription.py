@@ -11,10 +11,10 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.lib import colors
 from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 
 from app.core.config import settings
+from app.services import pdf_assets
 from app.services.pdf_branding import brand_header_css, render_brand_header_html
 
 
@@ -785,7 +785,8 @@ def build_prescription_pdf(
             patient=patient,
             doctor=doctor,
         )
-        pdf_bytes = HTML(string=html, base_url=str(settings.STORAGE_DIR)).write_pdf()
+        pdf_bytes = HTML(string=html, base_url=str(settings.STORAGE_DIR)).write_pdf(
+            font_config=pdf_assets.font_config())
         return pdf_bytes, "application/pdf"
     except Exception:
         return _build_prescription_pdf_reportlab(
@@ -891,7 +892,7 @@ def _build_prescription_pdf_reportlab(
             try:
                 abs_path = Path(settings.STORAGE_DIR).joinpath(logo_path)
                 if abs_path.exists() and abs_path.is_file():
-                    img = ImageReader(str(abs_path))
+                    img = pdf_assets.image_reader(abs_path)
                     c.drawImage(img, x, y_top - logo_h, width=logo_w, height=logo_h,
                                 preserveAspectRatio=True, mask="auto")
             except Exception:
@@ -0,0 +1,383 @@
+# FILE: app/services/pdf_render_pool.py
+"""
+Off-request PDF rendering.
+
+Large renders (IPD case sheet, EMR export bundles, OPD / lab history
+merges, WeasyPrint summaries) run inside the request worker, holding it
+for seconds and leaving its RSS inflated afterwards. Endpoints that accept
+`?async=1` enqueue a job instead and answer 202:
+
+  submit()       queue a render -> job dict ("queued")
+  get_job()      poll: queued / running / done / failed
+  result_path()  finished PDF, served by /pdf/jobs/{id}/download
+
+Jobs run in a spawn-started process pool of PDF_RENDER_WORKERS processes;
+each process is replaced after PDF_RENDER_JOBS_PER_WORKER jobs, so memory
+left behind by WeasyPrint / ReportLab is returned to the OS. A job opens
+its own tenant session from the DB URI and calls a renderer named as
+"module:function" with db=... plus the job params. The renderer may
+return PDF bytes, a BytesIO, a (bytes, ...) tuple or a JSON-able dict
+(e.g. EMR export, which stores the file itself).
+
+Per tenant, at most PDF_RENDER_TENANT_CONCURRENCY jobs render at once
+(per API process); the rest wait in FIFO order, so one hospital printing
+forty case sheets does not starve the others. Each render is cut off
+after PDF_RENDER_TIMEOUT_SECONDS (SIGALRM inside the render process).
+
+Job state is kept as files under STORAGE_DIR/pdf_jobs/<tenant>/ so any
+API worker can answer a poll; files older than PDF_RENDER_JOB_TTL_MINUTES
+are swept on submit. The DB URI is held in memory only, never written.
+"""
+from __future__ import annotations
+
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+_SAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+# ============================================================
+# Job files
+# ============================================================
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+def _jobs_root() -> Path:
+    return Path(settings.STORAGE_DIR).resolve() / "pdf_jobs"
+
+
+def _tenant(db: Session) -> str:
+    url = getattr(db.get_bind(), "url", None)
+    return _SAFE.sub("_", str(getattr(url, "database", None) or "default"))
+
+
+def _db_uri(db: Session) -> str:
+    return db.get_bind().url.render_as_string(hide_password=False)
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _pdf_path(job_path: Path) -> Path:
+    return job_path.with_suffix(".pdf")
+
+
+# ============================================================
+# Render process side
+# ============================================================
+def _init_worker() -> None:
+    # renderers import their own modules; this registers the rest of the tenant tables
+    import app.db.base  # noqa: F401  (side effect: registers every tenant model for FK / relationship resolution)
+
+
+def _on_alarm(_signum, _frame):
+    raise RenderTimeout()
+
+
+def _resolve(target: str):
+    module, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def _as_pdf_bytes(out: Any) -> Optional[bytes]:
+    if isinstance(out, (bytes, bytearray, memoryview)):
+        return bytes(out)
+    if hasattr(out, "getvalue"):
+        return bytes(out.getvalue())
+    if isinstance(out, (tuple, list)):
+        for x in out:
+            b = _as_pdf_bytes(x)
+            if b:
+                return b
+    return None
+
+
+def _run_job(db_uri: str, target: str, params: Dict[str, Any], job_path: str, timeout: int) -> Dict[str, Any]:
+    """Body of one job inside a render process. Returns the outcome, never raises."""
+    from app.db.session import create_tenant_session
+
+    path = Path(job_path)
+    rec = _read_json(path) or {}
+    rec.update(status=RUNNING, started_at=_now(), pid=os.getpid())
+    _write_json(path, rec)
+
+    use_alarm = timeout > 0 and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.alarm(int(timeout))
+
+    t0 = time.perf_counter()
+    db = create_tenant_session(db_uri)
+    try:
+        out = _resolve(target)(db=db, **params)
+        pdf = _as_pdf_bytes(out)
+        if pdf is not None:
+            tmp = _pdf_path(path).with_suffix(".pdf.tmp")
+            tmp.write_bytes(pdf)
+            os.replace(tmp, _pdf_path(path))
+            return {"status": DONE, "bytes": len(pdf), "render_ms": int((time.perf_counter() - t0) * 1000)}
+        if isinstance(out, dict):
+            return {"status": DONE, "result": json.loads(json.dumps(out, default=str)),
+                    "render_ms": int((time.perf_counter() - t0) * 1000)}
+        return {"status": FAILED, "error": f"Renderer returned {type(out).__name__}"}
+    except RenderTimeout:
+        db.rollback()
+        return {"status": FAILED, "error": f"Render timed out after {timeout}s"}
+    except Exception as e:
+        db.rollback()
+        logger.exception("PDF render job failed: %s", target)
+        return {"status": FAILED, "error": str(getattr(e, "detail", None) or e or type(e).__name__)}
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+        db.close()
+
+
+# ============================================================
+# Dispatcher (API process side)
+# ============================================================
+@dataclass
+class _Job:
+    id: str
+    tenant: str
+    db_uri: str
+    target: str
+    params: Dict[str, Any]
+    path: Path
+
+
+class _Dispatcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running: Dict[str, int] = defaultdict(int)
+        self._waiting: Dict[str, Deque[_Job]] = defaultdict(deque)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=max(1, int(settings.PDF_RENDER_WORKERS)),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    max_tasks_per_child=max(1, int(settings.PDF_RENDER_JOBS_PER_WORKER)),
+                )
+            return self._executor
+
+    def _reset(self, broken: Optional[ProcessPoolExecutor]) -> None:
+        with self._lock:
+            if broken is not None and self._executor is not broken:
+                return
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=False)
+
+    def submit(self, job: _Job) -> None:
+        limit = max(1, int(settings.PDF_RENDER_TENANT_CONCURRENCY))
+        with self._lock:
+            if self._running[job.tenant] >= limit:
+                self._waiting[job.tenant].append(job)
+                return
+            self._running[job.tenant] += 1
+        self._start(job)
+
+    def _start(self, job: _Job) -> None:
+        pool = None
+        try:
+            pool = self._pool()
+            fut = pool.submit(_run_job, job.db_uri, job.target, job.params, str(job.path),
+                              int(settings.PDF_RENDER_TIMEOUT_SECONDS))
+        except Exception as e:  # BrokenProcessPool / interpreter shutdown
+            self._reset(pool)
+            self._finish(job, {"status": FAILED, "error": f"Render pool unavailable: {e}"})
+            return
+        fut.add_done_callback(lambda f, job=job, pool=pool: self._done(job, pool, f))
+
+    def _done(self, job: _Job, pool: ProcessPoolExecutor, fut: Future) -> None:
+        try:
+            outcome = fut.result()
+        except BrokenProcessPool:
+            self._reset(pool)
+            outcome = {"status": FAILED, "error": "Render process died (out of memory?)"}
+        except Exception as e:
+            outcome = {"status": FAILED, "error": str(e) or type(e).__name__}
+        self._finish(job, outcome)
+
+    def _finish(self, job: _Job, outcome: Dict[str, Any]) -> None:
+        try:
+            rec = _read_json(job.path) or {}
+            rec.update(outcome)
+            rec["finished_at"] = _now()
+            _write_json(job.path, rec)
+        except Exception:
+            logger.exception("PDF job %s: failed to store outcome", job.id)
+
+        nxt = None
+        with self._lock:
+            self._running[job.tenant] -= 1
+            waiting = self._waiting.get(job.tenant)
+            if waiting:
+                nxt = waiting.popleft()
+                self._running[job.tenant] += 1
+            if not waiting:
+                self._waiting.pop(job.tenant, None)
+            if self._running[job.tenant] <= 0:
+                self._running.pop(job.tenant, None)
+        if nxt is not None:
+            self._start(nxt)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            ex, self._executor = self._executor, None
+            self._waiting.clear()
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+
+_dispatcher = _Dispatcher()
+_last_sweep = [0.0]
+
+
+def _sweep(tenant_dir: Path) -> None:
+    """Drop job files past the TTL (at most once a minute per process)."""
+    now = time.time()
+    if now - _last_sweep[0] < 60:
+        return
+    _last_sweep[0] = now
+    cutoff = now - int(settings.PDF_RENDER_JOB_TTL_MINUTES) * 60
+    try:
+        with os.scandir(tenant_dir) as it:
+            for e in it:
+                try:
+                    if e.is_file() and e.stat().st_mtime < cutoff:
+                        os.unlink(e.path)
+                except OSError:
+                    pass
+    except FileNotFoundError:
+        pass
+
+
+# ============================================================
+# Public API
+# ============================================================
+def enabled() -> bool:
+    return int(settings.PDF_RENDER_WORKERS or 0) > 0
+
+
+def submit(
+    db: Session,
+    target: str,
+    params: Dict[str, Any],
+    *,
+    filename: str,
+    user_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Queue `target(db=..., **params)`; params must be picklable."""
+    tenant = _tenant(db)
+    tenant_dir = _jobs_root() / tenant
+    _sweep(tenant_dir)
+
+    job_id = uuid.uuid4().hex
+    path = tenant_dir / f"{job_id}.json"
+    rec = {
+        "id": job_id,
+        "target": target,
+        "params": params,
+        "filename": filename,
+        "user_id": user_id,
+        "status": QUEUED,
+        "created_at": _now(),
+    }
+    _write_json(path, rec)
+    _dispatcher.submit(_Job(job_id, tenant, _db_uri(db), target, dict(params), path))
+    return rec
+
+
+def get_job(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    if not _JOB_ID.match(job_id or ""):
+        return None
+    rec = _read_json(_jobs_root() / _tenant(db) / f"{job_id}.json")
+    if rec and rec.get("status") in (QUEUED, RUNNING):
+        # the API process that owned it restarted
+        created = datetime.fromisoformat(rec["created_at"])
+        if datetime.utcnow() - created > timedelta(minutes=int(settings.PDF_RENDER_JOB_TTL_MINUTES)):
+            rec.update(status=FAILED, error="Job lost (server restarted)")
+    return rec
+
+
+def result_path(db: Session, job: Dict[str, Any]) -> Optional[Path]:
+    path = _pdf_path(_jobs_root() / _tenant(db) / f"{job['id']}.json")
+    return path if path.exists() else None
+
+
+def public(job: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: job.get(k) for k in ("id", "status", "filename", "created_at", "started_at",
+                                   "finished_at", "error", "bytes", "render_ms", "result")}
+    base = f"{settings.API_V1_STR}/pdf/jobs/{job['id']}"
+    out["status_url"] = base
+    out["download_url"] = f"{base}/download" if job.get("status") == DONE and job.get("bytes") else None
+    return out
+
+
+def accepted(job: Dict[str, Any]) -> JSONResponse:
+    """202 answer for an `?async=1` request."""
+    body = public(job)
+    return JSONResponse(status_code=202, content=body, headers={"Location": body["status_url"]})
+
+
+def shutdown() -> None:
+    _dispatcher.shutdown()
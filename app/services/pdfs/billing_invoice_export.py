@@ -19,6 +19,7 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.pdfgen import canvas
 
 from app.core.config import settings
+from app.services import pdf_assets
 
 
 # ----------------------------
@@ -275,7 +276,7 @@ def _read_logo_reader(branding: Any) -> Optional[ImageReader]:
     if not abs_path.exists() or not abs_path.is_file():
         return None
     try:
-        return ImageReader(str(abs_path))
+        return pdf_assets.image_reader(abs_path)
     except Exception:
         return None
 
@@ -20,6 +20,7 @@ from reportlab.platypus import (
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 
 from app.models.ui_branding import UiBranding
+from app.services import pdf_assets
 
 logger = logging.getLogger(__name__)
 IST = ZoneInfo("Asia/Kolkata")
@@ -63,7 +64,7 @@ def _img_reader(path: Optional[str]) -> Optional[ImageReader]:
         logger.warning("PDF image not found: %s", path)
         return None
     try:
-        return ImageReader(str(p))
+        return pdf_assets.image_reader(p)
     except Exception:
         logger.exception("Failed to load image: %s", path)
         return None
@@ -73,7 +74,7 @@ def _img_reader(path: Optional[str]) -> Optional[ImageReader]:
 # Branding loader
 # -----------------------------
 def get_branding(db) -> UiBranding:
-    b = db.query(UiBranding).order_by(UiBranding.id.asc()).first()
+    b = pdf_assets.branding(db)
     if not b:
         # return a dummy object-like fallback
         b = UiBranding()
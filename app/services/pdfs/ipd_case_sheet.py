@@ -21,7 +21,6 @@ from reportlab.platypus import (
 )
 from reportlab.lib import colors
 from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
 
 logger = logging.getLogger(__name__)
 
@@ -69,7 +68,7 @@ except Exception:  # pragma: no cover
     IpdNewbornResuscitation = None  # type: ignore
 
 from app.models.pdf_template import PdfTemplate
-from app.models.ui_branding import UiBranding
+from app.services import pdf_assets
 
 from app.services.pdfs.engine import (
     build_pdf,
@@ -205,7 +204,7 @@ def _rl_image_fit(abs_path: str | None, max_w, max_h, hAlign: str = "LEFT"):
         return Spacer(max_w, max_h)
 
     try:
-        ir = ImageReader(abs_path)
+        ir = pdf_assets.image_reader(abs_path)
         iw, ih = ir.getSize()
         if not iw or not ih:
             return Spacer(max_w, max_h)
@@ -733,10 +732,7 @@ def _load_ipd_case_sheet_data(
 def _gov_header(db, d: IpdCaseSheetData) -> List[Any]:
     branding = None
     try:
-        q = db.query(UiBranding).order_by(UiBranding.id.desc())
-        if hasattr(UiBranding, "is_active"):
-            q = q.filter(UiBranding.is_active == True)  # noqa: E712
-        branding = q.first()
+        branding = pdf_assets.branding(db)
     except Exception:
         branding = None
 
@@ -14,6 +14,7 @@ from reportlab.pdfgen import canvas
 from sqlalchemy.orm import Session, joinedload
 
 from app.models.ui_branding import UiBranding
+from app.services import pdf_assets
 from app.models.ipd import (
     IpdAdmission,
     IpdBed,
@@ -148,7 +149,7 @@ def _draw_logo(c: canvas.Canvas, x, y, w, h, branding: Optional[UiBranding], ctx
 # Fetch data from DB
 # -------------------------
 def _get_branding(db: Session) -> Optional[UiBranding]:
-    return db.query(UiBranding).order_by(UiBranding.id.asc()).first()
+    return pdf_assets.branding(db)
 
 def _get_patient(db: Session, adm: IpdAdmission):
     if hasattr(adm, "patient") and adm.patient is not None:
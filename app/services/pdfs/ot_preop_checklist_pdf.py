@@ -11,11 +11,12 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.lib import colors
-from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.lib.utils import simpleSplit
 from reportlab.pdfbase import pdfmetrics
 
 from app.core.config import settings
 from app.models.ui_branding import UiBranding
+from app.services import pdf_assets
 
 IST = ZoneInfo("Asia/Kolkata")
 
@@ -417,7 +418,7 @@ def _draw_brand_header(c: canvas.Canvas, branding: UiBranding, x: float,
         abs_path = Path(settings.STORAGE_DIR).joinpath(logo_path)
         if abs_path.exists():
             try:
-                img = ImageReader(str(abs_path))
+                img = pdf_assets.image_reader(abs_path)
                 c.drawImage(
                     img,
                     logo_x,
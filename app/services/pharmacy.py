@@ -13,6 +13,7 @@ from sqlalchemy.orm import Session, selectinload
 
 from app.models.user import User
 
+from app.services.daily_rollups import touch as touch_rollups
 from app.services.drug_schedules import get_schedule_meta
 from app.services.inventory import create_stock_transaction
 from app.models.pharmacy_prescription import (
@@ -1520,6 +1521,14 @@ def create_counter_sale(
 # ============================================================
 # Sale operations
 # ============================================================
+def _touch_sale_rollups(db: Session, sale: PharmacySale) -> None:
+    # a draft finalized or a bill cancelled on a later day changes the
+    # pharmacy rollups of the sale's own days (created_at for MIS sales,
+    # bill_datetime for dispensed medicines)
+    for when in {sale.created_at, sale.bill_datetime}:
+        touch_rollups(db, when, "pharmacy")
+
+
 def finalize_sale(db: Session, sale_id: int, current_user: User) -> PharmacySale:
     sale = (
         db.query(PharmacySale)
@@ -1542,6 +1551,7 @@ def finalize_sale(db: Session, sale_id: int, current_user: User) -> PharmacySale
     # keep billing in sync (create if missing)
     db.flush()
     _ensure_billing_invoice_for_sale(db, sale, current_user)
+    _touch_sale_rollups(db, sale)
 
     db.commit()
     db.refresh(sale)
@@ -1582,6 +1592,8 @@ def cancel_sale(db: Session, sale_id: int, reason: str, current_user: User) -> P
             inv.void_reason = reason
             inv.updated_by = getattr(current_user, "id", None)
 
+    db.flush()
+    _touch_sale_rollups(db, sale)
     db.commit()
     db.refresh(sale)
     return sale
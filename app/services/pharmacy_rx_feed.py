@@ -0,0 +1,69 @@
+# FILE: app/services/pharmacy_rx_feed.py
+"""
+Push feed for the pharmacy prescription queue (GET /pharmacy/rx).
+
+  * every flush that inserts, edits or deletes a PharmacyPrescription or
+    one of its lines (new OPD / IPD / counter Rx, sign, dispense, cancel)
+    marks the prescription from a Session hook
+  * after commit the marked prescriptions are pushed on the event bus
+    under event_bus.PHARMACY as
+    {"type": "pharmacy.rx.changed", "rx_ids": [...]}; the dispensing
+    screen reloads /pharmacy/rx (or just those rows)
+"""
+from __future__ import annotations
+
+import logging
+from typing import Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.pharmacy_prescription import PharmacyPrescription, PharmacyPrescriptionLine
+from app.services import event_bus
+
+logger = logging.getLogger(__name__)
+
+_PENDING = "pharmacy_rx_pending"
+
+
+def _rx_id(o) -> int:
+    if isinstance(o, PharmacyPrescription):
+        return int(o.id or 0)
+    if isinstance(o, PharmacyPrescriptionLine):
+        return int(o.prescription_id or 0)
+    return 0
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_rx(session: Session, _flush_context) -> None:
+    ids: Set[int] = set()
+    for o in session.new:
+        ids.add(_rx_id(o))
+    for o in session.dirty:
+        if isinstance(o, (PharmacyPrescription, PharmacyPrescriptionLine)) \
+                and session.is_modified(o, include_collections=False):
+            ids.add(_rx_id(o))
+    for o in session.deleted:
+        ids.add(_rx_id(o))
+    ids.discard(0)
+    if ids:
+        session.info.setdefault(_PENDING, set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_rx(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    try:
+        event_bus.publish(event_bus.tenant_of(session), event_bus.PHARMACY,
+                          {"type": "pharmacy.rx.changed", "rx_ids": sorted(pending)})
+    except Exception:
+        logger.warning("pharmacy rx push failed", exc_info=True)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_uncommitted(session: Session, transaction) -> None:
+    # after_commit has already taken the committed ones
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
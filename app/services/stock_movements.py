@@ -0,0 +1,363 @@
+# FILE: app/services/stock_movements.py
+"""
+Per-day stock movement summary (inv_stock_daily_movements).
+
+Reorder / PO suggestions, non-moving detection, movement buckets and
+spike detection used to sum StockTransaction over the last N days on
+every request - a range scan over the fastest-growing pharmacy table.
+The same sums are kept per (day, location, item, txn_type):
+
+  - after_flush hook  every StockTransaction inserted through the ORM
+                      (create_stock_transaction and the services that
+                      build rows directly) is folded into its day row in
+                      the same transaction; the ledger is append-only
+  - rebuild_days()    recompute whole days from the ledger (backfill,
+                      nightly self-heal for rows written outside the ORM)
+  - totals_query()    windowed sums / last movement: stored rows for the
+                      whole covered days + the ledger for the partial
+                      boundary days, so results match the ledger exactly
+
+Days before inv_stock_movement_coverage.covered_from (everything, until
+the first backfill) are read from the ledger.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, delete, event, func, insert, literal, or_, select, union_all, update
+from sqlalchemy.orm import Session
+
+from app.models.pharmacy_inventory import (
+    InventoryItem,
+    StockDailyMovement,
+    StockMovementCoverage,
+    StockTransaction,
+)
+
+logger = logging.getLogger(__name__)
+
+CONSUMPTION_TYPES = ("DISPENSE", "SALE", "ISSUE")
+_KEY_COLS = ("day", "location_id", "item_id", "txn_type")
+_ZERO = Decimal("0")
+
+
+def _dec(v: Any) -> Decimal:
+    if v is None:
+        return _ZERO
+    return v if isinstance(v, Decimal) else Decimal(str(v))
+
+
+# ============================================================
+# Incremental maintenance
+# ============================================================
+def _fold(txns: Iterable[StockTransaction]) -> Dict[Tuple, List[Any]]:
+    acc: Dict[Tuple, List[Any]] = {}
+    for st in txns:
+        t = st.txn_time or datetime.utcnow()
+        q = _dec(st.quantity_change)
+        key = (t.date(), int(st.location_id), int(st.item_id), str(st.txn_type))
+        a = acc.get(key)
+        if a is None:
+            a = acc[key] = [_ZERO, _ZERO, 0, t]
+        if q > 0:
+            a[0] += q
+        elif q < 0:
+            a[1] -= q
+        a[2] += 1
+        if t > a[3]:
+            a[3] = t
+    return acc
+
+
+def _upsert(conn, acc: Dict[Tuple, List[Any]]) -> None:
+    t = StockDailyMovement.__table__
+    # key order = lock order (concurrent dispensing of the same items)
+    rows = [
+        {"day": k[0], "location_id": k[1], "item_id": k[2], "txn_type": k[3],
+         "qty_in": a[0], "qty_out": a[1], "txn_count": a[2], "last_txn_time": a[3]}
+        for k, a in sorted(acc.items())
+    ]
+    dialect = conn.dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(t)
+        new = stmt.inserted
+        stmt = stmt.on_duplicate_key_update(
+            qty_in=t.c.qty_in + new.qty_in,
+            qty_out=t.c.qty_out + new.qty_out,
+            txn_count=t.c.txn_count + new.txn_count,
+            last_txn_time=func.greatest(func.coalesce(t.c.last_txn_time, new.last_txn_time), new.last_txn_time),
+        )
+        conn.execute(stmt, rows)
+        return
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            greatest = func.max  # scalar max(a, b)
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            greatest = func.greatest
+        stmt = dialect_insert(t)
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_KEY_COLS),
+            set_={
+                "qty_in": t.c.qty_in + new.qty_in,
+                "qty_out": t.c.qty_out + new.qty_out,
+                "txn_count": t.c.txn_count + new.txn_count,
+                "last_txn_time": greatest(func.coalesce(t.c.last_txn_time, new.last_txn_time), new.last_txn_time),
+            },
+        )
+        conn.execute(stmt, rows)
+        return
+
+    for r in rows:
+        res = conn.execute(
+            update(t)
+            .where(*(t.c[k] == r[k] for k in _KEY_COLS))
+            .values(
+                qty_in=t.c.qty_in + r["qty_in"],
+                qty_out=t.c.qty_out + r["qty_out"],
+                txn_count=t.c.txn_count + r["txn_count"],
+                last_txn_time=case(
+                    (t.c.last_txn_time >= r["last_txn_time"], t.c.last_txn_time),
+                    else_=r["last_txn_time"],
+                ),
+            )
+        )
+        if not res.rowcount:
+            conn.execute(insert(t).values(**r))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_new_transactions(session: Session, _flush_context) -> None:
+    # session.new still lists the objects just inserted (ids, defaults set)
+    txns = [o for o in session.new if isinstance(o, StockTransaction)]
+    if not txns:
+        return
+    conn = session.connection()
+    try:
+        with conn.begin_nested():
+            _upsert(conn, _fold(txns))
+    except Exception:
+        # never fail the stock movement; reads fall back to the ledger
+        # until the next rebuild restores coverage
+        logger.warning("stock movement summary update failed; dropping coverage", exc_info=True)
+        try:
+            with conn.begin_nested():
+                conn.execute(delete(StockMovementCoverage.__table__))
+        except Exception:
+            logger.warning("could not drop stock movement coverage", exc_info=True)
+
+
+# ============================================================
+# Backfill / refresh
+# ============================================================
+def rebuild_days(db: Session, d_from: date, d_to: date) -> int:
+    """Recompute [d_from, d_to] from the ledger. Returns rows written."""
+    m, st = StockDailyMovement, StockTransaction
+    lo = datetime.combine(d_from, time.min)
+    hi = datetime.combine(d_to + timedelta(days=1), time.min)
+
+    db.execute(delete(m).where(m.day >= d_from, m.day <= d_to))
+    day = func.date(st.txn_time)
+    src = (
+        select(
+            day,
+            st.location_id,
+            st.item_id,
+            st.txn_type,
+            func.coalesce(func.sum(case((st.quantity_change > 0, st.quantity_change), else_=0)), 0),
+            func.coalesce(func.sum(case((st.quantity_change < 0, -st.quantity_change), else_=0)), 0),
+            func.count(st.id),
+            func.max(st.txn_time),
+        )
+        .where(st.txn_time >= lo, st.txn_time < hi)
+        .group_by(day, st.location_id, st.item_id, st.txn_type)
+    )
+    res = db.execute(
+        insert(m).from_select(
+            ["day", "location_id", "item_id", "txn_type", "qty_in", "qty_out", "txn_count", "last_txn_time"],
+            src,
+        )
+    )
+    return int(res.rowcount or 0)
+
+
+def first_ledger_day(db: Session) -> Optional[date]:
+    first = db.query(func.min(StockTransaction.txn_time)).scalar()
+    if first is None:
+        return None
+    if not isinstance(first, datetime):
+        first = datetime.fromisoformat(str(first))  # SQLite MIN() over DATETIME text
+    return first.date()
+
+
+def covered_from(db: Session) -> Optional[date]:
+    v = db.query(StockMovementCoverage.covered_from).filter(StockMovementCoverage.id == 1).scalar()
+    if v is not None and not isinstance(v, date):
+        v = date.fromisoformat(str(v)[:10])
+    return v
+
+
+def set_covered_from(db: Session, day: Optional[date]) -> None:
+    """Mark days >= `day` complete (None: read everything from the ledger)."""
+    row = db.get(StockMovementCoverage, 1)
+    if day is None:
+        if row is not None:
+            db.delete(row)
+    elif row is None:
+        db.add(StockMovementCoverage(id=1, covered_from=day, refreshed_at=datetime.utcnow()))
+    else:
+        row.covered_from = day
+        row.refreshed_at = datetime.utcnow()
+    db.flush()
+
+
+# ============================================================
+# Reading
+# ============================================================
+@dataclass(frozen=True)
+class Window:
+    """One summed column: txn_time in [since, until), optional txn types."""
+    since: Optional[datetime] = None    # None: whole history
+    until: Optional[datetime] = None    # exclusive, midnight-aligned
+    types: Optional[Tuple[str, ...]] = None
+    measure: str = "out"                # out (OUT qty) | net (qty change) | count
+
+
+def _midnight(d: date) -> datetime:
+    return datetime.combine(d, time.min)
+
+
+def _first_summary_day(since: Optional[datetime], cover: date) -> date:
+    if since is None:
+        return cover
+    d = since.date()
+    if since != _midnight(d):
+        d += timedelta(days=1)  # partial day -> ledger
+    return max(d, cover)
+
+
+def _sum_if(cond, value):
+    return func.coalesce(func.sum(case((cond, value), else_=0)), 0)
+
+
+def totals_query(
+    db: Session,
+    loc_ids: Sequence[int],
+    windows: Dict[str, Window],
+    *,
+    keys: Tuple[str, ...] = ("location_id", "item_id"),
+    last_time: bool = False,
+    item_filters: Sequence[Any] = (),
+):
+    """
+    Subquery: `keys` + one column per window (+ last_txn_time). Whole
+    covered days come from inv_stock_daily_movements, the rest (partial
+    boundary days, days before coverage) from StockTransaction, so only
+    those slices of the ledger are scanned.
+    """
+    for w in windows.values():
+        if w.until is not None and w.until != _midnight(w.until.date()):
+            raise ValueError("Window.until must be midnight-aligned")
+
+    cover = covered_from(db)
+    m, st = StockDailyMovement, StockTransaction
+    parts = []
+
+    # ---- ledger slices ----
+    cols = [getattr(st, k).label(k) for k in keys]
+    ranges = []
+    for name, w in windows.items():
+        hi = w.until
+        if cover is not None:
+            cut = _midnight(_first_summary_day(w.since, cover))
+            hi = cut if hi is None else min(hi, cut)
+        if w.since is not None and hi is not None and w.since >= hi:
+            cols.append(literal(0).label(name))
+            continue
+        rng = []
+        if w.since is not None:
+            rng.append(st.txn_time >= w.since)
+        if hi is not None:
+            rng.append(st.txn_time < hi)
+        ranges.append(and_(*rng) if rng else literal(True))
+        cond = list(rng)
+        if w.types:
+            cond.append(st.txn_type.in_(w.types))
+        if w.measure == "out":
+            cond.append(st.quantity_change < 0)
+            value = -st.quantity_change
+        elif w.measure == "net":
+            value = st.quantity_change
+        else:
+            value = 1
+        cols.append(_sum_if(and_(*cond) if cond else literal(True), value).label(name))
+    if last_time:
+        if cover is None:
+            cols.append(func.max(st.txn_time).label("last_txn_time"))
+            ranges.append(literal(True))
+        else:
+            before = st.txn_time < _midnight(cover)
+            cols.append(func.max(case((before, st.txn_time), else_=None)).label("last_txn_time"))
+            ranges.append(before)
+    if ranges:
+        q = select(*cols).where(st.location_id.in_(loc_ids), or_(*ranges))
+        if item_filters:
+            q = q.join(InventoryItem, InventoryItem.id == st.item_id).where(*item_filters)
+        parts.append(q.group_by(*(getattr(st, k) for k in keys)))
+
+    # ---- stored day rows ----
+    if cover is not None:
+        cols = [getattr(m, k).label(k) for k in keys]
+        first_days = [cover] if last_time else []
+        for name, w in windows.items():
+            first = _first_summary_day(w.since, cover)
+            first_days.append(first)
+            cond = [m.day >= first]
+            if w.until is not None:
+                cond.append(m.day < w.until.date())
+            if w.types:
+                cond.append(m.txn_type.in_(w.types))
+            value = {"out": m.qty_out, "net": m.qty_in - m.qty_out}.get(w.measure, m.txn_count)
+            cols.append(_sum_if(and_(*cond), value).label(name))
+        if last_time:
+            cols.append(func.max(m.last_txn_time).label("last_txn_time"))
+        q = select(*cols).where(m.location_id.in_(loc_ids), m.day >= min(first_days))
+        if item_filters:
+            q = q.join(InventoryItem, InventoryItem.id == m.item_id).where(*item_filters)
+        parts.append(q.group_by(*(getattr(m, k) for k in keys)))
+
+    if not parts:
+        # nothing to read (empty windows, no coverage): keep the column shape
+        empty = [literal(None).label(k) for k in keys] + [literal(0).label(n) for n in windows]
+        if last_time:
+            empty.append(literal(None).label("last_txn_time"))
+        return select(*empty).where(literal(False)).subquery()
+    if len(parts) == 1:
+        return parts[0].subquery()
+
+    u = union_all(*parts).subquery()
+    out = [u.c[k] for k in keys]
+    out += [func.coalesce(func.sum(u.c[n]), 0).label(n) for n in windows]
+    if last_time:
+        out.append(func.max(u.c.last_txn_time).label("last_txn_time"))
+    return select(*out).group_by(*(u.c[k] for k in keys)).subquery()
+
+
+def consumption_sq(db: Session, loc_ids: Sequence[int], since: datetime, types: Tuple[str, ...] = CONSUMPTION_TYPES):
+    """(location_id, item_id, out_qty): OUT quantity of `types` since `since`."""
+    return totals_query(db, loc_ids, {"out_qty": Window(since=since, types=types)})
+
+
+def last_movement_sq(db: Session, loc_ids: Sequence[int]):
+    """(location_id, item_id, last_txn_time): latest ledger entry of any type."""
+    return totals_query(db, loc_ids, {}, last_time=True)
@@ -15,6 +15,7 @@ from app.core.config import settings
 from app.core.security import hash_password
 from app.db.init_db import init_tenant_db
 from app.db.session import master_engine, get_or_create_tenant_engine
+from app.core.tenant_cache import invalidate_tenant
 from app.models.tenant import Tenant
 from app.models.user import User
 
@@ -341,5 +342,7 @@ def provision_tenant_with_admin(
     except Exception:
         master_db.rollback()
         return tenant
+    finally:
+        invalidate_tenant(code=tenant_code)
 
     return tenant